@@ -40,6 +40,7 @@ from pretix.base.models.auth import (
     EventPermissionSet, OrganizerPermissionSet, SuperuserPermissionSet,
 )
 from pretix.base.models.organizer import TeamAPIToken
+from pretix.base.services.resolution import resolve_event
 from pretix.helpers.security import (
     Session2FASetupRequired, SessionInvalid, SessionPasswordChangeRequired,
     SessionReauthRequired, assert_session_valid,
@@ -77,10 +78,13 @@ class EventPermission(BasePermission):
         perm_holder = (request.auth if isinstance(request.auth, (Device, TeamAPIToken))
                        else request.user)
         if 'event' in request.resolver_match.kwargs and 'organizer' in request.resolver_match.kwargs:
-            request.event = Event.objects.filter(
-                slug=request.resolver_match.kwargs['event'],
-                organizer__slug=request.resolver_match.kwargs['organizer'],
-            ).select_related('organizer').first()
+            try:
+                request.event = resolve_event(
+                    request.resolver_match.kwargs['organizer'],
+                    request.resolver_match.kwargs['event'],
+                )
+            except Event.DoesNotExist:
+                request.event = None
             if not request.event or not perm_holder.has_event_permission(request.event.organizer, request.event, request=request):
                 return False
             request.organizer = request.event.organizer
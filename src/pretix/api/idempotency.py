@@ -0,0 +1,271 @@
+#
+# This file is part of pretix (Community Edition).
+#
+# Copyright (C) 2014-2020  Raphael Michel and contributors
+# Copyright (C) 2020-today pretix GmbH and contributors
+#
+# This program is free software: you can redistribute it and/or modify it under the terms of the GNU Affero General
+# Public License as published by the Free Software Foundation in version 3 of the License.
+#
+# ADDITIONAL TERMS APPLY: Pursuant to Section 7 of the GNU Affero General Public License, additional terms are
+# applicable granting you additional permissions and placing additional restrictions on your usage of this software.
+# Please refer to the pretix LICENSE file to obtain the full terms applicable to this work. If you did not receive
+# this file, see <https://pretix.eu/about/en/license>.
+#
+# This program is distributed in the hope that it will be useful, but WITHOUT ANY WARRANTY; without even the implied
+# warranty of MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the GNU Affero General Public License for more
+# details.
+#
+# You should have received a copy of the GNU Affero General Public License along with this program.  If not, see
+# <https://www.gnu.org/licenses/>.
+#
+"""
+Storage for the responses of API calls with an ``X-Idempotency-Key`` header, such that a retried call returns the
+original response instead of being executed a second time. The backend is configured with ``IDEMPOTENCY_BACKEND``.
+"""
+import json
+import logging
+from datetime import timedelta
+from hashlib import sha1
+
+from django.conf import settings
+from django.db import IntegrityError, transaction
+from django.http import HttpResponse
+from django.utils.module_loading import import_string
+from django.utils.timezone import now
+
+from pretix.api.models import ApiCall
+
+logger = logging.getLogger(__name__)
+
+#: Returned instead of a stored response if a call with the same key is currently being executed
+LOCKED = object()
+
+
+def get_auth_hash(request):
+    auth_hash_parts = '{}:{}'.format(
+        request.headers.get('Authorization', ''),
+        request.COOKIES.get('__Host-' + settings.SESSION_COOKIE_NAME, request.COOKIES.get(settings.SESSION_COOKIE_NAME, ''))
+    )
+    return sha1(auth_hash_parts.encode()).hexdigest()
+
+
+def get_idempotency_backend():
+    return import_string(settings.IDEMPOTENCY_BACKEND)()
+
+
+class StoredResponse:
+
+    def __init__(self, status_code, headers, content):
+        self.status_code = status_code
+        self.headers = headers
+        self.content = content
+
+    @classmethod
+    def from_response(cls, resp):
+        if isinstance(resp.content, str):
+            content = resp.content.encode()
+        elif isinstance(resp.content, memoryview):
+            content = resp.content.tobytes()
+        elif isinstance(resp.content, bytes):
+            content = resp.content
+        elif hasattr(resp.content, 'read'):
+            content = resp.read()
+        elif hasattr(resp, 'data'):
+            content = json.dumps(resp.data).encode()
+        else:
+            content = repr(resp).encode()
+        return cls(resp.status_code, resp.headers._store, content)
+
+    def to_response(self):
+        r = HttpResponse(
+            content=self.content,
+            status=self.status_code,
+        )
+        for k, v in self.headers.values():
+            r[k] = v
+        return r
+
+
+class BaseIdempotencyBackend:
+
+    def acquire(self, auth_hash, idempotency_key, request):
+        """
+        Atomically reserves the key for a call that is about to be executed. Returns ``None`` if the caller should
+        execute the call, otherwise the same as :py:meth:`get`.
+        """
+        raise NotImplementedError()  # NOQA
+
+    def get(self, auth_hash, idempotency_key):
+        """
+        Returns ``None`` if the key is unknown or expired, ``LOCKED`` if a call with this key is currently being
+        executed, or the :py:class:`StoredResponse` of the call.
+        """
+        raise NotImplementedError()  # NOQA
+
+    def store(self, auth_hash, idempotency_key, request, response):
+        """
+        Stores the :py:class:`StoredResponse` of a call previously reserved with :py:meth:`acquire`.
+        """
+        raise NotImplementedError()  # NOQA
+
+    def release(self, auth_hash, idempotency_key):
+        """
+        Forgets a call previously reserved with :py:meth:`acquire`, such that it can be retried.
+        """
+        raise NotImplementedError()  # NOQA
+
+    def forget_responses(self, auth_hash, status_code):
+        """
+        Forgets all stored responses with the given status code for the given credentials.
+        """
+        raise NotImplementedError()  # NOQA
+
+
+class DatabaseIdempotencyBackend(BaseIdempotencyBackend):
+    """
+    Stores calls in the ``ApiCall`` table, where they are deleted after ``IDEMPOTENCY_TTL`` seconds.
+    """
+
+    def _expired(self, call):
+        if call.created < now() - timedelta(seconds=settings.IDEMPOTENCY_TTL):
+            return True
+        # The process that executed the call most likely died
+        return call.locked and call.locked < now() - timedelta(seconds=settings.IDEMPOTENCY_LOCK_TIMEOUT)
+
+    def _result(self, call):
+        if call.locked:
+            return LOCKED
+        content = call.response_body
+        if isinstance(content, memoryview):
+            content = content.tobytes()
+        return StoredResponse(call.response_code, json.loads(call.response_headers), content)
+
+    def acquire(self, auth_hash, idempotency_key, request):
+        for i in range(2):
+            try:
+                with transaction.atomic(durable=True):
+                    ApiCall.objects.create(
+                        auth_hash=auth_hash,
+                        idempotency_key=idempotency_key,
+                        locked=now(),
+                        request_method=request.method,
+                        request_path=request.path,
+                        response_code=0,
+                        response_headers='{}',
+                        response_body=b'',
+                    )
+                return None
+            except IntegrityError:
+                try:
+                    call = ApiCall.objects.get(auth_hash=auth_hash, idempotency_key=idempotency_key)
+                except ApiCall.DoesNotExist:
+                    continue  # Released in the meantime, try again
+                if not self._expired(call):
+                    return self._result(call)
+                # Deleting by primary key never removes the row of another caller that replaced it in the meantime
+                ApiCall.objects.filter(pk=call.pk).delete()
+        return LOCKED
+
+    def get(self, auth_hash, idempotency_key):
+        try:
+            call = ApiCall.objects.get(auth_hash=auth_hash, idempotency_key=idempotency_key)
+        except ApiCall.DoesNotExist:
+            return None
+        if self._expired(call):
+            # Expired calls are deleted by acquire() or cleanup_api_logs, such that this stays read-only
+            return None
+        return self._result(call)
+
+    def store(self, auth_hash, idempotency_key, request, response):
+        fields = {
+            'locked': None,
+            'request_method': request.method,
+            'request_path': request.path,
+            'response_code': response.status_code,
+            'response_headers': json.dumps(response.headers),
+            'response_body': response.content,
+        }
+        updated = ApiCall.objects.filter(auth_hash=auth_hash, idempotency_key=idempotency_key).update(**fields)
+        if not updated:
+            # Either the call has been reserved in redis, or our reservation expired and has been deleted. In the
+            # latter case, another call with the same key might already have stored its response. Our call has been
+            # executed nevertheless, so this must not turn it into an error.
+            try:
+                with transaction.atomic():
+                    ApiCall.objects.create(auth_hash=auth_hash, idempotency_key=idempotency_key, **fields)
+            except IntegrityError:
+                logger.warning(f'Response for idempotency key {idempotency_key} not stored, reservation was lost')
+
+    def release(self, auth_hash, idempotency_key):
+        ApiCall.objects.filter(auth_hash=auth_hash, idempotency_key=idempotency_key).delete()
+
+    def forget_responses(self, auth_hash, status_code):
+        ApiCall.objects.filter(auth_hash=auth_hash, response_code=status_code).delete()
+
+
+class RedisIdempotencyBackend(BaseIdempotencyBackend):
+    """
+    Stores calls in redis, where they expire after ``IDEMPOTENCY_TTL`` seconds. Responses larger than
+    ``IDEMPOTENCY_MAX_SIZE`` bytes are rare and are stored in the database instead to keep redis small.
+    """
+    key_prefix = 'pretix_idempotency'
+
+    def __init__(self):
+        import django_redis
+
+        self.rc = django_redis.get_redis_connection("redis")
+
+    def _key(self, auth_hash, idempotency_key):
+        return '{}:{}:{}'.format(self.key_prefix, auth_hash, sha1(idempotency_key.encode()).hexdigest())
+
+    def _status_key(self, auth_hash, status_code):
+        return '{}:{}:status:{}'.format(self.key_prefix, auth_hash, status_code)
+
+    def acquire(self, auth_hash, idempotency_key, request):
+        key = self._key(auth_hash, idempotency_key)
+        for i in range(2):
+            # An empty value marks a call that is being executed
+            if self.rc.set(key, b'', nx=True, ex=settings.IDEMPOTENCY_LOCK_TIMEOUT):
+                return None
+            result = self.get(auth_hash, idempotency_key)
+            if result is not None:
+                return result
+            # The existing call has expired in the meantime, try again
+        return LOCKED
+
+    def get(self, auth_hash, idempotency_key):
+        value = self.rc.get(self._key(auth_hash, idempotency_key))
+        if value is None:
+            return None
+        if not value:
+            return LOCKED
+        meta, content = value.split(b'\n', 1)
+        meta = json.loads(meta)
+        if meta.get('database'):
+            return DatabaseIdempotencyBackend().get(auth_hash, idempotency_key)
+        return StoredResponse(meta['status'], meta['headers'], content)
+
+    def store(self, auth_hash, idempotency_key, request, response):
+        key = self._key(auth_hash, idempotency_key)
+        if len(response.content) > settings.IDEMPOTENCY_MAX_SIZE:
+            DatabaseIdempotencyBackend().store(auth_hash, idempotency_key, request, response)
+            value = json.dumps({'database': True}).encode() + b'\n'
+        else:
+            value = json.dumps({'status': response.status_code, 'headers': response.headers}).encode() + b'\n' + response.content
+        pipe = self.rc.pipeline()
+        pipe.set(key, value, ex=settings.IDEMPOTENCY_TTL)
+        if response.status_code >= 400:
+            # Remember which keys returned errors such that forget_responses() does not need to scan all keys
+            status_key = self._status_key(auth_hash, response.status_code)
+            pipe.sadd(status_key, key)
+            pipe.expire(status_key, settings.IDEMPOTENCY_TTL)
+        pipe.execute()
+
+    def release(self, auth_hash, idempotency_key):
+        self.rc.delete(self._key(auth_hash, idempotency_key))
+
+    def forget_responses(self, auth_hash, status_code):
+        status_key = self._status_key(auth_hash, status_code)
+        self.rc.delete(status_key, *self.rc.smembers(status_key))
+        DatabaseIdempotencyBackend().forget_responses(auth_hash, status_code)
@@ -19,21 +19,18 @@
 # You should have received a copy of the GNU Affero General Public License along with this program.  If not, see
 # <https://www.gnu.org/licenses/>.
 #
-import json
 import logging
-from hashlib import sha1
 
-from django.conf import settings
-from django.db import transaction
-from django.http import HttpRequest, HttpResponse, JsonResponse
+from django.http import HttpRequest, JsonResponse
 from django.urls import resolve
-from django.utils.timezone import now
 from django_scopes import scope
 from rest_framework import status
 
-from pretix.api.models import ApiCall
+from pretix.api.idempotency import (
+    LOCKED, StoredResponse, get_auth_hash, get_idempotency_backend,
+)
 from pretix.base.models import Organizer
-from pretix.helpers import OF_SELF
+from pretix.base.services.resolution import resolve_organizer
 
 logger = logging.getLogger(__name__)
 
@@ -52,75 +49,32 @@ class IdempotencyMiddleware:
         if not request.headers.get('X-Idempotency-Key'):
             return self.get_response(request)
 
-        auth_hash_parts = '{}:{}'.format(
-            request.headers.get('Authorization', ''),
-            request.COOKIES.get('__Host-' + settings.SESSION_COOKIE_NAME, request.COOKIES.get(settings.SESSION_COOKIE_NAME, ''))
-        )
-        auth_hash = sha1(auth_hash_parts.encode()).hexdigest()
+        auth_hash = get_auth_hash(request)
         idempotency_key = request.headers.get('X-Idempotency-Key', '')
+        backend = get_idempotency_backend()
 
-        with transaction.atomic(durable=True):
-            call, created = ApiCall.objects.select_for_update(of=OF_SELF).get_or_create(
-                auth_hash=auth_hash,
-                idempotency_key=idempotency_key,
-                defaults={
-                    'locked': now(),
-                    'request_method': request.method,
-                    'request_path': request.path,
-                    'response_code': 0,
-                    'response_headers': '{}',
-                    'response_body': b''
-                }
-            )
-
-        if created:
+        stored = backend.acquire(auth_hash, idempotency_key, request)
+        if stored is None:
             resp = self.get_response(request)
-            with transaction.atomic(durable=True):
-                if resp.status_code in (409, 429, 500, 503):
-                    # This is the exception: These calls are *meant* to be retried!
-                    call.delete()
-                else:
-                    call.response_code = resp.status_code
-                    if isinstance(resp.content, str):
-                        call.response_body = resp.content.encode()
-                    elif isinstance(resp.content, memoryview):
-                        call.response_body = resp.content.tobytes()
-                    elif isinstance(resp.content, bytes):
-                        call.response_body = resp.content
-                    elif hasattr(resp.content, 'read'):
-                        call.response_body = resp.read()
-                    elif hasattr(resp, 'data'):
-                        call.response_body = json.dumps(resp.data)
-                    else:
-                        call.response_body = repr(resp).encode()
-                    call.response_headers = json.dumps(resp.headers._store)
-                    call.locked = None
-                    call.save(update_fields=['locked', 'response_code', 'response_headers',
-                                             'response_body'])
+            if resp.status_code in (409, 429, 500, 503):
+                # This is the exception: These calls are *meant* to be retried!
+                backend.release(auth_hash, idempotency_key)
+            else:
+                backend.store(auth_hash, idempotency_key, request, StoredResponse.from_response(resp))
             return resp
-        else:
-            if call.locked:
-                logger.info(
-                    f'Concurrent request with idempotency key {idempotency_key} blocked.'
-                )
-                r = JsonResponse(
-                    {'detail': 'Concurrent request with idempotency key.'},
-                    status=status.HTTP_409_CONFLICT,
-                )
-                r['Retry-After'] = 5
-                return r
-
-            content = call.response_body
-            if isinstance(content, memoryview):
-                content = content.tobytes()
-            r = HttpResponse(
-                content=content,
-                status=call.response_code,
+        elif stored is LOCKED:
+            logger.info(
+                f'Concurrent request with idempotency key {idempotency_key} blocked.'
+            )
+            r = JsonResponse(
+                {'detail': 'Concurrent request with idempotency key.'},
+                status=status.HTTP_409_CONFLICT,
             )
-            logger.info(f'API response replayed from idempotency store for key {idempotency_key} [{call.response_code}]')
-            for k, v in json.loads(call.response_headers).values():
-                r[k] = v
+            r['Retry-After'] = 5
             return r
+        else:
+            logger.info(f'API response replayed from idempotency store for key {idempotency_key} [{stored.status_code}]')
+            return stored.to_response()
 
 
 class ApiScopeMiddleware:
@@ -133,9 +87,10 @@ class ApiScopeMiddleware:
 
         url = resolve(request.path_info)
         if 'organizer' in url.kwargs:
-            request.organizer = Organizer.objects.filter(
-                slug=url.kwargs['organizer'],
-            ).first()
+            try:
+                request.organizer = resolve_organizer(url.kwargs['organizer'])
+            except Organizer.DoesNotExist:
+                request.organizer = None
 
         with scope(organizer=getattr(request, 'organizer', None)):
             return self.get_response(request)
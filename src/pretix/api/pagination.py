@@ -19,8 +19,10 @@
 # You should have received a copy of the GNU Affero General Public License along with this program.  If not, see
 # <https://www.gnu.org/licenses/>.
 #
+from rest_framework import pagination
 from rest_framework.filters import OrderingFilter
 from rest_framework.pagination import PageNumberPagination
+from rest_framework.settings import api_settings
 
 from pretix.helpers import get_deterministic_ordering
 
@@ -30,6 +32,32 @@ class Pagination(PageNumberPagination):
     max_page_size = 50
 
 
+class CursorPagination(pagination.CursorPagination):
+    """
+    Keyset pagination that always orders by primary key. Other than with page numbers, no total count is computed
+    and fetching a page does not get slower the further you are into the list, so larger pages are allowed.
+    """
+    ordering = 'pk'
+    page_size_query_param = 'page_size'
+    max_page_size = 1000
+
+    def get_ordering(self, request, queryset, view):
+        # Ignore the ordering filter, the cursor is only stable if the ordering is unique
+        return (self.ordering,)
+
+
+class CursorPaginationMixin:
+    """
+    Allows API clients to opt in to cursor pagination on a list endpoint by passing ``pagination=cursor``.
+    """
+
+    @property
+    def pagination_class(self):
+        if self.request.query_params.get('pagination') == 'cursor':
+            return CursorPagination
+        return api_settings.DEFAULT_PAGINATION_CLASS
+
+
 class TotalOrderingFilter(OrderingFilter):
     def get_ordering(self, request, queryset, view):
         o = super().get_ordering(request, queryset, view)
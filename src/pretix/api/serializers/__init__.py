@@ -22,9 +22,12 @@
 import json
 import re
 
+from django.core.exceptions import FieldDoesNotExist
 from django.db.models import prefetch_related_objects
 from rest_framework import serializers
 from rest_framework.exceptions import ValidationError
+from rest_framework.fields import SkipField
+from rest_framework.relations import PKOnlyObject, PrimaryKeyRelatedField
 
 
 class AsymmetricField(serializers.Field):
@@ -163,3 +166,69 @@ class CompatDecimalField(serializers.DecimalField):
         if m := self.regex.match(value):
             return m.group(1)
         return value
+
+
+_PLAN_VALUE = 0
+_PLAN_PK = 1
+_PLAN_FIELD = 2
+
+
+class CompiledRepresentationMixin:
+    """
+    Read-side fast path for model serializers that are used to render large lists, such as orders and positions.
+
+    DRF's ``Serializer.to_representation`` figures out for every single object which fields are readable, how to get
+    their values and whether related fields can be reduced to their primary key. We do this once per serializer
+    instance (i.e. once per request) and keep a flat plan of ``(name, kind, getter, renderer)`` entries:
+
+    * plain model fields are read with ``getattr`` and passed to the field's ``to_representation``
+    * primary key related fields are read from their ``*_id`` attribute without building a ``PKOnlyObject``
+    * everything else goes through the regular ``get_attribute`` / ``to_representation`` pair
+
+    The output is the same as DRF's. Setting ``compiled_representation`` to ``False`` in the serializer context
+    falls back to the generic implementation, which is useful for comparisons.
+    """
+
+    def _compile_field(self, field):
+        model = getattr(getattr(self, 'Meta', None), 'model', None)
+        if model is not None and len(field.source_attrs) == 1:
+            try:
+                model_field = model._meta.get_field(field.source_attrs[0])
+            except FieldDoesNotExist:
+                model_field = None
+            if model_field is not None and model_field.concrete and not model_field.many_to_many:
+                if (model_field.is_relation and type(field) is PrimaryKeyRelatedField and field.pk_field is None
+                        and field.use_pk_only_optimization()):
+                    return field.field_name, _PLAN_PK, model_field.attname, None
+                if (not model_field.is_relation and not isinstance(field, serializers.BaseSerializer)
+                        and type(field).get_attribute is serializers.Field.get_attribute):
+                    return field.field_name, _PLAN_VALUE, model_field.attname, field.to_representation
+        return field.field_name, _PLAN_FIELD, field.get_attribute, field.to_representation
+
+    @property
+    def _representation_plan(self):
+        if not hasattr(self, '_representation_plan_cache'):
+            self._representation_plan_cache = [
+                self._compile_field(field) for field in self.fields.values() if not field.write_only
+            ]
+        return self._representation_plan_cache
+
+    def to_representation(self, instance):
+        if not self.context.get('compiled_representation', True):
+            return super().to_representation(instance)
+
+        ret = {}
+        for name, kind, getter, renderer in self._representation_plan:
+            if kind == _PLAN_VALUE:
+                value = getattr(instance, getter)
+                ret[name] = None if value is None else renderer(value)
+            elif kind == _PLAN_PK:
+                ret[name] = getattr(instance, getter)
+            else:
+                try:
+                    attribute = getter(instance)
+                except SkipField:
+                    continue
+                check_for_none = attribute.pk if isinstance(attribute, PKOnlyObject) else attribute
+                ret[name] = None if check_for_none is None else renderer(attribute)
+        return ret
@@ -66,7 +66,7 @@ from pretix.base.plugins import (
     PLUGIN_LEVEL_EVENT, PLUGIN_LEVEL_EVENT_ORGANIZER_HYBRID,
 )
 from pretix.base.services.seating import (
-    SeatProtected, generate_seats, validate_plan_change,
+    SeatProtected, apply_seating_plan, validate_plan_change,
 )
 from pretix.base.settings import (
     PERSON_NAME_SALUTATIONS, PERSON_NAME_SCHEMES, PERSON_NAME_TITLE_GROUPS,
@@ -336,7 +336,7 @@ class EventSerializer(SalesChannelMigrationMixin, I18nAwareModelSerializer):
 
         # Seats
         if event.seating_plan:
-            generate_seats(event, None, event.seating_plan, {})
+            apply_seating_plan(event, None, event.seating_plan)
 
         # Plugins
         if plugins is not None:
@@ -419,10 +419,7 @@ class EventSerializer(SalesChannelMigrationMixin, I18nAwareModelSerializer):
             for m in current_mappings.values():
                 m.delete()
         if 'seating_plan' in validated_data or seat_category_mapping is not None:
-            generate_seats(event, None, event.seating_plan, {
-                m.layout_category: m.product
-                for m in event.seat_category_mappings.select_related('product').filter(subevent=None)
-            })
+            apply_seating_plan(event, None, event.seating_plan)
 
         # Plugins
         if plugins is not None:
@@ -594,10 +591,7 @@ class SubEventSerializer(I18nAwareModelSerializer):
                     self.context['request'].event.seat_category_mappings.create(
                         product=value, layout_category=key, subevent=subevent
                     )
-            generate_seats(self.context['request'].event, subevent, subevent.seating_plan, {
-                m.layout_category: m.product
-                for m in self.context['request'].event.seat_category_mappings.select_related('product').filter(subevent=subevent)
-            })
+            apply_seating_plan(self.context['request'].event, [subevent], subevent.seating_plan)
 
         return subevent
 
@@ -667,10 +661,7 @@ class SubEventSerializer(I18nAwareModelSerializer):
             for m in current_mappings.values():
                 m.delete()
         if 'seating_plan' in validated_data or seat_category_mapping is not None:
-            generate_seats(self.context['request'].event, subevent, subevent.seating_plan, {
-                m.layout_category: m.product
-                for m in self.context['request'].event.seat_category_mappings.select_related('product').filter(subevent=subevent)
-            })
+            apply_seating_plan(self.context['request'].event, [subevent], subevent.seating_plan)
 
         return subevent
 
@@ -41,7 +41,9 @@ from rest_framework.exceptions import ValidationError
 from rest_framework.relations import SlugRelatedField
 from rest_framework.reverse import reverse
 
-from pretix.api.serializers import CompatDecimalField, CompatibleJSONField
+from pretix.api.serializers import (
+    CompatDecimalField, CompatibleJSONField, CompiledRepresentationMixin,
+)
 from pretix.api.serializers.event import SubEventSerializer
 from pretix.api.serializers.forms import form_field_to_serializer_field
 from pretix.api.serializers.i18n import I18nAwareModelSerializer
@@ -228,7 +230,7 @@ class InlineSeatSerializer(I18nAwareModelSerializer):
         fields = ('id', 'name', 'seat_guid', 'zone_name', 'row_name', 'row_label', 'seat_label', 'seat_number')
 
 
-class AnswerSerializer(I18nAwareModelSerializer):
+class AnswerSerializer(CompiledRepresentationMixin, I18nAwareModelSerializer):
     question_identifier = AnswerQuestionIdentifierField(source='*', read_only=True)
     option_identifiers = AnswerQuestionOptionsIdentifierField(source='*', read_only=True)
 
@@ -332,7 +334,7 @@ class AnswerSerializer(I18nAwareModelSerializer):
         return data
 
 
-class InlineCheckinSerializer(I18nAwareModelSerializer):
+class InlineCheckinSerializer(CompiledRepresentationMixin, I18nAwareModelSerializer):
     device_id = serializers.SlugRelatedField(
         source='device',
         slug_field='device_id',
@@ -359,7 +361,7 @@ class CheckinSerializer(I18nAwareModelSerializer):
         )
 
 
-class PrintLogSerializer(serializers.ModelSerializer):
+class PrintLogSerializer(CompiledRepresentationMixin, serializers.ModelSerializer):
     device_id = serializers.SlugRelatedField(
         source='device',
         slug_field='device_id',
@@ -404,61 +406,83 @@ class FailedCheckinSerializer(I18nAwareModelSerializer):
             self.fields['raw_subevent'].queryset = event.subevents.all()
 
 
+def ticket_download_config(context, event):
+    """
+    Returns the value of the ``ticket_download_pending`` setting and the identifiers of all enabled ticket outputs
+    of ``event``. The result is cached in the serializer context, so we only instantiate the providers once per
+    request instead of once per order or position.
+    """
+    cache = context.setdefault('ticket_download_config', {})
+    if event.pk not in cache:
+        identifiers = []
+        for receiver, response in register_ticket_outputs.send(event):
+            provider = response(event)
+            if provider.is_enabled:
+                identifiers.append(provider.identifier)
+        cache[event.pk] = event.settings.ticket_download_pending, identifiers
+    return cache[event.pk]
+
+
 class OrderDownloadsField(serializers.Field):
     def to_representation(self, instance: Order):
+        download_pending, outputs = ticket_download_config(self.context, instance.event)
         if instance.status != Order.STATUS_PAID:
             if instance.status != Order.STATUS_PENDING or instance.require_approval or (
-                not instance.valid_if_pending and not instance.event.settings.ticket_download_pending
+                not instance.valid_if_pending and not download_pending
             ):
                 return []
 
         request = self.context['request']
-        res = []
-        responses = register_ticket_outputs.send(instance.event)
-        for receiver, response in responses:
-            provider = response(instance.event)
-            if provider.is_enabled:
-                res.append({
-                    'output': provider.identifier,
-                    'url': reverse('api-v1:order-download', kwargs={
-                        'organizer': instance.event.organizer.slug,
-                        'event': instance.event.slug,
-                        'code': instance.code,
-                        'output': provider.identifier,
-                    }, request=request)
-                })
-        return res
+        return [
+            {
+                'output': identifier,
+                'url': reverse('api-v1:order-download', kwargs={
+                    'organizer': instance.event.organizer.slug,
+                    'event': instance.event.slug,
+                    'code': instance.code,
+                    'output': identifier,
+                }, request=request)
+            }
+            for identifier in outputs
+        ]
 
 
 class PositionDownloadsField(serializers.Field):
     def to_representation(self, instance: OrderPosition):
+        download_pending, outputs = ticket_download_config(self.context, instance.order.event)
         if instance.order.status != Order.STATUS_PAID:
             if instance.order.status != Order.STATUS_PENDING or instance.order.require_approval or (
-                not instance.order.valid_if_pending and not instance.order.event.settings.ticket_download_pending
+                not instance.order.valid_if_pending and not download_pending
             ):
                 return []
         if not instance.generate_ticket:
             return []
 
         request = self.context['request']
-        res = []
-        responses = register_ticket_outputs.send(instance.order.event)
-        for receiver, response in responses:
-            provider = response(instance.order.event)
-            if provider.is_enabled:
-                res.append({
-                    'output': provider.identifier,
-                    'url': reverse('api-v1:orderposition-download', kwargs={
-                        'organizer': instance.order.event.organizer.slug,
-                        'event': instance.order.event.slug,
-                        'pk': instance.pk,
-                        'output': provider.identifier,
-                    }, request=request)
-                })
-        return res
+        return [
+            {
+                'output': identifier,
+                'url': reverse('api-v1:orderposition-download', kwargs={
+                    'organizer': instance.order.event.organizer.slug,
+                    'event': instance.order.event.slug,
+                    'pk': instance.pk,
+                    'output': identifier,
+                }, request=request)
+            }
+            for identifier in outputs
+        ]
 
 
 class PdfDataSerializer(serializers.Field):
+    def _meta_data(self, obj):
+        # Positions do not necessarily share their item, variation or subevent objects (e.g. with select_related()),
+        # so we cache the meta data by primary key for the whole request.
+        cache = self.context.setdefault('meta_data', {})
+        key = type(obj), obj.pk
+        if key not in cache:
+            cache[key] = obj.meta_data
+        return cache[key]
+
     def to_representation(self, instance: OrderPosition):
         res = {}
 
@@ -487,22 +511,15 @@ class PdfDataSerializer(serializers.Field):
                         logger.exception('Evaluating PDF variable failed')
                         res[k] = '(error)'
 
-            if not hasattr(ev, '_cached_meta_data'):
-                ev._cached_meta_data = ev.meta_data
-
-            for k, v in ev._cached_meta_data.items():
+            for k, v in self._meta_data(ev).items():
                 res['meta:' + k] = v
 
             if instance.variation_id:
-                if not hasattr(instance.variation, '_cached_meta_data'):
-                    instance.variation.item = instance.item  # saves some database lookups
-                    instance.variation._cached_meta_data = instance.variation.meta_data
-                for k, v in instance.variation._cached_meta_data.items():
+                instance.variation.item = instance.item  # saves some database lookups
+                for k, v in self._meta_data(instance.variation).items():
                     res['itemmeta:' + k] = v
             else:
-                if not hasattr(instance.item, '_cached_meta_data'):
-                    instance.item._cached_meta_data = instance.item.meta_data
-                for k, v in instance.item._cached_meta_data.items():
+                for k, v in self._meta_data(instance.item).items():
                     res['itemmeta:' + k] = v
 
             res['images'] = {}
@@ -582,7 +599,7 @@ class OrderPositionPluginDataField(serializers.Field):
         return d
 
 
-class OrderPositionSerializer(I18nAwareModelSerializer):
+class OrderPositionSerializer(CompiledRepresentationMixin, I18nAwareModelSerializer):
     checkins = InlineCheckinSerializer(many=True, read_only=True)
     print_logs = PrintLogSerializer(many=True, read_only=True)
     answers = AnswerSerializer(many=True)
@@ -749,7 +766,7 @@ class OrderPaymentDateField(serializers.DateField):
             return super().to_representation(t.date())
 
 
-class OrderFeeSerializer(I18nAwareModelSerializer):
+class OrderFeeSerializer(CompiledRepresentationMixin, I18nAwareModelSerializer):
     tax_rate = CompatDecimalField(max_digits=7, decimal_places=4)
 
     class Meta:
@@ -781,7 +798,7 @@ class PaymentDetailsField(serializers.Field):
             return {}
 
 
-class OrderPaymentSerializer(I18nAwareModelSerializer):
+class OrderPaymentSerializer(CompiledRepresentationMixin, I18nAwareModelSerializer):
     payment_url = PaymentURLField(source='*', allow_null=True, read_only=True)
     details = PaymentDetailsField(source='*', allow_null=True, read_only=True)
 
@@ -799,7 +816,7 @@ class RefundDetailsField(serializers.Field):
         return pp.api_refund_details(value)
 
 
-class OrderRefundSerializer(I18nAwareModelSerializer):
+class OrderRefundSerializer(CompiledRepresentationMixin, I18nAwareModelSerializer):
     payment = SlugRelatedField(slug_field='local_id', read_only=True)
     details = RefundDetailsField(source='*', allow_null=True, read_only=True)
 
@@ -857,7 +874,7 @@ class OrderPluginDataField(serializers.Field):
         return d
 
 
-class OrderSerializer(I18nAwareModelSerializer):
+class OrderSerializer(CompiledRepresentationMixin, I18nAwareModelSerializer):
     event = SlugRelatedField(slug_field='slug', read_only=True)
     invoice_address = InvoiceAddressSerializer(allow_null=True)
     positions = OrderPositionSerializer(many=True, read_only=True)
@@ -21,6 +21,7 @@
 #
 from datetime import timedelta
 
+from django.conf import settings
 from django.dispatch import receiver
 from django.utils.timezone import now
 from django_scopes import scopes_disabled
@@ -77,4 +78,4 @@ def cleanup_webhook_logs(sender, **kwargs):
 @scopes_disabled()
 @minimum_interval(minutes_after_success=12 * 60)
 def cleanup_api_logs(sender, **kwargs):
-    ApiCall.objects.filter(created__lte=now() - timedelta(hours=24)).delete()
+    ApiCall.objects.filter(created__lte=now() - timedelta(seconds=settings.IDEMPOTENCY_TTL)).delete()
@@ -43,6 +43,7 @@ from pretix.base.services.cart import (
     _get_quota_availability, _get_voucher_availability, error_messages,
 )
 from pretix.base.services.locking import lock_objects
+from pretix.base.services.seating import invalidate_seat_availability
 
 
 class CartPositionViewSet(CreateModelMixin, DestroyModelMixin, viewsets.ReadOnlyModelViewSet):
@@ -97,6 +98,8 @@ class CartPositionViewSet(CreateModelMixin, DestroyModelMixin, viewsets.ReadOnly
     def perform_destroy(self, instance):
         instance.addons.all().delete()
         instance.delete()
+        if instance.seat_id:
+            invalidate_seat_availability(instance.event_id)
 
     def _require_locking(self, quota_diff, voucher_use_diff, seat_diff):
         if voucher_use_diff or seat_diff:
@@ -19,16 +19,15 @@
 # You should have received a copy of the GNU Affero General Public License along with this program.  If not, see
 # <https://www.gnu.org/licenses/>.
 #
-import json
 import logging
-from hashlib import sha1
 
-from django.conf import settings
-from django.http import HttpResponse, JsonResponse
+from django.http import JsonResponse
 from rest_framework import status
 from rest_framework.views import APIView
 
-from pretix.api.models import ApiCall
+from pretix.api.idempotency import (
+    LOCKED, get_auth_hash, get_idempotency_backend,
+)
 
 logger = logging.getLogger(__name__)
 
@@ -40,27 +39,18 @@ class IdempotencyQueryView(APIView):
 
     def get(self, request, format=None):
         idempotency_key = request.GET.get("key")
-        auth_hash_parts = '{}:{}'.format(
-            request.headers.get('Authorization', ''),
-            request.COOKIES.get('__Host-' + settings.SESSION_COOKIE_NAME, request.COOKIES.get(settings.SESSION_COOKIE_NAME, ''))
-        )
-        auth_hash = sha1(auth_hash_parts.encode()).hexdigest()
         if not idempotency_key:
             return JsonResponse({
                 'detail': 'No idempotency key given.'
             }, status=status.HTTP_404_NOT_FOUND)
 
-        try:
-            call = ApiCall.objects.get(
-                auth_hash=auth_hash,
-                idempotency_key=idempotency_key,
-            )
-        except ApiCall.DoesNotExist:
+        stored = get_idempotency_backend().get(get_auth_hash(request), idempotency_key)
+        if stored is None:
             return JsonResponse({
                 'detail': 'Idempotency key not seen before.'
             }, status=status.HTTP_404_NOT_FOUND)
 
-        if call.locked:
+        if stored is LOCKED:
             r = JsonResponse(
                 {'detail': 'Concurrent request with idempotency key.'},
                 status=status.HTTP_409_CONFLICT,
@@ -68,13 +58,4 @@ class IdempotencyQueryView(APIView):
             r['Retry-After'] = 5
             return r
 
-        content = call.response_body
-        if isinstance(content, memoryview):
-            content = content.tobytes()
-        r = HttpResponse(
-            content=content,
-            status=call.response_code,
-        )
-        for k, v in json.loads(call.response_headers).values():
-            r[k] = v
-        return r
+        return stored.to_response()
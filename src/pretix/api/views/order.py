@@ -20,6 +20,7 @@
 # <https://www.gnu.org/licenses/>.
 #
 import datetime
+import json
 import logging
 import mimetypes
 import os
@@ -33,7 +34,7 @@ from django.db.models import (
     Exists, F, OuterRef, Prefetch, Q, Subquery, prefetch_related_objects,
 )
 from django.db.models.functions import Coalesce, Concat
-from django.http import FileResponse, HttpResponse
+from django.http import FileResponse, HttpResponse, StreamingHttpResponse
 from django.shortcuts import get_object_or_404
 from django.utils import formats
 from django.utils.timezone import make_aware, now
@@ -49,10 +50,11 @@ from rest_framework.exceptions import (
 from rest_framework.mixins import CreateModelMixin
 from rest_framework.permissions import SAFE_METHODS
 from rest_framework.response import Response
+from rest_framework.utils.encoders import JSONEncoder
 
 from pretix.api.filters import MultipleCharFilter
 from pretix.api.models import OAuthAccessToken
-from pretix.api.pagination import TotalOrderingFilter
+from pretix.api.pagination import CursorPaginationMixin, TotalOrderingFilter
 from pretix.api.serializers.order import (
     BlockedTicketSecretSerializer, InvoiceSerializer, OrderCreateSerializer,
     OrderPaymentCreateSerializer, OrderPaymentSerializer,
@@ -102,7 +104,7 @@ from pretix.base.signals import (
     order_modified, order_paid, order_placed, register_ticket_outputs,
 )
 from pretix.control.signals import order_search_filter_q
-from pretix.helpers import OF_SELF
+from pretix.helpers import OF_SELF, repeatable_reads_transaction
 
 logger = logging.getLogger(__name__)
 
@@ -213,7 +215,10 @@ with scopes_disabled():
             )
 
 
-class OrderViewSetMixin:
+ORDER_STREAM_CHUNK_SIZE = 500
+
+
+class OrderViewSetMixin(CursorPaginationMixin):
     serializer_class = OrderSerializer
     queryset = Order.objects.none()
     filter_backends = (DjangoFilterBackend, TotalOrderingFilter)
@@ -265,7 +270,8 @@ class OrderViewSetMixin:
                     Prefetch('checkins', queryset=Checkin.objects.select_related('device')),
                     Prefetch('print_logs', queryset=PrintLog.objects.select_related('device')),
                     Prefetch('item', queryset=self.request.event.items.prefetch_related(
-                        Prefetch('meta_values', ItemMetaValue.objects.select_related('property'), to_attr='meta_values_cached')
+                        Prefetch('meta_values', ItemMetaValue.objects.select_related('property'), to_attr='meta_values_cached'),
+                        'program_times',
                     )),
                     Prefetch('variation', queryset=ItemVariation.objects.prefetch_related(
                         Prefetch('meta_values', ItemVariationMetaValue.objects.select_related('property'), to_attr='meta_values_cached')
@@ -314,6 +320,28 @@ class OrderViewSetMixin:
         serializer = self.get_serializer(queryset, many=True)
         return Response(serializer.data, headers={'X-Page-Generated': date})
 
+    @action(detail=False, url_name='stream', url_path='stream')
+    def stream(self, request, **kwargs):
+        date = serializers.DateTimeField().to_representation(now())
+        queryset = self.filter_queryset(self.get_queryset())
+        resp = StreamingHttpResponse(self._stream_orders(queryset), content_type='application/x-ndjson')
+        resp['X-Page-Generated'] = date
+        return resp
+
+    def _stream_orders(self, queryset):
+        # The response is generated after the view has returned, so we can neither rely on the scope set by the
+        # middleware nor keep all orders in memory. We fetch one chunk after the other by primary key, all within
+        # one transaction to get a consistent snapshot.
+        with scopes_disabled(), repeatable_reads_transaction():
+            last_pk = 0
+            while True:
+                chunk = list(queryset.filter(pk__gt=last_pk).order_by('pk')[:ORDER_STREAM_CHUNK_SIZE])
+                if not chunk:
+                    break
+                last_pk = chunk[-1].pk
+                serializer = self.get_serializer(chunk, many=True)
+                yield "".join(json.dumps(o, cls=JSONEncoder) + "\n" for o in serializer.data)
+
 
 class OrganizerOrderViewSet(OrderViewSetMixin, viewsets.ReadOnlyModelViewSet):
     def get_base_queryset(self):
@@ -1069,7 +1097,7 @@ with scopes_disabled():
             }
 
 
-class OrderPositionViewSetMixin:
+class OrderPositionViewSetMixin(CursorPaginationMixin):
     queryset = OrderPosition.all.none()
     filter_backends = (DjangoFilterBackend, RichOrderingFilter)
     ordering = ('order__datetime', 'positionid')
@@ -1111,7 +1139,8 @@ class OrderPositionViewSetMixin:
                 Prefetch('print_logs', queryset=PrintLog.objects.select_related('device')),
                 Prefetch('item', queryset=self.request.event.items.prefetch_related(
                     Prefetch('meta_values', ItemMetaValue.objects.select_related('property'),
-                             to_attr='meta_values_cached')
+                             to_attr='meta_values_cached'),
+                    'program_times',
                 )),
                 'variation',
                 'answers', 'answers__options', 'answers__question',
@@ -2164,7 +2193,7 @@ with scopes_disabled():
             }
 
 
-class TransactionViewSet(viewsets.ReadOnlyModelViewSet):
+class TransactionViewSet(CursorPaginationMixin, viewsets.ReadOnlyModelViewSet):
     serializer_class = TransactionSerializer
     queryset = Transaction.objects.none()
     filter_backends = (DjangoFilterBackend, TotalOrderingFilter)
@@ -35,6 +35,7 @@ from rest_framework.response import Response
 from pretix.api.pagination import TotalOrderingFilter
 from pretix.api.serializers.voucher import VoucherSerializer
 from pretix.base.models import Voucher
+from pretix.base.services.seating import invalidate_seat_availability
 
 with scopes_disabled():
     class VoucherFilter(FilterSet):
@@ -117,6 +118,7 @@ class VoucherViewSet(viewsets.ModelViewSet):
             instance.cartposition_set.filter(addon_to__isnull=False).delete()
             instance.cartposition_set.all().delete()
             super().perform_destroy(instance)
+            invalidate_seat_availability(instance.event_id)
 
     @action(detail=False, methods=['POST'])
     @transaction.atomic()
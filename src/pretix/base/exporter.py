@@ -130,6 +130,15 @@ class BaseExporter:
         """
         return True
 
+    @property
+    def replica_read(self) -> bool:
+        """
+        If ``True``, this exporter reads from a database replica if one is configured and not lagging behind too
+        much. Set this to ``False`` if your exporter changes data and reads it back, e.g. by generating files that
+        are missing.
+        """
+        return True
+
     @property
     def identifier(self) -> str:
         """
@@ -126,6 +126,8 @@ class InvoiceExporter(InvoiceExporterMixin, BaseExporter):
     verbose_name = _('All invoices')
     description = _('Download all invoices created by the system as a ZIP file of PDF files.')
     repeatable_read = False
+    # Missing PDF files are generated on the primary database and read back right away
+    replica_read = False
 
     def render(self, form_data: dict, output_file=None):
         qs = self.invoices_queryset(form_data).filter(shredded=False)
@@ -0,0 +1,98 @@
+#
+# This file is part of pretix (Community Edition).
+#
+# Copyright (C) 2014-2020  Raphael Michel and contributors
+# Copyright (C) 2020-today pretix GmbH and contributors
+#
+# This program is free software: you can redistribute it and/or modify it under the terms of the GNU Affero General
+# Public License as published by the Free Software Foundation in version 3 of the License.
+#
+# ADDITIONAL TERMS APPLY: Pursuant to Section 7 of the GNU Affero General Public License, additional terms are
+# applicable granting you additional permissions and placing additional restrictions on your usage of this software.
+# Please refer to the pretix LICENSE file to obtain the full terms applicable to this work. If you did not receive
+# this file, see <https://pretix.eu/about/en/license>.
+#
+# This program is distributed in the hope that it will be useful, but WITHOUT ANY WARRANTY; without even the implied
+# warranty of MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the GNU Affero General Public License for more
+# details.
+#
+# You should have received a copy of the GNU Affero General Public License along with this program.  If not, see
+# <https://www.gnu.org/licenses/>.
+#
+"""
+Compares the compiled read path of the order serializers with DRF's generic implementation on real data. Both
+paths are run on the same, already loaded orders, so the numbers only contain serialization time and the queries
+caused by it, and the rendered JSON is checked to be byte-identical.
+"""
+import sys
+import time
+from unittest import mock
+
+from django.core.management.base import BaseCommand
+from django.utils.timezone import now
+from django_scopes import scope
+from rest_framework.renderers import JSONRenderer
+from rest_framework.request import Request
+from rest_framework.test import APIRequestFactory
+
+from pretix.api.views.order import EventOrderViewSet
+from pretix.base.models import Event, Organizer
+from pretix.helpers.metrics.queries import QueryStats
+
+
+class Command(BaseCommand):
+    help = "Benchmark the compiled representation of the order API serializers against the generic one"
+
+    def add_arguments(self, parser):
+        parser.add_argument('organizer_slug', type=str)
+        parser.add_argument('event_slug', type=str)
+        parser.add_argument('--limit', action='store', type=int, default=500,
+                            help='Number of orders to serialize')
+        parser.add_argument('--repeat', action='store', type=int, default=5,
+                            help='Number of runs per implementation, the fastest one is reported')
+        parser.add_argument('--pdf-data', action='store_true', help='Include pdf_data as with ?pdf_data=true')
+
+    def handle(self, *args, **options):
+        try:
+            organizer = Organizer.objects.get(slug=options['organizer_slug'])
+        except Organizer.DoesNotExist:
+            self.stderr.write(self.style.ERROR('Organizer not found.'))
+            sys.exit(1)
+
+        with scope(organizer=organizer):
+            try:
+                event = organizer.events.get(slug=options['event_slug'])
+            except Event.DoesNotExist:
+                self.stderr.write(self.style.ERROR('Event not found.'))
+                sys.exit(1)
+
+            request = Request(APIRequestFactory().get(
+                f'/api/v1/organizers/{organizer.slug}/events/{event.slug}/orders/',
+                {'pdf_data': 'true'} if options['pdf_data'] else {},
+            ))
+            request.organizer = organizer
+            request.event = event
+            view = EventOrderViewSet(request=request, format_kwarg=None, kwargs={})
+            orders = list(view.get_queryset().order_by('pk')[:options['limit']])
+
+            # pdf_data contains the current time, which must not make the outputs differ
+            results = {}
+            frozen_now = now()
+            for i in range(options['repeat']):
+                for compiled in (False, True):
+                    context = {**view.get_serializer_context(), 'compiled_representation': compiled}
+                    with QueryStats() as stats, mock.patch('pretix.base.pdf.now', return_value=frozen_now):
+                        t0 = time.perf_counter()
+                        content = JSONRenderer().render(view.get_serializer_class()(orders, many=True, context=context).data)
+                        duration = time.perf_counter() - t0
+                    if compiled in results:
+                        duration = min(duration, results[compiled][0])
+                    results[compiled] = duration, stats.count, content
+
+        for compiled, label in ((False, 'generic'), (True, 'compiled')):
+            duration, queries, content = results[compiled]
+            self.stdout.write(f'{label:>8}: {duration * 1000:9.1f} ms  {queries:5d} queries  {len(content)} bytes')
+        self.stdout.write(f' speedup: {results[False][0] / results[True][0]:9.2f}x  ({len(orders)} orders)')
+        if results[False][2] != results[True][2]:
+            self.stderr.write(self.style.ERROR('The output of both implementations differs!'))
+            sys.exit(1)
@@ -0,0 +1,117 @@
+#
+# This file is part of pretix (Community Edition).
+#
+# Copyright (C) 2014-2020  Raphael Michel and contributors
+# Copyright (C) 2020-today pretix GmbH and contributors
+#
+# This program is free software: you can redistribute it and/or modify it under the terms of the GNU Affero General
+# Public License as published by the Free Software Foundation in version 3 of the License.
+#
+# ADDITIONAL TERMS APPLY: Pursuant to Section 7 of the GNU Affero General Public License, additional terms are
+# applicable granting you additional permissions and placing additional restrictions on your usage of this software.
+# Please refer to the pretix LICENSE file to obtain the full terms applicable to this work. If you did not receive
+# this file, see <https://pretix.eu/about/en/license>.
+#
+# This program is distributed in the hope that it will be useful, but WITHOUT ANY WARRANTY; without even the implied
+# warranty of MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the GNU Affero General Public License for more
+# details.
+#
+# You should have received a copy of the GNU Affero General Public License along with this program.  If not, see
+# <https://www.gnu.org/licenses/>.
+#
+"""
+Compares the bounding box restriction of the seat distancing check with comparing every seat to every taken seat.
+The seats are generated in a temporary event that is rolled back at the end, so the command does not leave any
+data behind. The brute-force variant is emulated with a box that is larger than the whole plan, and both variants
+are checked to find the same free seats.
+"""
+import contextlib
+import sys
+import time
+import uuid
+from decimal import Decimal
+from unittest import mock
+
+from django.core.management.base import BaseCommand
+from django.db import transaction
+from django.utils.timezone import now
+from django_scopes import scope
+
+from pretix.base.models import Order, OrderPosition, Organizer, Seat
+
+
+class Command(BaseCommand):
+    help = "Benchmark the seat distancing check on a generated seating plan"
+
+    def add_arguments(self, parser):
+        parser.add_argument('--rows', action='store', type=int, default=100)
+        parser.add_argument('--seats-per-row', action='store', type=int, default=200)
+        parser.add_argument('--sold-every', action='store', type=int, default=13,
+                            help='Mark every n-th seat as sold')
+        parser.add_argument('--distance', action='store', type=float, default=25,
+                            help='Minimal distance between seats, seats are 10 units apart within a row')
+        parser.add_argument('--within-row', action='store_true', help='Only keep the distance within the same row')
+        parser.add_argument('--repeat', action='store', type=int, default=3,
+                            help='Number of runs per implementation, the fastest one is reported')
+
+    def handle(self, *args, **options):
+        with transaction.atomic():
+            organizer = Organizer.objects.create(name='Benchmark', slug=f'benchmark-{uuid.uuid4().hex[:8]}')
+            with scope(organizer=organizer):
+                event = self._generate(organizer, options)
+                results = self._run(event, options)
+            transaction.set_rollback(True)
+
+        for label in ('brute force', 'box'):
+            duration, free = results[label]
+            self.stdout.write(f'{label:>11}: {duration * 1000:9.1f} ms  {len(free)} free seats')
+        self.stdout.write(
+            f'    speedup: {results["brute force"][0] / results["box"][0]:9.2f}x  '
+            f'({options["rows"] * options["seats_per_row"]} seats)'
+        )
+        if results['brute force'][1] != results['box'][1]:
+            self.stderr.write(self.style.ERROR('The free seats of both implementations differ!'))
+            sys.exit(1)
+
+    def _generate(self, organizer, options):
+        event = organizer.events.create(name='Benchmark', slug='benchmark', date_from=now())
+        event.settings.seating_minimal_distance = options['distance']
+        event.settings.seating_distance_within_row = options['within_row']
+        ticket = event.items.create(name='Ticket', default_price=Decimal('0.00'), admission=True)
+        seats = Seat.objects.bulk_create([
+            Seat(event=event, product=ticket, seat_guid=f'{r}-{c}', row_name=str(r), seat_number=str(c),
+                 x=c * 10 + (5 if r % 2 else 0), y=r * 12)
+            for r in range(options['rows']) for c in range(options['seats_per_row'])
+        ], batch_size=1000)
+        order = Order.objects.create(
+            code='BENCH', event=event, email='dummy@dummy.test', total=Decimal('0.00'),
+            sales_channel=organizer.sales_channels.get(identifier='web'),
+            status=Order.STATUS_PAID, datetime=now(), expires=now(),
+        )
+        for seat in seats[::options['sold_every']]:
+            OrderPosition.objects.create(order=order, item=ticket, price=Decimal('0.00'), seat=seat)
+        return event
+
+    def _run(self, event, options):
+        # A box that covers the whole plan restricts nothing, which makes the query compare every seat with every
+        # taken seat like it did before
+        extent = max(options['rows'] * 12, options['seats_per_row'] * 10 + 5)
+        margins = {
+            'brute force': (extent + options['distance']) / options['distance'],
+            'box': None,
+        }
+        results = {}
+        for i in range(options['repeat']):
+            for label, margin in margins.items():
+                patch = (
+                    mock.patch('pretix.base.models.seating.SEAT_DISTANCE_BOX_MARGIN', margin)
+                    if margin else contextlib.nullcontext()
+                )
+                with patch:
+                    t0 = time.perf_counter()
+                    free = set(event.free_seats().values_list('seat_guid', flat=True))
+                    duration = time.perf_counter() - t0
+                if label in results:
+                    duration = min(duration, results[label][0])
+                results[label] = duration, free
+        return results
@@ -0,0 +1,58 @@
+#
+# This file is part of pretix (Community Edition).
+#
+# Copyright (C) 2014-2020  Raphael Michel and contributors
+# Copyright (C) 2020-today pretix GmbH and contributors
+#
+# This program is free software: you can redistribute it and/or modify it under the terms of the GNU Affero General
+# Public License as published by the Free Software Foundation in version 3 of the License.
+#
+# ADDITIONAL TERMS APPLY: Pursuant to Section 7 of the GNU Affero General Public License, additional terms are
+# applicable granting you additional permissions and placing additional restrictions on your usage of this software.
+# Please refer to the pretix LICENSE file to obtain the full terms applicable to this work. If you did not receive
+# this file, see <https://pretix.eu/about/en/license>.
+#
+# This program is distributed in the hope that it will be useful, but WITHOUT ANY WARRANTY; without even the implied
+# warranty of MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the GNU Affero General Public License for more
+# details.
+#
+# You should have received a copy of the GNU Affero General Public License along with this program.  If not, see
+# <https://www.gnu.org/licenses/>.
+#
+import json
+import time
+from collections import Counter
+
+from django.core.management.base import BaseCommand
+
+from pretix.helpers.profile.sampling import (
+    load_samples, to_collapsed, to_speedscope,
+)
+
+
+class Command(BaseCommand):
+    help = "Export stack samples collected by the sampling profiler as collapsed stacks or speedscope profile"
+
+    def add_arguments(self, parser):
+        parser.add_argument('--since', action='store', type=int, default=60,
+                            help='Include samples of the last this many minutes')
+        parser.add_argument('--tag', action='store', type=str,
+                            help='Only include samples of views or tasks whose tag starts with this value, '
+                                 'e.g. "view:presale:event.index" or "celery:"')
+        parser.add_argument('--format', action='store', choices=('collapsed', 'speedscope', 'list'),
+                            default='collapsed')
+
+    def handle(self, *args, **options):
+        samples = load_samples(time.time() - options['since'] * 60, name=options.get('tag'))
+
+        if options['format'] == 'list':
+            for tag, stacks in sorted(samples.items(), key=lambda i: -sum(i[1].values())):
+                self.stdout.write(f'{sum(stacks.values())}\t{tag}')
+        elif options['format'] == 'speedscope':
+            self.stdout.write(json.dumps(to_speedscope(samples)))
+        else:
+            merged = Counter()
+            for tag, stacks in samples.items():
+                for stack, count in stacks.items():
+                    merged[f'{tag};{stack}'] += count
+            self.stdout.write(to_collapsed(merged), ending='')
@@ -32,19 +32,20 @@
 # distributed on an "AS IS" BASIS, WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied. See the
 # License for the specific language governing permissions and limitations under the License.
 
+import random
 import time
 import traceback
+from concurrent.futures import FIRST_COMPLETED, ThreadPoolExecutor, wait
 
 from django.conf import settings
 from django.core.cache import cache
 from django.core.management.base import BaseCommand
-from django.db import close_old_connections
-from django.dispatch.dispatcher import NO_RECEIVERS
-from django_querytagger.tagging import with_tag
+from django.db import connections
 
-from pretix.helpers.periodic import SKIPPED
-
-from ...signals import periodic_task
+from pretix.base.metrics import pretix_periodic_task_runs_total
+from pretix.base.services.periodic import (
+    periodic_receivers, run_periodic_receiver, run_receiver,
+)
 
 
 class Command(BaseCommand):
@@ -56,48 +57,112 @@ class Command(BaseCommand):
         parser.add_argument('--list-tasks', action='store_true', help='Only list all tasks')
         parser.add_argument('--exclude', action='store', type=str, help='Exclude the tasks with this name '
                                                                         '(dotted path, comma separation)')
+        parser.add_argument('--concurrency', action='store', type=int, default=1,
+                            help='Number of tasks to run in parallel threads')
+        parser.add_argument('--timeout', action='store', type=int, default=0,
+                            help='Report tasks that take longer than this many seconds as failed. With --celery, '
+                                 'they are also aborted.')
+        parser.add_argument('--jitter', action='store', type=int, default=0,
+                            help='Wait a random number of seconds up to this value before starting, to spread out '
+                                 'the load if this command is started on many hosts at the same time.')
+        parser.add_argument('--celery', action='store_true',
+                            help='Dispatch every task to the celery workers instead of running it in this process')
 
     def handle(self, *args, **options):
-        verbosity = int(options['verbosity'])
+        self.verbosity = int(options['verbosity'])
 
         cache.set("pretix_runperiodic_executed", True, 3600 * 12)
 
-        if not periodic_task.receivers or periodic_task.sender_receivers_cache.get(self) is NO_RECEIVERS:
+        receivers = periodic_receivers(self)
+        if options['list_tasks']:
+            for name in receivers:
+                print(name)
+            return
+        if options.get('tasks'):
+            receivers = {n: r for n, r in receivers.items() if n in options.get('tasks').split(',')}
+        if options.get('exclude'):
+            receivers = {n: r for n, r in receivers.items() if n not in options.get('exclude').split(',')}
+        if not receivers:
             return
 
-        for receiver in periodic_task._live_receivers(self)[0]:
-            name = f'{receiver.__module__}.{receiver.__name__}'
-            if options['list_tasks']:
-                print(name)
-                continue
-            if options.get('tasks'):
-                if name not in options.get('tasks').split(','):
-                    continue
-            if options.get('exclude'):
-                if name in options.get('exclude').split(','):
-                    continue
-
-            if verbosity > 1:
-                self.stdout.write(f'INFO Running {name}…')
-            t0 = time.time()
-            try:
-                # Check if the DB connection is still good, it might be closed if the previous task took too long.
-                close_old_connections()
-                with with_tag(f"periodictask={name}"):
-                    r = receiver(signal=periodic_task, sender=self)
-            except Exception as err:
-                if isinstance(err, KeyboardInterrupt):
-                    raise err
-                if settings.SENTRY_ENABLED:
-                    from sentry_sdk import capture_exception
-                    capture_exception(err)
-                    self.stdout.write(self.style.ERROR(f'ERROR {name}: {str(err)}\n'))
-                else:
-                    self.stdout.write(self.style.ERROR(f'ERROR {name}: {str(err)}\n'))
-                    traceback.print_exc()
+        if options['jitter']:
+            time.sleep(random.uniform(0, options['jitter']))
+
+        if options['celery']:
+            for name in receivers:
+                if self.verbosity > 1:
+                    self.stdout.write(f'INFO Dispatching {name}…')
+                run_periodic_receiver.apply_async(
+                    args=(name,),
+                    expires=options['timeout'] or None,
+                    soft_time_limit=options['timeout'] or None,
+                    time_limit=options['timeout'] * 1.1 if options['timeout'] else None,
+                )
+        elif options['concurrency'] > 1:
+            self._run_parallel(receivers, options['concurrency'], options['timeout'])
+        else:
+            for name, receiver in receivers.items():
+                t0 = time.time()
+                try:
+                    self._run(name, receiver)
+                finally:
+                    if options['timeout'] and time.time() - t0 > options['timeout']:
+                        self._timed_out(name)
+
+    def _run(self, name, receiver):
+        if self.verbosity > 1:
+            self.stdout.write(f'INFO Running {name}…')
+        t0 = time.time()
+        try:
+            r = run_receiver(name, receiver, sender=self)
+        except Exception as err:
+            if isinstance(err, KeyboardInterrupt):
+                raise err
+            if settings.SENTRY_ENABLED:
+                from sentry_sdk import capture_exception
+                capture_exception(err)
+                self.stdout.write(self.style.ERROR(f'ERROR {name}: {str(err)}\n'))
             else:
-                if options.get('verbosity') > 1:
-                    if r is SKIPPED:
-                        self.stdout.write(self.style.SUCCESS(f'INFO Skipped {name}'))
-                    else:
-                        self.stdout.write(self.style.SUCCESS(f'INFO Completed {name} in {round(time.time() - t0, 3)}s'))
+                self.stdout.write(self.style.ERROR(f'ERROR {name}: {str(err)}\n'))
+                traceback.print_exc()
+        else:
+            if self.verbosity > 1:
+                if r == "skipped":
+                    self.stdout.write(self.style.SUCCESS(f'INFO Skipped {name}'))
+                else:
+                    self.stdout.write(self.style.SUCCESS(f'INFO Completed {name} in {round(time.time() - t0, 3)}s'))
+
+    def _run_in_thread(self, name, receiver):
+        try:
+            self._run(name, receiver)
+        finally:
+            connections.close_all()
+
+    def _timed_out(self, name):
+        if settings.METRICS_ENABLED:
+            pretix_periodic_task_runs_total.inc(1, task_name=name, status="timeout")
+        self.stdout.write(self.style.ERROR(f'ERROR {name}: Did not complete within the timeout\n'))
+
+    def _run_parallel(self, receivers, concurrency, timeout):
+        # Threads cannot be aborted, so a task exceeding the timeout is only reported. It does not block the
+        # other tasks, but the command only exits once it is done.
+        executor = ThreadPoolExecutor(max_workers=concurrency, thread_name_prefix='runperiodic')
+        started = {}
+        pending = {}
+        for name, receiver in receivers.items():
+            f = executor.submit(self._run_in_thread, name, receiver)
+            pending[f] = name
+        try:
+            while pending:
+                done, _ = wait(pending, timeout=1, return_when=FIRST_COMPLETED)
+                for f in done:
+                    pending.pop(f)
+                now = time.time()
+                for f, name in list(pending.items()):
+                    if f.running():
+                        started.setdefault(f, now)
+                        if timeout and now - started[f] > timeout:
+                            self._timed_out(name)
+                            pending.pop(f)
+        finally:
+            executor.shutdown(wait=True)
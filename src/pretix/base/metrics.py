@@ -39,7 +39,9 @@ from collections import defaultdict
 
 from django.apps import apps
 from django.conf import settings
+from django.core.cache import cache
 from django.db import connection
+from django_scopes import scopes_disabled
 
 from pretix.base.models import Event, Invoice, Order, OrderPosition, Organizer
 from pretix.celery_app import app
@@ -241,6 +243,61 @@ class Histogram(Metric):
         self._execute_redis_pipeline(pipe)
 
 
+collected_gauges = []
+
+
+class CollectedGauge(Metric):
+    """
+    Gauge Metric Object for values that are expensive to compute, such as the number of rows in a large
+    table. The values are not computed when the metrics are scraped, but by a background job that calls
+    ``collect()`` at most every ``interval`` seconds and stores the result in the cache. Scraping the metrics
+    only reads the last computed values. Without a shared cache, the values are computed when scraping.
+
+    ``func`` needs to return an iterable of ``(labels, value)`` tuples, where ``labels`` is a dictionary
+    containing exactly the label names of the metric.
+    """
+
+    def __init__(self, name, helpstring, labelnames=None, interval=None, func=None):
+        if not callable(func):
+            raise ValueError("A function computing the values is required.")
+        super().__init__(name, helpstring, labelnames)
+        self.interval = interval
+        self.func = func
+        collected_gauges.append(self)
+
+    @property
+    def cache_key(self):
+        return 'pretix_metrics_collected:{}'.format(self.name)
+
+    def get_interval(self):
+        return self.interval or settings.METRICS_COLLECT_INTERVAL
+
+    def collect(self):
+        return self.func()
+
+    def is_due(self):
+        data = cache.get(self.cache_key)
+        return not data or time.time() - data['timestamp'] >= self.get_interval()
+
+    def compute(self):
+        """
+        Computes the current values.
+        """
+        values = {}
+        for labels, value in self.collect():
+            self._check_label_consistency(labels)
+            values[self._construct_metric_identifier("", labels)] = value
+        return {'timestamp': time.time(), 'values': values}
+
+    def update(self):
+        """
+        Computes the current values and stores them in the cache.
+        """
+        # Values are kept a bit longer than the interval, so a single failed run does not make the metric
+        # disappear, but they vanish eventually if the background job stops running.
+        cache.set(self.cache_key, self.compute(), timeout=self.get_interval() * 4)
+
+
 def estimate_count_fast(type):
     """
     See https://wiki.postgresql.org/wiki/Count_estimate
@@ -256,6 +313,32 @@ def estimate_count_fast(type):
         return type.objects.count()
 
 
+def _model_instance_counts():
+    exact_tables = [
+        Order, Invoice, Event, Organizer
+    ]
+    for m in apps.get_models():  # Count all models
+        if issubclass(m, OrderPosition):
+            yield {"model": str(m._meta)}, m.all.count()
+        elif any(issubclass(m, p) for p in exact_tables):
+            yield {"model": str(m._meta)}, m.objects.count()
+        else:
+            yield {"model": str(m._meta)}, estimate_count_fast(m)
+
+
+def collect_metrics(force=False):
+    """
+    Updates the values of all collected gauges that are due. This is intended to run in the background.
+    """
+    if not settings.REAL_CACHE_USED:
+        # The values could not be handed over to the scraping process, metric_values() computes them itself
+        return
+    with scopes_disabled():
+        for g in collected_gauges:
+            if force or g.is_due():
+                g.update()
+
+
 def metric_values():
     """
     Produces the the values to be presented to the monitoring system
@@ -280,17 +363,18 @@ def metric_values():
     for a, atarget in aliases.items():
         metrics[a] = metrics[atarget]
 
-    # Throwaway metrics
-    exact_tables = [
-        Order, Invoice, Event, Organizer
-    ]
-    for m in apps.get_models():  # Count all models
-        if issubclass(m, OrderPosition):
-            metrics['pretix_model_instances']['{model="%s"}' % m._meta] = m.all.count()
-        elif any(issubclass(m, p) for p in exact_tables):
-            metrics['pretix_model_instances']['{model="%s"}' % m._meta] = m.objects.count()
-        else:
-            metrics['pretix_model_instances']['{model="%s"}' % m._meta] = estimate_count_fast(m)
+    # Expensive metrics, precomputed in the background
+    if settings.REAL_CACHE_USED:
+        stored = cache.get_many([g.cache_key for g in collected_gauges])
+    else:
+        with scopes_disabled():
+            stored = {g.cache_key: g.compute() for g in collected_gauges}
+    for g in collected_gauges:
+        data = stored.get(g.cache_key)
+        if not data:
+            continue
+        metrics[g.name].update(data['values'])
+        metrics['pretix_metrics_collected_timestamp_seconds']['{collector="%s"}' % g.name] = data['timestamp']
 
     if settings.HAS_CELERY:
         channel = app.broker_connection().channel()
@@ -333,5 +417,22 @@ pretix_task_runs_total = Counter("pretix_task_runs_total", "Total calls to a cel
                                  ["task_name", "status"])
 pretix_task_duration_seconds = Histogram("pretix_task_duration_seconds", "Call time of a celery task",
                                          ["task_name"])
+pretix_task_inline_total = Counter("pretix_task_inline_total",
+                                   "Calls to a task that may run inline, by how they were executed",
+                                   ["task_name", "path"])
+pretix_periodic_task_runs_total = Counter("pretix_periodic_task_runs_total", "Total runs of a periodic task",
+                                          ["task_name", "status"])
+pretix_periodic_task_duration_seconds = Histogram("pretix_periodic_task_duration_seconds",
+                                                  "Run time of a periodic task", ["task_name"],
+                                                  buckets=(.1, 1, 5, 10, 30, 60, 300, 600, 1800, 3600, _INF))
+pretix_query_count = Histogram("pretix_query_count", "Number of database queries per view or celery task",
+                               ["name"], buckets=(1, 2, 5, 10, 20, 50, 100, 200, 500, 1000, 5000, _INF))
+pretix_query_duration_seconds = Histogram("pretix_query_duration_seconds",
+                                          "Total database time per view or celery task", ["name"])
+pretix_query_duplicates = Histogram("pretix_query_duplicates",
+                                    "Highest number of executions of the same query per view or celery task",
+                                    ["name"], buckets=(1, 2, 5, 10, 20, 50, 100, 500, 1000, _INF))
 pretix_successful_logins = Counter("pretix_logins_successful", "Successful logins", [])
 pretix_failed_logins = Counter("pretix_logins_failed", "Failed logins", ["reason"])
+pretix_model_instances = CollectedGauge("pretix_model_instances", "Number of instances of a database model",
+                                        ["model"], func=_model_instance_counts)
@@ -0,0 +1,44 @@
+# Generated by Django 5.2.18 on 2026-10-19 09:45
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('pretixbase', '0307_devicelastseen'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='SalesRollupState',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False)),
+                ('built', models.DateTimeField(auto_now_add=True)),
+                ('timezone', models.CharField(max_length=100)),
+                ('event', models.OneToOneField(on_delete=django.db.models.deletion.CASCADE, related_name='sales_rollup_state', to='pretixbase.event')),
+            ],
+        ),
+        migrations.CreateModel(
+            name='SalesRollup',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False)),
+                ('status', models.CharField(max_length=10)),
+                ('canceled', models.BooleanField(default=False)),
+                ('order_date', models.DateField()),
+                ('payment_date', models.DateField(null=True)),
+                ('count', models.IntegerField(default=0)),
+                ('price', models.DecimalField(decimal_places=2, default=0, max_digits=13)),
+                ('tax_value', models.DecimalField(decimal_places=2, default=0, max_digits=13)),
+                ('event', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='sales_rollups', to='pretixbase.event')),
+                ('item', models.ForeignKey(null=True, on_delete=django.db.models.deletion.CASCADE, related_name='+', to='pretixbase.item')),
+                ('sales_channel', models.ForeignKey(null=True, on_delete=django.db.models.deletion.CASCADE, related_name='+', to='pretixbase.saleschannel')),
+                ('subevent', models.ForeignKey(null=True, on_delete=django.db.models.deletion.CASCADE, related_name='+', to='pretixbase.subevent')),
+                ('variation', models.ForeignKey(null=True, on_delete=django.db.models.deletion.CASCADE, related_name='+', to='pretixbase.itemvariation')),
+            ],
+            options={
+                'indexes': [models.Index(fields=['event', 'order_date'], name='pretixbase_salesrollup_day')],
+            },
+        ),
+    ]
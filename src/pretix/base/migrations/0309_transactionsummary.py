@@ -0,0 +1,45 @@
+# Generated by Django 5.2.18 on 2026-10-19 09:57
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('pretixbase', '0308_salesrollup'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='TransactionSummaryState',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False)),
+                ('watermark', models.DateTimeField(null=True)),
+            ],
+        ),
+        migrations.CreateModel(
+            name='TransactionSummary',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False)),
+                ('date', models.DateField()),
+                ('fee_type', models.CharField(max_length=100, null=True)),
+                ('internal_type', models.CharField(max_length=255, null=True)),
+                ('price', models.DecimalField(decimal_places=2, max_digits=13)),
+                ('tax_rate', models.DecimalField(decimal_places=4, max_digits=7)),
+                ('testmode', models.BooleanField(default=False)),
+                ('migrated', models.BooleanField(default=False)),
+                ('count', models.IntegerField(default=0)),
+                ('total', models.DecimalField(decimal_places=2, default=0, max_digits=13)),
+                ('tax_total', models.DecimalField(decimal_places=2, default=0, max_digits=13)),
+                ('event', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='transaction_summaries', to='pretixbase.event')),
+                ('item', models.ForeignKey(null=True, on_delete=django.db.models.deletion.CASCADE, related_name='+', to='pretixbase.item')),
+                ('subevent', models.ForeignKey(null=True, on_delete=django.db.models.deletion.CASCADE, related_name='+', to='pretixbase.subevent')),
+                ('tax_rule', models.ForeignKey(null=True, on_delete=django.db.models.deletion.CASCADE, related_name='+', to='pretixbase.taxrule')),
+                ('variation', models.ForeignKey(null=True, on_delete=django.db.models.deletion.CASCADE, related_name='+', to='pretixbase.itemvariation')),
+            ],
+            options={
+                'indexes': [models.Index(fields=['event', 'date'], name='pretixbase_txsummary_day')],
+            },
+        ),
+    ]
@@ -0,0 +1,31 @@
+# Generated by Django 5.2.18 on 2026-10-19 10:01
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('pretixbase', '0309_transactionsummary'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='OrderSideEffectQueue',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False)),
+                ('created', models.DateTimeField(auto_now_add=True)),
+                ('steps', models.JSONField(default=list)),
+                ('params', models.JSONField(default=dict)),
+                ('failed_attempts', models.PositiveIntegerField(default=0)),
+                ('not_before', models.DateTimeField(db_index=True)),
+                ('in_flight_since', models.DateTimeField(blank=True, null=True)),
+                ('event', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='queued_side_effects', to='pretixbase.event')),
+                ('order', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='queued_side_effects', to='pretixbase.order')),
+            ],
+            options={
+                'ordering': ('created',),
+            },
+        ),
+    ]
@@ -0,0 +1,17 @@
+# Generated by Django 5.2.18 on 2026-10-19 10:30
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('pretixbase', '0310_ordersideeffectqueue'),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='seat',
+            index=models.Index(fields=['event', 'subevent', 'x'], name='pretixbase_seat_position'),
+        ),
+    ]
@@ -191,6 +191,15 @@ class ImportColumn:
         """
         pass
 
+    def save_many(self, objs):
+        """
+        This will be called instead of ``save`` if multiple objects have been saved to the database at once, e.g.
+        during an order import. By default, this calls ``save`` for every object in ``objs``. You can override it to
+        create related objects in bulk.
+        """
+        for obj in objs:
+            self.save(obj)
+
     @property
     def timezone(self):
         return self.event.timezone
@@ -134,17 +134,22 @@ class ItemColumn(ImportColumn):
     def items(self):
         return list(self.event.items.filter(active=True))
 
+    @cached_property
+    def lookup(self):
+        lookup = defaultdict(list)
+        for p in self.items:
+            for k in {str(p.pk), p.internal_name, *i18n_flat(p.name)}:
+                if k:
+                    lookup[k].append(p)
+        return lookup
+
     def static_choices(self):
         return [
             (str(p.pk), str(p)) for p in self.items
         ]
 
     def clean(self, value, previous_values):
-        matches = [
-            p for p in self.items
-            if str(p.pk) == value or (p.internal_name and p.internal_name == value) or any(
-                (v and v == value) for v in i18n_flat(p.name))
-        ]
+        matches = self.lookup.get(value, [])
         if len(matches) == 0:
             raise ValidationError(_("No matching product was found."))
         if len(matches) > 1:
@@ -166,6 +171,19 @@ class Variation(ImportColumn):
             active=True, item__active=True, item__event=self.event
         ).select_related('item'))
 
+    @cached_property
+    def lookup(self):
+        lookup = defaultdict(list)
+        for p in self.items:
+            for k in {str(p.pk), *i18n_flat(p.value)}:
+                if k:
+                    lookup[p.item_id, k].append(p)
+        return lookup
+
+    @cached_property
+    def items_with_variations(self):
+        return set(ItemVariation.objects.filter(item__event=self.event).values_list('item_id', flat=True))
+
     def static_choices(self):
         return [
             (str(p.pk), '{} – {}'.format(p.item, p.value)) for p in self.items
@@ -173,16 +191,13 @@ class Variation(ImportColumn):
 
     def clean(self, value, previous_values):
         if value:
-            matches = [
-                p for p in self.items
-                if (str(p.pk) == value or any((v and v == value) for v in i18n_flat(p.value))) and p.item_id == previous_values['item'].pk
-            ]
+            matches = self.lookup.get((previous_values['item'].pk, value), [])
             if len(matches) == 0:
                 raise ValidationError(_("No matching variation was found."))
             if len(matches) > 1:
                 raise ValidationError(_("Multiple matching variations were found."))
             return matches[0]
-        elif previous_values['item'].variations.exists():
+        elif previous_values['item'].pk in self.items_with_variations:
             raise ValidationError(_("You need to select a variation for this product."))
         return value
 
@@ -585,16 +600,22 @@ class Saleschannel(ImportColumn):
     def channels(self):
         return list(self.event.organizer.sales_channels.all())
 
+    @cached_property
+    def lookup(self):
+        lookup = defaultdict(list)
+        for p in self.channels:
+            for k in {p.identifier, *i18n_flat(p.label)}:
+                if k:
+                    lookup[k].append(p)
+        return lookup
+
     def static_choices(self):
         return [
             (c.identifier, str(c.label)) for c in self.channels
         ]
 
     def clean(self, value, previous_values):
-        matches = [
-            p for p in self.channels
-            if p.identifier == value or any((v and v == value) for v in i18n_flat(p.label))
-        ]
+        matches = self.lookup.get(value, [])
         if len(matches) == 0:
             raise ValidationError(_("Please enter a valid sales channel."))
         if len(matches) > 1:
@@ -614,6 +635,10 @@ class SeatColumn(ImportColumn):
         self._cached = set()
         super().__init__(*args)
 
+    @cached_property
+    def seated_products(self):
+        return set(self.event.seat_category_mappings.values_list('product_id', 'subevent_id'))
+
     def clean(self, value, previous_values):
         if value:
             try:
@@ -630,7 +655,7 @@ class SeatColumn(ImportColumn):
                 raise ValidationError(
                     _('The seat you selected has already been taken. Please select a different seat.'))
             self._cached.add(value)
-        elif previous_values['item'].seat_category_mappings.filter(subevent=previous_values.get('subevent')).exists():
+        elif (previous_values['item'].pk, getattr(previous_values.get('subevent'), 'pk', None)) in self.seated_products:
             raise ValidationError(_('You need to select a specific seat.'))
         return value
 
@@ -729,21 +754,39 @@ class QuestionColumn(ImportColumn):
             else:
                 order._answers.append(QuestionAnswer(question=self.q, answer=str(value), orderposition=position))
 
+    def _own_answers(self, order):
+        return [a for a in getattr(order, '_answers', []) if a.question_id == self.q.pk]
+
     def save(self, order):
-        for a in getattr(order, '_answers', []):
+        for a in self._own_answers(order):
             a.orderposition = a.orderposition  # This is apparently required after save() again
             a.save()
             if hasattr(a, '_options'):
                 a.options.add(*a._options)
 
+    def save_many(self, orders):
+        answers = [a for o in orders for a in self._own_answers(o)]
+        QuestionAnswer.objects.bulk_create(answers)
+        QuestionAnswer.options.through.objects.bulk_create([
+            QuestionAnswer.options.through(questionanswer_id=a.pk, questionoption_id=opt.pk)
+            for a in answers for opt in getattr(a, '_options', [])
+        ])
+
 
 class CustomerColumn(ImportColumn):
     identifier = 'customer'
     verbose_name = gettext_lazy('Customer')
     order_level = True
 
+    def __init__(self, *args):
+        self._customer_cache = {}
+        super().__init__(*args)
+
     def clean(self, value, previous_values):
         if value:
+            if value in self._customer_cache:
+                return self._customer_cache[value]
+            raw_value = value
             try:
                 value = self.event.organizer.customers.get(
                     Q(identifier=value) | Q(email__iexact=value) | Q(external_identifier=value)
@@ -754,6 +797,7 @@ class CustomerColumn(ImportColumn):
                 )
             except Customer.DoesNotExist:
                 raise ValidationError(_('No matching customer was found.'))
+            self._customer_cache[raw_value] = value
         return value
 
     def assign(self, value, order, position, invoice_address, **kwargs):
@@ -57,6 +57,10 @@ from .organizer import (
     TeamInvite,
 )
 from .seating import Seat, SeatCategoryMapping, SeatingPlan
+from .sideeffects import OrderSideEffectQueue
+from .statistics import (
+    SalesRollup, SalesRollupState, TransactionSummary, TransactionSummaryState,
+)
 from .tax import TaxRule
 from .vouchers import Voucher
 from .waitinglist import WaitingListEntry
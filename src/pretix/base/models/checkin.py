@@ -47,6 +47,7 @@ from django_scopes import ScopedManager, scopes_disabled
 from pretix.base.media import MEDIA_TYPES
 from pretix.base.models import LoggedModel
 from pretix.helpers import PostgresWindowFrame
+from pretix.helpers.database import get_read_replica
 
 
 class CheckinList(LoggedModel):
@@ -225,7 +226,7 @@ class CheckinList(LoggedModel):
     def checkin_count(self):
         return self.event.cache.get_or_set(
             'checkin_list_{}_checkin_count'.format(self.pk),
-            lambda: self.positions.using(settings.DATABASE_REPLICA).annotate(
+            lambda: self.positions.using(get_read_replica()).annotate(
                 checkedin=Exists(Checkin.objects.filter(list_id=self.pk, position=OuterRef('pk'), type=Checkin.TYPE_ENTRY,))
             ).filter(
                 checkedin=True
@@ -71,7 +71,7 @@ from pretix.base.models.base import LoggedModel
 from pretix.base.reldate import RelativeDateWrapper
 from pretix.base.timemachine import time_machine_now
 from pretix.base.validators import EventSlugBanlistValidator
-from pretix.helpers.database import GroupConcat
+from pretix.helpers.database import GroupConcat, get_read_replica
 from pretix.helpers.daterange import daterange
 from pretix.helpers.hierarkey import clean_filename
 from pretix.helpers.json import CustomJSONEncoder, safe_string
@@ -343,7 +343,7 @@ class EventMixin:
 
         assert isinstance(channel, (SalesChannel, str))
 
-        sq_active_item = Item.objects.using(settings.DATABASE_REPLICA).filter_available(channel=channel, voucher=voucher).filter(
+        sq_active_item = Item.objects.using(get_read_replica()).filter_available(channel=channel, voucher=voucher).filter(
             Q(variations__isnull=True)
             & Q(quotas__pk=OuterRef('pk'))
         )
@@ -380,7 +380,7 @@ class EventMixin:
             q_variation &= Q(item__hide_without_voucher=False)
 
         sq_active_variation = ItemVariation.objects.filter(q_variation)
-        quota_base_qs = Quota.objects.using(settings.DATABASE_REPLICA).filter(
+        quota_base_qs = Quota.objects.using(get_read_replica()).filter(
             ignore_for_event_availability=False
         )
 
@@ -782,10 +782,12 @@ class Event(EventMixin, LoggedModel):
         from .orders import (
             OrderFee, OrderPayment, OrderPosition, OrderRefund, Transaction,
         )
+        from .statistics import TransactionSummary
 
         if not really:
             raise TypeError("Pass really=True as a parameter.")
 
+        TransactionSummary.remove_transactions(Transaction.objects.filter(order__event=self))
         Transaction.objects.filter(order__event=self).delete()
         OrderPosition.all.filter(order__event=self, addon_to__isnull=False).delete()
         OrderPosition.all.filter(order__event=self).delete()
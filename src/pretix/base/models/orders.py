@@ -357,7 +357,8 @@ class Order(LockModel, LoggedModel):
     def gracefully_delete_bulk(cls, event, orders, user=None, auth=None):
         # Expects to be called in a transaction
         from . import (
-            GiftCard, GiftCardTransaction, LogEntry, Membership, Voucher,
+            GiftCard, GiftCardTransaction, LogEntry, Membership,
+            TransactionSummary, Voucher,
         )
 
         if not transaction.get_connection().in_atomic_block:
@@ -393,6 +394,7 @@ class Order(LockModel, LoggedModel):
         OrderPosition.all.filter(order__in=orders, addon_to__isnull=False).delete()
         OrderPosition.all.filter(order__in=orders).delete()
         OrderFee.all.filter(order__in=orders).delete()
+        TransactionSummary.remove_transactions(Transaction.objects.filter(order__in=orders))
         Transaction.objects.filter(order__in=orders).delete()
         OrderRefund.objects.filter(order__in=orders).delete()
         OrderPayment.objects.filter(order__in=orders).delete()
@@ -881,25 +883,33 @@ class Order(LockModel, LoggedModel):
         tr = str.maketrans(d)
         return code.upper().translate(tr)
 
-    def assign_code(self):
+    @staticmethod
+    def random_code(length=None, testmode=False):
+        """
+        Returns a random order code that is not on the banlist, without checking if it is already in use.
+        """
         # This omits some character pairs completely because they are hard to read even on screens (1/I and O/0)
         # and includes only one of two characters for some pairs because they are sometimes hard to distinguish in
         # handwriting (2/Z, 4/A, 5/S, 6/G, 8/B). This allows for better detection e.g. in incoming wire transfers that
         # might include OCR'd handwritten text
         charset = list('ABCDEFGHJKLMNPQRSTUVWXYZ379')
-        iteration = 0
-        length = settings.ENTROPY['order_code']
         while True:
-            code = get_random_string(length=length, allowed_chars=charset)
-            iteration += 1
-
+            code = get_random_string(length=length or settings.ENTROPY['order_code'], allowed_chars=charset)
             if banned(code):
                 continue
 
-            if self.testmode:
+            if testmode:
                 # Subtle way to recognize test orders while debugging: They all contain a 0 at the second place,
                 # even though zeros are not used outside test mode.
                 code = code[0] + "0" + code[2:]
+            return code
+
+    def assign_code(self):
+        iteration = 0
+        length = settings.ENTROPY['order_code']
+        while True:
+            code = self.random_code(length, self.testmode)
+            iteration += 1
 
             if not Order.objects.filter(event__organizer=self.event.organizer, code=code).exists():
                 self.code = code
@@ -1238,13 +1248,16 @@ class Order(LockModel, LoggedModel):
             return set.intersection(set(self.positions_with_tickets_ignoring_plugins), *[set(r) for rr, r in signal_response if isinstance(r, Iterable)])
 
     def create_transactions(self, is_new=False, positions=None, fees=None, dt_now=None, migrated=False,
-                            _backfill_before_cancellation=False, save=True):
+                            _backfill_before_cancellation=False, save=True, current_transactions=None):
         dt_now = dt_now or now()
 
         # Count the transactions we already have
         current_transaction_count = Counter()
         if not is_new:
-            for t in Transaction.objects.filter(order=self):  # do not use related manager, we want to avoid cached data
+            if current_transactions is None:
+                # do not use related manager, we want to avoid cached data
+                current_transactions = Transaction.objects.filter(order=self)
+            for t in current_transactions:
                 current_transaction_count[Transaction.key(t)] += t.count
 
         # Count the transactions we'd actually need
@@ -2891,15 +2904,22 @@ class OrderPosition(AbstractPosition):
 
         return super().save(*args, **kwargs)
 
-    @scopes_disabled()
-    def assign_pseudonymization_id(self):
+    @staticmethod
+    def random_pseudonymization_id():
+        """
+        Returns a random pseudonymization ID, without checking if it is already in use.
+        """
         # This omits some character pairs completely because they are hard to read even on screens (1/I and O/0)
         # and includes only one of two characters for some pairs because they are sometimes hard to distinguish in
         # handwriting (2/Z, 4/A, 5/S, 6/G). This allows for better detection e.g. in incoming wire transfers that
         # might include OCR'd handwritten text
         charset = list('ABCDEFGHJKLMNPQRSTUVWXYZ3789')
+        return get_random_string(length=10, allowed_chars=charset)
+
+    @scopes_disabled()
+    def assign_pseudonymization_id(self):
         while True:
-            code = get_random_string(length=10, allowed_chars=charset)
+            code = self.random_pseudonymization_id()
             with scopes_disabled():
                 if not OrderPosition.all.filter(pseudonymization_id=code).exists():
                     self.pseudonymization_id = code
@@ -33,6 +33,8 @@ from django.utils.translation import gettext, gettext_lazy as _
 
 from pretix.base.models import Event, Item, LoggedModel, Organizer, SubEvent
 
+SEAT_DISTANCE_BOX_MARGIN = 1.01
+
 
 @deconstructible
 class SeatingPlanLayoutValidator:
@@ -187,6 +189,9 @@ class Seat(models.Model):
 
     class Meta:
         ordering = ['sorting_rank', 'seat_guid']
+        indexes = [
+            models.Index(fields=['event', 'subevent', 'x'], name='pretixbase_seat_position'),
+        ]
 
     @property
     def name(self):
@@ -262,9 +267,18 @@ class Seat(models.Model):
             )
 
         if minimal_distance > 0:
-            # TODO: Is there a more performant implementation on PostgreSQL using
-            # https://www.postgresql.org/docs/8.2/functions-geometry.html ?
-            sq_closeby = qs_annotated.annotate(
+            # Comparing every seat with every other seat is quadratic. Two seats can only be closer than
+            # minimal_distance if they are within a square of that size around each other, so we first restrict
+            # the candidates to that box, which the database can look up using the (event, subevent, x) index. The
+            # box is slightly larger than necessary so that rounding can never exclude a seat the exact distance
+            # check below would have found.
+            box = minimal_distance * SEAT_DISTANCE_BOX_MARGIN
+            sq_closeby = qs_annotated.filter(
+                x__gt=OuterRef('x') - box,
+                x__lt=OuterRef('x') + box,
+                y__gt=OuterRef('y') - box,
+                y__lt=OuterRef('y') + box,
+            ).annotate(
                 distance=(
                     Power(F('x') - OuterRef('x'), Value(2), output_field=models.FloatField()) +
                     Power(F('y') - OuterRef('y'), Value(2), output_field=models.FloatField())
@@ -340,7 +354,13 @@ class Seat(models.Model):
             self_x = Subquery(Seat.objects.filter(pk=self.pk).values('x'))
             self_y = Subquery(Seat.objects.filter(pk=self.pk).values('y'))
 
-            qs_closeby_taken = qs_annotated.annotate(
+            box = self.event.settings.seating_minimal_distance * SEAT_DISTANCE_BOX_MARGIN
+            qs_closeby_taken = qs_annotated.filter(
+                x__gt=self_x - box,
+                x__lt=self_x + box,
+                y__gt=self_y - box,
+                y__lt=self_y + box,
+            ).annotate(
                 distance=(
                     Power(F('x') - self_x, Value(2), output_field=models.FloatField()) +
                     Power(F('y') - self_y, Value(2), output_field=models.FloatField())
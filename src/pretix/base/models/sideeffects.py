@@ -0,0 +1,48 @@
+#
+# This file is part of pretix (Community Edition).
+#
+# Copyright (C) 2014-2020  Raphael Michel and contributors
+# Copyright (C) 2020-today pretix GmbH and contributors
+#
+# This program is free software: you can redistribute it and/or modify it under the terms of the GNU Affero General
+# Public License as published by the Free Software Foundation in version 3 of the License.
+#
+# ADDITIONAL TERMS APPLY: Pursuant to Section 7 of the GNU Affero General Public License, additional terms are
+# applicable granting you additional permissions and placing additional restrictions on your usage of this software.
+# Please refer to the pretix LICENSE file to obtain the full terms applicable to this work. If you did not receive
+# this file, see <https://pretix.eu/about/en/license>.
+#
+# This program is distributed in the hope that it will be useful, but WITHOUT ANY WARRANTY; without even the implied
+# warranty of MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the GNU Affero General Public License for more
+# details.
+#
+# You should have received a copy of the GNU Affero General Public License along with this program.  If not, see
+# <https://www.gnu.org/licenses/>.
+#
+from django.db import models
+
+
+class OrderSideEffectQueue(models.Model):
+    """
+    Follow-up work after an order has been placed, such as generating the invoice, sending emails and starting
+    payments that do not need user interaction. The job is created in the same database transaction as the order,
+    so the work is not lost even if the worker dies right after the order has been committed.
+
+    ``steps`` is the ordered list of steps that still need to run. A step is removed from the list once it has
+    completed, so a job that is picked up again continues where it stopped.
+    """
+    order = models.ForeignKey(
+        'Order', on_delete=models.CASCADE, related_name="queued_side_effects"
+    )
+    event = models.ForeignKey(
+        'Event', on_delete=models.CASCADE, related_name="queued_side_effects"
+    )
+    created = models.DateTimeField(auto_now_add=True)
+    steps = models.JSONField(default=list)
+    params = models.JSONField(default=dict)
+    failed_attempts = models.PositiveIntegerField(default=0)
+    not_before = models.DateTimeField(db_index=True)
+    in_flight_since = models.DateTimeField(null=True, blank=True)
+
+    class Meta:
+        ordering = ("created",)
@@ -0,0 +1,191 @@
+#
+# This file is part of pretix (Community Edition).
+#
+# Copyright (C) 2014-2020  Raphael Michel and contributors
+# Copyright (C) 2020-today pretix GmbH and contributors
+#
+# This program is free software: you can redistribute it and/or modify it under the terms of the GNU Affero General
+# Public License as published by the Free Software Foundation in version 3 of the License.
+#
+# ADDITIONAL TERMS APPLY: Pursuant to Section 7 of the GNU Affero General Public License, additional terms are
+# applicable granting you additional permissions and placing additional restrictions on your usage of this software.
+# Please refer to the pretix LICENSE file to obtain the full terms applicable to this work. If you did not receive
+# this file, see <https://pretix.eu/about/en/license>.
+#
+# This program is distributed in the hope that it will be useful, but WITHOUT ANY WARRANTY; without even the implied
+# warranty of MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the GNU Affero General Public License for more
+# details.
+#
+# You should have received a copy of the GNU Affero General Public License along with this program.  If not, see
+# <https://www.gnu.org/licenses/>.
+#
+from collections import defaultdict
+from datetime import timezone
+from decimal import Decimal
+
+from django.db import models, transaction
+from django.db.models import F, Q, Sum
+from django.db.models.functions import TruncDate
+
+
+class SalesRollup(models.Model):
+    """
+    Pre-aggregated sales numbers of an event, used to render statistics and sales overviews without aggregating
+    over all order positions of an event.
+
+    There are two kinds of rows:
+
+    * *Position rows* (``item`` is set) count order positions and sum up their ``price`` and ``tax_value``.
+      ``canceled`` is set if the position is canceled.
+
+    * *Order rows* (``item`` is ``None``) count orders. If ``subevent`` is ``None``, ``price`` is the sum of the
+      order totals and ``canceled`` is set if the order does not contain any non-canceled position. In event series,
+      there is additionally one order row per date for all orders containing a non-canceled position for that date.
+      These rows do not carry a price.
+
+    ``status`` is the status of the order, with the additional value ``unapproved`` for pending orders that
+    require approval. ``order_date`` and ``payment_date`` (date of the last confirmed or refunded payment) are
+    dates in the timezone of the event.
+
+    Rows are always replaced for full days of ``order_date`` by ``pretix.base.services.stats``, never modified.
+    """
+    event = models.ForeignKey('Event', on_delete=models.CASCADE, related_name='sales_rollups')
+    subevent = models.ForeignKey('SubEvent', null=True, on_delete=models.CASCADE, related_name='+')
+    item = models.ForeignKey('Item', null=True, on_delete=models.CASCADE, related_name='+')
+    variation = models.ForeignKey('ItemVariation', null=True, on_delete=models.CASCADE, related_name='+')
+    sales_channel = models.ForeignKey('SalesChannel', null=True, on_delete=models.CASCADE, related_name='+')
+    status = models.CharField(max_length=10)
+    canceled = models.BooleanField(default=False)
+    order_date = models.DateField()
+    payment_date = models.DateField(null=True)
+    count = models.IntegerField(default=0)
+    price = models.DecimalField(decimal_places=2, max_digits=13, default=0)
+    tax_value = models.DecimalField(decimal_places=2, max_digits=13, default=0)
+
+    class Meta:
+        indexes = [
+            models.Index(fields=["event", "order_date"], name="pretixbase_salesrollup_day"),
+        ]
+
+
+class SalesRollupState(models.Model):
+    """
+    Marks the sales rollups of an event as complete. As long as this does not exist, or if the timezone of the
+    event has changed since, the rollups must not be used.
+    """
+    event = models.OneToOneField('Event', on_delete=models.CASCADE, related_name='sales_rollup_state')
+    built = models.DateTimeField(auto_now_add=True)
+    timezone = models.CharField(max_length=100)
+
+
+class TransactionSummary(models.Model):
+    """
+    Pre-aggregated sums of ``Transaction`` rows per event, date, product or fee type, price and tax rule, used for
+    financial reporting over long time frames without reading every single transaction.
+
+    ``date`` is the date of the transaction in UTC, ``count`` is the sum of the transactions' ``count``, ``total`` and
+    ``tax_total`` are the sums of ``count * price`` and ``count * tax_value``. Since transactions are never modified,
+    summaries are maintained incrementally by ``pretix.base.services.stats.update_transaction_summaries``. They
+    contain every transaction created up to ``TransactionSummaryState.watermark`` exactly once. There is no unique
+    constraint on the grouping fields since some of them are nullable, instead all writes are serialized by locking
+    the ``TransactionSummaryState``.
+    """
+    event = models.ForeignKey('Event', on_delete=models.CASCADE, related_name='transaction_summaries')
+    date = models.DateField()
+    subevent = models.ForeignKey('SubEvent', null=True, on_delete=models.CASCADE, related_name='+')
+    item = models.ForeignKey('Item', null=True, on_delete=models.CASCADE, related_name='+')
+    variation = models.ForeignKey('ItemVariation', null=True, on_delete=models.CASCADE, related_name='+')
+    fee_type = models.CharField(max_length=100, null=True)
+    internal_type = models.CharField(max_length=255, null=True)
+    price = models.DecimalField(decimal_places=2, max_digits=13)
+    tax_rate = models.DecimalField(max_digits=7, decimal_places=4)
+    tax_rule = models.ForeignKey('TaxRule', null=True, on_delete=models.CASCADE, related_name='+')
+    testmode = models.BooleanField(default=False)
+    migrated = models.BooleanField(default=False)
+    count = models.IntegerField(default=0)
+    total = models.DecimalField(decimal_places=2, max_digits=13, default=0)
+    tax_total = models.DecimalField(decimal_places=2, max_digits=13, default=0)
+
+    KEY_FIELDS = (
+        'event_id', 'date', 'subevent_id', 'item_id', 'variation_id', 'fee_type', 'internal_type', 'price',
+        'tax_rate', 'tax_rule_id', 'testmode', 'migrated',
+    )
+
+    class Meta:
+        indexes = [
+            models.Index(fields=["event", "date"], name="pretixbase_txsummary_day"),
+        ]
+
+    @classmethod
+    def add_transactions(cls, transactions, sign=1):
+        """
+        Adds the given queryset of transactions to the summaries, or removes them if ``sign`` is ``-1``. The caller
+        needs to hold the lock on ``TransactionSummaryState``.
+        """
+        groups = transactions.annotate(
+            summary_date=TruncDate('datetime', tzinfo=timezone.utc),
+        ).order_by().values(
+            'order__event_id', 'summary_date', 'subevent_id', 'item_id', 'variation_id', 'fee_type', 'internal_type',
+            'price', 'tax_rate', 'tax_rule_id', 'order__testmode', 'migrated',
+        ).annotate(
+            sum_count=Sum('count'),
+            sum_total=Sum(F('count') * F('price')),
+            sum_tax=Sum(F('count') * F('tax_value')),
+        )
+        sums = {}
+        for g in groups:
+            key = (
+                g['order__event_id'], g['summary_date'], g['subevent_id'], g['item_id'], g['variation_id'],
+                g['fee_type'], g['internal_type'], g['price'], g['tax_rate'], g['tax_rule_id'], g['order__testmode'],
+                g['migrated'],
+            )
+            sums[key] = (g['sum_count'], g['sum_total'] or Decimal('0.00'), g['sum_tax'] or Decimal('0.00'))
+        if not sums:
+            return
+
+        dates_by_event = defaultdict(set)
+        for event_id, date in {k[:2] for k in sums}:
+            dates_by_event[event_id].add(date)
+        existing = {}
+        event_ids = sorted(dates_by_event)
+        for i in range(0, len(event_ids), 100):
+            days = Q()
+            for event_id in event_ids[i:i + 100]:
+                days |= Q(event_id=event_id, date__in=dates_by_event[event_id])
+            for s in cls.objects.filter(days):
+                existing[tuple(getattr(s, f) for f in cls.KEY_FIELDS)] = s
+
+        create, update = [], []
+        for key, (count, total, tax_total) in sums.items():
+            if key in existing:
+                s = existing[key]
+                s.count += sign * count
+                s.total += sign * total
+                s.tax_total += sign * tax_total
+                update.append(s)
+            else:
+                s = cls(**dict(zip(cls.KEY_FIELDS, key)))
+                s.count = sign * count
+                s.total = sign * total
+                s.tax_total = sign * tax_total
+                create.append(s)
+        cls.objects.bulk_update(update, ['count', 'total', 'tax_total'], batch_size=500)
+        cls.objects.bulk_create(create, batch_size=500)
+
+    @classmethod
+    def remove_transactions(cls, transactions):
+        """
+        Needs to be called before transactions are deleted, which only happens if orders in test mode are deleted.
+        """
+        with transaction.atomic():
+            state = TransactionSummaryState.objects.select_for_update().filter(pk=1).first()
+            if state and state.watermark:
+                cls.add_transactions(transactions.filter(created__lte=state.watermark), sign=-1)
+
+
+class TransactionSummaryState(models.Model):
+    """
+    Singleton (``pk=1``) that stores up to which ``Transaction.created`` timestamp transactions are contained in
+    ``TransactionSummary``. Its row is locked while summaries are modified.
+    """
+    watermark = models.DateTimeField(null=True)
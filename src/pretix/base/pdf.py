@@ -780,6 +780,9 @@ def generate_compressed_addon_list(op, order, event, only_checked_in=False):
         else op.addons.select_related('item', 'variation')
     )
     if only_checked_in:
+        if 'addons' in getattr(op, '_prefetched_objects_cache', {}) and not addon_qs:
+            # No need to ask the database which add-ons are checked in if there are none at all
+            return []
         addon_qs = addon_qs.filter(Exists(Checkin.objects.filter(position=OuterRef('pk'))), canceled=False)
     addons = [p for p in addon_qs if not p.canceled]
 
@@ -44,7 +44,7 @@ from django import forms
 from django.conf import settings
 from django.core.exceptions import ValidationError
 from django.db import DatabaseError, transaction
-from django.db.models import Count, Exists, IntegerField, OuterRef, Q, Value
+from django.db.models import Exists, IntegerField, OuterRef, Q, Value
 from django.db.models.aggregates import Min
 from django.dispatch import receiver
 from django.utils.timezone import make_aware, now
@@ -64,6 +64,7 @@ from pretix.base.models.event import SubEvent
 from pretix.base.models.orders import OrderFee
 from pretix.base.models.tax import TaxRule
 from pretix.base.reldate import RelativeDateWrapper
+from pretix.base.services.catalogue import EventCatalogue
 from pretix.base.services.checkin import _save_answers
 from pretix.base.services.locking import LockTimeoutException, lock_objects
 from pretix.base.services.pricing import (
@@ -71,6 +72,7 @@ from pretix.base.services.pricing import (
     get_price, is_included_for_free,
 )
 from pretix.base.services.quotas import QuotaAvailability
+from pretix.base.services.seating import invalidate_seat_availability
 from pretix.base.services.tasks import ProfiledEventTask
 from pretix.base.settings import PERSON_NAME_SCHEMES, LazyI18nStringList
 from pretix.base.signals import validate_cart_addons
@@ -427,6 +429,7 @@ class CartManager:
         self._operations = []
         self._quota_diff = Counter()
         self._voucher_use_diff = Counter()
+        self._catalogue = EventCatalogue(event)
         self._items_cache = {}
         self._subevents_cache = {}
         self._variations_cache = {}
@@ -435,6 +438,7 @@ class CartManager:
         self._widget_data = widget_data or {}
         self._sales_channel = sales_channel
         self.num_extended_positions = 0
+        self._seats_released = False
         self.price_change_for_extended = False
 
         if reservation_time:
@@ -497,20 +501,22 @@ class CartManager:
 
     def _delete_out_of_timeframe(self):
         err = None
+        delete_pks = []
+        seated_pks = set()
         for cp in self.positions:
             if not cp.pk:
                 continue
+            if cp.seat_id:
+                seated_pks.add(cp.pk)
 
             if cp.subevent and cp.subevent.presale_start and time_machine_now(self.real_now_dt) < cp.subevent.presale_start:
                 err = error_messages['some_subevent_not_started']
-                cp.addons.all().delete()
-                cp.delete()
+                delete_pks.append(cp.pk)
                 continue
 
             if cp.subevent and cp.subevent.presale_end and time_machine_now(self.real_now_dt) > cp.subevent.presale_end:
                 err = error_messages['some_subevent_ended']
-                cp.addons.all().delete()
-                cp.delete()
+                delete_pks.append(cp.pk)
                 continue
 
             if cp.subevent:
@@ -522,35 +528,27 @@ class CartManager:
                     ), self.event.timezone)
                     if term_last < time_machine_now(self.real_now_dt):
                         err = error_messages['some_subevent_ended']
-                        cp.addons.all().delete()
-                        cp.delete()
+                        delete_pks.append(cp.pk)
                         continue
+
+        if delete_pks:
+            # Delete all affected positions and their add-ons at once instead of one query per position
+            CartPosition.objects.filter(addon_to__in=delete_pks).delete()
+            CartPosition.objects.filter(pk__in=delete_pks).delete()
+            self._seats_released = self._seats_released or bool(seated_pks.intersection(delete_pks))
         return err
 
     def _update_subevents_cache(self, se_ids: List[int]):
-        self._subevents_cache.update({
-            i.pk: i
-            for i in self.event.subevents.filter(id__in=[i for i in se_ids if i and i not in self._subevents_cache])
-        })
+        self._subevents_cache.update(self._catalogue.subevents(
+            [i for i in se_ids if i and i not in self._subevents_cache]
+        ))
 
     def _update_items_cache(self, item_ids: List[int], variation_ids: List[int]):
         self._items_cache.update({
-            i.pk: i
-            for i in self.event.items.select_related('category').prefetch_related(
-                'addons', 'bundles', 'addons__addon_category', 'quotas'
-            ).annotate(
-                has_variations=Count('variations'),
-            ).filter(
-                id__in=[i for i in item_ids if i and i not in self._items_cache]
-            ).order_by()
+            i: self._catalogue.items[i] for i in item_ids if i in self._catalogue.items
         })
         self._variations_cache.update({
-            v.pk: v
-            for v in ItemVariation.objects.filter(item__event=self.event).prefetch_related(
-                'quotas'
-            ).select_related('item', 'item__event').filter(
-                id__in=[i for i in variation_ids if i and i not in self._variations_cache]
-            ).order_by()
+            i: self._catalogue.variations[i] for i in variation_ids if i in self._catalogue.variations
         })
 
     def _check_max_cart_size(self):
@@ -650,6 +648,7 @@ class CartManager:
         ).prefetch_related(
             'item__quotas',
             'variation__quotas',
+            'addon_to__item__bundles',
             'addons'
         ).order_by('-is_bundled')
         err = None
@@ -661,7 +660,10 @@ class CartManager:
             cp.item.requires_seat = self.event.settings.seating_choice and cp.requires_seat
 
             if cp.is_bundled:
-                bundle = cp.addon_to.item.bundles.filter(bundled_item=cp.item, bundled_variation=cp.variation).first()
+                bundle = next((
+                    b for b in cp.addon_to.item.bundles.all()
+                    if b.bundled_item_id == cp.item_id and b.bundled_variation_id == cp.variation_id
+                ), None)
                 if bundle:
                     if cp.addon_to.voucher_id and cp.addon_to.voucher.all_bundles_included:
                         listed_price = Decimal('0.00')
@@ -680,7 +682,7 @@ class CartManager:
                 else:
                     price_after_voucher = listed_price
 
-            quotas = list(cp.quotas)
+            quotas = self._catalogue.quotas(cp.item, cp.variation, cp.subevent)
             if not quotas:
                 self._operations.append(self.RemoveOperation(position=cp))
                 err = error_messages['unavailable']
@@ -842,8 +844,7 @@ class CartManager:
                             voucher_use_diff[voucher] -= i['count']
 
             # Fetch all quotas. If there are no quotas, this item is not allowed to be sold.
-            quotas = list(item.quotas.filter(subevent=subevent)
-                          if variation is None else variation.quotas.filter(subevent=subevent))
+            quotas = self._catalogue.quotas(item, variation, subevent)
             if not quotas:
                 raise CartError(error_messages['unavailable'])
             if not voucher or (not voucher.allow_ignore_quota and not voucher.block_quota):
@@ -863,8 +864,7 @@ class CartManager:
                     raise CartError(error_messages['not_for_sale'])
                 bitem = self._items_cache[bundle.bundled_item_id]
                 bvar = self._variations_cache[bundle.bundled_variation_id] if bundle.bundled_variation_id else None
-                bundle_quotas = list(bitem.quotas.filter(subevent=subevent)
-                                     if bvar is None else bvar.quotas.filter(subevent=subevent))
+                bundle_quotas = self._catalogue.quotas(bitem, bvar, subevent)
                 if not bundle_quotas:
                     raise CartError(error_messages['unavailable'])
                 if not voucher or not voucher.allow_ignore_quota:
@@ -1011,8 +1011,7 @@ class CartManager:
                 raise CartError(error_messages['addon_invalid_base'])
 
             # Fetch all quotas. If there are no quotas, this item is not allowed to be sold.
-            quotas = list(item.quotas.filter(subevent=cp.subevent)
-                          if variation is None else variation.quotas.filter(subevent=cp.subevent))
+            quotas = self._catalogue.quotas(item, variation, cp.subevent)
             if not quotas:
                 raise CartError(error_messages['unavailable'])
 
@@ -1128,7 +1127,7 @@ class CartManager:
                 if input_num < current_num:
                     for a in current_addons[cp][k][:current_num - input_num]:
                         if a.expires > self.real_now_dt:
-                            quotas = list(a.quotas)
+                            quotas = self._catalogue.quotas(a.item, a.variation, a.subevent)
 
                             for quota in quotas:
                                 quota_diff[quota] -= 1
@@ -1264,7 +1263,8 @@ class CartManager:
         for iop, op in enumerate(self._operations):
             if isinstance(op, self.RemoveOperation):
                 if op.position.expires > self.real_now_dt:
-                    for q in op.position.quotas:
+                    for q in self._catalogue.quotas(op.position.item, op.position.variation,
+                                                    op.position.subevent):
                         quotas_ok[q] += 1
                 addons = op.position.addons.all()
                 deleted_positions |= {a.pk for a in addons}
@@ -1570,6 +1570,15 @@ class CartManager:
         err = self._perform_operations() or err
         self.recompute_final_prices_and_taxes()
 
+        if self._seats_released or any(
+            (isinstance(op, (self.RemoveOperation, self.ExtendOperation)) and op.position.seat_id) or
+            (isinstance(op, self.AddOperation) and op.seat)
+            for op in self._operations
+        ):
+            # New positions are created in bulk and removed or extended positions may have given up their seat, none
+            # of which the seat availability snapshot picks up on its own
+            invalidate_seat_availability(self.event.pk)
+
         if err:
             raise CartError(err)
 
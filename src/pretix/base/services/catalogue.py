@@ -0,0 +1,204 @@
+#
+# This file is part of pretix (Community Edition).
+#
+# Copyright (C) 2014-2020  Raphael Michel and contributors
+# Copyright (C) 2020-today pretix GmbH and contributors
+#
+# This program is free software: you can redistribute it and/or modify it under the terms of the GNU Affero General
+# Public License as published by the Free Software Foundation in version 3 of the License.
+#
+# ADDITIONAL TERMS APPLY: Pursuant to Section 7 of the GNU Affero General Public License, additional terms are
+# applicable granting you additional permissions and placing additional restrictions on your usage of this software.
+# Please refer to the pretix LICENSE file to obtain the full terms applicable to this work. If you did not receive
+# this file, see <https://pretix.eu/about/en/license>.
+#
+# This program is distributed in the hope that it will be useful, but WITHOUT ANY WARRANTY; without even the implied
+# warranty of MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the GNU Affero General Public License for more
+# details.
+#
+# You should have received a copy of the GNU Affero General Public License along with this program.  If not, see
+# <https://www.gnu.org/licenses/>.
+#
+"""
+A snapshot of the products of an event that is shared between requests and tasks.
+
+Adding something to a cart or placing an order requires the same product configuration over and over again: the
+items with their categories, add-on and bundle configurations, the variations, and the quotas of the relevant
+subevent. Instead of loading these from the database in every cart operation, :py:class:`EventCatalogue` stores
+them in ``event.cache``. Since the cache namespace of an event is replaced whenever an item, variation, quota, tax
+rule or the event itself is changed, a stored snapshot is implicitly versioned and never needs to be invalidated
+explicitly, the only exception being subevents, which are stored individually.
+
+All objects are loaded from the cache once per :py:class:`EventCatalogue` instance and are not shared between
+instances, so they can be modified by the caller just like objects fetched from the database.
+"""
+from collections import defaultdict
+from functools import partial
+
+from django.core.exceptions import ObjectDoesNotExist
+from django.db import transaction
+from django.db.models import Count
+from django.db.models.signals import m2m_changed, post_delete, post_save
+from django.dispatch import receiver
+
+from pretix.base.cache import NamespacedCache, ObjectRelatedCache
+from pretix.base.models import (
+    Item, ItemAddOn, ItemBundle, ItemCategory, ItemVariation, Quota, SubEvent,
+    TaxRule,
+)
+
+CATALOGUE_TTL = 300
+
+
+class EventCatalogue:
+
+    def __init__(self, event):
+        self.event = event
+        # A fresh cache object, so all snapshots loaded by this instance use the current cache version of the
+        # event even if ``event.cache`` has been used before the event was changed.
+        self.cache = ObjectRelatedCache(event)
+        self._items = None
+        self._variations = None
+        self._subevents = {}
+        self._quotas = {}
+
+    def _load_items(self):
+        items = {
+            i.pk: i
+            for i in Item.objects.filter(event=self.event).select_related('category', 'tax_rule').prefetch_related(
+                'addons', 'bundles', 'addons__addon_category',
+            ).annotate(
+                has_variations=Count('variations'),
+            ).order_by()
+        }
+        variations = {
+            v.pk: v
+            for v in ItemVariation.objects.filter(item__event=self.event).order_by()
+        }
+        return items, variations
+
+    def _ensure_items(self):
+        if self._items is not None:
+            return
+        self._items, self._variations = self.cache.get_or_set('catalogue:items', self._load_items, CATALOGUE_TTL)
+        for i in self._items.values():
+            i.event = self.event
+        for v in self._variations.values():
+            v.item = self._items[v.item_id]
+
+    @property
+    def items(self):
+        """
+        A dictionary mapping the IDs of all items of the event to ``Item`` objects, with the category, tax rule,
+        add-on and bundle configurations already fetched and ``has_variations`` annotated.
+        """
+        self._ensure_items()
+        return self._items
+
+    @property
+    def variations(self):
+        """
+        A dictionary mapping the IDs of all variations of the event to ``ItemVariation`` objects.
+        """
+        self._ensure_items()
+        return self._variations
+
+    def subevents(self, ids):
+        """
+        Returns a dictionary mapping the given subevent IDs to ``SubEvent`` objects. IDs that do not belong to
+        a subevent of this event are left out.
+        """
+        ids = {int(i) for i in ids if i}
+        missing = ids - set(self._subevents)
+        if missing:
+            cached = self.cache.get_many([f'catalogue:subevent:{pk}' for pk in missing])
+            found = {se.pk: se for se in cached.values()}
+            if len(found) < len(missing):
+                loaded = {
+                    se.pk: se for se in SubEvent.objects.filter(event=self.event, id__in=missing - set(found))
+                }
+                self.cache.set_many({f'catalogue:subevent:{pk}': se for pk, se in loaded.items()}, CATALOGUE_TTL)
+                found.update(loaded)
+            for se in found.values():
+                se.event = self.event
+            self._subevents.update(found)
+        return {pk: self._subevents[pk] for pk in ids if pk in self._subevents}
+
+    def _load_quotas(self, subevent_id):
+        quotas = {
+            q.pk: q for q in Quota.objects.filter(event=self.event, subevent_id=subevent_id).order_by()
+        }
+        item_quotas = defaultdict(list)
+        for item_id, quota_id in Quota.items.through.objects.filter(quota_id__in=quotas).values_list(
+                'item_id', 'quota_id'):
+            item_quotas[item_id].append(quota_id)
+        variation_quotas = defaultdict(list)
+        for var_id, quota_id in Quota.variations.through.objects.filter(quota_id__in=quotas).values_list(
+                'itemvariation_id', 'quota_id'):
+            variation_quotas[var_id].append(quota_id)
+        return quotas, dict(item_quotas), dict(variation_quotas)
+
+    def quotas(self, item, variation=None, subevent=None):
+        """
+        Returns the list of quotas of ``subevent`` the given item or variation is assigned to. This is
+        equivalent to ``item.quotas.filter(subevent=subevent)`` or ``variation.quotas.filter(subevent=subevent)``.
+        """
+        se_id = subevent.pk if subevent else None
+        if se_id not in self._quotas:
+            quotas, item_quotas, variation_quotas = self.cache.get_or_set(
+                f'catalogue:quotas:{se_id or 0}', partial(self._load_quotas, se_id), CATALOGUE_TTL
+            )
+            for q in quotas.values():
+                q.event = self.event
+                if subevent:
+                    q.subevent = subevent
+            self._quotas[se_id] = quotas, item_quotas, variation_quotas
+        quotas, item_quotas, variation_quotas = self._quotas[se_id]
+        if variation is not None:
+            return [quotas[pk] for pk in variation_quotas.get(variation.pk, [])]
+        return [quotas[pk] for pk in item_quotas.get(item.pk, [])]
+
+
+def _event_id(instance):
+    if isinstance(instance, (Item, ItemCategory, Quota, SubEvent, TaxRule)):
+        return instance.event_id
+    try:
+        if isinstance(instance, ItemVariation):
+            return instance.item.event_id
+        if isinstance(instance, (ItemAddOn, ItemBundle)):
+            return instance.base_item.event_id
+    except ObjectDoesNotExist:
+        # The parent item is being deleted as well and takes care of the invalidation
+        return None
+
+
+def invalidate_catalogue(sender, instance, **kwargs):
+    """
+    Most of these models clear ``event.cache`` themselves when they are saved, but before the transaction is
+    committed. A concurrent request could therefore store an outdated snapshot in the new cache namespace, which
+    is why we clear it again once the change is visible to everyone.
+    """
+    event_id = _event_id(instance)
+    if not event_id:
+        return
+    cache = NamespacedCache(f'Event:{event_id}')
+    if sender is SubEvent:
+        # Subevents are stored individually and are not covered by the cache namespace
+        transaction.on_commit(partial(cache.delete, f'catalogue:subevent:{instance.pk}'))
+    else:
+        transaction.on_commit(cache.clear)
+
+
+for model in (Item, ItemVariation, ItemCategory, ItemAddOn, ItemBundle, Quota, SubEvent, TaxRule):
+    post_save.connect(invalidate_catalogue, sender=model, dispatch_uid=f'catalogue_invalidate_save_{model.__name__}')
+    post_delete.connect(invalidate_catalogue, sender=model, dispatch_uid=f'catalogue_invalidate_delete_{model.__name__}')
+
+
+@receiver(m2m_changed, sender=Quota.items.through, dispatch_uid="catalogue_invalidate_quota_items")
+@receiver(m2m_changed, sender=Quota.variations.through, dispatch_uid="catalogue_invalidate_quota_variations")
+def invalidate_catalogue_quotas(sender, instance, action, **kwargs):
+    if action not in ('post_add', 'post_remove', 'post_clear'):
+        return
+    event_id = _event_id(instance)
+    if event_id:
+        transaction.on_commit(NamespacedCache(f'Event:{event_id}').clear)
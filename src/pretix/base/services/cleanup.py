@@ -19,34 +19,92 @@
 # You should have received a copy of the GNU Affero General Public License along with this program.  If not, see
 # <https://www.gnu.org/licenses/>.
 #
+import time
 from datetime import timedelta
 
 from django.conf import settings
+from django.core.cache import cache
 from django.core.management import call_command
+from django.db import transaction
 from django.db.models import Exists, OuterRef
 from django.dispatch import receiver
 from django.utils.timezone import now
 from django_scopes import scopes_disabled
 
-from pretix.base.models import CachedCombinedTicket, CachedTicket, OutgoingMail
+from pretix.base.models import (
+    CachedCombinedTicket, CachedTicket, OutgoingMail, Quota,
+)
 from pretix.base.models.customers import CustomerSSOGrant
+from pretix.base.services.quotas import invalidate_quota_cache
+from pretix.helpers.database import OF_SELF
 
 from ..models import CachedFile, CartPosition, InvoiceAddress
 from ..models.auth import UserKnownLoginSource
 from ..signals import periodic_task
 
+CART_CLEANUP_BATCH_SIZE = 500
+CART_CLEANUP_TIME_BUDGET = 60
+CART_EXPIRY_MAX_LOOKBACK = timedelta(minutes=30)
+
+
+def _delete_cart_position_batch(cutoff, addons):
+    # Positions that are currently locked, e.g. because a customer is just reviving their cart, are skipped and
+    # picked up by a later run instead of blocking the sweep.
+    with transaction.atomic():
+        pks = list(
+            CartPosition.objects.filter(
+                expires__lt=cutoff, addon_to__isnull=not addons
+            ).select_for_update(
+                skip_locked=True, of=OF_SELF
+            ).order_by().values_list('pk', flat=True)[:CART_CLEANUP_BATCH_SIZE]
+        )
+        if pks:
+            CartPosition.objects.filter(pk__in=pks).delete()
+    return len(pks)
+
 
 @receiver(signal=periodic_task)
 @scopes_disabled()
 def clean_cart_positions(sender, **kwargs):
-    for cp in CartPosition.objects.filter(expires__lt=now() - timedelta(days=14), addon_to__isnull=False):
-        cp.delete()
-    for cp in CartPosition.objects.filter(expires__lt=now() - timedelta(days=14), addon_to__isnull=True):
-        cp.delete()
+    """
+    Deletes cart positions that expired more than 14 days ago. The work is done in small transactions of
+    ``CART_CLEANUP_BATCH_SIZE`` positions. If there is more to do than fits in ``CART_CLEANUP_TIME_BUDGET``
+    seconds, the rest is left for the next run.
+    """
+    cutoff = now() - timedelta(days=14)
+    deadline = time.monotonic() + CART_CLEANUP_TIME_BUDGET
+    for addons in (True, False):
+        while time.monotonic() < deadline:
+            if _delete_cart_position_batch(cutoff, addons) < CART_CLEANUP_BATCH_SIZE:
+                break
     for ia in InvoiceAddress.objects.filter(order__isnull=True, customer__isnull=True, last_modified__lt=now() - timedelta(days=14)):
         ia.delete()
 
 
+@receiver(signal=periodic_task)
+@scopes_disabled()
+def release_expired_cart_quotas(sender, **kwargs):
+    """
+    Removes the cached availability of all quotas that had cart positions expire since the last run, so that
+    the freed-up capacity is shown right away instead of after the cache entries time out.
+    """
+    if not settings.HAS_REDIS:
+        return
+    until = now()
+    since = max(
+        cache.get('pretix_cart_expiry_released_until') or until - CART_EXPIRY_MAX_LOOKBACK,
+        until - CART_EXPIRY_MAX_LOOKBACK,
+    )
+    item_ids = set(
+        CartPosition.objects.filter(expires__gt=since, expires__lte=until).order_by().values_list('item_id', flat=True)
+    )
+    if item_ids:
+        invalidate_quota_cache(
+            Quota.objects.filter(items__in=item_ids).order_by().values_list('event_id', 'pk').distinct()
+        )
+    cache.set('pretix_cart_expiry_released_until', until, CART_EXPIRY_MAX_LOOKBACK.total_seconds())
+
+
 @receiver(signal=periodic_task)
 @scopes_disabled()
 def clean_cached_files(sender, **kwargs):
@@ -19,6 +19,7 @@
 # You should have received a copy of the GNU Affero General Public License along with this program.  If not, see
 # <https://www.gnu.org/licenses/>.
 #
+import contextlib
 import logging
 from datetime import timedelta
 from typing import Any, Dict, Union
@@ -51,6 +52,7 @@ from pretix.base.signals import (
 )
 from pretix.celery_app import app
 from pretix.helpers import OF_SELF, repeatable_reads_transaction
+from pretix.helpers.database import replica_reads
 from pretix.helpers.urls import mainreverse_absolute
 
 logger = logging.getLogger(__name__)
@@ -64,6 +66,16 @@ class ExportEmptyError(ExportError):
     pass
 
 
+def _render_export(exporter, form_data):
+    # Most exports only read data and can take a long time, so we run them against a replica if there is one that
+    # is not lagging behind too much
+    with (replica_reads() if exporter.replica_read else contextlib.nullcontext('default')) as using:
+        if exporter.repeatable_read:
+            with repeatable_reads_transaction(using=using):
+                return exporter.render(form_data)
+        return exporter.render(form_data)
+
+
 @app.task(base=ProfiledEventTask, throws=(ExportError, ExportEmptyError), bind=True)
 def export(self, event: Event, user: User, device: int, token: int, fileid: str, provider: str,
            form_data: Dict[str, Any], staff_session=False) -> None:
@@ -97,11 +109,7 @@ def export(self, event: Event, user: User, device: int, token: int, fileid: str,
 
     file = CachedFile.objects.get(id=fileid)
     with language(event.settings.locale, event.settings.region), override(event.settings.timezone):
-        if ex.repeatable_read:
-            with repeatable_reads_transaction():
-                d = ex.render(form_data)
-        else:
-            d = ex.render(form_data)
+        d = _render_export(ex, form_data)
 
         if d is None:
             raise ExportError(
@@ -170,11 +178,7 @@ def multiexport(self, organizer: Organizer, user: User, device: int, token: int,
             timezone = organizer.settings.timezone or settings.TIME_ZONE
             region = organizer.settings.region
     with language(locale, region), override(timezone):
-        if ex.repeatable_read:
-            with repeatable_reads_transaction():
-                d = ex.render(form_data)
-        else:
-            d = ex.render(form_data)
+        d = _render_export(ex, form_data)
         if d is None:
             raise ExportError(
                 gettext('Your export did not contain any data.')
@@ -364,11 +368,7 @@ def _run_scheduled_export(schedule, context: Union[Event, Organizer], exporter,
         try:
             if not exporter:
                 raise ExportError("Export type not found or permission denied.")
-            if exporter.repeatable_read:
-                with repeatable_reads_transaction():
-                    d = exporter.render(schedule.export_form_data)
-            else:
-                d = exporter.render(schedule.export_form_data)
+            d = _render_export(exporter, schedule.export_form_data)
             if d is None:
                 raise ExportEmptyError(
                     gettext('Your export did not contain any data.')
@@ -21,6 +21,7 @@
 #
 
 import logging
+from contextvars import ContextVar
 from itertools import groupby
 
 from django.conf import settings
@@ -35,6 +36,9 @@ logger = logging.getLogger('pretix.base.locking')
 # A lock acquisition is aborted if it takes longer than LOCK_ACQUISITION_TIMEOUT to prevent connection starvation
 LOCK_ACQUISITION_TIMEOUT = 3
 
+# Allows callers to give up on locks faster if they have a cheaper alternative to waiting, in seconds
+lock_acquisition_timeout_var = ContextVar('lock_acquisition_timeout', default=LOCK_ACQUISITION_TIMEOUT)
+
 # We make the assumption that it is safe to e.g. transform an order into a cart if the order has a lifetime of more than
 # LOCK_TRUST_WINDOW into the future. In other words, we assume that a lock is never held longer than LOCK_TRUST_WINDOW.
 # This assumption holds true for all in-request locks, since our gunicorn default settings kill a worker that takes
@@ -110,7 +114,7 @@ def lock_objects(objects, *, shared_lock_objects=None, replace_exclusive_with_sh
 
         try:
             with connection.cursor() as cursor:
-                cursor.execute(f"SET LOCAL lock_timeout = '{LOCK_ACQUISITION_TIMEOUT}s';")
+                cursor.execute(f"SET LOCAL lock_timeout = '{lock_acquisition_timeout_var.get()}s';")
                 cursor.execute(f"SELECT {calls};")
                 cursor.execute("SET LOCAL lock_timeout = '0';")  # back to default
         except DatabaseError as e:
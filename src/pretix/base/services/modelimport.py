@@ -19,7 +19,10 @@
 # You should have received a copy of the GNU Affero General Public License along with this program.  If not, see
 # <https://www.gnu.org/licenses/>.
 #
+import hashlib
+import json
 import logging
+from datetime import datetime
 from decimal import Decimal
 from typing import List
 
@@ -27,6 +30,7 @@ from django.conf import settings as django_settings
 from django.core.exceptions import ValidationError
 from django.db import transaction
 from django.db.utils import IntegrityError
+from django.utils.formats import date_format
 from django.utils.timezone import now
 from django.utils.translation import gettext as _, ngettext
 
@@ -39,6 +43,7 @@ from pretix.base.models import (
     OrderPosition, User, Voucher,
 )
 from pretix.base.models.orders import Transaction
+from pretix.base.secrets import assign_ticket_secret
 from pretix.base.services.invoices import generate_invoice, invoice_qualified
 from pretix.base.services.locking import lock_objects
 from pretix.base.services.tasks import ProfiledEventTask
@@ -46,11 +51,33 @@ from pretix.base.signals import order_paid, order_placed
 from pretix.celery_app import app
 
 logger = logging.getLogger(__name__)
+ORDER_IMPORT_CHUNK_SIZE = 500  # positions per transaction
 
 
-def _validate(cf: CachedFile, charset: str, cols: List[ImportColumn], settings: dict):
+class _LineDigest:
+    """
+    Running digest over the raw lines of a file, so we can recognize a file that starts with the same lines as one
+    that has been imported partially.
+    """
+
+    def __init__(self):
+        self.value = ''
+        self.lines = {}
+
+    def update(self, i, record):
+        self.value = hashlib.sha256((self.value + json.dumps(record, sort_keys=True)).encode()).hexdigest()
+        self.lines[i] = self.value
+
+    def pop_until(self, i):
+        value = self.lines[i]
+        for k in [k for k in self.lines if k <= i]:
+            del self.lines[k]
+        return value
+
+
+def _parse(cf: CachedFile, charset: str):
     try:
-        parsed = parse_csv(cf.file, charset=charset)
+        return parse_csv(cf.file, charset=charset)
     except UnicodeDecodeError as e:
         raise DataImportError(
             _(
@@ -58,9 +85,30 @@ def _validate(cf: CachedFile, charset: str, cols: List[ImportColumn], settings:
                 message=str(e)
             )
         )
-    data = []
-    for i, record in enumerate(parsed):
-        if not any(record.values()):
+
+
+def _prefix_digest(cf: CachedFile, charset: str, lines: int):
+    """
+    Returns the digest of the first ``lines`` lines of the file, or ``None`` if it is shorter.
+    """
+    digest = _LineDigest()
+    for i, record in enumerate(_parse(cf, charset)):
+        if i >= lines:
+            break
+        digest.update(i, record)
+    return digest.lines.get(lines - 1)
+
+
+def _iter_records(cf: CachedFile, charset: str, cols: List[ImportColumn], settings: dict, skip: int = 0,
+                  digest: _LineDigest = None):
+    """
+    Yields the line number and the validated values of every non-empty line of the file, starting at line ``skip``.
+    If a ``digest`` is given, it is updated with every line read.
+    """
+    for i, record in enumerate(_parse(cf, charset)):
+        if digest is not None:
+            digest.update(i, record)
+        if i < skip or not any(record.values()):
             continue
         values = {}
         for c in cols:
@@ -76,177 +124,307 @@ def _validate(cf: CachedFile, charset: str, cols: List[ImportColumn], settings:
                         value=val if val is not None else '', column=c.verbose_name, line=i + 1, message=e.message
                     )
                 )
-        data.append(values)
-    return data
+        yield i, values
 
 
-@app.task(base=ProfiledEventTask, throws=(DataImportError,))
-def import_orders(event: Event, fileid: str, settings: dict, locale: str, user, charset=None) -> None:
-    cf = CachedFile.objects.get(id=fileid)
-    user = User.objects.get(pk=user)
-    with language(locale, event.settings.region):
-        cols = get_order_import_columns(event)
-        data = _validate(cf, charset, cols, settings)
+def _validate(cf: CachedFile, charset: str, cols: List[ImportColumn], settings: dict):
+    return [values for i, values in _iter_records(cf, charset, cols, settings)]
 
-        if settings['orders'] == 'one' and len(data) > django_settings.PRETIX_MAX_ORDER_SIZE:
-            raise DataImportError(
-                _('Orders cannot have more than %(max)s positions.') % {'max': django_settings.PRETIX_MAX_ORDER_SIZE}
-            )
 
-        used_groupers = set()
-        current_grouper = []
-        current_order_level_data = {}
-        orders = []
-        order = None
+def _iter_orders(event: Event, cols: List[ImportColumn], records, settings: dict):
+    """
+    Builds unsaved orders from the validated records and yields every order as soon as all its lines have been read.
+    The number of the last line of every order is stored as ``order._last_line``.
+    """
+    used_groupers = set()
+    current_grouper = []
+    current_order_level_data = {}
+    order = None
 
-        # Prepare model objects. Yes, this might consume lots of RAM, but allows us to make the actual SQL transaction
-        # shorter. We'll see what works better in reality…
-        lock_seats = []
-        for i, record in enumerate(data):
-            try:
-                create_new_order = (
-                    order is None or
-                    settings['orders'] == 'many' or
-                    (settings['orders'] == 'mixed' and record["grouping"] != current_grouper)
+    for i, record in records:
+        create_new_order = (
+            order is None or
+            settings['orders'] == 'many' or
+            (settings['orders'] == 'mixed' and record["grouping"] != current_grouper)
+        )
+        if create_new_order and order is not None:
+            yield order
+
+        try:
+            if create_new_order:
+                if settings['orders'] == 'mixed':
+                    if record["grouping"] in used_groupers:
+                        raise DataImportError(
+                            _('The grouping "%(value)s" occurs on non-consecutive lines (seen again on line %(row)s).') % {
+                                "value": record["grouping"],
+                                "row": i + 1,
+                            }
+                        )
+                    current_grouper = record["grouping"]
+                    used_groupers.add(current_grouper)
+
+                current_order_level_data = {
+                    c.identifier: record.get(c.identifier)
+                    for c in cols if getattr(c, "order_level", False)
+                }
+                order = Order(
+                    event=event,
+                    testmode=settings['testmode'],
                 )
+                order.meta_info = {}
+                order._positions = []
+                order._address = InvoiceAddress()
+                order._address.name_parts = {'_scheme': event.settings.name_scheme}
 
-                if create_new_order:
-                    if settings['orders'] == 'mixed':
-                        if record["grouping"] in used_groupers:
-                            raise DataImportError(
-                                _('The grouping "%(value)s" occurs on non-consecutive lines (seen again on line %(row)s).') % {
-                                    "value": record["grouping"],
-                                    "row": i + 1,
-                                }
-                            )
-                        current_grouper = record["grouping"]
-                        used_groupers.add(current_grouper)
-
-                    current_order_level_data = {
-                        c.identifier: record.get(c.identifier)
-                        for c in cols if getattr(c, "order_level", False)
-                    }
-                    order = Order(
-                        event=event,
-                        testmode=settings['testmode'],
-                    )
-                    order.meta_info = {}
-                    order._positions = []
-                    order._address = InvoiceAddress()
-                    order._address.name_parts = {'_scheme': event.settings.name_scheme}
-                    orders.append(order)
+            if len(order._positions) >= django_settings.PRETIX_MAX_ORDER_SIZE:
+                raise DataImportError(
+                    _('Orders cannot have more than %(max)s positions.') % {
+                        'max': django_settings.PRETIX_MAX_ORDER_SIZE}
+                )
+
+            position = OrderPosition(positionid=len(order._positions) + 1)
+            position.attendee_name_parts = {'_scheme': event.settings.name_scheme}
+            position.meta_info = {}
+            order._positions.append(position)
 
-                if settings['orders'] == 'mixed' and len(order._positions) >= django_settings.PRETIX_MAX_ORDER_SIZE:
+            for c in cols:
+                value = record.get(c.identifier)
+                if getattr(c, "order_level", False) and value != current_order_level_data.get(c.identifier):
                     raise DataImportError(
-                        _('Orders cannot have more than %(max)s positions.') % {
-                            'max': django_settings.PRETIX_MAX_ORDER_SIZE}
+                        _('Inconsistent data in row {row}: Column {col} contains value "{val_line}", but '
+                          'for this order, the value has already been set to "{val_order}".').format(
+                            row=i + 1,
+                            col=c.verbose_name,
+                            val_line=value,
+                            val_order=current_order_level_data.get(c.identifier) or "",
+                        )
                     )
+                c.assign(value, order, position, order._address)
+            order._last_line = i
+        except (ValidationError, ImportError) as e:
+            raise DataImportError(
+                _('Invalid data in row {row}: {message}').format(row=i + 1, message=str(e))
+            )
 
-                position = OrderPosition(positionid=len(order._positions) + 1)
-                position.attendee_name_parts = {'_scheme': event.settings.name_scheme}
-                position.meta_info = {}
-                order._positions.append(position)
-                position.assign_pseudonymization_id()
+    if order is not None:
+        yield order
 
-                for c in cols:
-                    value = record.get(c.identifier)
-                    if getattr(c, "order_level", False) and value != current_order_level_data.get(c.identifier):
-                        raise DataImportError(
-                            _('Inconsistent data in row {row}: Column {col} contains value "{val_line}", but '
-                              'for this order, the value has already been set to "{val_order}".').format(
-                                row=i + 1,
-                                col=c.verbose_name,
-                                val_line=value,
-                                val_order=current_order_level_data.get(c.identifier) or "",
-                            )
-                        )
-                    c.assign(value, order, position, order._address)
 
-                if position.seat is not None:
-                    lock_seats.append((order.sales_channel, position.seat))
-            except (ValidationError, ImportError) as e:
+def _iter_chunks(orders):
+    chunk = []
+    size = 0
+    for o in orders:
+        chunk.append(o)
+        size += len(o._positions)
+        if size >= ORDER_IMPORT_CHUNK_SIZE:
+            yield chunk
+            chunk = []
+            size = 0
+    if chunk:
+        yield chunk
+
+
+def _assign_unique(objs, attr, generate, existing):
+    """
+    Sets ``attr`` to a new value from ``generate(obj)`` for all objects that do not have a value yet, and repeats this
+    for all objects whose value is returned by ``existing(values)`` or occurs twice. This needs one query per round
+    instead of one per object.
+    """
+    pending = [o for o in objs if not getattr(o, attr)]
+    while pending:
+        for o in pending:
+            setattr(o, attr, generate(o))
+        taken = set(existing([getattr(o, attr) for o in pending]))
+        seen = set()
+        retry = []
+        for o in pending:
+            value = getattr(o, attr)
+            if value in taken or value in seen:
+                retry.append(o)
+            seen.add(value)
+        pending = retry
+
+
+def _save_orders(event: Event, orders: List[Order], cols: List[ImportColumn], settings: dict, user):
+    positions = [p for o in orders for p in o._positions]
+
+    for o in orders:
+        o.total = sum([c.price for c in o._positions])  # currently no support for fees
+        if o.total == Decimal('0.00') or settings['status'] == 'paid':
+            o.status = Order.STATUS_PAID
+        else:
+            o.status = Order.STATUS_PENDING
+        if not o.datetime:
+            o.datetime = now()
+        o.organizer_id = event.organizer_id
+        if not o.expires:
+            o.set_expires()
+        o._address.order = o
+        o._address.name_cached = o._address.name
+        for p in o._positions:
+            p.order = o
+            p.organizer_id = event.organizer_id
+            p.attendee_name_cached = p.attendee_name
+            if p.tax_rate is None:
+                p._calculate_tax()
+
+    # Codes and secrets need to be unique, but checking them one by one would take one query per order or position
+    _assign_unique(
+        orders, 'code',
+        lambda o: Order.random_code(testmode=o.testmode),
+        lambda codes: Order.objects.filter(event__organizer=event.organizer, code__in=codes).values_list('code', flat=True)
+    )
+    _assign_unique(
+        positions, 'pseudonymization_id',
+        lambda p: OrderPosition.random_pseudonymization_id(),
+        lambda ids: OrderPosition.all.filter(pseudonymization_id__in=ids).values_list('pseudonymization_id', flat=True)
+    )
+
+    def _generate_secret(p):
+        assign_ticket_secret(event=event, position=p, force_invalidate=True, save=False)
+        return p.secret
+
+    _assign_unique(
+        positions, 'secret',
+        _generate_secret,
+        lambda secrets: OrderPosition.all.filter(
+            secret__in=secrets, order__event__organizer_id=event.organizer_id
+        ).values_list('secret', flat=True)
+    )
+
+    with transaction.atomic():
+        # We don't support vouchers, quotas, or memberships here, so we only need to lock if seats are in use
+        lock_seats = [(o.sales_channel, p.seat) for o in orders for p in o._positions if p.seat is not None]
+        if lock_seats:
+            lock_objects([s for c, s in lock_seats], shared_lock_objects=[event])
+            for c, s in lock_seats:
+                if not s.is_available(sales_channel=c):
+                    raise DataImportError(_('The seat you selected has already been taken. Please select a different seat.'))
+
+        Order.objects.bulk_create(orders)
+        OrderPosition.objects.bulk_create(positions)
+        InvoiceAddress.objects.bulk_create([o._address for o in orders])
+        OrderPayment.objects.bulk_create([
+            OrderPayment(
+                local_id=1,
+                order=o,
+                amount=o.total,
+                provider='free' if o.total == Decimal('0.00') else 'manual',
+                info='{}',
+                payment_date=now(),
+                state=OrderPayment.PAYMENT_STATE_CONFIRMED
+            )
+            for o in orders if o.status == Order.STATUS_PAID
+        ])
+        for c in cols:
+            c.save_many(orders)
+
+        save_transactions = []
+        save_logentries = []
+        for o in orders:
+            save_logentries.append(o.log_action(
+                'pretix.event.order.placed',
+                user=user,
+                data={'source': 'import'},
+                save=False,
+            ))
+            save_transactions += o.create_transactions(is_new=True, fees=[], positions=o._positions, save=False)
+        Transaction.objects.bulk_create(save_transactions)
+        LogEntry.bulk_create_and_postprocess(save_logentries)
+
+
+def _order_placed(event: Event, orders: List[Order]):
+    for o in orders:
+        with language(o.locale, event.settings.region):
+            order_placed.send(event, order=o, bulk=True)
+            if o.status == Order.STATUS_PAID:
+                order_paid.send(event, order=o)
+
+            gen_invoice = invoice_qualified(o) and (
+                (event.settings.get('invoice_generate') == 'True') or
+                (event.settings.get('invoice_generate') == 'paid' and o.status == Order.STATUS_PAID)
+            ) and not o.invoices.last()
+            if gen_invoice:
+                try:
+                    generate_invoice(o, trigger_pdf=True)
+                except Exception as e:
+                    logger.exception("Could not generate invoice.")
+                    o.log_action("pretix.event.order.invoice.failed", data={
+                        "exception": str(e)
+                    })
+
+
+def _resume_order_import(event: Event, cf: CachedFile, charset: str):
+    """
+    Returns the number of lines of the file that have already been imported by an import that stopped half-way, or
+    raises an error if a previous import stopped half-way, but the file does not start with the same lines.
+    """
+    progress = event.settings.get('order_import_progress', as_type=dict)
+    if not progress:
+        return 0
+    if _prefix_digest(cf, charset, progress['lines']) != progress['digest']:
+        raise DataImportError(
+            _('The import of the file "{filename}" on {date} stopped after the first {lines} lines, which have been '
+              'imported. To prevent duplicate orders, you can only import a file that starts with the same {lines} '
+              'lines. The import will then continue after them.').format(
+                filename=progress['filename'],
+                date=date_format(
+                    datetime.fromisoformat(progress['date']).astimezone(event.timezone), 'SHORT_DATETIME_FORMAT'
+                ),
+                lines=progress['lines'],
+            )
+        )
+    return progress['lines']
+
+
+@app.task(base=ProfiledEventTask, throws=(DataImportError,))
+def import_orders(event: Event, fileid: str, settings: dict, locale: str, user, charset=None) -> None:
+    cf = CachedFile.objects.get(id=fileid)
+    user = User.objects.get(pk=user)
+
+    with language(locale, event.settings.region):
+        # Orders are committed in chunks, together with the number of lines imported so far. If the import fails
+        # half-way, e.g. because a seat has been sold in the meantime, importing a file that starts with the same
+        # lines continues after the last chunk that has been committed.
+        skip = _resume_order_import(event, cf, charset)
+
+        # We validate the whole file before writing anything, but only keep one chunk of orders in memory at a time.
+        # Columns remember values they have seen before, e.g. to detect duplicate seats, so we need a fresh set of
+        # columns for the second run.
+        cols = get_order_import_columns(event)
+        for order in _iter_orders(event, cols, _iter_records(cf, charset, cols, settings, skip=skip), settings):
+            pass
+
+        cols = get_order_import_columns(event)
+        digest = _LineDigest()
+        orders = _iter_orders(
+            event, cols, _iter_records(cf, charset, cols, settings, skip=skip, digest=digest), settings
+        )
+        imported = skip
+        for chunk in _iter_chunks(orders):
+            progress = {
+                'lines': chunk[-1]._last_line + 1,
+                'digest': digest.pop_until(chunk[-1]._last_line),
+                'filename': cf.filename,
+                'date': now().isoformat(),
+            }
+            try:
+                with transaction.atomic():
+                    _save_orders(event, chunk, cols, settings, user)
+                    event.settings.set('order_import_progress', progress)
+            except DataImportError as e:
+                if not imported:
+                    raise
                 raise DataImportError(
-                    _('Invalid data in row {row}: {message}').format(row=i + 1, message=str(e))
+                    _('{message} The first {lines} lines of your file have already been imported. If you import a '
+                      'file that starts with the same lines, the import will continue after them.').format(
+                        message=str(e), lines=imported,
+                    )
                 )
+            imported = progress['lines']
+            _order_placed(event, chunk)
 
-        try:
-            with transaction.atomic():
-                # We don't support vouchers, quotas, or memberships here, so we only need to lock if seats are in use
-                if lock_seats:
-                    lock_objects([s for c, s in lock_seats], shared_lock_objects=[event])
-                    for c, s in lock_seats:
-                        if not s.is_available(sales_channel=c):
-                            raise DataImportError(_('The seat you selected has already been taken. Please select a different seat.'))
-
-                save_transactions = []
-                save_logentries = []
-                for o in orders:
-                    o.total = sum([c.price for c in o._positions])  # currently no support for fees
-                    if o.total == Decimal('0.00'):
-                        o.status = Order.STATUS_PAID
-                        o.save()
-                        OrderPayment.objects.create(
-                            local_id=1,
-                            order=o,
-                            amount=Decimal('0.00'),
-                            provider='free',
-                            info='{}',
-                            payment_date=now(),
-                            state=OrderPayment.PAYMENT_STATE_CONFIRMED
-                        )
-                    elif settings['status'] == 'paid':
-                        o.status = Order.STATUS_PAID
-                        o.save()
-                        OrderPayment.objects.create(
-                            local_id=1,
-                            order=o,
-                            amount=o.total,
-                            provider='manual',
-                            info='{}',
-                            payment_date=now(),
-                            state=OrderPayment.PAYMENT_STATE_CONFIRMED
-                        )
-                    else:
-                        o.status = Order.STATUS_PENDING
-                        o.save()
-                    for p in o._positions:
-                        p.order = o
-                        p.save()
-                    o._address.order = o
-                    o._address.save()
-                    for c in cols:
-                        c.save(o)
-                    save_logentries.append(o.log_action(
-                        'pretix.event.order.placed',
-                        user=user,
-                        data={'source': 'import'},
-                        save=False,
-                    ))
-                    save_transactions += o.create_transactions(is_new=True, fees=[], positions=o._positions, save=False)
-                Transaction.objects.bulk_create(save_transactions)
-                LogEntry.bulk_create_and_postprocess(save_logentries)
-
-            for o in orders:
-                with language(o.locale, event.settings.region):
-                    order_placed.send(event, order=o, bulk=True)
-                    if o.status == Order.STATUS_PAID:
-                        order_paid.send(event, order=o)
-
-                    gen_invoice = invoice_qualified(o) and (
-                        (event.settings.get('invoice_generate') == 'True') or
-                        (event.settings.get('invoice_generate') == 'paid' and o.status == Order.STATUS_PAID)
-                    ) and not o.invoices.last()
-                    if gen_invoice:
-                        try:
-                            generate_invoice(o, trigger_pdf=True)
-                        except Exception as e:
-                            logger.exception("Could not generate invoice.")
-                            o.log_action("pretix.event.order.invoice.failed", data={
-                                "exception": str(e)
-                            })
-        except DataImportError:
-            raise ValidationError(_('We were not able to process your request completely as the server was too busy. '
-                                    'Please try again.'))
+    event.settings.delete('order_import_progress')
     cf.delete()
 
 
@@ -46,12 +46,11 @@ from typing import List, Optional
 
 from celery.exceptions import MaxRetriesExceededError
 from django.conf import settings
-from django.core.cache import cache
 from django.core.exceptions import ValidationError
-from django.db import transaction
+from django.db import connections, transaction
 from django.db.models import (
-    Count, Exists, F, IntegerField, Max, Min, OuterRef, Q, QuerySet, Sum,
-    Value,
+    Count, Exists, F, IntegerField, Max, Min, OuterRef, Q, QuerySet, Subquery,
+    Sum, Value,
 )
 from django.db.models.functions import Coalesce, Greatest
 from django.db.transaction import get_connection
@@ -59,7 +58,7 @@ from django.dispatch import receiver
 from django.utils.functional import cached_property
 from django.utils.timezone import make_aware, now
 from django.utils.translation import gettext as _, gettext_lazy, ngettext_lazy
-from django_scopes import scopes_disabled
+from django_scopes import scope, scopes_disabled
 
 from pretix.api.models import OAuthApplication
 from pretix.base.decimal import round_decimal
@@ -67,9 +66,10 @@ from pretix.base.email import get_email_context
 from pretix.base.i18n import get_language_without_region, language
 from pretix.base.media import MEDIA_TYPES
 from pretix.base.models import (
-    CartPosition, Device, Event, GiftCard, Item, ItemVariation, LogEntry,
-    Membership, Order, OrderPayment, OrderPosition, Quota, Seat,
-    SeatCategoryMapping, User, Voucher,
+    CartPosition, Device, Event, GiftCard, Invoice, Item, ItemVariation,
+    LogEntry, Membership, Order, OrderPayment, OrderPosition,
+    OrderSideEffectQueue, Quota, Seat, SeatCategoryMapping, Transaction, User,
+    Voucher,
 )
 from pretix.base.models.event import SubEvent
 from pretix.base.models.orders import (
@@ -82,6 +82,7 @@ from pretix.base.payment import GiftCardPayment, PaymentException
 from pretix.base.reldate import RelativeDateWrapper
 from pretix.base.secrets import assign_ticket_secret
 from pretix.base.services import cart, tickets
+from pretix.base.services.catalogue import EventCatalogue
 from pretix.base.services.invoices import (
     generate_cancellation, generate_invoice, invoice_qualified,
     invoice_transmission_separately, order_invoice_transmission_separately,
@@ -208,6 +209,14 @@ error_messages = {
 
 logger = logging.getLogger(__name__)
 
+# A job of follow-up work after placing an order is picked up by the periodic task if it has not been dispatched
+# directly for this long, e.g. because the worker died right after committing the order.
+SIDE_EFFECT_PICKUP_DELAY = timedelta(minutes=10)
+SIDE_EFFECT_IN_FLIGHT_TIMEOUT = timedelta(minutes=20)
+SIDE_EFFECT_RETRY_DELAY = timedelta(minutes=1)
+SIDE_EFFECT_MAX_ATTEMPTS = 5
+EXPIRE_CHUNK_SIZE = 500
+
 
 def mark_order_paid(*args, **kwargs):
     raise NotImplementedError("This method is no longer supported since pretix 1.17.")
@@ -746,8 +755,9 @@ def _check_positions(event: Event, now_dt: datetime, time_machine_now_dt: dateti
 
     sorted_positions = list(sorted(positions, key=lambda c: (-int(c.is_bundled), c.pk)))
 
+    catalogue = EventCatalogue(event)
     for cp in sorted_positions:
-        cp._cached_quotas = list(cp.quotas)
+        cp._cached_quotas = catalogue.quotas(cp.item, cp.variation, cp.subevent)
 
     for cp in sorted_positions:
         try:
@@ -1277,6 +1287,20 @@ def _perform_order(event: Event, payment_requests: List[dict], position_ids: Lis
                         p.confirm(send_mail=False, lock=False, generate_invoice=False)
             except Quota.QuotaExceededException:
                 pass
+
+            side_effects = OrderSideEffectQueue.objects.create(
+                order=order,
+                event=event,
+                steps=list(ORDER_PLACED_SIDE_EFFECTS),
+                params={
+                    'payments': [p.pk for p in payment_objs],
+                    'requires_invoice_immediately': any(
+                        p['pprov'].requires_invoice_immediately for p in payment_requests
+                    ),
+                },
+                # The job is dispatched directly below, the periodic task only picks it up if that did not happen
+                not_before=real_now_dt + SIDE_EFFECT_PICKUP_DELAY,
+            )
     if err_out:
         raise err_out
 
@@ -1299,121 +1323,271 @@ def _perform_order(event: Event, payment_requests: List[dict], position_ids: Lis
             else:
                 order.refresh_from_db()
 
-    pending_sum = order.pending_sum
-    free_order_flow = (
-        payment_objs and
-        (
-            any(p['provider'] == 'free' for p in payment_requests) or
-            all(p['provider'] == 'giftcard' for p in payment_requests)
-        ) and
-        pending_sum == Decimal('0.00') and
-        not order.require_approval
-    )
+    if any_payment_failed:
+        # Cancel all other payments because their amount might be wrong now.
+        for p in payment_objs:
+            if p.state == OrderPayment.PAYMENT_STATE_CREATED:
+                p.state = OrderPayment.PAYMENT_STATE_CANCELED
+                p.save(update_fields=['state'])
 
-    transmit_invoice_task = order_invoice_transmission_separately(order)
-    transmit_invoice_mail = not transmit_invoice_task and order.event.settings.invoice_email_attachment and order.email
+    if not any_payment_failed and any(_needs_payment_execution(p) for p in payment_objs):
+        # Payments that do not need user interaction can fail with a message that is shown to the customer. They run
+        # after the emails, so the remaining steps are processed right here.
+        job = _claim_order_side_effects(side_effects.pk)
+        if job:
+            warnings += run_order_side_effects(job)
+    else:
+        # Everything else does not influence the response to the customer and is processed in the background
+        process_order_side_effects.apply_async(args=(side_effects.pk,))
 
-    invoice = order.invoices.last()  # Might be generated by plugin already
-    if not invoice and invoice_qualified(order):
-        invoice_required = (
-            event.settings.get('invoice_generate') == 'True' or (
-                event.settings.get('invoice_generate') == 'paid' and (
-                    any(p['pprov'].requires_invoice_immediately for p in payment_requests) or
-                    pending_sum <= Decimal('0.00')
-                )
+    return {
+        'order_id': order.id,
+        'warnings': warnings,
+    }
+
+
+def _side_effect_invoice(order: Order, payments: List[OrderPayment], job: OrderSideEffectQueue):
+    event = order.event
+    if order.invoices.exists() or not invoice_qualified(order):
+        return  # Might be generated by plugin already
+    invoice_required = (
+        event.settings.get('invoice_generate') == 'True' or (
+            event.settings.get('invoice_generate') == 'paid' and (
+                job.params.get('requires_invoice_immediately') or order.pending_sum <= Decimal('0.00')
             )
         )
-        if invoice_required:
-            try:
-                invoice = generate_invoice(
-                    order,
-                    # send_mail will trigger PDF generation later
-                    trigger_pdf=not transmit_invoice_mail
-                )
-                if transmit_invoice_task:
-                    transmit_invoice.apply_async(args=(event.pk, invoice.pk, False))
-            except Exception as e:
-                logger.exception("Could not generate invoice.")
-                order.log_action("pretix.event.order.invoice.failed", data={
-                    "exception": str(e)
-                })
+    )
+    if invoice_required:
+        transmit_invoice_task = order_invoice_transmission_separately(order)
+        transmit_invoice_mail = not transmit_invoice_task and event.settings.invoice_email_attachment and order.email
+        invoice = generate_invoice(
+            order,
+            # send_mail will trigger PDF generation later
+            trigger_pdf=not transmit_invoice_mail
+        )
+        if transmit_invoice_task:
+            transmit_invoice.apply_async(args=(event.pk, invoice.pk, False))
 
-    if order.email:
-        if order.require_approval:
-            email_template = event.settings.mail_text_order_placed_require_approval
-            subject_template = event.settings.mail_subject_order_placed_require_approval
-            log_entry = 'pretix.event.order.email.order_placed_require_approval'
-
-            email_attendees = False
-        elif free_order_flow:
-            email_template = event.settings.mail_text_order_free
-            subject_template = event.settings.mail_subject_order_free
-            log_entry = 'pretix.event.order.email.order_free'
-
-            email_attendees = event.settings.mail_send_order_free_attendee
-            email_attendees_template = event.settings.mail_text_order_free_attendee
-            subject_attendees_template = event.settings.mail_subject_order_free_attendee
-        else:
-            email_template = event.settings.mail_text_order_placed
-            subject_template = event.settings.mail_subject_order_placed
-            log_entry = 'pretix.event.order.email.order_placed'
 
-            email_attendees = event.settings.mail_send_order_placed_attendee
-            email_attendees_template = event.settings.mail_text_order_placed_attendee
-            subject_attendees_template = event.settings.mail_subject_order_placed_attendee
+def _order_placed_email_config(order: Order, payments: List[OrderPayment]):
+    event = order.event
+    free_order_flow = (
+        payments and
+        (
+            any(p.provider == 'free' for p in payments) or
+            all(p.provider == 'giftcard' for p in payments)
+        ) and
+        order.pending_sum == Decimal('0.00') and
+        not order.require_approval
+    )
+    if order.require_approval:
+        return free_order_flow, (
+            event.settings.mail_text_order_placed_require_approval,
+            event.settings.mail_subject_order_placed_require_approval,
+            'pretix.event.order.email.order_placed_require_approval',
+        ), None
+    elif free_order_flow:
+        return free_order_flow, (
+            event.settings.mail_text_order_free,
+            event.settings.mail_subject_order_free,
+            'pretix.event.order.email.order_free',
+        ), (
+            event.settings.mail_text_order_free_attendee,
+            event.settings.mail_subject_order_free_attendee,
+            'pretix.event.order.email.order_free',
+        ) if event.settings.mail_send_order_free_attendee else None
+    else:
+        return free_order_flow, (
+            event.settings.mail_text_order_placed,
+            event.settings.mail_subject_order_placed,
+            'pretix.event.order.email.order_placed',
+        ), (
+            event.settings.mail_text_order_placed_attendee,
+            event.settings.mail_subject_order_placed_attendee,
+            'pretix.event.order.email.order_placed',
+        ) if event.settings.mail_send_order_placed_attendee else None
+
+
+def _side_effect_email(order: Order, payments: List[OrderPayment], job: OrderSideEffectQueue):
+    event = order.event
+    if not order.email or order.sales_channel.identifier not in event.settings.mail_sales_channel_placed_paid:
+        return
+    free_order_flow, (email_template, subject_template, log_entry), __ = _order_placed_email_config(order, payments)
+    transmit_invoice_mail = (
+        not order_invoice_transmission_separately(order) and event.settings.invoice_email_attachment
+    )
+    _order_placed_email(
+        event,
+        order,
+        email_template,
+        subject_template,
+        log_entry,
+        order.invoices.last() if transmit_invoice_mail else None,
+        payments,
+        is_free=free_order_flow
+    )
 
-        if sales_channel.identifier in event.settings.mail_sales_channel_placed_paid:
-            _order_placed_email(
-                event,
-                order,
-                email_template,
-                subject_template,
-                log_entry,
-                invoice if transmit_invoice_mail else None,
-                payment_objs,
-                is_free=free_order_flow
-            )
-            if email_attendees:
-                for p in order.positions.all():
-                    if p.addon_to_id is None and p.attendee_email and p.attendee_email != order.email:
-                        _order_placed_email_attendee(event, order, p, email_attendees_template, subject_attendees_template, log_entry,
-                                                     is_free=free_order_flow)
 
-    if not any_payment_failed:
-        for p in payment_objs:
-            if not p.payment_provider.execute_payment_needs_user and not p.process_initiated:
+def _side_effect_email_attendees(order: Order, payments: List[OrderPayment], job: OrderSideEffectQueue):
+    event = order.event
+    if not order.email or order.sales_channel.identifier not in event.settings.mail_sales_channel_placed_paid:
+        return
+    free_order_flow, __, attendee_config = _order_placed_email_config(order, payments)
+    if attendee_config:
+        email_template, subject_template, log_entry = attendee_config
+        error = None
+        for p in order.positions.all():
+            if p.addon_to_id is None and p.attendee_email and p.attendee_email != order.email:
+                # Every attendee is marked as done before the email is sent, just like the step as a whole, such that
+                # a retry after a failure or crash only contacts the attendees that have not received their email
+                sent = job.params.get('attendees_sent', [])
+                if p.pk in sent:
+                    continue
+                job.params['attendees_sent'] = sent + [p.pk]
+                job.save(update_fields=['params'])
                 try:
-                    p.process_initiated = True
-                    p.save(update_fields=['process_initiated'])
-                    resp = p.payment_provider.execute_payment(None, p)
-                    if isinstance(resp, str):
-                        logger.warning('Payment provider returned URL from execute_payment even though execute_payment_needs_user is not set')
-                except PaymentException as e:
-                    warnings.append(str(e))
-                    any_payment_failed = True
-                except Exception:
-                    logger.exception('Error during payment attempt')
+                    _order_placed_email_attendee(event, order, p, email_template, subject_template, log_entry,
+                                                 is_free=free_order_flow)
+                except Exception as e:
+                    logger.exception('Could not send email to attendee %s of order %s', p.positionid, order.code)
+                    job.params['attendees_sent'].remove(p.pk)
+                    job.save(update_fields=['params'])
+                    error = e
+        if error:
+            raise error
+
+
+def _needs_payment_execution(p: OrderPayment):
+    return (
+        p.state == OrderPayment.PAYMENT_STATE_CREATED and not p.payment_provider.execute_payment_needs_user
+        and not p.process_initiated
+    )
+
+
+def _side_effect_payment(order: Order, payments: List[OrderPayment], job: OrderSideEffectQueue):
+    warnings = []
+    any_payment_failed = False
+    for p in payments:
+        if _needs_payment_execution(p):
+            try:
+                p.process_initiated = True
+                p.save(update_fields=['process_initiated'])
+                resp = p.payment_provider.execute_payment(None, p)
+                if isinstance(resp, str):
+                    logger.warning('Payment provider returned URL from execute_payment even though execute_payment_needs_user is not set')
+            except PaymentException as e:
+                warnings.append(str(e))
+                any_payment_failed = True
+            except Exception:
+                logger.exception('Error during payment attempt')
 
     if any_payment_failed:
         # Cancel all other payments because their amount might be wrong now.
-        for p in payment_objs:
+        for p in payments:
+            p.refresh_from_db()
             if p.state == OrderPayment.PAYMENT_STATE_CREATED:
                 p.state = OrderPayment.PAYMENT_STATE_CANCELED
                 p.save(update_fields=['state'])
+    return warnings
 
-    return {
-        'order_id': order.id,
-        'warnings': warnings,
-    }
 
+# Steps of the follow-up work after an order has been placed, in the order they are executed
+ORDER_PLACED_SIDE_EFFECTS = {
+    'invoice': _side_effect_invoice,
+    'email': _side_effect_email,
+    'email_attendees': _side_effect_email_attendees,
+    'payment': _side_effect_payment,
+}
+
+# Steps that are marked as done before they run, such that a worker dying after an email has been queued does not
+# lead to a second email. They are still retried if they fail with an exception.
+AT_MOST_ONCE_SIDE_EFFECTS = {'email', 'email_attendees'}
 
-@receiver(signal=periodic_task)
+
+def run_order_side_effects(job: OrderSideEffectQueue):
+    """
+    Runs the remaining steps of a job. Every completed step is removed from the job right away. If a step fails, the
+    job is retried later with an exponential backoff, starting with the failed step. After
+    ``SIDE_EFFECT_MAX_ATTEMPTS`` failed attempts, the step is skipped.
+
+    Returns the warnings of failed payments that should be shown to the customer.
+    """
+    warnings = []
+    order = job.order
+    with scope(organizer=job.event.organizer), language(order.locale, job.event.settings.region):
+        while job.steps:
+            step = job.steps[0]
+            if step in AT_MOST_ONCE_SIDE_EFFECTS:
+                job.steps = job.steps[1:]
+                job.save(update_fields=['steps'])
+            payments = list(OrderPayment.objects.filter(pk__in=job.params.get('payments', [])).order_by('pk'))
+            order.refresh_from_db()
+            try:
+                warnings += ORDER_PLACED_SIDE_EFFECTS[step](order, payments, job) or []
+            except Exception as e:
+                logger.exception('Follow-up step %s of order %s failed', step, order.code)
+                job.failed_attempts += 1
+                if job.failed_attempts < SIDE_EFFECT_MAX_ATTEMPTS:
+                    order.log_action('pretix.event.order.side_effects.retry', data={
+                        'step': step,
+                        'exception': str(e),
+                    })
+                    if step in AT_MOST_ONCE_SIDE_EFFECTS:
+                        job.steps = [step] + job.steps
+                    delay = SIDE_EFFECT_RETRY_DELAY * 2 ** (job.failed_attempts - 1)
+                    job.not_before = now() + delay
+                    job.in_flight_since = None
+                    job.save(update_fields=['steps', 'failed_attempts', 'not_before', 'in_flight_since'])
+                    process_order_side_effects.apply_async(args=(job.pk,), countdown=delay.total_seconds())
+                    return warnings
+                order.log_action('pretix.event.order.side_effects.failed', data={
+                    'step': step,
+                    'exception': str(e),
+                })
+                if step == 'invoice':
+                    order.log_action('pretix.event.order.invoice.failed', data={
+                        'exception': str(e)
+                    })
+                job.failed_attempts = 0
+            if step not in AT_MOST_ONCE_SIDE_EFFECTS:
+                job.steps = job.steps[1:]
+            job.save(update_fields=['steps', 'failed_attempts'])
+    job.delete()
+    return warnings
+
+
+def _claim_order_side_effects(job_id: int):
+    claimed = OrderSideEffectQueue.objects.filter(pk=job_id, in_flight_since__isnull=True).update(in_flight_since=now())
+    if not claimed:
+        return None  # Already processed or being processed by another worker
+    return OrderSideEffectQueue.objects.select_related('order', 'event', 'event__organizer').get(pk=job_id)
+
+
+@app.task(base=ProfiledTask)
 @scopes_disabled()
-def expire_orders(sender, **kwargs):
-    event_id = None
-    expire = None
+def process_order_side_effects(job_id: int):
+    job = _claim_order_side_effects(job_id)
+    if job:
+        for w in run_order_side_effects(job):
+            # Nobody is waiting for the result anymore
+            logger.info('Payment of order %s failed in the background: %s', job.order.code, w)
 
-    qs = Order.objects.filter(
+
+@receiver(signal=periodic_task)
+@scopes_disabled()
+def pick_up_order_side_effects(sender, **kwargs):
+    OrderSideEffectQueue.objects.filter(
+        in_flight_since__lt=now() - SIDE_EFFECT_IN_FLIGHT_TIMEOUT,
+    ).update(in_flight_since=None)
+    for job_id in OrderSideEffectQueue.objects.filter(
+        in_flight_since__isnull=True,
+        not_before__lt=now(),
+    ).values_list('pk', flat=True)[:1000]:
+        process_order_side_effects.apply_async(args=(job_id,))
+
+
+def _expirable_orders(qs):
+    return qs.filter(
         expires__lt=now(),
         status=Order.STATUS_PENDING,
         valid_if_pending=False,
@@ -1422,72 +1596,153 @@ def expire_orders(sender, **kwargs):
         Exists(
             OrderFee.objects.filter(order_id=OuterRef('pk'), fee_type=OrderFee.FEE_TYPE_CANCELLATION)
         )
-    ).prefetch_related('event').order_by('event_id')
-    for o in qs:
-        if o.event_id != event_id:
-            expire = o.event.settings.get('payment_term_expire_automatically', as_type=bool)
-            event_id = o.event_id
-        if expire and now() >= o.payment_term_expire_date:
-            mark_order_expired(o)
+    )
+
+
+def _expire_order_chunk(event, order_ids):
+    with transaction.atomic():
+        # Orders that are currently being paid or changed are skipped and picked up by the next run
+        orders = list(_expirable_orders(event.orders.filter(pk__in=order_ids)).select_for_update(
+            of=OF_SELF, skip_locked=connections['default'].features.has_select_for_update_skip_locked
+        ).only('pk', 'event_id', 'code', 'status', 'require_approval'))
+        if not orders:
+            return []
+
+        Order.objects.filter(pk__in=[o.pk for o in orders]).update(
+            status=Order.STATUS_EXPIRED, last_modified=now()
+        )
+        log_entries = []
+        for o in orders:
+            o.event = event
+            o.status = Order.STATUS_EXPIRED
+            log_entries.append(o.log_action('pretix.event.order.expired', save=False))
+        LogEntry.bulk_create_and_postprocess(log_entries)
+
+        last_invoices = {}
+        for i in Invoice.objects.filter(order__in=orders, is_cancellation=False).annotate(
+            has_cancellation=Exists(Invoice.objects.filter(refers_id=OuterRef('pk')))
+        ).order_by('pk'):
+            last_invoices[i.order_id] = i
+        for i in last_invoices.values():
+            if not i.has_cancellation:
+                generate_cancellation(i)
+
+        current_transactions = defaultdict(list)
+        for t in Transaction.objects.filter(order__in=orders):
+            current_transactions[t.order_id].append(t)
+        Transaction.objects.bulk_create([
+            t
+            for o in orders
+            for t in o.create_transactions(current_transactions=current_transactions[o.pk], save=False)
+        ])
+    return orders
+
+
+@app.task(base=ProfiledEventTask)
+def expire_event_orders(event: Event):
+    if not event.settings.get('payment_term_expire_automatically', as_type=bool):
+        return
+
+    qs = _expirable_orders(event.orders.all()).order_by('pk')
+    if event.settings.get('payment_term_expire_delay_days', as_type=int):
+        # payment_term_expire_date depends on the date of the event or subevents, we can only check this
+        # in python
+        order_ids = []
+        for o in qs.only('pk', 'event_id', 'expires'):
+            o.event = event
+            if now() >= o.payment_term_expire_date:
+                order_ids.append(o.pk)
+    else:
+        # payment_term_expire_date equals expires
+        order_ids = list(qs.values_list('pk', flat=True))
+
+    for i in range(0, len(order_ids), EXPIRE_CHUNK_SIZE):
+        for o in _expire_order_chunk(event, order_ids[i:i + EXPIRE_CHUNK_SIZE]):
+            order_expired.send(event, order=o)
 
 
 @receiver(signal=periodic_task)
 @scopes_disabled()
-@minimum_interval(minutes_after_success=60)
-def send_expiry_warnings(sender, **kwargs):
+def expire_orders(sender, **kwargs):
+    event_ids = _expirable_orders(Order.objects.all()).order_by().values_list('event_id', flat=True).distinct()
+    for event_id in event_ids:
+        expire_event_orders.apply_async(args=(event_id,))
+
+
+@app.task(base=ProfiledEventTask)
+def send_event_expiry_warnings(event: Event):
+    settings = event.settings
+    days = settings.get('mail_days_order_expire_warning', as_type=int)
+    if not days:
+        return
     today = now().replace(hour=0, minute=0, second=0)
-    days = None
-    settings = None
-    event_id = None
 
-    for o in Order.objects.filter(
-            expires__gte=today, expiry_reminder_sent=False, status=Order.STATUS_PENDING,
-            datetime__lte=now() - timedelta(hours=2), require_approval=False
-    ).only('pk', 'event_id', 'expires').order_by('event_id'):
-
-        lp = o.payments.last()
-        if (
-                lp and
-                lp.state in [OrderPayment.PAYMENT_STATE_CREATED, OrderPayment.PAYMENT_STATE_PENDING] and
-                lp.payment_provider and
-                lp.payment_provider.prevent_reminder_mail(o, lp)
-        ):
+    orders = event.orders.filter(
+        expires__gte=today, expires__lt=today + timedelta(days=days + 1),
+        expiry_reminder_sent=False, status=Order.STATUS_PENDING,
+        datetime__lte=now() - timedelta(hours=2), require_approval=False
+    ).annotate(
+        last_payment_id=Subquery(
+            OrderPayment.objects.filter(order_id=OuterRef('pk')).order_by('-local_id').values('pk')[:1]
+        ),
+        has_cancellation_fee=Exists(
+            OrderFee.objects.filter(order_id=OuterRef('pk'), fee_type=OrderFee.FEE_TYPE_CANCELLATION)
+        ),
+    ).order_by('pk')
+    orders = list(orders)
+    open_payments = {
+        p.pk: p for p in OrderPayment.objects.filter(
+            pk__in=[o.last_payment_id for o in orders if o.last_payment_id],
+            state__in=[OrderPayment.PAYMENT_STATE_CREATED, OrderPayment.PAYMENT_STATE_PENDING],
+        )
+    }
+
+    for o in orders:
+        o.event = event
+        lp = open_payments.get(o.last_payment_id)
+        if lp and lp.payment_provider and lp.payment_provider.prevent_reminder_mail(o, lp):
             continue
 
-        if event_id != o.event_id:
-            settings = o.event.settings
-            days = cache.get_or_set('{}:{}:setting_mail_days_order_expire_warning'.format('event', o.event_id),
-                                    default=lambda: settings.get('mail_days_order_expire_warning', as_type=int),
-                                    timeout=3600)
-            event_id = o.event_id
+        with transaction.atomic():
+            claimed = Order.objects.filter(
+                pk=o.pk, status=Order.STATUS_PENDING, expiry_reminder_sent=False
+            ).update(expiry_reminder_sent=True, last_modified=now())
+            if not claimed:
+                # Race condition
+                continue
+            o.expiry_reminder_sent = True
 
-        if days and (o.expires - today).days <= days:
-            with transaction.atomic():
-                o = Order.objects.select_related('event').select_for_update(of=OF_SELF).get(pk=o.pk)
-                if o.status != Order.STATUS_PENDING or o.expiry_reminder_sent:
-                    # Race condition
-                    continue
+            with language(o.locale, settings.region):
+                email_context = get_email_context(event=event, order=o)
+                can_autoexpire = (
+                    settings.payment_term_expire_automatically and
+                    not o.valid_if_pending and
+                    not o.has_cancellation_fee
+                )
+                if can_autoexpire:
+                    email_template = settings.mail_text_order_expire_warning
+                    email_subject = settings.mail_subject_order_expire_warning
+                else:
+                    email_template = settings.mail_text_order_pending_warning
+                    email_subject = settings.mail_subject_order_pending_warning
 
-                with language(o.locale, settings.region):
-                    o.expiry_reminder_sent = True
-                    o.save(update_fields=['expiry_reminder_sent'])
-                    email_context = get_email_context(event=o.event, order=o)
-                    can_autoexpire = (
-                        settings.payment_term_expire_automatically and
-                        not o.valid_if_pending and
-                        not o.fees.filter(fee_type=OrderFee.FEE_TYPE_CANCELLATION).exists()
-                    )
-                    if can_autoexpire:
-                        email_template = settings.mail_text_order_expire_warning
-                        email_subject = settings.mail_subject_order_expire_warning
-                    else:
-                        email_template = settings.mail_text_order_pending_warning
-                        email_subject = settings.mail_subject_order_pending_warning
+                o.send_mail(
+                    email_subject, email_template, email_context,
+                    'pretix.event.order.email.expire_warning_sent'
+                )
 
-                    o.send_mail(
-                        email_subject, email_template, email_context,
-                        'pretix.event.order.email.expire_warning_sent'
-                    )
+
+@receiver(signal=periodic_task)
+@scopes_disabled()
+@minimum_interval(minutes_after_success=60)
+def send_expiry_warnings(sender, **kwargs):
+    today = now().replace(hour=0, minute=0, second=0)
+    event_ids = Order.objects.filter(
+        expires__gte=today, expiry_reminder_sent=False, status=Order.STATUS_PENDING,
+        datetime__lte=now() - timedelta(hours=2), require_approval=False
+    ).order_by().values_list('event_id', flat=True).distinct()
+    for event_id in event_ids:
+        send_event_expiry_warnings.apply_async(args=(event_id,))
 
 
 @receiver(signal=periodic_task)
@@ -0,0 +1,90 @@
+#
+# This file is part of pretix (Community Edition).
+#
+# Copyright (C) 2014-2020  Raphael Michel and contributors
+# Copyright (C) 2020-today pretix GmbH and contributors
+#
+# This program is free software: you can redistribute it and/or modify it under the terms of the GNU Affero General
+# Public License as published by the Free Software Foundation in version 3 of the License.
+#
+# ADDITIONAL TERMS APPLY: Pursuant to Section 7 of the GNU Affero General Public License, additional terms are
+# applicable granting you additional permissions and placing additional restrictions on your usage of this software.
+# Please refer to the pretix LICENSE file to obtain the full terms applicable to this work. If you did not receive
+# this file, see <https://pretix.eu/about/en/license>.
+#
+# This program is distributed in the hope that it will be useful, but WITHOUT ANY WARRANTY; without even the implied
+# warranty of MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the GNU Affero General Public License for more
+# details.
+#
+# You should have received a copy of the GNU Affero General Public License along with this program.  If not, see
+# <https://www.gnu.org/licenses/>.
+#
+"""
+Execution of the receivers of the ``periodic_task`` signal, used by the ``runperiodic`` management command.
+"""
+import logging
+import time
+
+from django.conf import settings
+from django.db import close_old_connections
+from django.dispatch.dispatcher import NO_RECEIVERS
+from django_querytagger.tagging import with_tag
+
+from pretix.base.metrics import (
+    pretix_periodic_task_duration_seconds, pretix_periodic_task_runs_total,
+)
+from pretix.base.services.tasks import ProfiledTask
+from pretix.base.signals import periodic_task
+from pretix.celery_app import app
+from pretix.helpers.periodic import SKIPPED
+
+logger = logging.getLogger(__name__)
+
+
+def receiver_name(receiver):
+    return f'{receiver.__module__}.{receiver.__name__}'
+
+
+def periodic_receivers(sender=None):
+    """
+    Returns a dictionary of all live receivers of ``periodic_task``, keyed by their dotted path.
+    """
+    if not periodic_task.receivers or periodic_task.sender_receivers_cache.get(sender) is NO_RECEIVERS:
+        return {}
+    return {
+        receiver_name(receiver): receiver
+        for receiver in periodic_task._live_receivers(sender)[0]
+    }
+
+
+def run_receiver(name, receiver, sender=None):
+    """
+    Runs a single receiver and records its duration and outcome. Returns ``"success"`` or ``"skipped"`` and
+    re-raises any exception after recording it.
+    """
+    t0 = time.perf_counter()
+    status = "error"
+    try:
+        # Check if the DB connection is still good, it might be closed if the previous task took too long.
+        close_old_connections()
+        with with_tag(f"periodictask={name}"):
+            r = receiver(signal=periodic_task, sender=sender)
+        status = "skipped" if r is SKIPPED else "success"
+        return status
+    finally:
+        if settings.METRICS_ENABLED:
+            pretix_periodic_task_runs_total.inc(1, task_name=name, status=status)
+            if status != "skipped":
+                pretix_periodic_task_duration_seconds.observe(time.perf_counter() - t0, task_name=name)
+
+
+@app.task(base=ProfiledTask)
+def run_periodic_receiver(name):
+    receiver = periodic_receivers().get(name)
+    if not receiver:
+        logger.warning(f'Periodic task {name} does not exist (anymore)')
+        return
+    try:
+        return run_receiver(name, receiver)
+    finally:
+        close_old_connections()
@@ -41,6 +41,27 @@ from pretix.base.models import (
 from ..signals import quota_availability
 
 
+def invalidate_quota_cache(quotas):
+    """
+    Removes the cached availability of the given quotas, passed as an iterable of ``(event_id, quota_id)`` tuples,
+    from redis.
+    """
+    if not settings.HAS_REDIS:
+        return
+    quotas_by_event = defaultdict(list)
+    for event_id, quota_id in quotas:
+        quotas_by_event[event_id].append(str(quota_id))
+    if not quotas_by_event:
+        return
+
+    rc = django_redis.get_redis_connection("redis")
+    pipe = rc.pipeline()
+    for event_id, quota_ids in quotas_by_event.items():
+        for suffix in ("", ":nocw", ":igcl", ":nocw:igcl"):
+            pipe.hdel(f'quotas:{event_id}:availabilitycache{suffix}', *quota_ids)
+    pipe.execute()
+
+
 class QuotaAvailability:
     """
     This special object allows so compute the availability of multiple quotas, even across events, and inspect their
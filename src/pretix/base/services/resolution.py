@@ -0,0 +1,168 @@
+#
+# This file is part of pretix (Community Edition).
+#
+# Copyright (C) 2014-2020  Raphael Michel and contributors
+# Copyright (C) 2020-today pretix GmbH and contributors
+#
+# This program is free software: you can redistribute it and/or modify it under the terms of the GNU Affero General
+# Public License as published by the Free Software Foundation in version 3 of the License.
+#
+# ADDITIONAL TERMS APPLY: Pursuant to Section 7 of the GNU Affero General Public License, additional terms are
+# applicable granting you additional permissions and placing additional restrictions on your usage of this software.
+# Please refer to the pretix LICENSE file to obtain the full terms applicable to this work. If you did not receive
+# this file, see <https://pretix.eu/about/en/license>.
+#
+# This program is distributed in the hope that it will be useful, but WITHOUT ANY WARRANTY; without even the implied
+# warranty of MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the GNU Affero General Public License for more
+# details.
+#
+# You should have received a copy of the GNU Affero General Public License along with this program.  If not, see
+# <https://www.gnu.org/licenses/>.
+#
+"""
+Cached lookups of organizers and events by their slugs or primary keys.
+
+Every request to the shop, the widget or the API starts by looking up the organizer and event it belongs to. These
+lookups are served from snapshots of the model fields in the shared cache. A snapshot records the versions of the
+cache namespaces (see :py:class:`pretix.base.cache.ObjectRelatedCache`) of all objects it contains. Since these
+namespaces are replaced whenever an organizer or event is changed, checking that a snapshot is current only takes
+a single round trip to the cache, and no explicit invalidation of the snapshots is needed.
+"""
+import time
+import zlib
+from functools import lru_cache
+
+from django.core.cache import cache
+from django.db import transaction
+from django.db.models.signals import post_delete, post_save
+from django_scopes import scopes_disabled
+
+from pretix.base.cache import NamespacedCache
+from pretix.base.models import Event, Organizer
+
+RESOLUTION_TTL = 600
+
+
+@lru_cache(maxsize=None)
+def _field_names(model):
+    return tuple(f.attname for f in model._meta.concrete_fields)
+
+
+@lru_cache(maxsize=None)
+def _schema_version(model):
+    # Part of the cache keys, so snapshots taken before a field was added or removed are never used
+    return zlib.crc32(",".join(_field_names(model)).encode())
+
+
+def _namespace_key(model, pk):
+    # The cache key holding the current prefix of the ObjectRelatedCache of the object
+    return '%s:%s' % (model._meta.object_name, pk)
+
+
+def _current_versions(keys):
+    versions = cache.get_many(keys)
+    missing = [k for k in keys if k not in versions]
+    if missing:
+        for k in missing:
+            # Use add() so we never overwrite a version that has just been set by a concurrent change
+            cache.add(k, int(time.time()))
+        versions.update(cache.get_many(missing))
+    return versions
+
+
+def _resolve(key, models, load, using, known_keys=()):
+    """
+    Returns the objects of the given ``models`` stored under ``key``, or loads them with ``load`` if there is
+    no current snapshot.
+
+    A snapshot is only stored if the namespace versions of all objects it contains were read before the objects
+    were loaded and did not change in the meantime, otherwise a change committed while we load could be stored
+    under its new version. If we do not know which objects a lookup leads to yet, we only store their keys, so the
+    next lookup can take a snapshot.
+    """
+    cached = cache.get(key)
+    if cached is not None:
+        versions, values = cached
+        if values is not None and cache.get_many(list(versions)) == versions:
+            objs = []
+            for model, v, version in zip(models, values, versions.values()):
+                obj = model.from_db(using, _field_names(model), v)
+                # We already know the current prefix of the object cache, save a round trip on its first use
+                obj.cache._last_prefix = version
+                objs.append(obj)
+            return objs
+        known_keys = set(known_keys) | set(versions)
+
+    versions_before = _current_versions(list(known_keys)) if known_keys else {}
+    with scopes_disabled():
+        # Snapshots are shared with requests that need the latest state, so they are never taken from a replica
+        # that might lag behind
+        objs = load('default')
+    keys = [_namespace_key(model, obj.pk) for model, obj in zip(models, objs)]
+    versions = _current_versions(keys)
+    if len(versions) == len(keys):
+        if all(versions_before.get(k) == versions[k] for k in keys):
+            cache.set(key, (
+                {k: versions[k] for k in keys},
+                [tuple(getattr(obj, f) for f in _field_names(model)) for model, obj in zip(models, objs)]
+            ), RESOLUTION_TTL)
+        else:
+            cache.set(key, ({k: versions[k] for k in keys}, None), RESOLUTION_TTL)
+    return objs
+
+
+def resolve_organizer(slug=None, pk=None, using='default') -> Organizer:
+    """
+    Returns the organizer with the given slug or primary key. Raises ``Organizer.DoesNotExist`` if there is none.
+    """
+    if pk is not None:
+        lookup = {'pk': pk}
+        key = 'pretix_resolution:organizer:{}:pk:{}'.format(_schema_version(Organizer), pk)
+    else:
+        lookup = {'slug': slug}
+        key = 'pretix_resolution:organizer:{}:slug:{}'.format(_schema_version(Organizer), slug)
+
+    orga, = _resolve(
+        key, (Organizer,), lambda db: [Organizer.objects.using(db).get(**lookup)], using,
+        known_keys=[_namespace_key(Organizer, pk)] if pk is not None else (),
+    )
+    return orga
+
+
+def resolve_event(organizer_slug=None, slug=None, pk=None, using='default') -> Event:
+    """
+    Returns the event with the given organizer slug and event slug, or with the given primary key, with the
+    organizer already attached. Raises ``Event.DoesNotExist`` if there is none.
+    """
+    if pk is not None:
+        lookup = {'pk': pk}
+        key = 'pretix_resolution:event:{}:pk:{}'.format(_schema_version(Event), pk)
+    else:
+        lookup = {'slug': slug, 'organizer__slug': organizer_slug}
+        key = 'pretix_resolution:event:{}:slug:{}:{}'.format(_schema_version(Event), organizer_slug, slug)
+
+    def load(db):
+        event = Event.objects.select_related('organizer').using(db).get(**lookup)
+        return [event, event.organizer]
+
+    event, orga = _resolve(
+        key, (Event, Organizer), load, using,
+        known_keys=[_namespace_key(Event, pk)] if pk is not None else (),
+    )
+    event.organizer = orga
+    return event
+
+
+def invalidate_resolution(sender, instance, **kwargs):
+    """
+    Events and organizers replace their cache namespace when they are saved, but before the transaction is
+    committed. A concurrent request could therefore store an outdated snapshot for the new namespace, which is why
+    we replace it again once the change is visible to everyone. Deleted objects do not replace it at all.
+    """
+    transaction.on_commit(NamespacedCache(_namespace_key(sender, instance.pk)).clear)
+
+
+for model in (Event, Organizer):
+    post_save.connect(invalidate_resolution, sender=model, dispatch_uid=f'resolution_invalidate_save_{model.__name__}')
+    post_delete.connect(invalidate_resolution, sender=model,
+                        dispatch_uid=f'resolution_invalidate_delete_{model.__name__}')
@@ -19,11 +19,34 @@
 # You should have received a copy of the GNU Affero General Public License along with this program.  If not, see
 # <https://www.gnu.org/licenses/>.
 #
-from django.db.models import Count, Exists, OuterRef, Q
+import time
+import zlib
+from array import array
+from collections import defaultdict
+from itertools import accumulate
+
+from django.core.cache import cache
+from django.db import transaction
+from django.db.models import Count, Exists, Min, OuterRef, Q
+from django.db.models.signals import post_save
+from django.dispatch import receiver
+from django.utils.timezone import now
 from django.utils.translation import gettext_lazy as _
 
 from pretix.base.i18n import LazyLocaleException
-from pretix.base.models import CartPosition, Order, OrderPosition, Seat
+from pretix.base.models import (
+    CartPosition, Event, Order, OrderPosition, Seat, Voucher,
+)
+from pretix.base.services.tasks import ProfiledEventTask
+from pretix.base.signals import (
+    order_approved, order_canceled, order_changed, order_denied, order_expired,
+    order_paid, order_placed, order_reactivated,
+)
+from pretix.celery_app import app
+
+SEAT_AVAILABILITY_TTL = 300
+SEAT_BATCH_SIZE = 1000
+SEAT_SUBEVENT_CHUNK_SIZE = 20
 
 
 class SeatProtected(LazyLocaleException):
@@ -63,65 +86,60 @@ def validate_plan_change(event, subevent, plan):
 
 
 def generate_seats(event, subevent, plan, mapping, blocked_guids=None):
+    _generate_seats(event, subevent, list(plan.iter_all_seats()) if plan else [], mapping, blocked_guids)
+
+
+def _generate_seats(event, subevent, plan_seats, mapping, blocked_guids=None):
     current_seats = {}
-    for s in event.seats.select_related('product').annotate(
+    duplicates = []
+    for s in event.seats.annotate(
         has_op=Exists(OrderPosition.all.filter(
             seat=OuterRef('pk'),
             canceled=False,
         ).exclude(
             order__status__in=(Order.STATUS_CANCELED, Order.STATUS_EXPIRED)
         )),
-        has_v=Count('vouchers')
+        has_v=Exists(Voucher.objects.filter(seat=OuterRef('pk'))),
     ).filter(subevent=subevent).order_by():
         if s.seat_guid in current_seats:
-            s.delete()  # Duplicates should not exist
+            duplicates.append(s.pk)  # Duplicates should not exist
         else:
             current_seats[s.seat_guid] = s
 
-    def update(o, a, v):
-        if getattr(o, a) != v:
-            setattr(o, a, v)
-            return True
-        return False
-
     create_seats = []
-    if plan:
-        for ss in plan.iter_all_seats():
-            p = mapping.get(ss.category)
-            if ss.guid in current_seats:
-                seat = current_seats.pop(ss.guid)
-                updated = any([
-                    update(seat, 'product', p),
-                    update(seat, 'row_name', ss.row),
-                    update(seat, 'seat_number', ss.number),
-                    update(seat, 'zone_name', ss.zone),
-                    update(seat, 'sorting_rank', ss.sorting_rank),
-                    update(seat, 'row_label', ss.row_label),
-                    update(seat, 'seat_label', ss.seat_label),
-                    update(seat, 'x', ss.x),
-                    update(seat, 'y', ss.y),
-                ] + (
-                    [update(seat, 'blocked', ss.guid in blocked_guids)]
-                    if blocked_guids else []
-                ))
-                if updated:
-                    seat.save()
-            else:
-                create_seats.append(Seat(
-                    event=event,
-                    subevent=subevent,
-                    seat_guid=ss.guid,
-                    row_name=ss.row,
-                    seat_number=ss.number,
-                    zone_name=ss.zone,
-                    sorting_rank=ss.sorting_rank,
-                    row_label=ss.row_label,
-                    seat_label=ss.seat_label,
-                    x=ss.x,
-                    y=ss.y,
-                    blocked=bool(blocked_guids and ss.guid in blocked_guids),
-                    product=p,
-                ))
+    update_seats = []
+    update_fields = set()
+    for ss in plan_seats:
+        p = mapping.get(ss.category)
+        values = {
+            'product_id': p.pk if p else None,
+            'row_name': ss.row,
+            'seat_number': ss.number,
+            'zone_name': ss.zone,
+            'sorting_rank': ss.sorting_rank,
+            'row_label': ss.row_label,
+            'seat_label': ss.seat_label,
+            'x': ss.x,
+            'y': ss.y,
+        }
+        if ss.guid in current_seats:
+            seat = current_seats.pop(ss.guid)
+            if blocked_guids:
+                values['blocked'] = ss.guid in blocked_guids
+            changed = {k for k, v in values.items() if getattr(seat, k) != v}
+            if changed:
+                for k in changed:
+                    setattr(seat, k, values[k])
+                update_fields |= changed
+                update_seats.append(seat)
+        else:
+            create_seats.append(Seat(
+                event=event,
+                subevent=subevent,
+                seat_guid=ss.guid,
+                blocked=bool(blocked_guids and ss.guid in blocked_guids),
+                **values
+            ))
 
     for s in current_seats.values():
         if s.has_op:
@@ -131,11 +149,282 @@ def generate_seats(event, subevent, plan, mapping, blocked_guids=None):
             raise SeatProtected(_('You can not change the plan since seat "%s" is not present in the new plan and is '
                                   'already used in a voucher.', s.name))
 
-    Seat.objects.bulk_create(create_seats)
-    CartPosition.objects.filter(addon_to__seat__in=[s.pk for s in current_seats.values()]).delete()
-    CartPosition.objects.filter(seat__in=[s.pk for s in current_seats.values()]).delete()
-    OrderPosition.all.filter(
-        Q(canceled=True) | Q(order__status__in=(Order.STATUS_CANCELED, Order.STATUS_EXPIRED)),
-        seat__in=[s.pk for s in current_seats.values()],
-    ).update(seat=None)
-    Seat.objects.filter(pk__in=[s.pk for s in current_seats.values()]).delete()
+    if duplicates:
+        Seat.objects.filter(pk__in=duplicates).delete()
+    if update_seats:
+        Seat.objects.bulk_update(
+            update_seats,
+            ['product' if f == 'product_id' else f for f in sorted(update_fields)],
+            batch_size=SEAT_BATCH_SIZE
+        )
+    Seat.objects.bulk_create(create_seats, batch_size=SEAT_BATCH_SIZE)
+    removed = [s.pk for s in current_seats.values()]
+    if removed:
+        CartPosition.objects.filter(addon_to__seat__in=removed).delete()
+        CartPosition.objects.filter(seat__in=removed).delete()
+        OrderPosition.all.filter(
+            Q(canceled=True) | Q(order__status__in=(Order.STATUS_CANCELED, Order.STATUS_EXPIRED)),
+            seat__in=removed,
+        ).update(seat=None)
+        Seat.objects.filter(pk__in=removed).delete()
+    invalidate_seat_availability(event.pk)
+
+
+def _taken_seats(event, subevents):
+    q = Q(subevent__isnull=True) if subevents == [None] else Q(subevent__in=subevents)
+    return event.seats.filter(q).filter(
+        Exists(OrderPosition.all.filter(
+            seat=OuterRef('pk'),
+            canceled=False,
+        ).exclude(
+            order__status__in=(Order.STATUS_CANCELED, Order.STATUS_EXPIRED)
+        )) | Exists(Voucher.objects.filter(seat=OuterRef('pk')))
+    ).order_by()
+
+
+def apply_seating_plan(event, subevents, plan, progress=None):
+    """
+    Assigns ``plan`` (or no plan) to the given subevents, or to the event itself if ``subevents`` is ``None``, and
+    updates their seats according to their category mappings. The plan is only parsed once and all changes are written
+    in bulk.
+
+    Subevents are processed in chunks of ``SEAT_SUBEVENT_CHUNK_SIZE`` that are committed one by one, so a large event
+    series does not hold locks on all of its seats at once. All subevents are checked for sold seats missing from the
+    new plan before the first chunk is written, so a :py:class:`SeatProtected` error usually leaves everything
+    unchanged. ``progress`` is called with the percentage of processed subevents after every chunk.
+    """
+    plan_seats = list(plan.iter_all_seats()) if plan else []
+    plan_guids = {ss.guid for ss in plan_seats}
+    targets = [None] if subevents is None else list(subevents)
+    chunks = [targets[i:i + SEAT_SUBEVENT_CHUNK_SIZE] for i in range(0, len(targets), SEAT_SUBEVENT_CHUNK_SIZE)]
+
+    for chunk in chunks:
+        for s in _taken_seats(event, chunk).iterator():
+            if s.seat_guid not in plan_guids:
+                raise SeatProtected(_('You can not change the plan since seat "%s" is not present in the new plan '
+                                      'and is already sold.'), s.name)
+
+    for i, chunk in enumerate(chunks):
+        mappings = defaultdict(dict)
+        for m in event.seat_category_mappings.filter(
+            Q(subevent__isnull=True) if subevents is None else Q(subevent__in=chunk)
+        ).select_related('product'):
+            mappings[m.subevent_id][m.layout_category] = m.product
+
+        with transaction.atomic():
+            for target in chunk:
+                obj = target or event
+                if obj.seating_plan_id != (plan.pk if plan else None):
+                    obj.seating_plan = plan
+                    obj.save(update_fields=['seating_plan'])
+                _generate_seats(event, target, plan_seats, mappings[target.pk if target else None])
+        if progress:
+            progress(round(100 * (i + 1) / len(chunks)))
+
+
+@app.task(base=ProfiledEventTask, bind=True, throws=(SeatProtected,))
+def generate_seats_for_subevents(self, event: Event, subevents: list, plan: int = None):
+    """
+    Background version of :py:func:`apply_seating_plan` for the subevents with the given IDs.
+    """
+    def set_progress(value):
+        if not self.request.called_directly:
+            self.update_state(
+                state='PROGRESS',
+                meta={'value': value}
+            )
+
+    apply_seating_plan(
+        event,
+        event.subevents.filter(pk__in=subevents).order_by('pk'),
+        event.organizer.seating_plans.get(pk=plan) if plan else None,
+        progress=set_progress,
+    )
+
+
+def _to_bitset(ordinals, size):
+    b = bytearray((size + 7) // 8)
+    for i in ordinals:
+        b[i >> 3] |= 1 << (i & 7)
+    return bytes(b)
+
+
+class SeatAvailability:
+    """
+    Compact snapshot of the state of all seats of an event or subevent. Every seat is identified by its ordinal,
+    i.e. its position in the list of seats ordered by ID, and every state is a bitset over the ordinals. Computing
+    the snapshot takes one query, after that it is served from the cache until a seat, cart position, order position
+    or voucher of the event changes, or until the first cart position or voucher included in the snapshot expires.
+
+    The snapshot is meant for counters and displays. Checks that must not oversell, such as
+    :py:meth:`Seat.is_available`, still query the database.
+    """
+    STATES = ('sold', 'cart', 'voucher', 'blocked', 'closeby')
+
+    def __init__(self, seat_ids, bitsets, products, timestamp, valid_until, settings_key):
+        self.seat_ids = seat_ids
+        self.bitsets = bitsets
+        self.products = products
+        self.timestamp = timestamp
+        self.valid_until = valid_until
+        self.settings_key = settings_key
+        self._ordinals = None
+
+    @staticmethod
+    def _settings_key(event):
+        return event.settings.seating_minimal_distance, event.settings.seating_distance_within_row
+
+    @staticmethod
+    def _cache_key(event, subevent):
+        return 'seat_availability:{}:{}'.format(event.pk, subevent.pk if subevent else 0)
+
+    @classmethod
+    def compute(cls, event, subevent=None):
+        timestamp = time.time()
+        ev = subevent or event
+        fields = ['pk', 'product_id', 'blocked', 'has_order', 'has_cart', 'has_voucher']
+        if event.settings.seating_minimal_distance > 0:
+            fields.append('has_closeby_taken')
+
+        seat_ids = []
+        ordinals = {state: [] for state in cls.STATES}
+        products = {}
+        for i, (pk, product_id, blocked, has_order, has_cart, has_voucher, *closeby) in enumerate(
+                ev._seats().order_by('pk').values_list(*fields)):
+            seat_ids.append(pk)
+            products.setdefault(product_id, []).append(i)
+            states = zip(cls.STATES, (has_order, has_cart, has_voucher, blocked, closeby and closeby[0]))
+            for state, value in states:
+                if value:
+                    ordinals[state].append(i)
+
+        # Cart positions and vouchers stop blocking their seat at some point without anything changing in the
+        # database, so the snapshot is only valid until the first of them expires
+        expiries = [
+            d for d in (
+                CartPosition.objects.filter(
+                    event=event, subevent=subevent, seat__isnull=False, expires__gte=now()
+                ).aggregate(m=Min('expires'))['m'],
+                Voucher.objects.filter(
+                    event=event, subevent=subevent, seat__isnull=False, valid_until__gte=now()
+                ).aggregate(m=Min('valid_until'))['m'],
+            ) if d
+        ]
+        return cls(
+            seat_ids=seat_ids,
+            bitsets={state: int.from_bytes(_to_bitset(o, len(seat_ids)), 'little') for state, o in ordinals.items()},
+            products={p: int.from_bytes(_to_bitset(o, len(seat_ids)), 'little') for p, o in products.items()},
+            timestamp=timestamp,
+            valid_until=min(expiries).timestamp() if expiries else None,
+            settings_key=cls._settings_key(event),
+        )
+
+    def serialize(self):
+        size = len(self.seat_ids)
+        deltas = array('q', (b - a for a, b in zip([0] + self.seat_ids, self.seat_ids)))
+        return {
+            'seat_ids': zlib.compress(deltas.tobytes()),
+            'bitsets': {k: v.to_bytes((size + 7) // 8, 'little') for k, v in self.bitsets.items()},
+            'products': {k: v.to_bytes((size + 7) // 8, 'little') for k, v in self.products.items()},
+            'timestamp': self.timestamp,
+            'valid_until': self.valid_until,
+            'settings_key': self.settings_key,
+        }
+
+    @classmethod
+    def deserialize(cls, data):
+        deltas = array('q')
+        deltas.frombytes(zlib.decompress(data['seat_ids']))
+        return cls(
+            seat_ids=list(accumulate(deltas)),
+            bitsets={k: int.from_bytes(v, 'little') for k, v in data['bitsets'].items()},
+            products={k: int.from_bytes(v, 'little') for k, v in data['products'].items()},
+            timestamp=data['timestamp'],
+            valid_until=data['valid_until'],
+            settings_key=data['settings_key'],
+        )
+
+    def is_fresh(self, event):
+        changed = cache.get('seat_availability_changed:{}'.format(event.pk))
+        return (
+            (not changed or changed < self.timestamp) and
+            (not self.valid_until or time.time() < self.valid_until) and
+            self.settings_key == self._settings_key(event)
+        )
+
+    @classmethod
+    def get(cls, event, subevent=None):
+        """
+        Returns the current snapshot for the given event or subevent, computing it if necessary.
+        """
+        data = cache.get(cls._cache_key(event, subevent))
+        if data:
+            snapshot = cls.deserialize(data)
+            if snapshot.is_fresh(event):
+                return snapshot
+        snapshot = cls.compute(event, subevent)
+        cache.set(cls._cache_key(event, subevent), snapshot.serialize(), SEAT_AVAILABILITY_TTL)
+        return snapshot
+
+    def free_bitset(self, sales_channel='web', include_blocked=False, event=None):
+        """
+        Returns the bitset of all seats that :py:meth:`Event.free_seats` would return with the same arguments.
+        """
+        taken = self.bitsets['sold'] | self.bitsets['cart'] | self.bitsets['voucher'] | self.bitsets['closeby']
+        free = ((1 << len(self.seat_ids)) - 1) & ~taken
+        if not (include_blocked or (event and sales_channel in event.settings.seating_allow_blocked_seats_for_channel)):
+            free &= ~self.bitsets['blocked']
+        return free
+
+    def count(self, bitset, product_id=None):
+        if product_id is not None:
+            bitset &= self.products.get(product_id, 0)
+        return bitset.bit_count()
+
+    def count_free(self, product_id=None, sales_channel='web', include_blocked=False, event=None):
+        return self.count(self.free_bitset(sales_channel, include_blocked, event), product_id)
+
+    def seat_ids_in(self, bitset):
+        return [sid for i, sid in enumerate(self.seat_ids) if bitset >> i & 1]
+
+    def is_free(self, seat_id, sales_channel='web', include_blocked=False, event=None):
+        if self._ordinals is None:
+            self._ordinals = {sid: i for i, sid in enumerate(self.seat_ids)}
+        i = self._ordinals.get(seat_id)
+        return i is not None and bool(self.free_bitset(sales_channel, include_blocked, event) >> i & 1)
+
+
+def invalidate_seat_availability(event_id):
+    def _mark_changed():
+        cache.set('seat_availability_changed:{}'.format(event_id), time.time(), SEAT_AVAILABILITY_TTL)
+
+    # Only mark the snapshot as outdated once the change is visible to others, otherwise a snapshot computed
+    # in the meantime would be considered current.
+    transaction.on_commit(_mark_changed)
+
+
+# Deletions are deliberately not hooked up here, as a post_delete receiver disables Django's fast-delete path and
+# turns every bulk deletion of cart positions or vouchers into one query and one signal per row. Deleting objects
+# only ever frees seats, so the code paths that release seats interactively call invalidate_seat_availability()
+# themselves and everything else is picked up once the snapshot expires.
+@receiver(post_save, sender=Seat, dispatch_uid="seat_availability_seat_saved")
+@receiver(post_save, sender=CartPosition, dispatch_uid="seat_availability_cartposition_saved")
+@receiver(post_save, sender=Voucher, dispatch_uid="seat_availability_voucher_saved")
+def _seat_object_changed(sender, instance, **kwargs):
+    if sender is Seat or instance.seat_id:
+        invalidate_seat_availability(instance.event_id)
+
+
+@receiver(post_save, sender=OrderPosition, dispatch_uid="seat_availability_orderposition_saved")
+def _orderposition_changed(sender, instance, **kwargs):
+    if instance.seat_id:
+        invalidate_seat_availability(instance.order.event_id)
+
+
+def _order_changed(sender, *args, **kwargs):
+    invalidate_seat_availability(sender.pk)
+
+
+for sig in (order_placed, order_paid, order_canceled, order_changed, order_expired, order_reactivated,
+            order_approved, order_denied):
+    sig.connect(_order_changed, dispatch_uid='seat_availability_order_changed')
@@ -32,21 +32,46 @@
 # distributed on an "AS IS" BASIS, WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied. See the
 # License for the specific language governing permissions and limitations under the License.
 
+from collections import defaultdict
 from datetime import date, datetime, time, timedelta
 from decimal import Decimal
 from typing import Any, Dict, Iterable, List, Tuple
 
+from django.core.cache import cache
+from django.db import transaction
 from django.db.models import (
-    Case, Count, DateTimeField, F, Max, OuterRef, QuerySet, Subquery, Sum,
-    Value, When,
+    Case, Count, DateTimeField, Exists, F, Max, OuterRef, QuerySet, Subquery,
+    Sum, Value, When,
 )
-from django.utils.timezone import make_aware
+from django.db.models.functions import TruncDate
+from django.db.models.signals import post_delete
+from django.dispatch import receiver
+from django.utils.timezone import make_aware, now
 from django.utils.translation import gettext_lazy as _
+from django_scopes import scopes_disabled
 
-from pretix.base.models import Event, Item, ItemCategory, Order, OrderPosition
+from pretix.base.models import (
+    Event, Item, ItemCategory, Order, OrderPosition, SalesRollup,
+    SalesRollupState, Transaction, TransactionSummary, TransactionSummaryState,
+)
 from pretix.base.models.event import SubEvent
 from pretix.base.models.orders import OrderFee, OrderPayment
-from pretix.base.signals import order_fee_type_name
+from pretix.base.services.tasks import EventTask
+from pretix.base.settings import GlobalSettingsObject
+from pretix.base.signals import order_fee_type_name, periodic_task
+from pretix.celery_app import app
+
+# Orders are re-aggregated if they were modified this long before the last run, to account for database
+# transactions that committed after the last run had started.
+ROLLUP_OVERLAP = timedelta(minutes=10)
+
+# Transactions are only added to the summaries once they are this old, since a transaction might be committed a while
+# after its ``created`` timestamp has been set. Reports read younger transactions directly.
+TRANSACTION_SUMMARY_DELAY = timedelta(hours=1)
+
+# Transactions are added to the summaries in chunks of about this many rows, each in its own database transaction that
+# advances the watermark, so building the summaries for the first time does not aggregate the whole table at once.
+TRANSACTION_SUMMARY_CHUNK_SIZE = 10000
 
 
 class DummyObject:
@@ -113,15 +138,28 @@ def dictsum(*dicts) -> dict:
 def order_overview(
         event: Event, subevent: SubEvent=None, date_filter='', date_from=None, date_until=None, fees=False,
         admission_only=False, base_qs=None, base_fees_qs=None, subevent_date_from=None, subevent_date_until=None,
-        skip_empty_lines=False,
+        skip_empty_lines=False, use_rollups=False,
 ) -> Tuple[List[Tuple[ItemCategory, List[Item]]], Dict[str, Tuple[Decimal, Decimal]]]:
+    """
+    If ``use_rollups`` is set, numbers are taken from the ``SalesRollup`` table if possible, which can be a few
+    minutes behind the actual orders.
+    """
     items = event.items.all().select_related(
         'category',  # for re-grouping
     ).prefetch_related(
         'variations'
     ).order_by('category__position', 'category_id', 'position', 'name')
 
+    use_rollups = (
+        use_rollups and
+        base_qs is None and
+        not isinstance(date_from, datetime) and
+        not isinstance(date_until, datetime) and
+        sales_rollups_available(event)
+    )
     qs = OrderPosition.all if base_qs is None else base_qs
+    if use_rollups:
+        qs = event.sales_rollups.filter(item__isnull=False)
     if isinstance(subevent, (list, QuerySet)):
         qs = qs.filter(subevent__in=subevent)
     elif subevent:
@@ -135,6 +173,30 @@ def order_overview(
         qs = qs.filter(item__admission=True)
         items = items.filter(admission=True)
 
+    if use_rollups:
+        if date_filter == 'order_date':
+            if date_from:
+                qs = qs.filter(order_date__gte=date_from)
+            if date_until:
+                qs = qs.filter(order_date__lte=date_until)
+        elif date_filter == 'last_payment_date':
+            if date_from:
+                qs = qs.filter(payment_date__gte=date_from)
+            if date_until:
+                qs = qs.filter(payment_date__lte=date_until)
+        counters = [
+            {**c, 'status': c['rollup_status']}
+            for c in qs.annotate(
+                rollup_status=Case(
+                    When(status='unapproved', then=Value('unapproved')),
+                    When(canceled=True, then=Value('c')),
+                    default=F('status')
+                )
+            ).values(
+                'item', 'variation', 'rollup_status'
+            ).annotate(cnt=Sum('count'), price=Sum('price'), tax_value=Sum('tax_value')).order_by()
+        ]
+
     if date_from and isinstance(date_from, date) and not isinstance(date_from, datetime):
         date_from = make_aware(datetime.combine(
             date_from,
@@ -147,36 +209,31 @@ def order_overview(
             time(hour=0, minute=0, second=0, microsecond=0)
         ), event.timezone)
 
-    if date_filter == 'order_date':
-        if date_from:
-            qs = qs.filter(order__datetime__gte=date_from)
-        if date_until:
-            qs = qs.filter(order__datetime__lt=date_until)
-    elif date_filter == 'last_payment_date':
-        p_date = OrderPayment.objects.filter(
-            order=OuterRef('order'),
-            state__in=[OrderPayment.PAYMENT_STATE_CONFIRMED, OrderPayment.PAYMENT_STATE_REFUNDED],
-            payment_date__isnull=False
-        ).values('order').annotate(
-            m=Max('payment_date')
-        ).values('m').order_by()
-        qs = qs.annotate(payment_date=Subquery(p_date, output_field=DateTimeField()))
-        if date_from:
-            qs = qs.filter(payment_date__gte=date_from)
-        if date_until:
-            qs = qs.filter(payment_date__lt=date_until)
-
-    counters = qs.filter(
-        order__event=event
-    ).annotate(
-        status=Case(
-            When(order__status='n', order__require_approval=True, then=Value('unapproved')),
-            When(canceled=True, then=Value('c')),
-            default=F('order__status')
-        )
-    ).values(
-        'item', 'variation', 'status'
-    ).annotate(cnt=Count('id'), price=Sum('price'), tax_value=Sum('tax_value')).order_by()
+    p_date = _last_payment_date('order')
+    if not use_rollups:
+        if date_filter == 'order_date':
+            if date_from:
+                qs = qs.filter(order__datetime__gte=date_from)
+            if date_until:
+                qs = qs.filter(order__datetime__lt=date_until)
+        elif date_filter == 'last_payment_date':
+            qs = qs.annotate(payment_date=Subquery(p_date, output_field=DateTimeField()))
+            if date_from:
+                qs = qs.filter(payment_date__gte=date_from)
+            if date_until:
+                qs = qs.filter(payment_date__lt=date_until)
+
+        counters = qs.filter(
+            order__event=event
+        ).annotate(
+            status=Case(
+                When(order__status='n', order__require_approval=True, then=Value('unapproved')),
+                When(canceled=True, then=Value('c')),
+                default=F('order__status')
+            )
+        ).values(
+            'item', 'variation', 'status'
+        ).annotate(cnt=Count('id'), price=Sum('price'), tax_value=Sum('tax_value')).order_by()
 
     states = {
         'unapproved': 'unapproved',
@@ -326,3 +383,209 @@ def order_overview(
         total['num'][l] = tuplesum(c.num[l] for c, i in items_by_category)
 
     return items_by_category, total
+
+
+def _last_payment_date(order_ref):
+    return OrderPayment.objects.filter(
+        order=OuterRef(order_ref),
+        state__in=(OrderPayment.PAYMENT_STATE_CONFIRMED, OrderPayment.PAYMENT_STATE_REFUNDED),
+        payment_date__isnull=False
+    ).values('order').annotate(
+        m=Max('payment_date')
+    ).values('m').order_by()
+
+
+def compute_sales_rollups(event: Event, date_from: datetime=None, date_until: datetime=None) -> List[SalesRollup]:
+    """
+    Aggregates the orders of ``event`` placed between ``date_from`` (inclusive) and ``date_until`` (exclusive)
+    into unsaved ``SalesRollup`` objects.
+    """
+    tz = event.timezone
+    oqs = Order.objects.filter(event=event)
+    pqs = OrderPosition.all.filter(order__event=event)
+    if date_from:
+        oqs = oqs.filter(datetime__gte=date_from)
+        pqs = pqs.filter(order__datetime__gte=date_from)
+    if date_until:
+        oqs = oqs.filter(datetime__lt=date_until)
+        pqs = pqs.filter(order__datetime__lt=date_until)
+
+    pqs = pqs.annotate(
+        rollup_status=Case(
+            When(order__status=Order.STATUS_PENDING, order__require_approval=True, then=Value('unapproved')),
+            default=F('order__status')
+        ),
+        rollup_order_date=TruncDate('order__datetime', tzinfo=tz),
+        rollup_payment_date=TruncDate(
+            Subquery(_last_payment_date('order'), output_field=DateTimeField()), tzinfo=tz
+        ),
+    )
+    rows = [
+        SalesRollup(
+            event=event, subevent_id=r['subevent'], item_id=r['item'], variation_id=r['variation'],
+            sales_channel_id=r['order__sales_channel'], status=r['rollup_status'], canceled=r['canceled'],
+            order_date=r['rollup_order_date'], payment_date=r['rollup_payment_date'],
+            count=r['cnt'], price=r['price_sum'], tax_value=r['tax_sum'],
+        )
+        for r in pqs.values(
+            'subevent', 'item', 'variation', 'order__sales_channel', 'rollup_status', 'canceled',
+            'rollup_order_date', 'rollup_payment_date',
+        ).annotate(cnt=Count('id'), price_sum=Sum('price'), tax_sum=Sum('tax_value')).order_by()
+    ]
+
+    oqs = oqs.annotate(
+        rollup_status=Case(
+            When(status=Order.STATUS_PENDING, require_approval=True, then=Value('unapproved')),
+            default=F('status')
+        ),
+        rollup_canceled=~Exists(OrderPosition.objects.filter(order=OuterRef('pk'))),
+        rollup_order_date=TruncDate('datetime', tzinfo=tz),
+        rollup_payment_date=TruncDate(
+            Subquery(_last_payment_date('pk'), output_field=DateTimeField()), tzinfo=tz
+        ),
+    )
+    rows += [
+        SalesRollup(
+            event=event, sales_channel_id=r['sales_channel'], status=r['rollup_status'],
+            canceled=r['rollup_canceled'], order_date=r['rollup_order_date'], payment_date=r['rollup_payment_date'],
+            count=r['cnt'], price=r['price_sum'],
+        )
+        for r in oqs.values(
+            'sales_channel', 'rollup_status', 'rollup_canceled', 'rollup_order_date', 'rollup_payment_date',
+        ).annotate(cnt=Count('id'), price_sum=Sum('total')).order_by()
+    ]
+
+    if event.has_subevents:
+        rows += [
+            SalesRollup(
+                event=event, subevent_id=r['subevent'], sales_channel_id=r['order__sales_channel'],
+                status=r['rollup_status'], order_date=r['rollup_order_date'], payment_date=r['rollup_payment_date'],
+                count=r['cnt'],
+            )
+            for r in pqs.filter(canceled=False).values(
+                'subevent', 'order__sales_channel', 'rollup_status', 'rollup_order_date', 'rollup_payment_date',
+            ).annotate(cnt=Count('order', distinct=True)).order_by()
+        ]
+    return rows
+
+
+def build_sales_rollups(event: Event):
+    """
+    Replaces all sales rollups of an event.
+    """
+    with transaction.atomic():
+        SalesRollupState.objects.filter(event=event).delete()
+        event.sales_rollups.all().delete()
+        SalesRollup.objects.bulk_create(compute_sales_rollups(event), batch_size=1000)
+        SalesRollupState.objects.create(event=event, timezone=event.settings.timezone)
+
+
+def update_sales_rollups(event: Event, days: Iterable[date]):
+    """
+    Replaces the sales rollups for all orders that have been placed on one of the given days.
+    """
+    tz = event.timezone
+    for day in sorted(days):
+        with transaction.atomic():
+            event.sales_rollups.filter(order_date=day).delete()
+            SalesRollup.objects.bulk_create(
+                compute_sales_rollups(
+                    event,
+                    date_from=make_aware(datetime.combine(day, time(0, 0, 0)), tz),
+                    date_until=make_aware(datetime.combine(day + timedelta(days=1), time(0, 0, 0)), tz),
+                ),
+                batch_size=1000
+            )
+
+
+def sales_rollups_available(event: Event) -> bool:
+    """
+    Returns whether complete sales rollups exist for this event. If not, they are built in the background and
+    the caller should fall back to aggregating the orders directly.
+    """
+    try:
+        available = event.sales_rollup_state.timezone == event.settings.timezone
+    except SalesRollupState.DoesNotExist:
+        available = False
+    if not available and cache.add(f'sales_rollup_build:{event.pk}', True, 3600):
+        transaction.on_commit(lambda: build_sales_rollups_task.apply_async(kwargs={'event': event.pk}))
+    return available
+
+
+@app.task(base=EventTask)
+def build_sales_rollups_task(event: Event):
+    build_sales_rollups(event)
+
+
+@app.task()
+@scopes_disabled()
+def refresh_sales_rollups():
+    gs = GlobalSettingsObject()
+    watermark = gs.settings.get('sales_rollup_watermark', as_type=datetime)
+    new_watermark = now()
+    if watermark is None:
+        first_built = SalesRollupState.objects.order_by('built').values_list('built', flat=True).first()
+        if first_built is None:
+            return
+        watermark = first_built
+
+    states = {s.event_id: s for s in SalesRollupState.objects.select_related('event', 'event__organizer')}
+    days = defaultdict(set)
+    changed = Order.objects.filter(
+        event_id__in=states.keys(),
+        last_modified__gte=watermark - ROLLUP_OVERLAP,
+        last_modified__lt=new_watermark,
+    ).values_list('event_id', 'datetime')
+    tzs = {}
+    for event_id, dt in changed.iterator(chunk_size=5000):
+        if event_id not in tzs:
+            tzs[event_id] = states[event_id].event.timezone
+        days[event_id].add(dt.astimezone(tzs[event_id]).date())
+
+    for event_id, event_days in days.items():
+        event = states[event_id].event
+        if states[event_id].timezone != event.settings.timezone:
+            build_sales_rollups(event)
+        else:
+            update_sales_rollups(event, event_days)
+
+    gs.settings.set('sales_rollup_watermark', new_watermark)
+
+
+@receiver(signal=periodic_task)
+def run_sales_rollup_refresh(sender, **kwargs):
+    refresh_sales_rollups.apply_async()
+
+
+@receiver(post_delete, sender=Order, dispatch_uid="sales_rollups_order_deleted")
+def invalidate_sales_rollups(sender, instance, **kwargs):
+    # Deleted orders can't be found by refresh_sales_rollups, so we need to start over
+    SalesRollupState.objects.filter(event_id=instance.event_id).delete()
+    cache.delete(f'sales_rollup_build:{instance.event_id}')
+
+
+@app.task()
+@scopes_disabled()
+def update_transaction_summaries():
+    new_watermark = now() - TRANSACTION_SUMMARY_DELAY
+    while True:
+        with transaction.atomic():
+            state, _created = TransactionSummaryState.objects.select_for_update().get_or_create(pk=1)
+            if state.watermark and state.watermark >= new_watermark:
+                return
+            qs = Transaction.objects.filter(created__lte=new_watermark)
+            if state.watermark:
+                qs = qs.filter(created__gt=state.watermark)
+            chunk_end = list(qs.order_by('created').values_list('created', flat=True)[
+                TRANSACTION_SUMMARY_CHUNK_SIZE - 1:TRANSACTION_SUMMARY_CHUNK_SIZE
+            ])
+            # All transactions with the same timestamp as the last one end up in the same chunk
+            chunk_end = chunk_end[0] if chunk_end else new_watermark
+            TransactionSummary.add_transactions(qs.filter(created__lte=chunk_end))
+            state.watermark = chunk_end
+            state.save(update_fields=['watermark'])
+
+
+@receiver(signal=periodic_task)
+def run_transaction_summary_update(sender, **kwargs):
+    update_transaction_summaries.apply_async()
@@ -32,21 +32,43 @@ import cProfile
 import os
 import random
 import time
+from contextvars import ContextVar
 
 from django.conf import settings
+from django.core.cache import cache
 from django.db import transaction
 from django_scopes import scope, scopes_disabled
 
 from pretix.base.metrics import (
-    pretix_task_duration_seconds, pretix_task_runs_total,
+    pretix_task_duration_seconds, pretix_task_inline_total,
+    pretix_task_runs_total,
 )
 from pretix.base.models import Event, Organizer, User
+from pretix.base.services.locking import lock_acquisition_timeout_var
 from pretix.celery_app import app
+from pretix.helpers.metrics.queries import QueryStats
+from pretix.helpers.profile.sampling import profiler as sampling_profiler
+
+inline_execution_var = ContextVar('inline_execution', default=False)
+
+
+class InlineExecutionAborted(Exception):
+    """
+    Raised instead of retrying a task that is executed by :py:func:`apply_inline`.
+    """
+    pass
 
 
 class ProfiledTask(app.Task):
     def __call__(self, *args, **kwargs):
+        if settings.METRICS_ENABLED:
+            with QueryStats() as queries:
+                ret = self._profiled_call(*args, **kwargs)
+            queries.report(name='celery:' + self.name)
+            return ret
+        return self._profiled_call(*args, **kwargs)
 
+    def _profiled_call(self, *args, **kwargs):
         if settings.PROFILING_RATE > 0 and random.random() < settings.PROFILING_RATE / 100:
             profiler = cProfile.Profile()
             profiler.enable()
@@ -57,6 +79,11 @@ class ProfiledTask(app.Task):
             profiler.dump_stats(os.path.join(settings.PROFILE_DIR, '{time:.0f}_{tottime:.3f}_celery_{t}.pstat'.format(
                 t=self.name, tottime=tottime, time=time.time()
             )))
+        elif settings.PROFILING_SAMPLING:
+            t0 = time.perf_counter()
+            with sampling_profiler.tag('celery:' + self.name):
+                ret = super().__call__(*args, **kwargs)
+            tottime = time.perf_counter() - t0
         else:
             t0 = time.perf_counter()
             ret = super().__call__(*args, **kwargs)
@@ -83,6 +110,12 @@ class ProfiledTask(app.Task):
 
         return super().on_success(retval, task_id, args, kwargs)
 
+    def retry(self, *args, **kwargs):
+        if inline_execution_var.get():
+            # Do not keep the web process busy, the caller will send the task to the workers
+            raise InlineExecutionAborted()
+        return super().retry(*args, **kwargs)
+
 
 class EventTask(app.Task):
     def __call__(self, *args, **kwargs):
@@ -185,3 +218,46 @@ class TransactionAwareProfiledEventTask(ProfiledEventTask):
         transaction.on_commit(
             lambda: super(TransactionAwareProfiledEventTask, self).apply_async(*args, **kwargs)
         )
+
+
+def count_inline_path(task, path):
+    if settings.METRICS_ENABLED:
+        pretix_task_inline_total.inc(1, task_name=task.name, path=path)
+
+
+def apply_inline(task, args=None, kwargs=None, key=None):
+    """
+    Executes ``task`` within the current process instead of sending it to the celery workers, which saves the
+    round trip through the broker and the result polling for short operations a user is waiting for. Locks are
+    only waited for ``INLINE_TASKS_LOCK_TIMEOUT`` seconds.
+
+    Returns an ``EagerResult`` or ``None`` if the task needs to be sent to the workers instead. This is the case if
+    it ran into a lock held by someone else, or if an execution of the same task with the same ``key`` (e.g. for
+    the same event) ran into a lock or took longer than ``INLINE_TASKS_BUDGET`` within the last
+    ``INLINE_TASKS_BACKOFF`` seconds.
+    """
+    backoff_key = 'pretix_inline_backoff:{}:{}'.format(task.name, key)
+    if cache.get(backoff_key):
+        count_inline_path(task, "celery-backoff")
+        return None
+
+    inline_token = inline_execution_var.set(True)
+    lock_token = lock_acquisition_timeout_var.set(settings.INLINE_TASKS_LOCK_TIMEOUT)
+    t0 = time.perf_counter()
+    try:
+        res = task.apply(args=args, kwargs=kwargs, throw=False)
+    finally:
+        lock_acquisition_timeout_var.reset(lock_token)
+        inline_execution_var.reset(inline_token)
+    duration = time.perf_counter() - t0
+
+    if isinstance(res.info, InlineExecutionAborted):
+        cache.set(backoff_key, True, settings.INLINE_TASKS_BACKOFF)
+        count_inline_path(task, "celery-contention")
+        return None
+    if duration > settings.INLINE_TASKS_BUDGET:
+        cache.set(backoff_key, True, settings.INLINE_TASKS_BACKOFF)
+        count_inline_path(task, "inline-slow")
+    else:
+        count_inline_path(task, "inline")
+    return res
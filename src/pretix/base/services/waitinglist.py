@@ -36,6 +36,7 @@ from pretix.base.models import (
 )
 from pretix.base.models.waitinglist import WaitingListException
 from pretix.base.services.locking import lock_objects
+from pretix.base.services.seating import SeatAvailability
 from pretix.base.services.tasks import EventTask
 from pretix.base.signals import periodic_task
 from pretix.celery_app import app
@@ -61,7 +62,7 @@ def assign_automatically(event: Event, user_id: int=None, subevent_id: int=None)
         # See comment in WaitingListEntry.send_voucher() for rationale
         subevent_id = subevent.pk if subevent else None
         if (item.pk, subevent_id) not in _seats_available_cache:
-            num_free_seats_for_product = (subevent or event).free_seats().filter(product_id=item.pk).count()
+            num_free_seats_for_product = SeatAvailability.get(event, subevent).count_free(product_id=item.pk)
             num_valid_vouchers_for_product = event.vouchers.filter(
                 Q(valid_until__isnull=True) | Q(valid_until__gte=now()),
                 block_quota=True,
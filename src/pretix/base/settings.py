@@ -35,15 +35,18 @@
 
 import json
 import operator
+import threading
+import time
 from collections import OrderedDict, UserList
-from datetime import datetime
+from datetime import date, datetime
 from decimal import Decimal
 from typing import Any
 
 import pycountry
 from django import forms
 from django.conf import settings
-from django.core.exceptions import ValidationError
+from django.core.cache import cache
+from django.core.exceptions import ObjectDoesNotExist, ValidationError
 from django.core.files import File
 from django.core.validators import (
     MaxValueValidator, MinValueValidator, RegexValidator,
@@ -56,6 +59,7 @@ from django.utils.translation import (
 )
 from django_countries.fields import Country
 from hierarkey.models import GlobalSettingsBase, Hierarkey
+from hierarkey.proxy import HierarkeyProxy
 from i18nfield.forms import I18nFormField, I18nTextarea, I18nTextInput
 from i18nfield.rest_framework import I18nField
 from i18nfield.strings import LazyI18nString
@@ -911,6 +915,36 @@ DEFAULTS = {
             help_text=_("The number of minutes the items in a user's cart are reserved for this user."),
         )
     },
+    'waiting_room_enabled': {
+        'default': 'False',
+        'type': bool,
+        'serializer_class': serializers.BooleanField,
+        'form_class': forms.BooleanField,
+        'form_kwargs': dict(
+            label=_("Enable waiting room"),
+            help_text=_("Visitors of the ticket shop will be placed in a queue and let in at a limited rate, so that "
+                        "the system only needs to handle as many buyers at once as it can process. Use this only "
+                        "during high-demand sales. Visitors who are already managing their existing orders are not "
+                        "affected."),
+        )
+    },
+    'waiting_room_rate': {
+        'default': None,
+        'type': int,
+        'serializer_class': serializers.IntegerField,
+        'form_class': forms.IntegerField,
+        'serializer_kwargs': dict(
+            min_value=1,
+        ),
+        'form_kwargs': dict(
+            label=_("Waiting room admissions per minute"),
+            help_text=_("If you keep this option empty, the rate will be derived from the number of orders that have "
+                        "been placed in the last minutes."),
+            min_value=1,
+            required=False,
+            widget=forms.NumberInput(),
+        )
+    },
     'redirect_to_checkout_directly': {
         'default': 'False',
         'type': bool,
@@ -3463,6 +3497,10 @@ Your {organizer} team"""))  # noqa: W291
         'default': '{}',
         'type': dict
     },
+    'order_import_progress': {
+        'default': '{}',
+        'type': dict
+    },
     'organizer_info_text': {
         'default': '',
         'type': LazyI18nString,
@@ -3522,6 +3560,10 @@ Your {organizer} team"""))  # noqa: W291
         'default': None,
         'type': str
     },
+    'sales_rollup_watermark': {
+        'default': None,
+        'type': datetime
+    },
     'banner_message': {
         'default': '',
         'type': LazyI18nString
@@ -4059,7 +4101,174 @@ COUNTRY_STATE_LABEL = {
 # Workaround for https://github.com/pretix/pretix/issues/5796
 pycountry_add(pycountry.subdivisions, code="IT-AO", country_code="IT", name="Valle d'Aosta", parent="23", parent_code="IT-23", type="Province")
 
-settings_hierarkey = Hierarkey(attribute_name='settings')
+SETTINGS_L1_SIZE = 2000
+SETTINGS_VERSION_TIMEOUT = 3600 * 24
+
+
+def _copy_i18n(s):
+    return LazyI18nString(dict(s.data) if isinstance(s.data, dict) else s.data)
+
+
+# Types whose unserialized values are memoized by SettingsProxy, with a function to copy a memoized value if it
+# is mutable
+UNSERIALIZE_MEMO_TYPES = {
+    date: None,
+    datetime: None,
+    Decimal: None,
+    LazyI18nString: _copy_i18n,
+    LazyI18nStringList: lambda lst: LazyI18nStringList([_copy_i18n(s) for s in lst]),
+    RelativeDateWrapper: lambda rdw: RelativeDateWrapper(rdw.data),
+}
+
+
+class SettingsProxy(HierarkeyProxy):
+    """
+    Settings storage with a process-local cache in front of the shared cache used by hierarkey.
+
+    Every object has a version number in the shared cache that is incremented whenever its settings are changed.
+    As long as the version did not change, the settings dictionary is taken from the local cache, which saves
+    transferring and unpickling the full dictionary on every request. Unserialized values of expensive types
+    are memoized by their serialized value.
+    """
+    _l1 = OrderedDict()
+    _l1_lock = threading.Lock()
+    _l1_shared = False
+    _unserialize_memo = {}
+
+    @classmethod
+    def _new(cls, obj, hierarkey, cache_namespace, parent=None, type=None):
+        o = cls()
+        o._obj = obj
+        o._h = hierarkey
+        o._cache_namespace = cache_namespace
+        o._parent = parent
+        o._cached_obj = None
+        o._type = type
+        return o
+
+    @property
+    def _version_key(self):
+        return 'hierarkey_version_{}_{}'.format(self._cache_namespace, self._obj.pk)
+
+    def _cache(self):
+        if self._cached_obj is not None:
+            return self._cached_obj
+        if self._cache_key not in self._get_dirty_cache_queue():
+            version = cache.get(self._version_key)
+            if version is None:
+                # Use add() so we never overwrite a version a concurrent write has just set
+                cache.add(self._version_key, int(time.time() * 1000), timeout=SETTINGS_VERSION_TIMEOUT)
+                version = cache.get(self._version_key)
+            entry = self._l1.get(self._cache_key)
+            if version is not None and entry is not None and entry[0] == version:
+                self._cached_obj = entry[1]
+                self._l1_shared = True
+            elif version is not None:
+                values = super()._cache()
+                with self._l1_lock:
+                    self._l1[self._cache_key] = (version, values)
+                    self._l1.move_to_end(self._cache_key)
+                    while len(self._l1) > SETTINGS_L1_SIZE:
+                        self._l1.popitem(last=False)
+                self._l1_shared = True
+        return super()._cache()
+
+    def _bump_version(self):
+        self._l1.pop(self._cache_key, None)
+        try:
+            cache.incr(self._version_key)
+        except ValueError:
+            cache.set(self._version_key, int(time.time() * 1000), timeout=SETTINGS_VERSION_TIMEOUT)
+
+    def _detach(self):
+        # The dictionary in the local cache is shared with other instances and threads and must not be changed
+        if self._l1_shared:
+            self._cached_obj = dict(self._cached_obj)
+            self._l1_shared = False
+
+    def _invalidate_cache_after_transaction(self):
+        super()._invalidate_cache_after_transaction()
+        self._bump_version()
+
+    def flush(self) -> None:
+        super().flush()
+        self._l1_shared = False
+        self._bump_version()
+
+    def set(self, key: str, value: Any) -> None:
+        self._detach()
+        super().set(key, value)
+
+    def delete(self, key: str) -> None:
+        self._detach()
+        super().delete(key)
+
+    def _unserialize(self, value: str, as_type: type, binary_file=False) -> Any:
+        if as_type not in UNSERIALIZE_MEMO_TYPES or not isinstance(value, str):
+            return super()._unserialize(value, as_type, binary_file=binary_file)
+        try:
+            result = self._unserialize_memo[as_type, value]
+        except KeyError:
+            result = super()._unserialize(value, as_type, binary_file=binary_file)
+            if len(self._unserialize_memo) >= SETTINGS_L1_SIZE:
+                self._unserialize_memo.clear()
+            self._unserialize_memo[as_type, value] = result
+        copy = UNSERIALIZE_MEMO_TYPES[as_type]
+        # hierarkey returns booleans for the strings "True" and "False", whatever type is requested
+        return copy(result) if copy and isinstance(result, as_type) else result
+
+
+class SettingsHierarkey(Hierarkey):
+    """
+    Attaches a :py:class:`SettingsProxy` instead of a plain ``HierarkeyProxy`` to the models.
+    """
+
+    def _attach_proxy(self, model, kv_model, cache_namespace, parent_field=None):
+        hierarkey = self
+        attrname = '_hierarkey_proxy_{}_{}'.format(cache_namespace, self.attribute_name)
+
+        def prop(iself):
+            cached = getattr(iself, attrname, None)
+            if not cached:
+                try:
+                    parent = getattr(iself, parent_field) if parent_field else None
+                except ObjectDoesNotExist:  # pragma: no cover
+                    parent = None
+                if not parent and hierarkey.global_class and not isinstance(iself, hierarkey.global_class):
+                    parent = hierarkey.global_class()
+                cached = SettingsProxy._new(iself, type=kv_model, hierarkey=hierarkey, parent=parent,
+                                            cache_namespace=cache_namespace)
+                setattr(iself, attrname, cached)
+            return cached
+
+        setattr(model, self.attribute_name, property(prop))
+
+    def set_global(self, cache_namespace: str = None) -> type:
+        decorator = super().set_global(cache_namespace=cache_namespace)
+
+        def wrapper(wrapped_class):
+            wrapped_class = decorator(wrapped_class)
+            kv_model = getattr(wrapped_class, '_%s_objects' % self.attribute_name).model
+            self._attach_proxy(wrapped_class, kv_model,
+                               cache_namespace or ('%s_%s' % (wrapped_class.__name__, self.attribute_name)))
+            return wrapped_class
+
+        return wrapper
+
+    def add(self, cache_namespace: str = None, parent_field: str = None) -> type:
+        decorator = super().add(cache_namespace=cache_namespace, parent_field=parent_field)
+
+        def wrapper(model):
+            model = decorator(model)
+            kv_model = getattr(model, '_%s_objects' % self.attribute_name).rel.related_model
+            self._attach_proxy(model, kv_model, cache_namespace or ('%s_%s' % (model.__name__, self.attribute_name)),
+                               parent_field=parent_field)
+            return model
+
+        return wrapper
+
+
+settings_hierarkey = SettingsHierarkey(attribute_name='settings')
 
 for k, v in DEFAULTS.items():
     settings_hierarkey.add_default(k, v['default'], v['type'])
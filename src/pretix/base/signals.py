@@ -34,13 +34,14 @@
 
 import logging
 import warnings
+import weakref
 from typing import Any, Callable, Generic, List, Tuple, TypeVar
 
 import django.dispatch
 from django.apps import apps
 from django.conf import settings
 from django.core.exceptions import ImproperlyConfigured
-from django.dispatch.dispatcher import NO_RECEIVERS
+from django.dispatch.dispatcher import NO_RECEIVERS, NONE_ID
 
 from .models.event import Event
 from .models.organizer import Organizer
@@ -141,11 +142,130 @@ def is_receiver_active(sender, receiver, allow_legacy_plugins=False):
     return is_app_active(sender, app, allow_legacy_plugins)
 
 
+def _receiver_sort_key(receiver):
+    def _getattr_fallback_to_class(obj, key):
+        return getattr(obj, key, getattr(obj.__class__, key))
+
+    module = _getattr_fallback_to_class(receiver, "__module__")
+    return (
+        0 if any(module.startswith(c) for c in settings.CORE_MODULES) else 1,
+        module,
+        _getattr_fallback_to_class(receiver, "__name__"),
+    )
+
+
+# Upper bound for the number of distinct plugin configurations we keep dispatch lists for, per signal
+DISPATCH_LIST_CACHE_SIZE = 1000
+
+
 class PluginSignal(Generic[T], django.dispatch.Signal):
+    """
+    Base class for signals that are only sent to receivers of plugins active for the sender.
+
+    Finding out which app defines a receiver and whether it is active is not cheap, and some signals are sent many
+    times per request. Therefore, we keep a dispatch table of all receivers in their final order together with the app
+    they belong to, which is rebuilt whenever receivers are connected, disconnected or garbage collected. For every
+    distinct set of active plugins, we then remember which receivers of the table need to be called. The table only
+    holds the same (weak) references as Django does, so it does not keep receivers alive.
+    """
     type = None
 
-    def _is_receiver_active(self, sender, receiver):
-        return is_receiver_active(sender, receiver)
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        self._reset_dispatch_table()
+
+    def _reset_dispatch_table(self):
+        self._dispatch_table = None
+        self._dispatch_lists = {}
+        self._dispatch_needs_organizer = False
+
+    def connect(self, receiver, sender=None, weak=True, dispatch_uid=None):
+        try:
+            return super().connect(receiver, sender, weak, dispatch_uid)
+        finally:
+            self._reset_dispatch_table()
+
+    def disconnect(self, receiver=None, sender=None, dispatch_uid=None):
+        try:
+            return super().disconnect(receiver, sender, dispatch_uid)
+        finally:
+            self._reset_dispatch_table()
+
+    def _remove_receiver(self, receiver=None):
+        super()._remove_receiver(receiver)
+        self._reset_dispatch_table()
+
+    def _is_app_active(self, sender, app):
+        return is_app_active(sender, app)
+
+    def _get_dispatch_table(self):
+        """
+        Returns a list of ``(reference, app)`` tuples for all receivers in the order they are called in, or ``False``
+        if there are receivers only connected for a specific sender, which we do not optimize for.
+        """
+        table = self._dispatch_table
+        if table is not None and not self._dead_receivers:
+            return table
+
+        if not app_cache:
+            _populate_app_cache()
+
+        with self.lock:
+            self._clear_dead_receivers()
+            entries = []
+            for (receiverkey, senderkey), ref, is_async in self.receivers:
+                if senderkey != NONE_ID:
+                    entries = False
+                    break
+                if is_async:
+                    logger.error('Async receivers are not supported.')
+                    raise NotImplementedError
+                receiver = ref() if isinstance(ref, weakref.ReferenceType) else ref
+                if receiver is not None:
+                    entries.append((_receiver_sort_key(receiver), ref, get_defining_app(receiver)))
+            if entries is not False:
+                entries = [(ref, app) for key, ref, app in sorted(entries, key=lambda e: e[0])]
+                # If any receiver belongs to an organizer-level plugin, the plugins of the event's organizer matter too
+                self._dispatch_needs_organizer = any(
+                    getattr(getattr(app, "PretixPluginMeta", None), "level", PLUGIN_LEVEL_EVENT) != PLUGIN_LEVEL_EVENT
+                    for ref, app in entries if app != 'CORE'
+                )
+            self._dispatch_lists = {}
+            self._dispatch_table = entries
+        return entries
+
+    def _plugin_state(self, sender):
+        """
+        Returns a hashable value that is equal for all senders with the same active plugins.
+        """
+        if sender is None:
+            return None
+        if isinstance(sender, Event) and self._dispatch_needs_organizer:
+            return Event, sender.plugins, sender.organizer.plugins
+        return type(sender), sender.plugins
+
+    def _active_receivers(self, sender):
+        table = self._get_dispatch_table()
+        if table is False:
+            return [
+                receiver for receiver in self._live_receivers(sender)[0]
+                if sender is None or self._is_app_active(sender, get_defining_app(receiver))
+            ]
+
+        state = self._plugin_state(sender)
+        refs = self._dispatch_lists.get(state)
+        if refs is None:
+            refs = [ref for ref, app in table if sender is None or self._is_app_active(sender, app)]
+            if len(self._dispatch_lists) >= DISPATCH_LIST_CACHE_SIZE:
+                self._dispatch_lists = {}
+            self._dispatch_lists[state] = refs
+
+        receivers = []
+        for ref in refs:
+            receiver = ref() if isinstance(ref, weakref.ReferenceType) else ref
+            if receiver is not None:
+                receivers.append(receiver)
+        return receivers
 
     def send(self, sender: T, **named) -> List[Tuple[Callable, Any]]:
         """
@@ -159,13 +279,9 @@ class PluginSignal(Generic[T], django.dispatch.Signal):
         if not self.receivers or self.sender_receivers_cache.get(sender) is NO_RECEIVERS:
             return responses
 
-        if not app_cache:
-            _populate_app_cache()
-
-        for receiver in self._live_receivers(sender)[0]:
-            if self._is_receiver_active(sender, receiver):
-                response = receiver(signal=self, sender=sender, **named)
-                responses.append((receiver, response))
+        for receiver in self._active_receivers(sender):
+            response = receiver(signal=self, sender=sender, **named)
+            responses.append((receiver, response))
         return responses
 
     def send_chained(self, sender: T, chain_kwarg_name, **named) -> List[Tuple[Callable, Any]]:
@@ -181,13 +297,9 @@ class PluginSignal(Generic[T], django.dispatch.Signal):
         if not self.receivers or self.sender_receivers_cache.get(sender) is NO_RECEIVERS:
             return response
 
-        if not app_cache:
-            _populate_app_cache()
-
-        for receiver in self._live_receivers(sender)[0]:
-            if self._is_receiver_active(sender, receiver):
-                named[chain_kwarg_name] = response
-                response = receiver(signal=self, sender=sender, **named)
+        for receiver in self._active_receivers(sender):
+            named[chain_kwarg_name] = response
+            response = receiver(signal=self, sender=sender, **named)
         return response
 
     def send_robust(self, sender: T, **named) -> List[Tuple[Callable, Any]]:
@@ -206,17 +318,13 @@ class PluginSignal(Generic[T], django.dispatch.Signal):
         ):
             return []
 
-        if not app_cache:
-            _populate_app_cache()
-
-        for receiver in self._live_receivers(sender)[0]:
-            if self._is_receiver_active(sender, receiver):
-                try:
-                    response = receiver(signal=self, sender=sender, **named)
-                except Exception as err:
-                    responses.append((receiver, err))
-                else:
-                    responses.append((receiver, response))
+        for receiver in self._active_receivers(sender):
+            try:
+                response = receiver(signal=self, sender=sender, **named)
+            except Exception as err:
+                responses.append((receiver, err))
+            else:
+                responses.append((receiver, response))
         return responses
 
     def asend(self, sender: T, **named):
@@ -232,22 +340,7 @@ class PluginSignal(Generic[T], django.dispatch.Signal):
             logger.error('Async receivers are not supported.')
             raise NotImplementedError
 
-        def _getattr_fallback_to_class(obj, key):
-            return getattr(obj, key, getattr(obj.__class__, key))
-
-        def _is_core_module(receiver):
-            m = _getattr_fallback_to_class(receiver, "__module__")
-            return any(m.startswith(c) for c in settings.CORE_MODULES)
-
-        sorted_list = sorted(
-            orig_list,
-            key=lambda receiver: (
-                0 if _is_core_module(receiver) else 1,
-                _getattr_fallback_to_class(receiver, "__module__"),
-                _getattr_fallback_to_class(receiver, "__name__"),
-            )
-        )
-        return sorted_list, []
+        return sorted(orig_list, key=_receiver_sort_key), []
 
 
 class EventPluginSignal(PluginSignal[Event]):
@@ -286,8 +379,8 @@ class OrganizerPluginSignal(PluginSignal[Organizer]):
         self.allow_legacy_plugins = allow_legacy_plugins
         super().__init__()
 
-    def _is_receiver_active(self, sender, receiver):
-        return is_receiver_active(sender, receiver, allow_legacy_plugins=self.allow_legacy_plugins)
+    def _is_app_active(self, sender, app):
+        return is_app_active(sender, app, allow_legacy_plugins=self.allow_legacy_plugins)
 
     def connect(self, receiver, sender=None, weak=True, dispatch_uid=None):
         app = get_defining_app(receiver)
@@ -342,22 +435,7 @@ class GlobalSignal(django.dispatch.Signal):
             logger.error('Async receivers are not supported.')
             raise NotImplementedError
 
-        def _getattr_fallback_to_class(obj, key):
-            return getattr(obj, key, getattr(obj.__class__, key))
-
-        def _is_core_module(receiver):
-            m = _getattr_fallback_to_class(receiver, "__module__")
-            return any(m.startswith(c) for c in settings.CORE_MODULES)
-
-        sorted_list = sorted(
-            orig_list,
-            key=lambda receiver: (
-                0 if _is_core_module(receiver) else 1,
-                _getattr_fallback_to_class(receiver, "__module__"),
-                _getattr_fallback_to_class(receiver, "__name__"),
-            )
-        )
-        return sorted_list, []
+        return sorted(orig_list, key=_receiver_sort_key), []
 
 
 class DeprecatedSignal(GlobalSignal):
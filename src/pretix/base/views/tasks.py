@@ -48,8 +48,11 @@ from django.views.generic import FormView
 from redis import ResponseError
 
 from pretix.base.models import CachedFile, User
-from pretix.base.services.tasks import ProfiledEventTask
+from pretix.base.services.tasks import (
+    ProfiledEventTask, apply_inline, count_inline_path,
+)
 from pretix.celery_app import app
+from pretix.helpers.database import pin_to_primary
 from pretix.helpers.http import redirect_to_url
 
 logger = logging.getLogger('pretix.base.tasks')
@@ -138,6 +141,8 @@ class AsyncMixin:
         if not RE_ASYNC_ID.match(request.GET.get('async_id')):
             raise BadRequest("Invalid async_id given")
         res = AsyncResult(request.GET.get('async_id'))
+        # The task might have changed data that the next pages need to show
+        pin_to_primary(request)
         if 'ajax' in self.request.GET:
             return JsonResponse(self._return_ajax_result(res, timeout=0.25))
         else:
@@ -194,16 +199,33 @@ class AsyncMixin:
 
 class AsyncAction(AsyncMixin):
     task = None
+    inline_task = False
+
+    def can_run_inline(self, *args, **kwargs):
+        """
+        Returns whether the task may be executed within the web process, see ``apply_inline``. Only relevant if
+        ``inline_task`` is set and inline tasks are enabled in the configuration.
+        """
+        return True
 
     def do(self, *args, **kwargs):
         if not isinstance(self.task, app.Task):
             raise TypeError('Method has no task attached')
 
-        try:
-            res = self.task.apply_async(args=args, kwargs=kwargs)
-        except ConnectionError:
-            # Task very likely not yet sent, due to redis restarting etc. Let's try once again
-            res = self.task.apply_async(args=args, kwargs=kwargs)
+        res = None
+        if self.inline_task and settings.HAS_CELERY and settings.INLINE_TASKS:
+            if self.can_run_inline(*args, **kwargs):
+                event = getattr(self.request, 'event', None)
+                res = apply_inline(self.task, args=args, kwargs=kwargs, key=event.pk if event else None)
+            else:
+                count_inline_path(self.task, "celery")
+
+        if res is None:
+            try:
+                res = self.task.apply_async(args=args, kwargs=kwargs)
+            except ConnectionError:
+                # Task very likely not yet sent, due to redis restarting etc. Let's try once again
+                res = self.task.apply_async(args=args, kwargs=kwargs)
 
         if 'ajax' in self.request.GET or 'ajax' in self.request.POST:
             data = self._return_ajax_result(res)
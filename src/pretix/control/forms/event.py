@@ -624,6 +624,8 @@ class EventSettingsForm(EventSettingsValidationMixin, FormPlaceholderMixin, Sett
         'waiting_list_limit_per_user',
         'max_items_per_order',
         'reservation_time',
+        'waiting_room_enabled',
+        'waiting_room_rate',
         'contact_mail',
         'contact_url',
         'show_variations_expanded',
@@ -734,6 +736,10 @@ class EventSettingsForm(EventSettingsValidationMixin, FormPlaceholderMixin, Sett
             del self.fields['event_list_available_only']
             del self.fields['event_list_filters']
             del self.fields['event_calendar_future_only']
+        if not settings.HAS_REDIS:
+            # The waiting room keeps its state in redis
+            del self.fields['waiting_room_enabled']
+            del self.fields['waiting_room_rate']
         self.fields['primary_font'].choices = [('Open Sans', 'Open Sans')] + sorted([
             (a, FontSelect.FontOption(title=a, data=v)) for a, v in get_fonts(self.event, pdf_support_required=False).items()
         ], key=lambda a: a[0])
@@ -381,6 +381,11 @@ styles. It is advisable to set a prefix for your form to avoid clashes with othe
 your form instance will automatically being set to the subevent that has just been created. During
 creation, ``copy_from`` can be a subevent that is being copied from.
 
+When many dates are created at once, ``save()`` is called once for every new subevent. If your form has a
+``save_bulk(subevents)`` method, it is called once with the list of all new subevents instead. Use this to
+write your data in bulk, e.g. assign a seating plan to all dates at once with
+``pretix.base.services.seating.apply_seating_plan``.
+
 Your forms may also have two special properties: ``template`` with a template that will be
 included to render the form, and ``title``, which will be used as a headline. Your template
 will be passed a ``form`` variable with your form.
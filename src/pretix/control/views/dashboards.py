@@ -32,37 +32,47 @@
 # distributed on an "AS IS" BASIS, WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied. See the
 # License for the specific language governing permissions and limitations under the License.
 
-from datetime import timedelta
+import time
+from datetime import datetime, timedelta, timezone
 from decimal import Decimal
 from zoneinfo import ZoneInfo
 
-from django.conf import settings
 from django.contrib.contenttypes.models import ContentType
 from django.contrib.humanize.templatetags.humanize import intcomma
-from django.db.models import (
-    Count, IntegerField, Max, Min, OuterRef, Prefetch, Q, Subquery, Sum,
-)
+from django.core.cache import cache
+from django.db.models import Count, Max, Min, Prefetch, Q, Sum
 from django.db.models.functions import Coalesce, Greatest
 from django.dispatch import receiver
 from django.http import JsonResponse
 from django.shortcuts import render
 from django.template.loader import get_template
 from django.urls import reverse
+from django.utils import translation
 from django.utils.formats import date_format
 from django.utils.html import conditional_escape, escape, format_html
 from django.utils.timezone import now
 from django.utils.translation import gettext_lazy as _, ngettext, pgettext
+from django_scopes import scopes_disabled
 
 from pretix.base.decimal import round_decimal
+from pretix.base.i18n import language
 from pretix.base.models import (
     Item, ItemCategory, ItemVariation, Order, OrderPosition, OrderRefund,
     Question, Quota, SubEvent, Voucher, WaitingListEntry,
 )
 from pretix.base.services.quotas import QuotaAvailability
+from pretix.base.services.tasks import EventTask
+from pretix.base.signals import (
+    checkin_annulled, checkin_created, order_approved, order_canceled,
+    order_changed, order_denied, order_expired, order_paid, order_placed,
+    order_reactivated,
+)
 from pretix.base.timeline import timeline_for_event
+from pretix.celery_app import app
 from pretix.control.signals import (
     event_dashboard_widgets, user_dashboard_widgets,
 )
+from pretix.helpers.database import get_read_replica
 from pretix.helpers.daterange import daterange
 
 from ...base.models.orders import CancellationRequest
@@ -72,6 +82,10 @@ from ..logdisplay import OVERVIEW_BANLIST
 
 NUM_WIDGET = '<div class="numwidget"><span class="num">{num}</span><span class="text">{text}</span></div>'
 
+# Lazy widgets are served from a snapshot that is refreshed in the background once it is older than this
+# (in seconds) or after a relevant change happened in the event.
+WIDGET_SNAPSHOT_TTL = 300
+
 
 @receiver(signal=event_dashboard_widgets)
 def base_widgets(sender, subevent=None, lazy=False, **kwargs):
@@ -173,7 +187,7 @@ def waitinglist_widgets(sender, subevent=None, lazy=False, **kwargs):
                 i.pk: i for i in sender.items.filter(id__in=[t['item'] for t in tuples]).prefetch_related(
                     Prefetch('quotas',
                              to_attr='_subevent_quotas',
-                             queryset=sender.quotas.using(settings.DATABASE_REPLICA).filter(subevent=subevent)),
+                             queryset=sender.quotas.using(get_read_replica()).filter(subevent=subevent)),
                 )
             }
             vars = {
@@ -182,7 +196,7 @@ def waitinglist_widgets(sender, subevent=None, lazy=False, **kwargs):
                 ).prefetch_related(
                     Prefetch('quotas',
                              to_attr='_subevent_quotas',
-                             queryset=sender.quotas.using(settings.DATABASE_REPLICA).filter(subevent=subevent)),
+                             queryset=sender.quotas.using(get_read_replica()).filter(subevent=subevent)),
                 )
             }
 
@@ -346,10 +360,70 @@ def welcome_wizard_widget(sender, **kwargs):
     }]
 
 
-def build_json_response(widgets):
+def build_json_response(widgets, timestamp=None):
     for widget in widgets:
         widget['content'] = conditional_escape(widget['content'])
-    return JsonResponse({'widgets': widgets})
+    data = {'widgets': widgets}
+    if timestamp:
+        data['timestamp'] = datetime.fromtimestamp(timestamp, timezone.utc).isoformat()
+    return JsonResponse(data)
+
+
+def _widget_snapshot_key(subevent):
+    return 'dashboard_widgets:{}:{}'.format(subevent.pk if subevent else 0, translation.get_language())
+
+
+def update_widget_snapshot(event, subevent=None):
+    """
+    Computes the content of all lazy dashboard widgets of an event in the currently active language and stores it
+    in the event's cache, together with the time the computation started.
+    """
+    started = time.time()
+    widgets = []
+    for r, result in event_dashboard_widgets.send(sender=event, subevent=subevent, lazy=False):
+        widgets += [
+            # Render and escape the content now, the snapshot may not contain lazy translations
+            {'lazy': w['lazy'], 'content': conditional_escape(w['content'])}
+            for w in result if w.get('lazy')
+        ]
+    snapshot = {
+        'timestamp': started,
+        'widgets': widgets,
+    }
+    event.cache.set(_widget_snapshot_key(subevent), snapshot, WIDGET_SNAPSHOT_TTL * 12)
+    return snapshot
+
+
+def widget_snapshot_is_stale(event, snapshot):
+    return (
+        snapshot['timestamp'] < time.time() - WIDGET_SNAPSHOT_TTL
+        or snapshot['timestamp'] < (event.cache.get('dashboard_widgets_changed') or 0)
+    )
+
+
+@app.task(base=EventTask)
+def refresh_widget_snapshot(event, subevent=None, locale=None):
+    try:
+        with language(locale):
+            update_widget_snapshot(event, event.subevents.get(pk=subevent) if subevent else None)
+    except SubEvent.DoesNotExist:
+        pass
+    finally:
+        cache.delete('pretix_dashboard_refresh:{}:{}:{}'.format(event.pk, subevent or 0, locale))
+
+
+def invalidate_widget_snapshots(sender, *args, **kwargs):
+    """
+    Marks all widget snapshots of the event as outdated. They are not deleted, since we rather show slightly
+    outdated numbers on the next page view than computing them synchronously.
+    """
+    sender.cache.set('dashboard_widgets_changed', time.time(), WIDGET_SNAPSHOT_TTL * 12)
+    cache.delete('pretix_dashboard_order_count:{}'.format(sender.pk))
+
+
+for sig in (order_placed, order_paid, order_canceled, order_changed, order_expired, order_reactivated,
+            order_approved, order_denied, checkin_created, checkin_annulled):
+    sig.connect(invalidate_widget_snapshots, dispatch_uid='dashboard_invalidate_widget_snapshots')
 
 
 def event_index(request, organizer, event):
@@ -402,11 +476,20 @@ def event_index_widgets_lazy(request, organizer, event):
         except SubEvent.DoesNotExist:
             pass
 
-    widgets = []
-    for r, result in event_dashboard_widgets.send(sender=request.event, subevent=subevent, lazy=False):
-        widgets.extend(result)
+    snapshot = request.event.cache.get(_widget_snapshot_key(subevent))
+    if snapshot is None:
+        snapshot = update_widget_snapshot(request.event, subevent)
+    elif widget_snapshot_is_stale(request.event, snapshot):
+        locale = translation.get_language()
+        if cache.add('pretix_dashboard_refresh:{}:{}:{}'.format(request.event.pk, subevent.pk if subevent else 0, locale),
+                     True, WIDGET_SNAPSHOT_TTL):
+            refresh_widget_snapshot.apply_async(kwargs={
+                'event': request.event.pk,
+                'subevent': subevent.pk if subevent else None,
+                'locale': locale,
+            })
 
-    return build_json_response(widgets)
+    return build_json_response(snapshot['widgets'], timestamp=snapshot['timestamp'])
 
 
 def event_index_warnings_lazy(request, organizer, event):
@@ -484,21 +567,33 @@ def event_index_log_lazy(request, organizer, event):
     )
 
 
-def annotated_event_query(request, lazy=False):
-    active_orders = Order.objects.filter(
-        event=OuterRef('pk'),
-        status__in=[Order.STATUS_PENDING, Order.STATUS_PAID]
-    ).order_by().values('event').annotate(
-        c=Count('*')
-    ).values(
-        'c'
-    )
+def event_order_counts(events):
+    """
+    Returns a dictionary mapping event IDs to the number of pending or paid orders. Counts are cached until an
+    order of the event changes, so only events with changes need to be counted again.
+    """
+    keys = {'pretix_dashboard_order_count:{}'.format(e.pk): e.pk for e in events}
+    result = {keys[k]: v for k, v in cache.get_many(keys.keys()).items()}
+    missing = [pk for pk in keys.values() if pk not in result]
+    if missing:
+        with scopes_disabled():
+            counts = dict(
+                Order.objects.filter(
+                    event_id__in=missing,
+                    status__in=[Order.STATUS_PENDING, Order.STATUS_PAID]
+                ).order_by().values('event').annotate(c=Count('*')).values_list('event', 'c')
+            )
+        for pk in missing:
+            result[pk] = counts.get(pk, 0)
+        cache.set_many(
+            {'pretix_dashboard_order_count:{}'.format(pk): result[pk] for pk in missing},
+            WIDGET_SNAPSHOT_TTL * 12
+        )
+    return result
 
+
+def annotated_event_query(request, lazy=False):
     qs = request.user.get_events_with_any_permission(request)
-    if not lazy:
-        qs = qs.annotate(
-            order_count=Subquery(active_orders, output_field=IntegerField()),
-        )
     qs = qs.annotate(
         min_from=Min('subevents__date_from'),
         max_from=Max('subevents__date_from'),
@@ -545,6 +640,7 @@ def widgets_for_event_qs(request, qs, user, nmax, lazy=False):
         events = qs.prefetch_related(
             '_settings_objects', 'organizer___settings_objects'
         ).select_related('organizer')[:nmax]
+        order_counts = event_order_counts(events)
     for event in events:
         if not lazy:
             tzname = event.cache.get_or_set('timezone', lambda: event.settings.timezone)
@@ -596,8 +692,8 @@ def widgets_for_event_qs(request, qs, user, nmax, lazy=False):
                             'event': event.slug,
                             'organizer': event.organizer.slug
                         }),
-                        orders_text=ngettext('{num} order', '{num} orders', event.order_count or 0).format(
-                            num=event.order_count or 0
+                        orders_text=ngettext('{num} order', '{num} orders', order_counts[event.pk]).format(
+                            num=order_counts[event.pk]
                         )
                     ) if user.has_active_staff_session(request.session.session_key) or event.pk in events_with_orders else ''
                 ),
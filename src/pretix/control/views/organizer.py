@@ -77,7 +77,8 @@ from django.views.generic import (
 )
 from django.views.generic.detail import SingleObjectMixin
 
-from pretix.api.models import ApiCall, WebHook
+from pretix.api.idempotency import get_idempotency_backend
+from pretix.api.models import WebHook
 from pretix.api.webhooks import manually_retry_all_calls
 from pretix.base.auth import get_auth_backends
 from pretix.base.channels import get_all_sales_channel_types
@@ -1326,10 +1327,7 @@ class DeviceUpdateView(OrganizerDetailViewMixin, OrganizerPermissionRequiredMixi
             # If the permission of the device have changed, let's clear "permission denied" errors from the idempotency store
             auth_hash_parts = f'Device {self.object.api_token}:'
             auth_hash = sha1(auth_hash_parts.encode()).hexdigest()
-            ApiCall.objects.filter(
-                auth_hash=auth_hash,
-                response_code=403,
-            ).delete()
+            get_idempotency_backend().forget_responses(auth_hash, 403)
 
         messages.success(self.request, _('Your changes have been saved.'))
         return super().form_valid(form)
@@ -19,7 +19,6 @@
 # You should have received a copy of the GNU Affero General Public License along with this program.  If not, see
 # <https://www.gnu.org/licenses/>.
 #
-from django.conf import settings
 from django.db.models import Count, Exists, IntegerField, OuterRef, Q, Subquery
 from django.utils.functional import cached_property
 from django.views.generic import ListView
@@ -30,6 +29,7 @@ from pretix.control.forms.filter import (
     OrderPaymentSearchFilterForm, OrderSearchFilterForm,
 )
 from pretix.control.views import LargeResultSetPaginator, PaginationMixin
+from pretix.helpers.database import get_read_replica
 
 
 class OrderSearch(PaginationMixin, ListView):
@@ -56,7 +56,7 @@ class OrderSearch(PaginationMixin, ListView):
         annotated = {
             o['pk']: o
             for o in
-            Order.annotate_overpayments(Order.objects).using(settings.DATABASE_REPLICA).filter(
+            Order.annotate_overpayments(Order.objects).using(get_read_replica()).filter(
                 pk__in=[o.pk for o in ctx['orders']]
             ).annotate(
                 pcnt=Subquery(s, output_field=IntegerField()),
@@ -81,7 +81,7 @@ class OrderSearch(PaginationMixin, ListView):
         return ctx
 
     def get_queryset(self):
-        qs = Order.objects.using(settings.DATABASE_REPLICA)
+        qs = Order.objects.using(get_read_replica())
 
         if not self.request.user.has_active_staff_session(self.request.session.session_key):
             qs = qs.filter(
@@ -119,7 +119,7 @@ class OrderSearch(PaginationMixin, ListView):
                 """
                 resultids = list(qs.order_by().values_list('id', flat=True)[:201])
                 if len(resultids) <= 200:
-                    qs = Order.objects.using(settings.DATABASE_REPLICA).filter(
+                    qs = Order.objects.using(get_read_replica()).filter(
                         id__in=resultids
                     )
 
@@ -155,7 +155,7 @@ class PaymentSearch(PaginationMixin, ListView):
         return ctx
 
     def get_queryset(self):
-        qs = OrderPayment.objects.using(settings.DATABASE_REPLICA)
+        qs = OrderPayment.objects.using(get_read_replica())
 
         if not self.request.user.has_active_staff_session(self.request.session.session_key):
             qs = qs.filter(
@@ -194,7 +194,7 @@ class PaymentSearch(PaginationMixin, ListView):
                     offset = 0
                 resultids = list(qs.order_by().values_list('id', flat=True)[:201])
                 if len(resultids) <= 200 and len(resultids) <= offset + limit:
-                    qs = OrderPayment.objects.using(settings.DATABASE_REPLICA).filter(
+                    qs = OrderPayment.objects.using(get_read_replica()).filter(
                         id__in=resultids
                     )
 
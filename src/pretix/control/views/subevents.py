@@ -1164,6 +1164,9 @@ class SubEventBulkCreate(SubEventEditorMixin, EventPermissionRequiredMixin, Asyn
 
         for f in self.plugin_forms:
             f.is_valid()
+            if hasattr(f, 'save_bulk'):
+                f.save_bulk(subevents)
+                continue
             for se in subevents:
                 f.subevent = se
                 f.save()
@@ -69,6 +69,7 @@ from pretix.base.models.vouchers import generate_codes
 from pretix.base.permissions import AnyPermissionOf
 from pretix.base.services.mail import prefix_subject
 from pretix.base.services.placeholders import get_sample_context
+from pretix.base.services.seating import invalidate_seat_availability
 from pretix.base.services.vouchers import vouchers_send
 from pretix.base.templatetags.rich_text import markdown_compile_email
 from pretix.base.views.tasks import AsyncFormView
@@ -241,6 +242,7 @@ class VoucherDeleteCarts(EventPermissionRequiredMixin, CompatDeleteView):
         self.object.log_action('pretix.voucher.carts.deleted', user=self.request.user)
         CartPosition.objects.filter(addon_to__voucher=self.object).delete()
         self.object.cartposition_set.all().delete()
+        invalidate_seat_availability(self.request.event.pk)
         messages.success(request, _('The selected cart positions have been removed.'))
         return HttpResponseRedirect(success_url)
 
@@ -283,6 +285,7 @@ class VoucherDelete(EventPermissionRequiredMixin, CompatDeleteView):
             CartPosition.objects.filter(addon_to__voucher=self.object).delete()
             self.object.cartposition_set.all().delete()
             self.object.delete()
+            invalidate_seat_availability(self.request.event.pk)
             messages.success(request, _('The selected voucher has been deleted.'))
         return HttpResponseRedirect(success_url)
 
@@ -666,6 +669,7 @@ class VoucherBulkAction(VoucherQueryMixin, EventPermissionRequiredMixin, View):
                 CartPosition.objects.filter(addon_to__voucher_id__in=to_delete).delete()
                 CartPosition.objects.filter(voucher_id__in=to_delete).delete()
                 Voucher.objects.filter(pk__in=to_delete).delete()
+                invalidate_seat_availability(self.request.event.pk)
             if to_update:
                 Voucher.objects.bulk_update(to_update, ['max_usages'])
 
@@ -51,6 +51,7 @@ from django.views.generic import ListView
 
 from pretix.base.models import Item, LogEntry, Quota, WaitingListEntry
 from pretix.base.models.waitinglist import WaitingListException
+from pretix.base.services.seating import SeatAvailability
 from pretix.base.services.waitinglist import assign_automatically
 from pretix.base.views.tasks import AsyncAction
 from pretix.control.forms.waitinglist import WaitingListEntryEditForm
@@ -274,7 +275,9 @@ class WaitingListView(EventPermissionRequiredMixin, WaitingListQuerySetMixin, Pa
                     )
                 if wle.availability[0] == Quota.AVAILABILITY_OK and ev.seat_category_mappings.filter(product=wle.item).exists():
                     # See comment in WaitingListEntry.send_voucher() for rationale
-                    num_free_seats_for_product = ev.free_seats().filter(product=wle.item).count()
+                    num_free_seats_for_product = SeatAvailability.get(
+                        self.request.event, wle.subevent
+                    ).count_free(product_id=wle.item_id)
                     num_valid_vouchers_for_product = self.request.event.vouchers.filter(
                         Q(valid_until__isnull=True) | Q(valid_until__gte=now()),
                         block_quota=True,
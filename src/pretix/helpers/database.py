@@ -20,16 +20,32 @@
 # <https://www.gnu.org/licenses/>.
 #
 import contextlib
+import logging
+import random
+import time
+from contextvars import ContextVar
 
 from django.conf import settings
 from django.contrib.postgres.indexes import BrinIndex
 from django.core.exceptions import FieldDoesNotExist, ImproperlyConfigured
-from django.db import connection, transaction
+from django.db import (
+    DEFAULT_DB_ALIAS, DatabaseError, connection, connections, transaction,
+)
 from django.db.models import (
     Aggregate, Expression, F, Field, JSONField, Lookup, OrderBy, Value,
 )
 from django.utils.functional import lazy
 
+from pretix.helpers.cookies import set_cookie_without_samesite
+
+logger = logging.getLogger(__name__)
+
+REPLICA_PIN_COOKIE = 'pretix_db_pin'
+_replica_scope = ContextVar('pretix_replica_scope', default=None)
+_primary_pinned = ContextVar('pretix_primary_pinned', default=False)
+_replica_health = {}
+_replica_order = None
+
 
 class DummyRollbackException(Exception):
     pass
@@ -65,7 +81,7 @@ def casual_reads():
 
 
 @contextlib.contextmanager
-def repeatable_reads_transaction():
+def repeatable_reads_transaction(using=DEFAULT_DB_ALIAS):
     """
     pretix, and Django, operate in the transaction isolation level READ COMMITTED by default. This is not a strong level
     of isolation, but we NEED to use it: Otherwise e.g. our quota logic breaks, because we need to be able to get the
@@ -77,20 +93,22 @@ def repeatable_reads_transaction():
     queries in READ COMMITTED mode, the results might be different for each query, causing numbers to be inconsistent
     with each other.
 
-    This context manager creates a transaction that is running in REPEATABLE READ mode to avoid this problem.
+    This context manager creates a transaction that is running in REPEATABLE READ mode on the database ``using`` to
+    avoid this problem.
 
     **You should only make read-only queries during this transaction and not rely on quota calculations.**
     """
     is_under_test = 'tests.testdummy' in settings.INSTALLED_APPS
+    connection = connections[using]
     try:
-        with transaction.atomic(durable=not is_under_test):
+        with transaction.atomic(using=using, durable=not is_under_test):
             if not is_under_test:
                 # We're not running this in tests, where we can basically not use this since the test runner does its
                 # own transaction logic for efficiency
                 with connection.cursor() as cursor:
-                    if 'postgresql' in settings.DATABASES['default']['ENGINE']:
+                    if connection.vendor == 'postgresql':
                         cursor.execute('SET TRANSACTION ISOLATION LEVEL REPEATABLE READ;')
-                    elif 'sqlite' in settings.DATABASES['default']['ENGINE']:
+                    elif connection.vendor == 'sqlite':
                         pass  # noop
                     else:
                         raise ImproperlyConfigured("Cannot set transaction isolation mode on this database backend")
@@ -131,16 +149,130 @@ class GroupConcat(Aggregate):
         return template, params
 
 
+def replication_lag(alias):
+    """
+    Returns the number of seconds the database ``alias`` is lagging behind the primary database.
+    """
+    conn = connections[alias]
+    if conn.vendor != 'postgresql':
+        return 0
+    with conn.cursor() as cursor:
+        # If all received changes are applied, the replica is up to date even if the last change is long ago.
+        # On a server that is not a replica, all of these functions return NULL.
+        cursor.execute(
+            "SELECT CASE WHEN pg_last_wal_receive_lsn() = pg_last_wal_replay_lsn() THEN 0 "
+            "ELSE COALESCE(EXTRACT(EPOCH FROM now() - pg_last_xact_replay_timestamp()), 0) END"
+        )
+        return float(cursor.fetchone()[0])
+
+
+def _replica_usable(alias):
+    checked_at, usable = _replica_health.get(alias, (None, False))
+    if checked_at is not None and time.monotonic() - checked_at < settings.DATABASE_REPLICA_CHECK_INTERVAL:
+        return usable
+    try:
+        lag = replication_lag(alias)
+    except DatabaseError:
+        logger.warning('Could not determine the replication lag of database %s', alias, exc_info=True)
+        usable = False
+    else:
+        usable = lag <= settings.DATABASE_REPLICA_MAX_LAG
+        if not usable:
+            logger.warning('Database %s is lagging behind by %.1f seconds and is not used', alias, lag)
+    _replica_health[alias] = (time.monotonic(), usable)
+    return usable
+
+
+def get_read_replica():
+    """
+    Returns the alias of the database to use for queries that can tolerate data that is a few seconds old. This
+    is a replica that is reachable and not lagging behind by more than ``DATABASE_REPLICA_MAX_LAG`` seconds, or
+    the primary database if there is none, if we are inside a transaction, or if the current browser has recently
+    changed data (see :py:class:`ReplicaPinningMiddleware`).
+    """
+    global _replica_order
+
+    if connections['default'].in_atomic_block or _primary_pinned.get() or not settings.DATABASE_REPLICAS:
+        return 'default'
+    scoped = _replica_scope.get()
+    if scoped:
+        return scoped
+    if _replica_order is None:
+        # Every process prefers a different replica to spread the load, but keeps reading from the same one as
+        # long as it is usable, to get consistent results
+        _replica_order = random.sample(settings.DATABASE_REPLICAS, len(settings.DATABASE_REPLICAS))
+    for alias in _replica_order:
+        if _replica_usable(alias):
+            return alias
+    return 'default'
+
+
+@contextlib.contextmanager
+def replica_reads():
+    """
+    Routes all reads within this block that do not explicitly choose a database to the replica returned by
+    :py:func:`get_read_replica`, which is also returned by the context manager. Use this for code that only reads
+    and can tolerate slightly outdated data, such as exports and statistics. Writes and reads inside transactions
+    on the primary database are not affected.
+    """
+    alias = get_read_replica()
+    token = _replica_scope.set(alias if alias != 'default' else None)
+    try:
+        yield alias
+    finally:
+        _replica_scope.reset(token)
+
+
+def pin_to_primary(request):
+    """
+    Makes :py:class:`ReplicaPinningMiddleware` pin the browser to the primary database after this request, even
+    though it is a safe request. Use this when the response reports that data has been changed elsewhere, e.g. when
+    the result of an asynchronous task is polled.
+    """
+    request._replica_pin = True
+
+
+class ReplicaPinningMiddleware:
+    """
+    After a browser sent a request that might have changed something, all its requests in the next
+    ``DATABASE_REPLICA_PIN_SECONDS`` only read from the primary database, so e.g. customers always see the order
+    they just placed.
+
+    Changes made by background tasks can finish long after the request that started them. Views that report the
+    result of such a task need to call :py:func:`pin_to_primary` to renew the pin.
+    """
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+
+    def __call__(self, request):
+        token = _primary_pinned.set(REPLICA_PIN_COOKIE in request.COOKIES)
+        try:
+            response = self.get_response(request)
+        finally:
+            _primary_pinned.reset(token)
+        if request.method not in ('GET', 'HEAD', 'OPTIONS', 'TRACE') or getattr(request, '_replica_pin', False):
+            set_cookie_without_samesite(
+                request, response, REPLICA_PIN_COOKIE, '1',
+                max_age=settings.DATABASE_REPLICA_PIN_SECONDS, httponly=True,
+                secure=request.scheme == 'https',
+            )
+        return response
+
+
 class ReplicaRouter:
 
     def db_for_read(self, model, **hints):
+        alias = _replica_scope.get()
+        if alias and not connections['default'].in_atomic_block:
+            return alias
         return 'default'
 
     def db_for_write(self, model, **hints):
         return 'default'
 
     def allow_relation(self, obj1, obj2, **hints):
-        db_list = ('default', 'replica')
+        db_list = ('default', *settings.DATABASE_REPLICAS)
         if obj1._state.db in db_list and obj2._state.db in db_list:
             return True
         return None
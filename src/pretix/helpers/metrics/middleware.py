@@ -37,6 +37,7 @@ import time
 from django.urls import resolve
 
 from pretix.base.metrics import pretix_view_duration_seconds
+from pretix.helpers.metrics.queries import QueryStats
 
 
 class MetricsMiddleware(object):
@@ -60,10 +61,13 @@ class MetricsMiddleware(object):
         url = resolve(request.path_info)
 
         t0 = time.perf_counter()
-        resp = self.get_response(request)
+        with QueryStats() as queries:
+            resp = self.get_response(request)
         tdiff = time.perf_counter() - t0
         if url.url_name:
+            url_name = url.namespace + ':' + url.url_name
             pretix_view_duration_seconds.observe(tdiff, status_code=resp.status_code, method=request.method,
-                                                 url_name=url.namespace + ':' + url.url_name)
+                                                 url_name=url_name)
+            queries.report(name=url_name)
 
         return resp
@@ -0,0 +1,117 @@
+#
+# This file is part of pretix (Community Edition).
+#
+# Copyright (C) 2014-2020  Raphael Michel and contributors
+# Copyright (C) 2020-today pretix GmbH and contributors
+#
+# This program is free software: you can redistribute it and/or modify it under the terms of the GNU Affero General
+# Public License as published by the Free Software Foundation in version 3 of the License.
+#
+# ADDITIONAL TERMS APPLY: Pursuant to Section 7 of the GNU Affero General Public License, additional terms are
+# applicable granting you additional permissions and placing additional restrictions on your usage of this software.
+# Please refer to the pretix LICENSE file to obtain the full terms applicable to this work. If you did not receive
+# this file, see <https://pretix.eu/about/en/license>.
+#
+# This program is distributed in the hope that it will be useful, but WITHOUT ANY WARRANTY; without even the implied
+# warranty of MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the GNU Affero General Public License for more
+# details.
+#
+# You should have received a copy of the GNU Affero General Public License along with this program.  If not, see
+# <https://www.gnu.org/licenses/>.
+#
+import logging
+import random
+import re
+import time
+import traceback
+from collections import Counter
+from contextlib import ExitStack
+
+from django.conf import settings
+from django.db import connections
+
+from pretix.base.metrics import (
+    pretix_query_count, pretix_query_duplicates, pretix_query_duration_seconds,
+)
+
+logger = logging.getLogger(__name__)
+
+_placeholder_list = re.compile(r"\((?:\s*%s\s*,)*\s*%s\s*\)")
+_numbers = re.compile(r"\b\d+\b")
+
+
+def fingerprint(sql):
+    """
+    Normalizes a SQL statement such that queries that only differ in their parameters (including the
+    length of ``IN (…)`` lists) have the same fingerprint.
+    """
+    sql = _placeholder_list.sub("(%s, …)", sql)
+    return _numbers.sub("?", sql)
+
+
+class QueryStats:
+    """
+    Context manager that records the number and total duration of all database queries executed in the
+    current thread, as well as how often each query fingerprint was executed. This is cheap enough to run
+    on every request, it does not rely on ``DEBUG`` query logging.
+    """
+
+    def __init__(self, duplicate_threshold=None):
+        self.count = 0
+        self.duration = 0.0
+        self.fingerprints = Counter()
+        self.stacks = {}
+        self.duplicate_threshold = duplicate_threshold or settings.METRICS_QUERY_DUPLICATE_THRESHOLD
+        self._stack = None
+
+    def __call__(self, execute, sql, params, many, context):
+        fp = fingerprint(sql)
+        self.fingerprints[fp] += 1
+        if self.fingerprints[fp] == self.duplicate_threshold:
+            # Only keep the stack of one execution of a repeated query, capturing it every time would be expensive
+            self.stacks[fp] = "".join(traceback.format_stack(limit=30)[:-1])
+        t0 = time.perf_counter()
+        try:
+            return execute(sql, params, many, context)
+        finally:
+            self.count += 1
+            self.duration += time.perf_counter() - t0
+
+    def __enter__(self):
+        self._stack = ExitStack()
+        for conn in connections.all():
+            self._stack.enter_context(conn.execute_wrapper(self))
+        return self
+
+    def __exit__(self, exc_type, exc_val, exc_tb):
+        self._stack.close()
+
+    @property
+    def max_duplicates(self):
+        if not self.fingerprints:
+            return 0
+        return self.fingerprints.most_common(1)[0][1]
+
+    def report(self, **labels):
+        """
+        Exports the recorded values as metrics and logs a sample of the requests or tasks that exceeded the query
+        budget or executed the same query many times.
+        """
+        pretix_query_count.observe(self.count, **labels)
+        pretix_query_duration_seconds.observe(self.duration, **labels)
+        pretix_query_duplicates.observe(self.max_duplicates, **labels)
+
+        over_budget = self.count > settings.METRICS_QUERY_BUDGET
+        if (over_budget or self.stacks) and random.random() < settings.METRICS_QUERY_LOG_RATE / 100:
+            name = ", ".join("{}={}".format(k, v) for k, v in labels.items())
+            if self.stacks:
+                fp, stack = max(self.stacks.items(), key=lambda i: self.fingerprints[i[0]])
+                logger.warning(
+                    "%s executed %d queries in %.3fs, %d times the same query: %s\n%s",
+                    name, self.count, self.duration, self.fingerprints[fp], fp, stack
+                )
+            else:
+                logger.warning(
+                    "%s executed %d queries in %.3fs, exceeding the budget of %d queries",
+                    name, self.count, self.duration, settings.METRICS_QUERY_BUDGET
+                )
@@ -20,9 +20,11 @@
 # <https://www.gnu.org/licenses/>.
 #
 import logging
+import random
 import uuid
 from functools import wraps
 
+from django.conf import settings
 from django.core.cache import cache
 
 logger = logging.getLogger(__name__)
@@ -30,55 +32,89 @@ logger = logging.getLogger(__name__)
 SKIPPED = object()
 
 
-def minimum_interval(minutes_after_success, minutes_after_error=0, minutes_running_timeout=30):
+def _acquire_lock(name, timeout):
+    """
+    Acquires the lock ``name`` if nobody else holds it. ``cache.add`` is atomic in all cache backends we support, so
+    at most one caller can succeed. Every acquisition gets a random token, which allows detecting that a lock has
+    expired and been taken over while we were still running. Returns the token, or ``None`` if the lock is held by
+    someone else.
+    """
+    token = str(uuid.uuid4())
+    if cache.add(f'pretix_periodic_{name}_running', token, timeout=timeout):
+        return token
+
+
+def _holds_lock(name, token):
+    if not settings.REAL_CACHE_USED:
+        # Without a shared cache there is no lock that could have been taken over
+        return True
+    return cache.get(f'pretix_periodic_{name}_running') == token
+
+
+def _release_lock(name, token):
+    if _holds_lock(name, token):
+        cache.delete(f'pretix_periodic_{name}_running')
+
+
+def minimum_interval(minutes_after_success, minutes_after_error=0, minutes_running_timeout=30, jitter=0.1):
     """
     This is intended to be used as a decorator on receivers of the ``periodic_task`` signal.
     It stores the result in the task in the cache (usually redis) to ensure the receiver function
     isn't executed less than ``minutes_after_success`` after the last successful run and no less
-    than ``minutes_after_error`` after the last failed run. There's also a simple locking mechanism
-    implemented making sure the function is not called a second time while it is running, unless
-    ``minutes_running_timeout`` have passed. This locking mechanism is naive and not safe of
-    race-conditions, it should not be relied upon.
+    than ``minutes_after_error`` after the last failed run. The intervals are randomly extended by up
+    to ``jitter`` (a fraction of the interval) to spread out tasks that would otherwise always run in the
+    same cycle.
+
+    While the function is running, it holds a lock that prevents it from being called a second time, e.g.
+    by the scheduler on a different host, unless ``minutes_running_timeout`` have passed. If the lock expired
+    and has been taken over by another run, the result of the slow run is not recorded.
     """
     def deco(f):
+        name = f'{f.__module__}.{f.__name__}'
+
         @wraps(f)
         def wrapper(*args, **kwargs):
-            key_running = f'pretix_periodic_{f.__module__}.{f.__name__}_running'
-            key_result = f'pretix_periodic_{f.__module__}.{f.__name__}_result'
+            key_result = f'pretix_periodic_{name}_result'
+
+            if cache.get(key_result):
+                # Has run recently
+                return SKIPPED
 
-            running_val = cache.get(key_running)
-            if running_val:
+            token = _acquire_lock(name, timeout=minutes_running_timeout * 60)
+            if not token:
                 # Currently running
                 return SKIPPED
 
-            result_val = cache.get(key_result)
-            if result_val:
-                # Has run recently
+            if cache.get(key_result):
+                # Another run finished and released the lock after our first check
+                _release_lock(name, token)
                 return SKIPPED
 
-            uniqid = str(uuid.uuid4())
-            cache.set(key_running, uniqid, timeout=minutes_running_timeout * 60)
-            try:
-                retval = f(*args, **kwargs)
-            except Exception as e:
+            def _store_result(result, minutes):
                 try:
-                    cache.set(key_result, 'error', timeout=minutes_after_error * 60)
+                    if not _holds_lock(name, token):
+                        logger.warning(f'Periodic task {name} took longer than {minutes_running_timeout} minutes, '
+                                       f'lock has been lost')
+                    elif minutes:
+                        cache.set(key_result, result, timeout=int(minutes * 60 * random.uniform(1, 1 + jitter)))
                 except:
                     logger.exception('Could not store result')
+
+            try:
+                retval = f(*args, **kwargs)
+            except Exception as e:
+                _store_result('error', minutes_after_error)
                 raise e
             else:
-                try:
-                    cache.set(key_result, 'success', timeout=minutes_after_success * 60)
-                except:
-                    logger.exception('Could not store result')
+                _store_result('success', minutes_after_success)
                 return retval
             finally:
                 try:
-                    if cache.get(key_running) == uniqid:
-                        cache.delete(key_running)
+                    _release_lock(name, token)
                 except:
                     logger.exception('Could not release lock')
 
+        wrapper.minimum_interval = minutes_after_success
         return wrapper
 
     return deco
@@ -38,6 +38,9 @@ import random
 import time
 
 from django.conf import settings
+from django.urls import Resolver404, resolve
+
+from pretix.helpers.profile.sampling import profiler
 
 
 class CProfileMiddleware(object):
@@ -70,3 +73,29 @@ class CProfileMiddleware(object):
             return response
         else:
             return self.get_response(request)
+
+
+class SamplingProfilerMiddleware(object):
+    banlist = (
+        '/healthcheck/',
+        '/jsi18n/',
+        '/metrics',
+    )
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+
+    def __call__(self, request):
+        for b in self.banlist:
+            if b in request.path:
+                return self.get_response(request)
+
+        try:
+            url = resolve(request.path_info)
+        except Resolver404:
+            return self.get_response(request)
+        if not url.url_name:
+            return self.get_response(request)
+
+        with profiler.tag('view:' + url.namespace + ':' + url.url_name):
+            return self.get_response(request)
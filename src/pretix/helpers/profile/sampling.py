@@ -0,0 +1,254 @@
+#
+# This file is part of pretix (Community Edition).
+#
+# Copyright (C) 2014-2020  Raphael Michel and contributors
+# Copyright (C) 2020-today pretix GmbH and contributors
+#
+# This program is free software: you can redistribute it and/or modify it under the terms of the GNU Affero General
+# Public License as published by the Free Software Foundation in version 3 of the License.
+#
+# ADDITIONAL TERMS APPLY: Pursuant to Section 7 of the GNU Affero General Public License, additional terms are
+# applicable granting you additional permissions and placing additional restrictions on your usage of this software.
+# Please refer to the pretix LICENSE file to obtain the full terms applicable to this work. If you did not receive
+# this file, see <https://pretix.eu/about/en/license>.
+#
+# This program is distributed in the hope that it will be useful, but WITHOUT ANY WARRANTY; without even the implied
+# warranty of MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the GNU Affero General Public License for more
+# details.
+#
+# You should have received a copy of the GNU Affero General Public License along with this program.  If not, see
+# <https://www.gnu.org/licenses/>.
+#
+"""
+A statistical sampling profiler that can be left running in production.
+
+Instead of tracing every function call like cProfile, a background thread looks at the stack of every thread
+that is currently handling a request or task every few milliseconds. The stacks are stored in "collapsed"
+form (``root;caller;callee``) and counted per *tag* (the URL name or the task name) and per time window, so
+the samples of many processes can be summed up into one flame graph.
+"""
+import logging
+import os
+import sys
+import threading
+import time
+from collections import Counter, defaultdict
+from contextlib import contextmanager
+
+from django.conf import settings
+
+logger = logging.getLogger(__name__)
+
+REDIS_KEY_PREFIX = "pretix_profile_samples"
+MAX_DEPTH = 128
+
+
+def frame_name(frame):
+    code = frame.f_code
+    return "{}:{}".format(frame.f_globals.get("__name__", code.co_filename), code.co_name)
+
+
+def collapse_stack(frame):
+    """
+    Returns the stack starting at ``frame`` in collapsed form, outermost frame first.
+    """
+    names = []
+    while frame is not None and len(names) < MAX_DEPTH:
+        names.append(frame_name(frame))
+        frame = frame.f_back
+    return ";".join(reversed(names))
+
+
+def window_start(timestamp=None):
+    timestamp = time.time() if timestamp is None else timestamp
+    return int(timestamp // settings.PROFILING_SAMPLING_WINDOW * settings.PROFILING_SAMPLING_WINDOW)
+
+
+class SamplingProfiler:
+    """
+    Collects stack samples of all threads that are currently inside a ``profiler.tag(…)`` block. There is one
+    instance per process, the sampling thread is started lazily (and restarted after a fork).
+    """
+
+    def __init__(self):
+        self.active = {}
+        self.samples = defaultdict(Counter)
+        self.lock = threading.Lock()
+        self.pid = None
+        self.thread = None
+        self.last_flush = time.monotonic()
+
+    def _is_running(self):
+        return self.pid == os.getpid() and self.thread is not None and self.thread.is_alive()
+
+    def _ensure_running(self):
+        if self._is_running():
+            return
+        with self.lock:
+            if self._is_running():
+                # Another thread has started the sampling thread while we were waiting for the lock
+                return
+            if self.pid != os.getpid():
+                # We have been forked, samples of the parent will be flushed by the parent
+                self.samples = defaultdict(Counter)
+                self.active = {}
+            self.pid = os.getpid()
+            self.thread = threading.Thread(target=self._run, name="pretix-sampling-profiler", daemon=True)
+            self.thread.start()
+
+    @contextmanager
+    def tag(self, name):
+        """
+        Marks the current thread to be sampled and attributes all samples to ``name`` until the block is left.
+        """
+        try:
+            self._ensure_running()
+        except Exception:
+            # Profiling must never break the request or task that is profiled
+            logger.exception("Could not start sampling profiler")
+        ident = threading.get_ident()
+        previous = self.active.get(ident)
+        self.active[ident] = name
+        try:
+            yield
+        finally:
+            if previous is None:
+                self.active.pop(ident, None)
+            else:
+                self.active[ident] = previous
+
+    def sample(self):
+        if not self.active:
+            return
+        frames = sys._current_frames()
+        window = window_start()
+        with self.lock:
+            for ident, name in list(self.active.items()):
+                frame = frames.get(ident)
+                if frame is not None:
+                    self.samples[window, name][collapse_stack(frame)] += 1
+
+    def flush(self):
+        with self.lock:
+            samples, self.samples = self.samples, defaultdict(Counter)
+        self.last_flush = time.monotonic()
+        if samples:
+            store_samples(samples)
+
+    def _run(self):
+        while True:
+            time.sleep(settings.PROFILING_SAMPLING_INTERVAL)
+            try:
+                self.sample()
+                if time.monotonic() - self.last_flush > settings.PROFILING_SAMPLING_FLUSH_INTERVAL:
+                    self.flush()
+            except Exception:
+                logger.exception("Sampling profiler failed")
+
+
+profiler = SamplingProfiler()
+
+
+def _redis():
+    import django_redis
+    return django_redis.get_redis_connection("redis")
+
+
+def _file_name(window, name):
+    return os.path.join(settings.PROFILE_DIR, "{}_{}.collapsed".format(window, name.replace("/", "_")))
+
+
+def store_samples(samples):
+    """
+    Adds the given samples (a dictionary mapping ``(window, tag)`` to a ``Counter`` of collapsed stacks) to the
+    shared storage. This is Redis if available, otherwise files in ``PROFILE_DIR``.
+    """
+    if settings.HAS_REDIS:
+        rc = _redis()
+        pipe = rc.pipeline()
+        for (window, name), stacks in samples.items():
+            key = "{}:{}:{}".format(REDIS_KEY_PREFIX, window, name)
+            for stack, count in stacks.items():
+                pipe.hincrby(key, stack, count)
+            pipe.expire(key, settings.PROFILING_SAMPLING_RETENTION)
+        pipe.execute()
+    else:
+        for (window, name), stacks in samples.items():
+            with open(_file_name(window, name), "a") as f:
+                f.write("".join("{} {}\n".format(stack, count) for stack, count in stacks.items()))
+
+
+def load_samples(since, name=None):
+    """
+    Returns a dictionary mapping tags to a ``Counter`` of collapsed stacks for all windows starting after the
+    timestamp ``since``, optionally only for tags starting with ``name``.
+    """
+    result = defaultdict(Counter)
+
+    def _matches(window, tag):
+        return int(window) >= window_start(since) and (not name or tag.startswith(name))
+
+    if settings.HAS_REDIS:
+        rc = _redis()
+        for key in rc.scan_iter(match="{}:*".format(REDIS_KEY_PREFIX), count=1000):
+            _, window, tag = key.decode().split(":", 2)
+            if not _matches(window, tag):
+                continue
+            for stack, count in rc.hgetall(key).items():
+                result[tag][stack.decode()] += int(count)
+    elif os.path.exists(settings.PROFILE_DIR):
+        for fname in os.listdir(settings.PROFILE_DIR):
+            if not fname.endswith(".collapsed"):
+                continue
+            window, tag = fname[:-len(".collapsed")].split("_", 1)
+            if not _matches(window, tag):
+                continue
+            with open(os.path.join(settings.PROFILE_DIR, fname)) as f:
+                for line in f:
+                    stack, count = line.rstrip("\n").rsplit(" ", 1)
+                    result[tag][stack] += int(count)
+    return result
+
+
+def to_collapsed(stacks):
+    """
+    Renders a ``Counter`` of stacks in the format understood by ``flamegraph.pl`` and speedscope.
+    """
+    return "".join("{} {}\n".format(stack, count) for stack, count in sorted(stacks.items()))
+
+
+def to_speedscope(samples):
+    """
+    Renders the result of ``load_samples`` as a speedscope document with one profile per tag.
+    """
+    frames = []
+    frame_index = {}
+    profiles = []
+    for tag, stacks in sorted(samples.items()):
+        profile_samples = []
+        weights = []
+        for stack, count in sorted(stacks.items()):
+            indexes = []
+            for fname in stack.split(";"):
+                if fname not in frame_index:
+                    frame_index[fname] = len(frames)
+                    frames.append({"name": fname})
+                indexes.append(frame_index[fname])
+            profile_samples.append(indexes)
+            weights.append(count)
+        profiles.append({
+            "type": "sampled",
+            "name": tag,
+            "unit": "none",
+            "startValue": 0,
+            "endValue": sum(weights),
+            "samples": profile_samples,
+            "weights": weights,
+        })
+    return {
+        "$schema": "https://www.speedscope.app/file-format-schema.json",
+        "shared": {"frames": frames},
+        "profiles": profiles,
+        "name": "pretix",
+        "exporter": "pretix",
+    }
@@ -57,6 +57,7 @@ from django.utils.http import http_date
 from django_scopes import scopes_disabled
 
 from pretix.base.models import Event, Organizer
+from pretix.base.services.resolution import resolve_event, resolve_organizer
 from pretix.helpers.cookies import (
     get_all_values_of_cookie, set_cookie_without_samesite,
     thoroughly_delete_cookie,
@@ -117,19 +118,18 @@ class MultiDomainMiddleware(MiddlewareMixin):
                     request.organizer = orga
                     request.event = event
                 else:
-                    with scopes_disabled():
-                        request.event = Event.objects.select_related('organizer').get(pk=event)
-                        request.organizer = request.event.organizer
+                    request.event = resolve_event(pk=event)
+                    request.organizer = request.event.organizer
                 request.urlconf = "pretix.multidomain.event_domain_urlconf"
             elif mode == KnownDomain.MODE_ORG_ALT_DOMAIN:
                 request.organizer_domain = True
                 request.domain_mode = KnownDomain.MODE_ORG_ALT_DOMAIN
-                request.organizer = orga if isinstance(orga, Organizer) else Organizer.objects.get(pk=orga)
+                request.organizer = orga if isinstance(orga, Organizer) else resolve_organizer(pk=orga)
                 request.urlconf = "pretix.multidomain.organizer_alternative_domain_urlconf"
             elif mode == KnownDomain.MODE_ORG_DOMAIN:
                 request.organizer_domain = True
                 request.domain_mode = KnownDomain.MODE_ORG_DOMAIN
-                request.organizer = orga if isinstance(orga, Organizer) else Organizer.objects.get(pk=orga)
+                request.organizer = orga if isinstance(orga, Organizer) else resolve_organizer(pk=orga)
                 request.urlconf = "pretix.multidomain.organizer_domain_urlconf"
             elif settings.DEBUG or domain in LOCAL_HOST_NAMES:
                 request.domain_mode = "system"
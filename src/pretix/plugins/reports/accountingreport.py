@@ -26,7 +26,7 @@ from collections import OrderedDict, defaultdict
 from decimal import Decimal
 
 from django import forms
-from django.db.models import F, Sum
+from django.db.models import F, Q, Sum
 from django.db.models.functions import Coalesce
 from django.utils.formats import date_format
 from django.utils.html import escape
@@ -42,6 +42,7 @@ from reportlab.platypus import (
 from pretix.base.exporter import BaseExporter
 from pretix.base.models import (
     GiftCardTransaction, OrderFee, OrderPayment, OrderRefund, Transaction,
+    TransactionSummary, TransactionSummaryState,
 )
 from pretix.base.templatetags.money import money_filter, tax_rate_format
 from pretix.base.timeframes import (
@@ -139,7 +140,8 @@ class ReportExporter(ReportlabExportMixin, BaseExporter):
         if not form_data["no_testmode"]:
             filters.append(_("Report includes test orders which may be deleted later!"))
 
-        if self._transaction_qs(form_data, currency=None).filter(migrated=True).exists():
+        tx_qs, summary_qs = self._ledger_sources(form_data, currency=None, *self._date_range(form_data))
+        if tx_qs.filter(migrated=True).exists() or summary_qs.filter(migrated=True).exists():
             filters.append(
                 _(
                     "The report time frame includes data generated with an old software version that did not yet "
@@ -187,6 +189,62 @@ class ReportExporter(ReportlabExportMixin, BaseExporter):
             qs = qs.filter(order__testmode=False)
         return qs
 
+    def _date_range(self, form_data):
+        if form_data.get("date_range"):
+            return resolve_timeframe_to_datetime_start_inclusive_end_exclusive(
+                now(), form_data["date_range"], self.timezone
+            )
+        return None, None
+
+    def _ledger_sources(self, form_data, currency, df_start=None, df_end=None):
+        """
+        Returns a queryset of transactions and a queryset of transaction summaries that, added up, contain every
+        transaction between ``df_start`` and ``df_end`` exactly once. Summaries are used for all days (in UTC) that
+        are fully contained in the time frame, transactions are read directly at the edges of the time frame and
+        if they have not yet been added to the summaries.
+        """
+        tx_qs = self._transaction_qs(form_data, currency, ignore_dates=True)
+        if df_start:
+            tx_qs = tx_qs.filter(datetime__gte=df_start)
+        if df_end:
+            tx_qs = tx_qs.filter(datetime__lt=df_end)
+
+        summary_qs = TransactionSummary.objects.none()
+        state = TransactionSummaryState.objects.filter(pk=1).first()
+        if not state or not state.watermark:
+            return tx_qs, summary_qs
+
+        day_from = day_until = None
+        if df_start:
+            day_from = df_start.astimezone(datetime.timezone.utc).date()
+            if df_start.astimezone(datetime.timezone.utc).time() != datetime.time(0, 0):
+                day_from += datetime.timedelta(days=1)
+        if df_end:
+            day_until = df_end.astimezone(datetime.timezone.utc).date()
+        if day_from and day_until and day_from >= day_until:
+            return tx_qs, summary_qs
+
+        summary_qs = TransactionSummary.objects.filter(event__in=self.events)
+        summarized = Q(created__lte=state.watermark)
+        if currency is not None:
+            summary_qs = summary_qs.filter(event__currency=currency)
+        if form_data["no_testmode"]:
+            summary_qs = summary_qs.filter(testmode=False)
+        if day_from:
+            summary_qs = summary_qs.filter(date__gte=day_from)
+            summarized &= Q(datetime__gte=datetime.datetime.combine(day_from, datetime.time(0, 0), datetime.timezone.utc))
+        if day_until:
+            summary_qs = summary_qs.filter(date__lt=day_until)
+            summarized &= Q(datetime__lt=datetime.datetime.combine(day_until, datetime.time(0, 0), datetime.timezone.utc))
+        return tx_qs.exclude(summarized), summary_qs
+
+    def _ledger_total(self, form_data, currency, df_start=None, df_end=None):
+        tx_qs, summary_qs = self._ledger_sources(form_data, currency, df_start, df_end)
+        return (
+            (tx_qs.aggregate(s=Sum(F("count") * F("price")))["s"] or Decimal("0.00"))
+            + (summary_qs.aggregate(s=Sum("total"))["s"] or Decimal("0.00"))
+        )
+
     def _payment_qs(self, form_data, currency, ignore_dates=False):
         qs = OrderPayment.objects.filter(
             order__event__in=self.events,
@@ -252,13 +310,18 @@ class ReportExporter(ReportlabExportMixin, BaseExporter):
             "tax_rate",
         ).values(
             *subevent_values,
+            "order__event_id",
             "order__event__date_from",
             "order__event__slug",
             "order__event__name",
             "item_id",
             "item__internal_name",
             "item__name",
+            "item__position",
+            "item__category_id",
+            "item__category__position",
             "variation__value",
+            "variation__position",
             "variation_id",
             "fee_type",
             "internal_type",
@@ -267,6 +330,76 @@ class ReportExporter(ReportlabExportMixin, BaseExporter):
         )
         return qs
 
+    def _transaction_rows(self, form_data, currency):
+        """
+        Returns the grouped sums of all transactions in the time frame in the same structure and order as
+        ``_transaction_qs_group``, combined from the transaction summaries and the remaining transactions.
+        """
+        tx_qs, summary_qs = self._ledger_sources(form_data, currency, *self._date_range(form_data))
+        rows = {}
+
+        def _add(r):
+            key = (r.get("subevent_id"), r["order__event_id"], r["item_id"], r["variation_id"], r["fee_type"],
+                   r["internal_type"], r["price"], r["tax_rate"])
+            if key in rows:
+                for k in ("sum_cont", "sum_price", "sum_tax"):
+                    rows[key][k] += r[k]
+            else:
+                rows[key] = r
+
+        for r in self._transaction_qs_group(tx_qs, form_data).annotate(
+            sum_cont=Sum("count"),
+            sum_price=Sum(F("count") * F("price")),
+            sum_tax=Sum(F("count") * F("tax_value")),
+        ):
+            _add(r)
+
+        summary_values = [
+            "event_id", "event__date_from", "event__slug", "event__name", "item_id", "item__internal_name",
+            "item__name", "item__position", "item__category_id", "item__category__position", "variation__value",
+            "variation__position", "variation_id", "fee_type", "internal_type", "price", "tax_rate",
+        ]
+        if form_data.get("split_subevents"):
+            summary_values += ["subevent_id", "subevent__name", "subevent__date_from"]
+        for r in summary_qs.order_by().values(*summary_values).annotate(
+            sum_cont=Sum("count"),
+            sum_price=Sum("total"),
+            sum_tax=Sum("tax_total"),
+        ):
+            _add({
+                ("order__" + k if k.startswith("event") else k): v for k, v in r.items()
+            })
+
+        def _nulls_first(v):
+            return v is not None, v
+
+        def _nulls_last(v):
+            return v is None, v
+
+        def _sort_key(r):
+            key = ()
+            if form_data.get("split_subevents"):
+                key += (
+                    r["subevent__date_from"] or r["order__event__date_from"],
+                    r["subevent_id"] or r["order__event_id"],
+                )
+            return key + (
+                r["order__event__date_from"],
+                r["order__event__slug"],
+                _nulls_first(r["fee_type"]),
+                _nulls_first(r["internal_type"]),
+                _nulls_first(r["item__category__position"]),
+                _nulls_first(r["item__category_id"]),
+                _nulls_last(r["item__position"]),
+                _nulls_last(r["item_id"]),
+                _nulls_last(r["variation__position"]),
+                _nulls_last(r["variation_id"]),
+                r["price"],
+                r["tax_rate"],
+            )
+
+        return sorted(rows.values(), key=_sort_key)
+
     def _transaction_group_header_label(self):
         return _("Event") + " / " + _("Product")
 
@@ -321,17 +454,7 @@ class ReportExporter(ReportlabExportMixin, BaseExporter):
             ]
         ]
 
-        qs = (
-            self._transaction_qs_group(
-                self._transaction_qs(form_data, currency),
-                form_data
-            )
-            .annotate(
-                sum_cont=Sum("count"),
-                sum_price=Sum(F("count") * F("price")),
-                sum_tax=Sum(F("count") * F("tax_value")),
-            )
-        )
+        qs = self._transaction_rows(form_data, currency)
 
         tstyledata = []
 
@@ -629,9 +752,7 @@ class ReportExporter(ReportlabExportMixin, BaseExporter):
         tdata = []
 
         if df_start:
-            tx_before = self._transaction_qs(form_data, currency, ignore_dates=True).filter(
-                datetime__lt=df_start
-            ).aggregate(s=Sum(F("count") * F("price")))["s"] or Decimal("0.00")
+            tx_before = self._ledger_total(form_data, currency, df_end=df_start)
             p_before = self._payment_qs(form_data, currency, ignore_dates=True).filter(
                 payment_date__lt=df_start
             ).aggregate(s=Sum("amount"))["s"] or Decimal("0.00")
@@ -659,9 +780,7 @@ class ReportExporter(ReportlabExportMixin, BaseExporter):
         else:
             open_before = Decimal("0.00")
 
-        tx_during = self._transaction_qs(form_data, currency).aggregate(
-            s=Sum(F("count") * F("price"))
-        )["s"] or Decimal("0.00")
+        tx_during = self._ledger_total(form_data, currency, df_start, df_end)
         p_during = self._payment_qs(form_data, currency).aggregate(s=Sum("amount"))[
             "s"
         ] or Decimal("0.00")
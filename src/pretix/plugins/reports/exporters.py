@@ -338,7 +338,8 @@ class OverviewReport(Report):
             subevent_date_from=sd_start,
             subevent_date_until=sd_end,
             fees=True,
-            skip_empty_lines=form_data.get("skip_empty_lines")
+            skip_empty_lines=form_data.get("skip_empty_lines"),
+            use_rollups=True,
         )
 
     def _table_story(self, doc, form_data, net=False):
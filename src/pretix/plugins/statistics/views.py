@@ -38,37 +38,94 @@ from decimal import Decimal
 
 import dateutil.parser
 import dateutil.rrule
-from django.db.models import Count, DateTimeField, Max, Min, OuterRef, Subquery
+from django.db.models import (
+    Count, DateTimeField, Max, Min, OuterRef, Subquery, Sum,
+)
 from django.utils import timezone
 from django.views.generic import TemplateView
 
 from pretix.base.models import (
     Item, Order, OrderPayment, OrderPosition, SubEvent,
 )
+from pretix.base.services.seating import SeatAvailability
+from pretix.base.services.stats import sales_rollups_available
 from pretix.control.permissions import EventPermissionRequiredMixin
 from pretix.control.views import ChartContainingView
+from pretix.helpers.database import replica_reads
 from pretix.plugins.statistics.signals import clear_cache
 
 
+def _day_series(ordered_by_day, paid_by_day):
+    data = []
+    for d in dateutil.rrule.rrule(
+            dateutil.rrule.DAILY,
+            dtstart=min(ordered_by_day.keys()) if ordered_by_day else datetime.date.today(),
+            until=max(
+                max(ordered_by_day.keys() if paid_by_day else [datetime.date.today()]),
+                max(paid_by_day.keys() if paid_by_day else [datetime.date(1970, 1, 1)])
+            )):
+        d = d.date()
+        data.append({
+            'date': d.strftime('%Y-%m-%d'),
+            'ordered': ordered_by_day.get(d, 0),
+            'paid': paid_by_day.get(d, 0)
+        })
+    return data
+
+
+def _cumulative_series(day_data):
+    time_data = []
+    for d in day_data:
+        time_data.append({
+            'date': d['date'],
+            'ordered': (time_data[-1]["ordered"] if time_data else 0) + d['ordered'],
+            'paid': (time_data[-1]["paid"] if time_data else 0) + d['paid']
+        })
+    return time_data
+
+
+def _product_series(event, num_ordered, num_paid):
+    item_names = {
+        i.id: str(i)
+        for i in Item.objects.filter(event=event)
+    }
+    return [
+        {
+            'item': item_names[item],
+            'item_short': item_names[item] if len(item_names[item]) < 15 else (item_names[item][:15] + "…"),
+            'ordered': cnt,
+            'paid': num_paid.get(item, 0)
+        } for item, cnt in num_ordered.items()
+    ]
+
+
+def _revenue_series(rev_by_day):
+    data = []
+    total = 0
+    for d in dateutil.rrule.rrule(
+            dateutil.rrule.DAILY,
+            dtstart=min(rev_by_day.keys() if rev_by_day else [datetime.date.today()]),
+            until=max(rev_by_day.keys() if rev_by_day else [datetime.date.today()])):
+        d = d.date()
+        total += float(rev_by_day.get(d, 0))
+        data.append({
+            'date': d.strftime('%Y-%m-%d'),
+            'revenue': round(total, 2),
+        })
+    return data
+
+
 class IndexView(EventPermissionRequiredMixin, ChartContainingView, TemplateView):
     template_name = 'pretixplugins/statistics/index.html'
     permission = 'event.orders:read'
 
-    def get_context_data(self, **kwargs):
-        ctx = super().get_context_data(**kwargs)
-        tz = timezone.get_current_timezone()
-
-        if 'latest' in self.request.GET:
-            clear_cache(self.request.event)
-
-        subevent = None
-        if self.request.GET.get("subevent", "") != "" and self.request.event.has_subevents:
-            i = self.request.GET.get("subevent", "")
-            try:
-                subevent = self.request.event.subevents.get(pk=i)
-            except SubEvent.DoesNotExist:
-                pass
+    def get(self, request, *args, **kwargs):
+        # Statistics only read data and it does not hurt if they are a few seconds behind
+        with replica_reads():
+            return super().get(request, *args, **kwargs)
 
+    def _data_from_orders(self, subevent, tz):
+        ctx = {}
         cache = self.request.event.cache
         ckey = str(subevent.pk) if subevent else 'all'
 
@@ -110,22 +167,7 @@ class IndexView(EventPermissionRequiredMixin, ChartContainingView, TemplateView)
                 day = o['payment_date'].astimezone(tz).date()
                 paid_by_day[day] = paid_by_day.get(day, 0) + 1
 
-            data = []
-            for d in dateutil.rrule.rrule(
-                    dateutil.rrule.DAILY,
-                    dtstart=min(ordered_by_day.keys()) if ordered_by_day else datetime.date.today(),
-                    until=max(
-                        max(ordered_by_day.keys() if paid_by_day else [datetime.date.today()]),
-                        max(paid_by_day.keys() if paid_by_day else [datetime.date(1970, 1, 1)])
-                    )):
-                d = d.date()
-                data.append({
-                    'date': d.strftime('%Y-%m-%d'),
-                    'ordered': ordered_by_day.get(d, 0),
-                    'paid': paid_by_day.get(d, 0)
-                })
-
-            ctx['obd_data'] = json.dumps(data)
+            ctx['obd_data'] = json.dumps(_day_series(ordered_by_day, paid_by_day))
             cache.set('statistics_obd_data' + ckey, ctx['obd_data'])
 
         # Attendees by day/time
@@ -148,29 +190,9 @@ class IndexView(EventPermissionRequiredMixin, ChartContainingView, TemplateView)
                 day = p['payment_date'].astimezone(tz).date()
                 paid_by_day[day] = paid_by_day.get(day, 0) + 1
 
-            day_data = []
-            time_data = []
-            for d in dateutil.rrule.rrule(
-                    dateutil.rrule.DAILY,
-                    dtstart=min(ordered_by_day.keys()) if ordered_by_day else datetime.date.today(),
-                    until=max(
-                        max(ordered_by_day.keys() if paid_by_day else [datetime.date.today()]),
-                        max(paid_by_day.keys() if paid_by_day else [datetime.date(1970, 1, 1)])
-                    )):
-                d = d.date()
-                day_data.append({
-                    'date': d.strftime('%Y-%m-%d'),
-                    'ordered': ordered_by_day.get(d, 0),
-                    'paid': paid_by_day.get(d, 0)
-                })
-                time_data.append({
-                    'date': d.strftime('%Y-%m-%d'),
-                    'ordered': (time_data[-1]["ordered"] if time_data else 0) + ordered_by_day.get(d, 0),
-                    'paid': (time_data[-1]["paid"] if time_data else 0) + paid_by_day.get(d, 0)
-                })
-
+            day_data = _day_series(ordered_by_day, paid_by_day)
             ctx['abd_data'] = json.dumps(day_data)
-            ctx['abt_data'] = json.dumps(time_data)
+            ctx['abt_data'] = json.dumps(_cumulative_series(day_data))
             cache.set('statistics_abd_data' + ckey, ctx['abd_data'])
             cache.set('statistics_abt_data' + ckey, ctx['abt_data'])
 
@@ -194,18 +216,7 @@ class IndexView(EventPermissionRequiredMixin, ChartContainingView, TemplateView)
                           .values('item')
                           .annotate(cnt=Count('id')).order_by())
             }
-            item_names = {
-                i.id: str(i)
-                for i in Item.objects.filter(event=self.request.event)
-            }
-            ctx['obp_data'] = json.dumps([
-                {
-                    'item': item_names[item],
-                    'item_short': item_names[item] if len(item_names[item]) < 15 else (item_names[item][:15] + "…"),
-                    'ordered': cnt,
-                    'paid': num_paid.get(item, 0)
-                } for item, cnt in num_ordered.items()
-            ])
+            ctx['obp_data'] = json.dumps(_product_series(self.request.event, num_ordered, num_paid))
             cache.set('statistics_obp_data' + ckey, ctx['obp_data'])
 
         ctx['rev_data'] = cache.get('statistics_rev_data' + ckey)
@@ -229,44 +240,117 @@ class IndexView(EventPermissionRequiredMixin, ChartContainingView, TemplateView)
                     day = o['payment_date'].astimezone(tz).date()
                     rev_by_day[day] = rev_by_day.get(day, 0) + o['total']
 
-            data = []
-            total = 0
-            for d in dateutil.rrule.rrule(
-                    dateutil.rrule.DAILY,
-                    dtstart=min(rev_by_day.keys() if rev_by_day else [datetime.date.today()]),
-                    until=max(rev_by_day.keys() if rev_by_day else [datetime.date.today()])):
-                d = d.date()
-                total += float(rev_by_day.get(d, 0))
-                data.append({
-                    'date': d.strftime('%Y-%m-%d'),
-                    'revenue': round(total, 2),
-                })
-            ctx['rev_data'] = json.dumps(data)
+            ctx['rev_data'] = json.dumps(_revenue_series(rev_by_day))
             cache.set('statistics_rev_data' + ckey, ctx['rev_data'])
 
+        return ctx
+
+    def _data_from_rollups(self, subevent):
+        ctx = {}
+        rollups = self.request.event.sales_rollups.all()
+        order_rows = rollups.filter(item__isnull=True, subevent=subevent)
+        position_rows = rollups.filter(item__isnull=False)
+        if subevent:
+            position_rows = position_rows.filter(subevent=subevent)
+
+        def _sum_by(qs, field, value='count'):
+            return {
+                r[field]: r['s'] for r in qs.filter(**{field + '__isnull': False}).values(field).annotate(
+                    s=Sum(value)
+                ).order_by()
+            }
+
+        # Orders by day
+        ctx['obd_data'] = json.dumps(_day_series(
+            _sum_by(order_rows, 'order_date'),
+            _sum_by(order_rows.filter(status=Order.STATUS_PAID, canceled=False), 'payment_date'),
+        ))
+
+        # Attendees by day/time
+        admission_rows = position_rows.filter(item__admission=True)
+        day_data = _day_series(
+            _sum_by(admission_rows, 'order_date'),
+            _sum_by(admission_rows.filter(status=Order.STATUS_PAID, canceled=False), 'payment_date'),
+        )
+        ctx['abd_data'] = json.dumps(day_data)
+        ctx['abt_data'] = json.dumps(_cumulative_series(day_data))
+
+        # Orders by product
+        num_ordered = _sum_by(position_rows, 'item')
+        num_paid = _sum_by(position_rows.filter(status=Order.STATUS_PAID, canceled=False), 'item')
+        ctx['obp_data'] = json.dumps(_product_series(self.request.event, num_ordered, num_paid))
+
+        # Revenue
+        if subevent:
+            rev_by_day = _sum_by(position_rows.filter(status=Order.STATUS_PAID, canceled=False), 'payment_date',
+                                 'price')
+        else:
+            rev_by_day = _sum_by(order_rows.filter(status=Order.STATUS_PAID), 'payment_date', 'price')
+        ctx['rev_data'] = json.dumps(_revenue_series(rev_by_day))
+        return ctx
+
+    def get_context_data(self, **kwargs):
+        ctx = super().get_context_data(**kwargs)
+        tz = timezone.get_current_timezone()
+
+        if 'latest' in self.request.GET:
+            clear_cache(self.request.event)
+
+        subevent = None
+        if self.request.GET.get("subevent", "") != "" and self.request.event.has_subevents:
+            i = self.request.GET.get("subevent", "")
+            try:
+                subevent = self.request.event.subevents.get(pk=i)
+            except SubEvent.DoesNotExist:
+                pass
+
+        if 'latest' not in self.request.GET and sales_rollups_available(self.request.event):
+            ctx.update(self._data_from_rollups(subevent))
+        else:
+            ctx.update(self._data_from_orders(subevent, tz))
+
         ctx['has_orders'] = self.request.event.orders.exists()
 
         ctx['seats'] = {}
 
-        if not self.request.event.has_subevents or (ckey != "all" and subevent):
+        if not self.request.event.has_subevents or subevent:
             ev = subevent or self.request.event
             if ev.seating_plan_id is not None:
-                seats_qs = ev.free_seats(sales_channel=None, include_blocked=True)
-                ctx['seats']['blocked_seats'] = seats_qs.filter(blocked=True).count()
-                ctx['seats']['free_seats'] = seats_qs.filter(blocked=False).count()
+                availability = SeatAvailability.get(self.request.event, subevent)
+                free = availability.free_bitset(include_blocked=True)
+                blocked = availability.bitsets['blocked']
+                ctx['seats']['blocked_seats'] = availability.count(free & blocked)
+                ctx['seats']['free_seats'] = availability.count(free & ~blocked)
                 ctx['seats']['purchased_seats'] = \
-                    ev.seats.count() - ctx['seats']['blocked_seats'] - ctx['seats']['free_seats']
+                    len(availability.seat_ids) - ctx['seats']['blocked_seats'] - ctx['seats']['free_seats']
 
-                seats_qs = seats_qs.values('product', 'blocked').annotate(count=Count('id'))\
-                    .order_by('product__category__position', 'product__position', 'product', 'blocked')
+                seats_qs = [
+                    {'product': product_id, 'blocked': b, 'count': availability.count(free & mask & product_mask)}
+                    for product_id, product_mask in availability.products.items()
+                    for b, mask in ((False, ~blocked), (True, blocked))
+                ]
+                seats_qs = [row for row in seats_qs if row['count']]
 
                 ctx['seats']['products'] = {}
                 ctx['seats']['stats'] = {}
                 item_cache = {i.pk: i for i in
-                              self.request.event.items.annotate(has_variations=Count('variations')).filter(
+                              self.request.event.items.select_related('category').annotate(
+                                  has_variations=Count('variations')
+                              ).filter(
                                   pk__in={p['product'] for p in seats_qs if p['product']}
                               )}
                 item_cache[None] = None
+                seats_qs = [row for row in seats_qs if row['product'] in item_cache]
+
+                def _sort_key(row):
+                    # Same order as product__category__position, product__position, product with NULLs last
+                    i = item_cache.get(row['product'])
+                    return (
+                        i is None or i.category is None, i.category.position if i and i.category else 0,
+                        i is None, i.position if i else 0, row['product'] or 0, row['blocked']
+                    )
+
+                seats_qs.sort(key=_sort_key)
 
                 for item in seats_qs:
                     product = item_cache[item['product']]
@@ -27,4 +27,4 @@ class PretixPresaleConfig(AppConfig):
     label = 'pretixpresale'
 
     def ready(self):
-        from . import style  # noqa
+        from . import style, waitingroom  # noqa
@@ -20,11 +20,11 @@
 # <https://www.gnu.org/licenses/>.
 #
 from django import forms
-from django.conf import settings
 from django.utils.translation import pgettext
 from i18nfield.strings import LazyI18nString
 
 from pretix.base.models import EventMetaValue, SubEventMetaValue
+from pretix.helpers.database import get_read_replica
 
 
 def meta_filtersets(organizer, event=None):
@@ -38,7 +38,7 @@ def meta_filtersets(organizer, event=None):
             existing_values = set()
             if event.meta_data.get(prop.name):
                 existing_values.add(event.meta_data.get(prop.name))
-            existing_values |= set(SubEventMetaValue.objects.using(settings.DATABASE_REPLICA).filter(
+            existing_values |= set(SubEventMetaValue.objects.using(get_read_replica()).filter(
                 property=prop,
                 subevent__event=event,
                 subevent__event__live=True,
@@ -51,13 +51,13 @@ def meta_filtersets(organizer, event=None):
             existing_values = set()
             if prop.default:
                 existing_values.add(prop.default)
-            existing_values |= set(EventMetaValue.objects.using(settings.DATABASE_REPLICA).filter(
+            existing_values |= set(EventMetaValue.objects.using(get_read_replica()).filter(
                 property=prop,
                 event__organizer=organizer,
                 event__live=True,
                 event__is_public=True,
             ).values_list("value", flat=True).distinct())
-            existing_values |= set(SubEventMetaValue.objects.using(settings.DATABASE_REPLICA).filter(
+            existing_values |= set(SubEventMetaValue.objects.using(get_read_replica()).filter(
                 property=prop,
                 subevent__event__organizer=organizer,
                 subevent__event__live=True,
@@ -40,6 +40,9 @@ from pretix.base.timemachine import time_machine_now_assigned_from_request
 from pretix.presale.signals import process_response
 
 from .utils import _detect_event
+from .waitingroom import (
+    get_status, requires_admission, store_ticket, waiting_room_redirect,
+)
 
 
 class EventMiddleware:
@@ -72,7 +75,17 @@ class EventMiddleware:
                     identifier=request.environ.get('PRETIX_SALES_CHANNEL', 'web')
                 )
 
-            response = self.get_response(request)
+            waiting_room_ticket = response = None
+            if hasattr(request, 'event') and requires_admission(request, url.url_name):
+                waiting_room_ticket, position = get_status(request, request.event)
+                if position > 0:
+                    response = waiting_room_redirect(request, url.kwargs, waiting_room_ticket)
+
+            if response is None:
+                response = self.get_response(request)
+
+            if waiting_room_ticket:
+                store_ticket(request, response, request.event, waiting_room_ticket)
 
             if hasattr(request, '_namespace') and request._namespace == 'presale' and hasattr(request, 'event'):
                 for receiver, r in process_response.send(request.event, request=request, response=response):
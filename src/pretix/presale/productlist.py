@@ -23,7 +23,6 @@ import sys
 from datetime import datetime
 from typing import Optional
 
-from django.conf import settings
 from django.db.models import (
     Count, Exists, IntegerField, OuterRef, Prefetch, Q, Value,
 )
@@ -37,6 +36,7 @@ from pretix.base.models.items import (
 )
 from pretix.base.services.quotas import QuotaAvailability
 from pretix.base.timemachine import time_machine_now
+from pretix.helpers.database import get_read_replica
 from pretix.presale.signals import item_description
 
 
@@ -85,7 +85,7 @@ def prepare_item_list_for_shop(event, *, channel: SalesChannel, subevent=None, v
     prefetch_var = Prefetch(
         'variations',
         to_attr='available_variations',
-        queryset=ItemVariation.objects.using(settings.DATABASE_REPLICA).annotate(
+        queryset=ItemVariation.objects.using(get_read_replica()).annotate(
             subevent_disabled=Exists(
                 SubEventItemVariation.objects.filter(
                     Q(disabled=True)
@@ -105,39 +105,39 @@ def prepare_item_list_for_shop(event, *, channel: SalesChannel, subevent=None, v
             *prefetch_membership_types,
             Prefetch('quotas',
                      to_attr='_subevent_quotas',
-                     queryset=event.quotas.using(settings.DATABASE_REPLICA).filter(
+                     queryset=event.quotas.using(get_read_replica()).filter(
                          subevent=subevent).select_related("subevent"))
         ).distinct()
     )
     prefetch_quotas = Prefetch(
         'quotas',
         to_attr='_subevent_quotas',
-        queryset=event.quotas.using(settings.DATABASE_REPLICA).filter(subevent=subevent).select_related("subevent")
+        queryset=event.quotas.using(get_read_replica()).filter(subevent=subevent).select_related("subevent")
     )
     prefetch_bundles = Prefetch(
         'bundles',
-        queryset=ItemBundle.objects.using(settings.DATABASE_REPLICA).prefetch_related(
+        queryset=ItemBundle.objects.using(get_read_replica()).prefetch_related(
             Prefetch('bundled_item',
-                     queryset=event.items.using(settings.DATABASE_REPLICA).select_related(
+                     queryset=event.items.using(get_read_replica()).select_related(
                          'tax_rule').prefetch_related(
                          Prefetch('quotas',
                                   to_attr='_subevent_quotas',
-                                  queryset=event.quotas.using(settings.DATABASE_REPLICA).filter(
+                                  queryset=event.quotas.using(get_read_replica()).filter(
                                       subevent=subevent)),
                      )),
             Prefetch('bundled_variation',
                      queryset=ItemVariation.objects.using(
-                         settings.DATABASE_REPLICA
+                         get_read_replica()
                      ).select_related('item', 'item__tax_rule').filter(item__event=event).prefetch_related(
                          Prefetch('quotas',
                                   to_attr='_subevent_quotas',
-                                  queryset=event.quotas.using(settings.DATABASE_REPLICA).filter(
+                                  queryset=event.quotas.using(get_read_replica()).filter(
                                       subevent=subevent)),
                      )),
         )
     )
 
-    items = base_qs.using(settings.DATABASE_REPLICA).filter_available(
+    items = base_qs.using(get_read_replica()).filter_available(
         channel=channel.identifier, voucher=voucher, allow_addons=allow_addons, allow_cross_sell=allow_cross_sell
     ).select_related(
         'category', 'tax_rule',  # for re-grouping
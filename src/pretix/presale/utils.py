@@ -55,7 +55,9 @@ from django_scopes import scope
 
 from pretix.base.middleware import LocaleMiddleware
 from pretix.base.models import Customer, Event, Organizer
+from pretix.base.services.resolution import resolve_event, resolve_organizer
 from pretix.base.timemachine import time_machine_now_assigned_from_request
+from pretix.helpers.database import get_read_replica
 from pretix.helpers.http import redirect_to_url
 from pretix.multidomain.models import KnownDomain
 from pretix.multidomain.urlreverse import (
@@ -255,7 +257,7 @@ def _detect_event(request, require_live=True, require_plugin=None):
 
     db = 'default'
     if request.method == 'GET':
-        db = settings.DATABASE_REPLICA
+        db = get_read_replica()
 
     url = resolve(request.path_info)
 
@@ -274,10 +276,8 @@ def _detect_event(request, require_live=True, require_plugin=None):
 
             request.organizer = request.organizer
             if 'event' in url.kwargs:
-                request.event = request.organizer.events.using(db).get(
-                    slug=url.kwargs['event'],
-                    organizer=request.organizer,
-                )
+                request.event = resolve_event(request.organizer.slug, url.kwargs['event'], using=db)
+                request.event.organizer = request.organizer
 
                 # If this event has a custom domain or is not available on this alt domain, send the user there
                 domain, domainmode = get_event_domain(request.event, fallback=False, return_mode=True)
@@ -299,13 +299,7 @@ def _detect_event(request, require_live=True, require_plugin=None):
         else:
             # We are on our main domain
             if 'event' in url.kwargs and 'organizer' in url.kwargs:
-                request.event = Event.objects\
-                    .select_related('organizer')\
-                    .using(db)\
-                    .get(
-                        slug=url.kwargs['event'],
-                        organizer__slug=url.kwargs['organizer']
-                    )
+                request.event = resolve_event(url.kwargs['organizer'], url.kwargs['event'], using=db)
                 request.organizer = request.event.organizer
 
                 # If this event has a custom domain, send the user there
@@ -321,9 +315,7 @@ def _detect_event(request, require_live=True, require_plugin=None):
                     r['Access-Control-Allow-Origin'] = '*'
                     return r
             elif 'organizer' in url.kwargs:
-                request.organizer = Organizer.objects.using(db).get(
-                    slug=url.kwargs['organizer']
-                )
+                request.organizer = resolve_organizer(url.kwargs['organizer'], using=db)
             else:
                 raise Http404()
 
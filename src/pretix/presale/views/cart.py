@@ -437,6 +437,7 @@ def cart_session(request, create=True):
 @method_decorator(allow_frame_if_namespaced, 'dispatch')
 class CartApplyVoucher(EventViewMixin, CartActionMixin, AsyncAction, View):
     task = apply_voucher
+    inline_task = True
     known_errortypes = ['CartError', 'CartPositionError']
 
     def get_success_message(self, value):
@@ -515,6 +516,7 @@ class CartApplyVoucher(EventViewMixin, CartActionMixin, AsyncAction, View):
 @method_decorator(allow_frame_if_namespaced, 'dispatch')
 class CartRemove(EventViewMixin, CartActionMixin, AsyncAction, View):
     task = remove_cart_position
+    inline_task = True
     known_errortypes = ['CartError', 'CartPositionError']
 
     def get_success_message(self, value):
@@ -544,6 +546,7 @@ class CartRemove(EventViewMixin, CartActionMixin, AsyncAction, View):
 @method_decorator(allow_frame_if_namespaced, 'dispatch')
 class CartClear(EventViewMixin, CartActionMixin, AsyncAction, View):
     task = clear_cart
+    inline_task = True
     known_errortypes = ['CartError', 'CartPositionError']
 
     def get_success_message(self, value):
@@ -570,6 +573,7 @@ class CartCreate(EventViewMixin, CartActionMixin, View):
 @method_decorator(allow_frame_if_namespaced, 'dispatch')
 class CartExtendReservation(EventViewMixin, CartActionMixin, AsyncAction, View):
     task = extend_cart_reservation
+    inline_task = True
     known_errortypes = ['CartError', 'CartPositionError']
 
     def _ajax_response_data(self, value):
@@ -596,8 +600,13 @@ class CartExtendReservation(EventViewMixin, CartActionMixin, AsyncAction, View):
 @method_decorator(iframe_entry_view_wrapper, 'dispatch')
 class CartAdd(EventViewMixin, CartActionMixin, AsyncAction, View):
     task = add_items_to_cart
+    inline_task = True
+    inline_max_count = 10
     known_errortypes = ['CartError', 'CartPositionError']
 
+    def can_run_inline(self, event, items, *args):
+        return sum(i['count'] for i in items) <= self.inline_max_count
+
     def get_success_message(self, value):
         return _('The products have been successfully added to your cart.')
 
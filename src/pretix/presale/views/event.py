@@ -66,6 +66,7 @@ from pretix.base.models.event import Event, SubEvent
 from pretix.base.services.placeholders import PlaceholderContext
 from pretix.base.timemachine import time_machine_now
 from pretix.helpers.compat import date_fromisocalendar
+from pretix.helpers.database import get_read_replica
 from pretix.helpers.formats.en.formats import (
     SHORT_MONTH_DAY_FORMAT, WEEK_FORMAT,
 )
@@ -157,7 +158,7 @@ class EventIndex(EventViewMixin, EventListMixin, CartMixin, TemplateView):
 
         if request.event.has_subevents:
             if 'subevent' in kwargs:
-                self.subevent = request.event.subevents.using(settings.DATABASE_REPLICA).filter(pk=kwargs['subevent'], active=True).first()
+                self.subevent = request.event.subevents.using(get_read_replica()).filter(pk=kwargs['subevent'], active=True).first()
                 if not self.subevent:
                     raise Http404()
 
@@ -318,7 +319,7 @@ class EventIndex(EventViewMixin, EventListMixin, CartMixin, TemplateView):
                     self.request.event.subevents_annotated(
                         self.request.sales_channel,
                         voucher,
-                    ).using(settings.DATABASE_REPLICA),
+                    ).using(get_read_replica()),
                     self.request
                 ),
                 before=limit_before,
@@ -382,7 +383,7 @@ class EventIndex(EventViewMixin, EventListMixin, CartMixin, TemplateView):
                     self.request.event.subevents_annotated(
                         self.request.sales_channel,
                         voucher=voucher,
-                    ).using(settings.DATABASE_REPLICA),
+                    ).using(get_read_replica()),
                     self.request
                 ),
                 before=limit_before,
@@ -436,7 +437,7 @@ class EventIndex(EventViewMixin, EventListMixin, CartMixin, TemplateView):
                     self.request.event.subevents_annotated(
                         self.request.sales_channel,
                         voucher=voucher,
-                    ).using(settings.DATABASE_REPLICA),
+                    ).using(get_read_replica()),
                     self.request
                 )
             )
@@ -479,7 +480,7 @@ class SeatingPlanView(EventViewMixin, TemplateView):
 
         if request.event.has_subevents:
             if 'subevent' in kwargs:
-                self.subevent = request.event.subevents.using(settings.DATABASE_REPLICA).filter(pk=kwargs['subevent'], active=True).first()
+                self.subevent = request.event.subevents.using(get_read_replica()).filter(pk=kwargs['subevent'], active=True).first()
                 if not self.subevent or not self.subevent.seating_plan:
                     raise Http404()
                 return super().get(request, *args, **kwargs)
@@ -67,6 +67,7 @@ from pretix.base.models import (
 from pretix.base.services.quotas import QuotaAvailability
 from pretix.base.timemachine import time_machine_now
 from pretix.helpers.compat import date_fromisocalendar
+from pretix.helpers.database import get_read_replica
 from pretix.helpers.daterange import daterange
 from pretix.helpers.formats.en.formats import (
     SHORT_MONTH_DAY_FORMAT, WEEK_FORMAT,
@@ -188,7 +189,7 @@ class EventListMixin:
 
     def _get_event_list_queryset(self):
         query = Q(is_public=True) & Q(live=True)
-        qs = self.request.organizer.events.using(settings.DATABASE_REPLICA).filter(query)
+        qs = self.request.organizer.events.using(get_read_replica()).filter(query)
         qs = qs.filter(Q(all_sales_channels=True) | Q(limit_sales_channels=self.request.sales_channel))
 
         show_old = "old" in self.request.GET
@@ -232,7 +233,7 @@ class EventListMixin:
     def _set_month_to_next_subevent(self):
         tz = self.request.event.timezone
         now_dt = time_machine_now()
-        next_sev = self.request.event.subevents.using(settings.DATABASE_REPLICA).annotate(
+        next_sev = self.request.event.subevents.using(get_read_replica()).annotate(
             effective_date=Case(
                 When(date_from__lt=now_dt, date_to__isnull=False, date_to__gte=now_dt, then=Value(now_dt)),
                 default=F('date_from'),
@@ -253,7 +254,7 @@ class EventListMixin:
 
     def _set_month_to_next_event(self):
         now_dt = now()
-        next_ev = filter_qs_by_attr(Event.objects.using(settings.DATABASE_REPLICA).annotate(
+        next_ev = filter_qs_by_attr(Event.objects.using(get_read_replica()).annotate(
             effective_date=Case(
                 When(date_from__lt=now_dt, date_to__isnull=False, date_to__gte=now_dt, then=Value(now())),
                 default=F('date_from'),
@@ -265,7 +266,7 @@ class EventListMixin:
             is_public=True,
             has_subevents=False
         ), self.request).order_by('effective_date').first()
-        next_sev = filter_qs_by_attr(SubEvent.objects.using(settings.DATABASE_REPLICA).annotate(
+        next_sev = filter_qs_by_attr(SubEvent.objects.using(get_read_replica()).annotate(
             effective_date=Case(
                 When(date_from__lt=now_dt, date_to__isnull=False, date_to__gte=now_dt, then=Value(now_dt)),
                 default=F('date_from'),
@@ -311,7 +312,7 @@ class EventListMixin:
     def _set_week_to_next_subevent(self):
         now_dt = time_machine_now()
         tz = self.request.event.timezone
-        next_sev = self.request.event.subevents.using(settings.DATABASE_REPLICA).annotate(
+        next_sev = self.request.event.subevents.using(get_read_replica()).annotate(
             effective_date=Case(
                 When(date_from__lt=now_dt, date_to__isnull=False, date_to__gte=now_dt, then=Value(now_dt)),
                 default=F('date_from'),
@@ -332,7 +333,7 @@ class EventListMixin:
 
     def _set_week_to_next_event(self):
         now_dt = now()
-        next_ev = filter_qs_by_attr(Event.objects.using(settings.DATABASE_REPLICA).annotate(
+        next_ev = filter_qs_by_attr(Event.objects.using(get_read_replica()).annotate(
             effective_date=Case(
                 When(date_from__lt=now_dt, date_to__isnull=False, date_to__gte=now_dt, then=Value(now_dt)),
                 default=F('date_from'),
@@ -344,7 +345,7 @@ class EventListMixin:
             is_public=True,
             has_subevents=False
         ), self.request).order_by('effective_date').first()
-        next_sev = filter_qs_by_attr(SubEvent.objects.using(settings.DATABASE_REPLICA).annotate(
+        next_sev = filter_qs_by_attr(SubEvent.objects.using(get_read_replica()).annotate(
             effective_date=Case(
                 When(date_from__lt=now_dt, date_to__isnull=False, date_to__gte=now_dt, then=Value(now_dt)),
                 default=F('date_from'),
@@ -805,7 +806,7 @@ class CalendarView(OrganizerViewMixin, EventListMixin, TemplateView):
         ebd = defaultdict(list)
         timezones = set()
         add_events_for_days(self.request, Event.annotated(self.request.organizer.events, self.request.sales_channel).using(
-            settings.DATABASE_REPLICA
+            get_read_replica()
         ).filter(
             Q(all_sales_channels=True) | Q(limit_sales_channels=self.request.sales_channel),
         ), before, after, ebd, timezones)
@@ -827,7 +828,7 @@ class CalendarView(OrganizerViewMixin, EventListMixin, TemplateView):
                         )
                     )
                 )
-            ), self.request.sales_channel), self.request).using(settings.DATABASE_REPLICA),
+            ), self.request.sales_channel), self.request).using(get_read_replica()),
             before=before,
             after=after,
             ebd=ebd,
@@ -909,7 +910,7 @@ class WeekCalendarView(OrganizerViewMixin, EventListMixin, TemplateView):
         ebd = defaultdict(list)
         timezones = set()
         add_events_for_days(self.request, Event.annotated(self.request.organizer.events, self.request.sales_channel).using(
-            settings.DATABASE_REPLICA
+            get_read_replica()
         ).filter(
             Q(all_sales_channels=True) | Q(limit_sales_channels=self.request.sales_channel),
         ), before, after, ebd, timezones)
@@ -931,7 +932,7 @@ class WeekCalendarView(OrganizerViewMixin, EventListMixin, TemplateView):
                         )
                     )
                 )
-            ), self.request.sales_channel), self.request).using(settings.DATABASE_REPLICA),
+            ), self.request.sales_channel), self.request).using(get_read_replica()),
             before=before,
             after=after,
             ebd=ebd,
@@ -947,7 +948,7 @@ class DayCalendarView(OrganizerViewMixin, EventListMixin, TemplateView):
 
     def _set_date_to_next_event(self):
         now_dt = now()
-        next_ev = filter_qs_by_attr(Event.objects.using(settings.DATABASE_REPLICA).annotate(
+        next_ev = filter_qs_by_attr(Event.objects.using(get_read_replica()).annotate(
             effective_date=Case(
                 When(date_from__lt=now_dt, date_to__isnull=False, date_to__gte=now_dt, then=Value(now_dt)),
                 default=F('date_from'),
@@ -959,7 +960,7 @@ class DayCalendarView(OrganizerViewMixin, EventListMixin, TemplateView):
             is_public=True,
             date_from__gte=now(),
         ), self.request).order_by('effective_date').first()
-        next_sev = filter_qs_by_attr(SubEvent.objects.using(settings.DATABASE_REPLICA).annotate(
+        next_sev = filter_qs_by_attr(SubEvent.objects.using(get_read_replica()).annotate(
             effective_date=Case(
                 When(date_from__lt=now_dt, date_to__isnull=False, date_to__gte=now_dt, then=Value(now_dt)),
                 default=F('date_from'),
@@ -1267,7 +1268,7 @@ class DayCalendarView(OrganizerViewMixin, EventListMixin, TemplateView):
         ebd = defaultdict(list)
         timezones = set()
         add_events_for_days(self.request, Event.annotated(self.request.organizer.events, self.request.sales_channel).using(
-            settings.DATABASE_REPLICA
+            get_read_replica()
         ).filter(
             Q(all_sales_channels=True) | Q(limit_sales_channels=self.request.sales_channel),
         ), before, after, ebd, timezones)
@@ -1289,7 +1290,7 @@ class DayCalendarView(OrganizerViewMixin, EventListMixin, TemplateView):
                         )
                     )
                 )
-            ), self.request.sales_channel), self.request).using(settings.DATABASE_REPLICA),
+            ), self.request.sales_channel), self.request).using(get_read_replica()),
             before=before,
             after=after,
             ebd=ebd,
@@ -0,0 +1,103 @@
+#
+# This file is part of pretix (Community Edition).
+#
+# Copyright (C) 2014-2020  Raphael Michel and contributors
+# Copyright (C) 2020-today pretix GmbH and contributors
+#
+# This program is free software: you can redistribute it and/or modify it under the terms of the GNU Affero General
+# Public License as published by the Free Software Foundation in version 3 of the License.
+#
+# ADDITIONAL TERMS APPLY: Pursuant to Section 7 of the GNU Affero General Public License, additional terms are
+# applicable granting you additional permissions and placing additional restrictions on your usage of this software.
+# Please refer to the pretix LICENSE file to obtain the full terms applicable to this work. If you did not receive
+# this file, see <https://pretix.eu/about/en/license>.
+#
+# This program is distributed in the hope that it will be useful, but WITHOUT ANY WARRANTY; without even the implied
+# warranty of MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the GNU Affero General Public License for more
+# details.
+#
+# You should have received a copy of the GNU Affero General Public License along with this program.  If not, see
+# <https://www.gnu.org/licenses/>.
+#
+from urllib.parse import urlencode
+
+from django.http import JsonResponse
+from django.shortcuts import render
+from django.utils.decorators import method_decorator
+from django.utils.http import url_has_allowed_host_and_scheme
+from django.views import View
+from django.views.generic import TemplateView
+
+from pretix.helpers.http import redirect_to_url
+from pretix.presale.views import EventViewMixin, allow_frame_if_namespaced
+from pretix.presale.waitingroom import (
+    admission_rate, get_status, has_cookie, requires_admission, store_ticket,
+    ticket_url,
+)
+
+
+class WaitingRoomMixin(EventViewMixin):
+
+    def get_next_url(self):
+        if "next" in self.request.GET and url_has_allowed_host_and_scheme(self.request.GET.get("next"), allowed_hosts=None):
+            return self.request.GET.get("next")
+        return self.get_index_url()
+
+    def get_admitted_url(self):
+        if self.ticket and not has_cookie(self.request, self.request.event):
+            # Without the cookie, the next page would put the visitor back at the end of the queue
+            return ticket_url(self.get_next_url(), self.request.event, self.ticket)
+        return self.get_next_url()
+
+    def dispatch(self, request, *args, **kwargs):
+        if not requires_admission(request, 'event.index'):
+            self.ticket, self.position = None, 0
+        else:
+            self.ticket, self.position = get_status(request, request.event)
+        response = super().dispatch(request, *args, **kwargs)
+        if self.ticket:
+            store_ticket(request, response, request.event, self.ticket)
+        return response
+
+
+@method_decorator(allow_frame_if_namespaced, 'dispatch')
+class WaitingRoomView(WaitingRoomMixin, TemplateView):
+    template_name = 'pretixpresale/event/waitingroom.html'
+
+    def get(self, request, *args, **kwargs):
+        if self.position <= 0:
+            if self.ticket and not has_cookie(request, request.event):
+                # The browser does not store our cookie, most likely because the shop is embedded into another
+                # website and third-party cookies are blocked. The shop can't be used like this, so the visitor
+                # continues in a new tab that takes the admission along in its URL.
+                return render(request, 'pretixpresale/event/cookies.html', {
+                    'url': self.get_admitted_url(),
+                    'cart_namespace': kwargs.get('cart_namespace'),
+                })
+            return redirect_to_url(self.get_next_url())
+        return super().get(request, *args, **kwargs)
+
+    def get_context_data(self, **kwargs):
+        ctx = super().get_context_data(**kwargs)
+        rate = admission_rate(self.request.event)
+        ctx['position'] = self.position
+        ctx['minutes'] = max(1, round(self.position / rate))
+        # Poll more often when the visitor's turn is near
+        ctx['refresh'] = min(30, max(5, int(self.position / rate * 60 / 4)))
+        # The ticket is kept in the URL of the page in case the browser does not store our cookie
+        url = self.request.path
+        if 'next' in self.request.GET:
+            url += '?' + urlencode({'next': self.request.GET['next']})
+        ctx['refresh_url'] = ticket_url(url, self.request.event, self.ticket)
+        return ctx
+
+
+@method_decorator(allow_frame_if_namespaced, 'dispatch')
+class WaitingRoomStatusView(WaitingRoomMixin, View):
+
+    def get(self, request, *args, **kwargs):
+        return JsonResponse({
+            'admitted': self.position <= 0,
+            'position': self.position,
+            'redirect': self.get_admitted_url() if self.position <= 0 else None,
+        })
@@ -0,0 +1,239 @@
+#
+# This file is part of pretix (Community Edition).
+#
+# Copyright (C) 2014-2020  Raphael Michel and contributors
+# Copyright (C) 2020-today pretix GmbH and contributors
+#
+# This program is free software: you can redistribute it and/or modify it under the terms of the GNU Affero General
+# Public License as published by the Free Software Foundation in version 3 of the License.
+#
+# ADDITIONAL TERMS APPLY: Pursuant to Section 7 of the GNU Affero General Public License, additional terms are
+# applicable granting you additional permissions and placing additional restrictions on your usage of this software.
+# Please refer to the pretix LICENSE file to obtain the full terms applicable to this work. If you did not receive
+# this file, see <https://pretix.eu/about/en/license>.
+#
+# This program is distributed in the hope that it will be useful, but WITHOUT ANY WARRANTY; without even the implied
+# warranty of MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the GNU Affero General Public License for more
+# details.
+#
+# You should have received a copy of the GNU Affero General Public License along with this program.  If not, see
+# <https://www.gnu.org/licenses/>.
+#
+"""
+A virtual waiting room in front of the ticket shop of an event.
+
+If the waiting room is enabled, every visitor receives a numbered ticket in a signed cookie the first time they open
+a page that leads towards a purchase. The highest admitted number grows at a limited rate, and every visitor with a
+number up to that can use the shop normally. Once admitted, this is remembered in the cookie. Visitors whose browser
+does not store the cookie, e.g. in a widget iframe with third-party cookies blocked, keep their ticket in the URL of
+the waiting room page and continue in a new tab once they are admitted. All state lives in
+Redis, so waiting visitors can poll their position without causing any load on the database apart from looking up the
+event. Without Redis, the waiting room is not available.
+"""
+import time
+from urllib.parse import quote, urlencode
+
+from django.conf import settings
+from django.core import signing
+from django.dispatch import receiver
+from django.http import JsonResponse
+from django.utils.translation import gettext as _
+
+from pretix.base.signals import order_placed
+from pretix.helpers.cookies import set_cookie_without_samesite
+from pretix.helpers.http import redirect_to_url
+from pretix.multidomain.urlreverse import eventreverse
+
+# URL names of the shop that are only accessible after admission. Everything else, e.g. existing orders, is not
+# affected by the waiting room.
+GATED_URL_NAMES = {
+    'event.index',
+    'event.seatingplan',
+    'event.redeem',
+    'event.cart.add',
+    'event.cart.create',
+    'event.cart.voucher',
+    'event.checkout.start',
+    'event.checkout',
+}
+
+# Admissions per minute as long as no orders have been placed recently
+DEFAULT_RATE = 60
+MIN_RATE = 10
+# We admit a bit more visitors per minute than the number of orders placed per minute over the last minutes, since
+# not every visitor ends up buying something
+THROUGHPUT_HEADROOM = 1.5
+THROUGHPUT_WINDOW = 5
+# Number of seconds a ticket is valid after it has been issued or after the visitor has been admitted
+TICKET_MAX_AGE = 3 * 3600
+# Query parameter that carries the ticket if the visitor's browser does not store our cookie
+TICKET_PARAM = 'waitingroom_ticket'
+
+
+def _key(event, name):
+    return 'pretix_waitingroom:{}:{}'.format(event.pk, name)
+
+
+def _minute(timestamp=None):
+    return int((timestamp or time.time()) // 60)
+
+
+def _redis():
+    from django_redis import get_redis_connection
+    return get_redis_connection("redis")
+
+
+def cookie_name(event):
+    return 'pretix_waitingroom_{}'.format(event.pk)
+
+
+def admission_rate(event):
+    """
+    Returns the number of visitors to admit per minute.
+    """
+    if event.settings.waiting_room_rate:
+        return event.settings.waiting_room_rate
+    current = _minute()
+    placed = sum(int(v) for v in _redis().mget([
+        _key(event, 'orders:{}'.format(m)) for m in range(current - THROUGHPUT_WINDOW, current)
+    ]) if v)
+    if not placed:
+        return DEFAULT_RATE
+    return max(MIN_RATE, int(placed / THROUGHPUT_WINDOW * THROUGHPUT_HEADROOM))
+
+
+def issue_ticket(event):
+    return _redis().incr(_key(event, 'issued'))
+
+
+def admitted_until(event, rate=None):
+    """
+    Returns the highest admitted ticket number. It grows with the admission rate since the last call, but never
+    more than one minute of admissions beyond the tickets issued so far, so that a quiet period does not let a
+    sudden rush of visitors in at once.
+    """
+    rate = rate or admission_rate(event)
+    key = _key(event, 'admitted')
+
+    def advance(pipe):
+        now = time.time()
+        issued = int(pipe.get(_key(event, 'issued')) or 0)
+        stored, last = pipe.hmget(key, 'admitted', 'last')
+        if stored is None:
+            # If the waiting room has just been enabled, the first minute of visitors is let in right away
+            base, last = issued + rate, now
+        else:
+            base, last = float(stored), float(last)
+            # Clocks of different servers might differ slightly
+            now = max(now, last)
+        grown = base + (now - last) * rate / 60
+        new_admitted = max(base, min(grown, issued + rate))
+        if stored is None or new_admitted != grown or int(new_admitted) > int(base):
+            # Between two admissions, the stored value does not need to change. This keeps visitors polling their
+            # position during a rush from competing for the key.
+            pipe.multi()
+            pipe.hset(key, mapping={'admitted': new_admitted, 'last': now})
+        return new_admitted
+
+    # The value is only written if nobody else changed it since we read it, so it can never move backwards
+    return int(_redis().transaction(advance, key, value_from_callable=True))
+
+
+def _loads(event, value):
+    try:
+        return signing.loads(
+            value or '',
+            salt='pretix.presale.waitingroom.{}'.format(event.pk),
+            max_age=TICKET_MAX_AGE,
+        )
+    except signing.BadSignature:
+        return None
+
+
+def load_ticket(request, event):
+    return _loads(event, request.COOKIES.get(cookie_name(event))) or _loads(event, request.GET.get(TICKET_PARAM))
+
+
+def has_cookie(request, event):
+    return cookie_name(event) in request.COOKIES
+
+
+def ticket_url(url, event, ticket):
+    """
+    Adds the ticket to ``url``, for visitors whose browser does not store our cookie.
+    """
+    return url + ('&' if '?' in url else '?') + urlencode({TICKET_PARAM: dump_ticket(event, ticket)})
+
+
+def dump_ticket(event, ticket):
+    return signing.dumps(ticket, salt='pretix.presale.waitingroom.{}'.format(event.pk))
+
+
+def get_status(request, event):
+    """
+    Returns the ticket of the current visitor (a dictionary with the ticket number ``n`` and the flag ``a`` if the
+    visitor has been admitted) and their position in the queue, issuing a new ticket if they do not have one yet.
+    The ticket needs to be stored in the response by the caller if it differs from the one sent by the visitor.
+    """
+    ticket = load_ticket(request, event)
+    if ticket and ticket.get('a'):
+        return ticket, 0
+    if not ticket:
+        ticket = {'n': issue_ticket(event)}
+    position = ticket['n'] - admitted_until(event)
+    if position <= 0:
+        return {'n': ticket['n'], 'a': True}, 0
+    return ticket, position
+
+
+def store_ticket(request, response, event, ticket):
+    if ticket != _loads(event, request.COOKIES.get(cookie_name(event))):
+        set_cookie_without_samesite(
+            request, response, cookie_name(event), dump_ticket(event, ticket),
+            max_age=TICKET_MAX_AGE, httponly=True,
+        )
+
+
+def waiting_room_redirect(request, url_kwargs, ticket):
+    """
+    Sends a visitor that has not yet been admitted to the waiting room page, from where they will be sent back to
+    the page they requested once it is their turn. The ticket is passed along in the URL in case the visitor's browser
+    does not store the cookie.
+    """
+    kwargs = {}
+    if url_kwargs.get('cart_namespace'):
+        kwargs['cart_namespace'] = url_kwargs['cart_namespace']
+    url = eventreverse(request.event, 'presale:event.waitingroom', kwargs=kwargs)
+    if request.method == 'GET':
+        url += '?next=' + quote(request.get_full_path())
+    url = ticket_url(url, request.event, ticket)
+    if 'ajax' in request.GET or 'ajax' in request.POST:
+        return JsonResponse({
+            'ready': True,
+            'success': False,
+            'redirect': url,
+            'message': _('Due to high demand, you need to wait in line before you can buy tickets.'),
+        })
+    return redirect_to_url(url)
+
+
+def requires_admission(request, url_name):
+    return (
+        settings.HAS_REDIS
+        and url_name in GATED_URL_NAMES
+        and request.event.settings.waiting_room_enabled
+        and not (
+            request.user.is_authenticated
+            and request.user.has_event_permission(request.organizer, request.event, request=request)
+        )
+    )
+
+
+@receiver(order_placed, dispatch_uid="waitingroom_order_placed")
+def count_order(sender, order, **kwargs):
+    if settings.HAS_REDIS and sender.settings.waiting_room_enabled and not sender.settings.waiting_room_rate:
+        key = _key(sender, 'orders:{}'.format(_minute()))
+        pipe = _redis().pipeline()
+        pipe.incr(key)
+        pipe.expire(key, (THROUGHPUT_WINDOW + 1) * 60)
+        pipe.execute()
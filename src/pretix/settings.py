@@ -169,21 +169,37 @@ DATABASES = {
         'TEST': {}
     }
 }
-DATABASE_REPLICA = 'default'
-if config.has_section('replica'):
-    DATABASE_REPLICA = 'replica'
-    DATABASES['replica'] = {
+
+
+def _replica_config(section):
+    return {
         'ENGINE': 'django.db.backends.' + db_backend,
-        'NAME': config.get('replica', 'name', fallback=DATABASES['default']['NAME']),
-        'USER': config.get('replica', 'user', fallback=DATABASES['default']['USER']),
-        'PASSWORD': config.get('replica', 'password', fallback=DATABASES['default']['PASSWORD']),
-        'HOST': config.get('replica', 'host', fallback=DATABASES['default']['HOST']),
-        'PORT': config.get('replica', 'port', fallback=DATABASES['default']['PORT']),
+        'NAME': config.get(section, 'name', fallback=DATABASES['default']['NAME']),
+        'USER': config.get(section, 'user', fallback=DATABASES['default']['USER']),
+        'PASSWORD': config.get(section, 'password', fallback=DATABASES['default']['PASSWORD']),
+        'HOST': config.get(section, 'host', fallback=DATABASES['default']['HOST']),
+        'PORT': config.get(section, 'port', fallback=DATABASES['default']['PORT']),
         'CONN_MAX_AGE': 0 if db_backend == 'sqlite3' else 120,
         'OPTIONS': db_options,
         'TEST': {}
     }
+
+
+# Additional replicas can be configured in sections called [replica_<name>] with the same options as [replica]
+DATABASE_REPLICAS = []
+DATABASE_REPLICA = 'default'
+if config.has_section('replica'):
+    DATABASE_REPLICA = 'replica'
+    DATABASE_REPLICAS = ['replica'] + sorted(s for s in config.sections() if s.startswith('replica_'))
+    for replica in DATABASE_REPLICAS:
+        DATABASES[replica] = _replica_config(replica)
     DATABASE_ROUTERS = ['pretix.helpers.database.ReplicaRouter']
+# Replicas lagging behind by more than this number of seconds are not used
+DATABASE_REPLICA_MAX_LAG = config.getfloat('replica', 'max_lag', fallback=10)
+# Seconds between two checks of the replication lag of a replica, per process
+DATABASE_REPLICA_CHECK_INTERVAL = config.getfloat('replica', 'lag_check_interval', fallback=5)
+# Seconds during which a browser only reads from the primary database after it made a change
+DATABASE_REPLICA_PIN_SECONDS = config.getint('replica', 'pin_after_write', fallback=int(DATABASE_REPLICA_MAX_LAG) + 1)
 
 if config.has_section('dbreadonly'):
     DATABASES['readonly'] = {
@@ -282,6 +298,10 @@ ADMINS = [('Admin', n) for n in config.get('mail', 'admins', fallback='').split(
 METRICS_ENABLED = config.getboolean('metrics', 'enabled', fallback=False)
 METRICS_USER = config.get('metrics', 'user', fallback="metrics")
 METRICS_PASSPHRASE = config.get('metrics', 'passphrase', fallback="")
+METRICS_COLLECT_INTERVAL = config.getint('metrics', 'collect_interval', fallback=300)
+METRICS_QUERY_BUDGET = config.getint('metrics', 'query_budget', fallback=100)
+METRICS_QUERY_DUPLICATE_THRESHOLD = config.getint('metrics', 'query_duplicate_threshold', fallback=10)
+METRICS_QUERY_LOG_RATE = config.getfloat('metrics', 'query_log_rate', fallback=1)  # Percentage of offenders to log
 
 CACHES = {
     'default': {
@@ -369,7 +389,30 @@ if not SESSION_ENGINE:
     else:
         SESSION_ENGINE = "django.contrib.sessions.backends.db"
 
+# Where the responses of API calls with an X-Idempotency-Key header are stored: "database", "redis", or the import
+# path of a subclass of pretix.api.idempotency.BaseIdempotencyBackend
+_idempotency_backend = config.get('idempotency', 'backend', fallback='database')
+if _idempotency_backend == 'redis' and not HAS_REDIS:
+    raise ImproperlyConfigured(
+        "idempotency.backend can only be set to redis if redis is configured."
+    )
+IDEMPOTENCY_BACKEND = {
+    'database': 'pretix.api.idempotency.DatabaseIdempotencyBackend',
+    'redis': 'pretix.api.idempotency.RedisIdempotencyBackend',
+}.get(_idempotency_backend, _idempotency_backend)
+IDEMPOTENCY_TTL = config.getint('idempotency', 'ttl', fallback=3600 * 24)
+# Calls that are locked for longer than this are assumed to have crashed and may be retried
+IDEMPOTENCY_LOCK_TIMEOUT = config.getint('idempotency', 'lock_timeout', fallback=600)
+# Larger responses are stored in the database even if the redis backend is used
+IDEMPOTENCY_MAX_SIZE = config.getint('idempotency', 'max_size', fallback=256 * 1024)
+
 HAS_CELERY = config.has_option('celery', 'broker')
+# Short operations like cart changes can be executed in the web process to save the round trip through celery. They
+# are only sent to the workers if they run into a lock or have recently taken longer than the budget (in seconds).
+INLINE_TASKS = config.getboolean('celery', 'inline_tasks', fallback=False)
+INLINE_TASKS_BUDGET = config.getfloat('celery', 'inline_tasks_budget', fallback=1)
+INLINE_TASKS_LOCK_TIMEOUT = config.getfloat('celery', 'inline_tasks_lock_timeout', fallback=.5)
+INLINE_TASKS_BACKOFF = config.getint('celery', 'inline_tasks_backoff', fallback=60)
 HAS_CELERY_BROKER_TRANSPORT_OPTS = config.has_option('celery', 'broker_transport_options')
 HAS_CELERY_BACKEND_TRANSPORT_OPTS = config.has_option('celery', 'backend_transport_options')
 if HAS_CELERY:
@@ -547,6 +590,10 @@ except ImportError:
     pass
 
 
+if DATABASE_REPLICAS:
+    MIDDLEWARE.insert(MIDDLEWARE.index('pretix.helpers.logs.RequestIdMiddleware') + 1,
+                      'pretix.helpers.database.ReplicaPinningMiddleware')
+
 if METRICS_ENABLED:
     MIDDLEWARE.insert(MIDDLEWARE.index('pretix.base.middleware.CustomCommonMiddleware') + 1,
                       'pretix.helpers.metrics.middleware.MetricsMiddleware')
@@ -558,6 +605,19 @@ if PROFILING_RATE > 0:
         os.mkdir(PROFILE_DIR)
     MIDDLEWARE.insert(0, 'pretix.helpers.profile.middleware.CProfileMiddleware')
 
+# Continuous statistical profiling, see pretix.helpers.profile.sampling
+PROFILING_SAMPLING = config.getboolean('django', 'profile_sampling', fallback=False)
+PROFILING_SAMPLING_INTERVAL = config.getfloat('django', 'profile_sampling_interval', fallback=0.01)  # seconds
+PROFILING_SAMPLING_WINDOW = config.getint('django', 'profile_sampling_window', fallback=600)  # seconds
+PROFILING_SAMPLING_FLUSH_INTERVAL = 30  # seconds
+PROFILING_SAMPLING_RETENTION = config.getint('django', 'profile_sampling_retention', fallback=3600 * 24 * 7)
+if PROFILING_SAMPLING:
+    if not HAS_REDIS and not os.path.exists(PROFILE_DIR):
+        os.mkdir(PROFILE_DIR)
+    # After MultiDomainMiddleware, such that URLs on custom domains are resolved correctly
+    MIDDLEWARE.insert(MIDDLEWARE.index('pretix.multidomain.middlewares.MultiDomainMiddleware') + 1,
+                      'pretix.helpers.profile.middleware.SamplingProfilerMiddleware')
+
 
 # Security settings
 X_FRAME_OPTIONS = 'DENY'
@@ -780,11 +840,15 @@ CELERY_TASK_ROUTES = ([
     ('pretix.base.services.cart.*', {'queue': 'checkout'}),
     ('pretix.base.services.export.scheduled_organizer_export', {'queue': 'background'}),
     ('pretix.base.services.export.scheduled_event_export', {'queue': 'background'}),
+    ('pretix.base.services.orders.expire_event_orders', {'queue': 'background'}),
+    ('pretix.base.services.orders.send_event_expiry_warnings', {'queue': 'background'}),
     ('pretix.base.services.orders.*', {'queue': 'checkout'}),
     ('pretix.base.services.mail.*', {'queue': 'mail'}),
     ('pretix.base.services.update_check.*', {'queue': 'background'}),
     ('pretix.base.services.quotas.*', {'queue': 'background'}),
     ('pretix.base.services.waitinglist.*', {'queue': 'background'}),
+    ('pretix.base.services.periodic.*', {'queue': 'background'}),
+    ('pretix.base.services.seating.*', {'queue': 'background'}),
     ('pretix.base.services.notifications.*', {'queue': 'notifications'}),
     ('pretix.api.webhooks.*', {'queue': 'notifications'}),
     ('pretix.presale.style.*', {'queue': 'background'}),
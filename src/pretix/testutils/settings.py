@@ -79,8 +79,10 @@ CACHES = {
 
 # Set databases
 DATABASE_REPLICA = 'default'
+DATABASE_REPLICAS = []
 DATABASES['default']['CONN_MAX_AGE'] = 0
-DATABASES.pop('replica', None)
+for alias in [a for a in DATABASES if a == 'replica' or a.startswith('replica_')]:
+    DATABASES.pop(alias)
 
 MIDDLEWARE.insert(0, 'pretix.testutils.middleware.DebugFlagMiddleware')
 
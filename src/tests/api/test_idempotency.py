@@ -21,10 +21,17 @@
 #
 import datetime
 import json
+from hashlib import sha1
+from unittest import mock
 
 import pytest
+from django.test import override_settings
 from django.utils.timezone import now
 
+from pretix.api.idempotency import (
+    LOCKED, DatabaseIdempotencyBackend, RedisIdempotencyBackend,
+    StoredResponse,
+)
 from pretix.api.models import ApiCall
 from pretix.base.models import Order
 
@@ -185,3 +192,116 @@ def test_allow_retry_409(token_client, organizer, event, order):
     assert resp.status_code == 200
     order.refresh_from_db()
     assert order.status == Order.STATUS_PAID
+
+
+@pytest.mark.django_db
+def test_expired(token_client, organizer):
+    resp = token_client.post('/api/v1/organizers/{}/events/'.format(organizer.slug),
+                             PAYLOAD, format='json', HTTP_X_IDEMPOTENCY_KEY='foo')
+    assert resp.status_code == 201
+    ApiCall.objects.all().update(created=now() - datetime.timedelta(hours=25))
+    resp = token_client.post('/api/v1/organizers/{}/events/'.format(organizer.slug),
+                             PAYLOAD, format='json', HTTP_X_IDEMPOTENCY_KEY='foo')
+    assert resp.status_code == 400
+
+
+@pytest.mark.django_db
+def test_stale_lock(token_client, organizer):
+    resp = token_client.post('/api/v1/organizers/{}/events/'.format(organizer.slug),
+                             PAYLOAD, format='json', HTTP_X_IDEMPOTENCY_KEY='foo')
+    assert resp.status_code == 201
+    ApiCall.objects.all().update(locked=now() - datetime.timedelta(hours=1))
+    resp = token_client.post('/api/v1/organizers/{}/events/'.format(organizer.slug),
+                             PAYLOAD, format='json', HTTP_X_IDEMPOTENCY_KEY='foo')
+    assert resp.status_code == 400
+
+
+@pytest.mark.django_db
+def test_query_expired_is_read_only(token_client, organizer):
+    resp = token_client.post('/api/v1/organizers/{}/events/'.format(organizer.slug),
+                             PAYLOAD, format='json', HTTP_X_IDEMPOTENCY_KEY='foo')
+    assert resp.status_code == 201
+    ApiCall.objects.all().update(created=now() - datetime.timedelta(hours=25))
+    resp = token_client.get('/api/v1/idempotency_query?key=foo')
+    assert resp.status_code == 404
+    assert ApiCall.objects.count() == 1
+
+
+@pytest.mark.django_db
+def test_store_after_lost_reservation():
+    backend = DatabaseIdempotencyBackend()
+    request = mock.Mock(method='POST', path='/api/v1/organizers/dummy/events/')
+    assert backend.acquire('hash', 'foo', request) is None
+    # Our reservation expires while the call is executed, and another call with the same key reserves the key after
+    # our response has been rejected by the update
+    ApiCall.objects.all().update(locked=now() - datetime.timedelta(hours=1))
+    assert backend.acquire('hash', 'foo', request) is None
+    with mock.patch('django.db.models.QuerySet.update', return_value=0):
+        backend.store('hash', 'foo', request, StoredResponse(201, {}, b'{}'))
+    assert backend.get('hash', 'foo') is LOCKED
+
+
+@pytest.fixture
+def redis_backend(fakeredis_client):
+    with override_settings(IDEMPOTENCY_BACKEND='pretix.api.idempotency.RedisIdempotencyBackend'):
+        yield fakeredis_client
+
+
+@pytest.mark.django_db
+def test_redis_scoped_by_key(token_client, organizer, redis_backend):
+    resp = token_client.post('/api/v1/organizers/{}/events/'.format(organizer.slug),
+                             PAYLOAD, format='json', HTTP_X_IDEMPOTENCY_KEY='foo')
+    assert resp.status_code == 201
+    d1 = resp
+    resp = token_client.post('/api/v1/organizers/{}/events/'.format(organizer.slug),
+                             PAYLOAD, format='json', HTTP_X_IDEMPOTENCY_KEY='foo')
+    assert resp.status_code == 201
+    assert d1.data == json.loads(resp.content.decode())
+    assert d1.headers._store == resp.headers._store
+    resp = token_client.get('/api/v1/idempotency_query?key=foo')
+    assert resp.status_code == 201
+    assert d1.data == json.loads(resp.content.decode())
+    resp = token_client.post('/api/v1/organizers/{}/events/'.format(organizer.slug),
+                             PAYLOAD, format='json', HTTP_X_IDEMPOTENCY_KEY='bar')
+    assert resp.status_code == 400
+    assert not ApiCall.objects.exists()
+    assert 0 < redis_backend.ttl(next(redis_backend.scan_iter('pretix_idempotency:*'))) <= 24 * 3600
+
+
+@pytest.mark.django_db
+def test_redis_concurrent(token_client, organizer, redis_backend):
+    backend = RedisIdempotencyBackend()
+    auth_hash = sha1('{}:'.format(token_client._credentials['HTTP_AUTHORIZATION']).encode()).hexdigest()
+    assert backend.acquire(auth_hash, 'foo', None) is None
+    resp = token_client.post('/api/v1/organizers/{}/events/'.format(organizer.slug),
+                             PAYLOAD, format='json', HTTP_X_IDEMPOTENCY_KEY='foo')
+    assert resp.status_code == 409
+    backend.release(auth_hash, 'foo')
+    resp = token_client.post('/api/v1/organizers/{}/events/'.format(organizer.slug),
+                             PAYLOAD, format='json', HTTP_X_IDEMPOTENCY_KEY='foo')
+    assert resp.status_code == 201
+
+
+@pytest.mark.django_db
+def test_redis_large_response(token_client, organizer, redis_backend):
+    with override_settings(IDEMPOTENCY_MAX_SIZE=10):
+        resp = token_client.post('/api/v1/organizers/{}/events/'.format(organizer.slug),
+                                 PAYLOAD, format='json', HTTP_X_IDEMPOTENCY_KEY='foo')
+        assert resp.status_code == 201
+        d1 = resp
+        assert ApiCall.objects.get().response_code == 201
+        resp = token_client.post('/api/v1/organizers/{}/events/'.format(organizer.slug),
+                                 PAYLOAD, format='json', HTTP_X_IDEMPOTENCY_KEY='foo')
+        assert resp.status_code == 201
+        assert d1.data == json.loads(resp.content.decode())
+
+
+@pytest.mark.django_db
+def test_redis_forget_responses(token_client, device, organizer, redis_backend):
+    token_client.credentials(HTTP_AUTHORIZATION='Device ' + device.api_token)
+    resp = token_client.post('/api/v1/organizers/{}/events/'.format(organizer.slug),
+                             PAYLOAD, format='json', HTTP_X_IDEMPOTENCY_KEY='foo')
+    assert resp.status_code == 403
+    RedisIdempotencyBackend().forget_responses(sha1('Device {}:'.format(device.api_token).encode()).hexdigest(), 403)
+    resp = token_client.get('/api/v1/idempotency_query?key=foo')
+    assert resp.status_code == 404
@@ -30,6 +30,7 @@ from django.core import mail as djmail
 from django.utils.timezone import now
 from django_countries.fields import Country
 from django_scopes import scopes_disabled
+from freezegun import freeze_time
 from stripe import error
 from tests.plugins.stripe.test_checkout import apple_domain_create
 from tests.plugins.stripe.test_provider import MockedCharge
@@ -371,6 +372,92 @@ TEST_ORDER_RES = {
 }
 
 
+@pytest.mark.django_db
+def test_order_list_cursor_pagination(token_client, organizer, event, order):
+    with scopes_disabled():
+        for code in ('BAZ', 'AAA'):
+            Order.objects.create(
+                code=code, event=event, email='dummy@dummy.test', status=Order.STATUS_PENDING,
+                datetime=now(), expires=now(), total=23, locale='en',
+                sales_channel=event.organizer.sales_channels.get(identifier="web"),
+            )
+
+    resp = token_client.get('/api/v1/organizers/{}/events/{}/orders/?pagination=cursor&page_size=2&ordering=code'.format(
+        organizer.slug, event.slug
+    ))
+    assert resp.status_code == 200
+    assert 'count' not in resp.data
+    assert [o['code'] for o in resp.data['results']] == ['FOO', 'BAZ']
+
+    resp = token_client.get(resp.data['next'])
+    assert [o['code'] for o in resp.data['results']] == ['AAA']
+    assert resp.data['next'] is None
+
+    resp = token_client.get('/api/v1/organizers/{}/orders/?pagination=cursor&page_size=500'.format(organizer.slug))
+    assert [o['code'] for o in resp.data['results']] == ['FOO', 'BAZ', 'AAA']
+
+    resp = token_client.get('/api/v1/organizers/{}/events/{}/orderpositions/?pagination=cursor'.format(
+        organizer.slug, event.slug
+    ))
+    assert resp.status_code == 200
+    assert 'count' not in resp.data
+    assert len(resp.data['results']) == 1
+
+
+@pytest.mark.django_db
+def test_order_stream(token_client, organizer, event, order):
+    with scopes_disabled():
+        for code in ('BAZ', 'AAA'):
+            Order.objects.create(
+                code=code, event=event, email='dummy@dummy.test', status=Order.STATUS_PAID,
+                datetime=now(), expires=now(), total=23, locale='en',
+                sales_channel=event.organizer.sales_channels.get(identifier="web"),
+            )
+
+    with mock.patch('pretix.api.views.order.ORDER_STREAM_CHUNK_SIZE', 2):
+        resp = token_client.get('/api/v1/organizers/{}/events/{}/orders/stream/'.format(organizer.slug, event.slug))
+        assert resp.status_code == 200
+        assert resp['Content-Type'] == 'application/x-ndjson'
+        lines = b"".join(resp.streaming_content).decode().splitlines()
+    orders = [json.loads(line) for line in lines]
+    assert [o['code'] for o in orders] == ['FOO', 'BAZ', 'AAA']
+    assert len(orders[0]['positions']) == 1
+    assert orders[0]['payments']
+
+    resp = token_client.get('/api/v1/organizers/{}/orders/stream/?status=p'.format(organizer.slug))
+    assert [json.loads(line)['code'] for line in b"".join(resp.streaming_content).decode().splitlines()] == ['BAZ', 'AAA']
+
+
+@pytest.mark.django_db
+@freeze_time("2017-12-01 10:00:00+00:00")
+def test_order_list_compiled_representation(token_client, organizer, event, order, item, question):
+    from pretix.api.views.order import (
+        EventOrderPositionViewSet, EventOrderViewSet, OrganizerOrderViewSet,
+    )
+
+    urls = [
+        '/api/v1/organizers/{}/events/{}/orders/?pdf_data=true'.format(organizer.slug, event.slug),
+        '/api/v1/organizers/{}/events/{}/orders/{}/'.format(organizer.slug, event.slug, order.code),
+        '/api/v1/organizers/{}/events/{}/orderpositions/?pdf_data=true'.format(organizer.slug, event.slug),
+        '/api/v1/organizers/{}/orders/'.format(organizer.slug),
+    ]
+    fast = [token_client.get(url).content for url in urls]
+
+    def generic_context(viewset):
+        get_serializer_context = viewset.get_serializer_context
+        return mock.patch.object(
+            viewset, 'get_serializer_context',
+            lambda self: {**get_serializer_context(self), 'compiled_representation': False}
+        )
+
+    with generic_context(EventOrderViewSet), generic_context(EventOrderPositionViewSet), \
+            generic_context(OrganizerOrderViewSet):
+        generic = [token_client.get(url).content for url in urls]
+
+    assert fast == generic
+    assert json.loads(fast[0])['results'][0]['positions'][0]['pdf_data']
+
+
 @pytest.mark.django_db
 def test_order_list_filter_subevent_date(token_client, device, organizer, event, order, item, taxrule, subevent, question):
     res = copy.deepcopy(TEST_ORDER_RES)
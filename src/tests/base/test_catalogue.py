@@ -0,0 +1,105 @@
+#
+# This file is part of pretix (Community Edition).
+#
+# Copyright (C) 2014-2020  Raphael Michel and contributors
+# Copyright (C) 2020-today pretix GmbH and contributors
+#
+# This program is free software: you can redistribute it and/or modify it under the terms of the GNU Affero General
+# Public License as published by the Free Software Foundation in version 3 of the License.
+#
+# ADDITIONAL TERMS APPLY: Pursuant to Section 7 of the GNU Affero General Public License, additional terms are
+# applicable granting you additional permissions and placing additional restrictions on your usage of this software.
+# Please refer to the pretix LICENSE file to obtain the full terms applicable to this work. If you did not receive
+# this file, see <https://pretix.eu/about/en/license>.
+#
+# This program is distributed in the hope that it will be useful, but WITHOUT ANY WARRANTY; without even the implied
+# warranty of MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the GNU Affero General Public License for more
+# details.
+#
+# You should have received a copy of the GNU Affero General Public License along with this program.  If not, see
+# <https://www.gnu.org/licenses/>.
+#
+from decimal import Decimal
+
+import pytest
+from django.core.cache import cache
+from django.test import override_settings
+from django.utils.timezone import now
+from django_scopes import scope
+
+from pretix.base.models import Event, Organizer
+from pretix.base.services.catalogue import EventCatalogue
+
+
+@pytest.fixture
+def event():
+    o = Organizer.objects.create(name='Dummy', slug='dummy')
+    event = Event.objects.create(
+        organizer=o, name='Dummy', slug='dummy', date_from=now(), has_subevents=True,
+    )
+    with override_settings(CACHES={'default': {'BACKEND': 'django.core.cache.backends.locmem.LocMemCache'}}):
+        cache.clear()
+        with scope(organizer=o):
+            yield event
+
+
+@pytest.mark.django_db
+def test_shared_between_instances(event, django_assert_num_queries):
+    se = event.subevents.create(name='Date', date_from=now())
+    ticket = event.items.create(name='Ticket', default_price=Decimal('23.00'))
+    shirt = event.items.create(name='Shirt', default_price=Decimal('10.00'))
+    red = shirt.variations.create(value='Red')
+    quota = event.quotas.create(name='Quota', size=10, subevent=se)
+    quota.items.add(ticket, shirt)
+    quota.variations.add(red)
+    event.quotas.create(name='Other date', size=10, subevent=event.subevents.create(name='Other', date_from=now()))
+
+    c = EventCatalogue(event)
+    assert set(c.items) == {ticket.pk, shirt.pk}
+    assert c.subevents([se.pk, '0']) == {se.pk: se}
+    assert c.quotas(ticket, None, se) == [quota]
+
+    with django_assert_num_queries(0):
+        c = EventCatalogue(event)
+        assert c.variations[red.pk].item is c.items[shirt.pk]
+        assert c.items[shirt.pk].has_variations
+        assert c.subevents([se.pk])[se.pk].event is event
+        assert c.quotas(shirt, c.variations[red.pk], se) == [quota]
+        assert c.quotas(ticket, None, c.subevents([se.pk])[se.pk])[0].subevent.name == 'Date'
+
+
+@pytest.mark.django_db
+def test_invalidated_on_change(event, django_capture_on_commit_callbacks):
+    se = event.subevents.create(name='Date', date_from=now())
+    ticket = event.items.create(name='Ticket', default_price=Decimal('23.00'))
+    quota = event.quotas.create(name='Quota', size=10, subevent=se)
+    c = EventCatalogue(event)
+    assert c.quotas(ticket, None, se) == []
+    assert c.subevents([se.pk])[se.pk].active is False
+
+    with django_capture_on_commit_callbacks(execute=True):
+        quota.items.add(ticket)
+    assert EventCatalogue(event).quotas(ticket, None, se) == [quota]
+
+    with django_capture_on_commit_callbacks(execute=True):
+        ticket.bundles.create(bundled_item=event.items.create(name='Shirt', default_price=Decimal('10.00')))
+    assert len(EventCatalogue(event).items[ticket.pk].bundles.all()) == 1
+
+    with django_capture_on_commit_callbacks(execute=True):
+        se.active = True
+        se.save()
+    assert EventCatalogue(event).subevents([se.pk])[se.pk].active is True
+
+
+@pytest.mark.django_db
+def test_invalidated_on_tax_rule_change(event, django_capture_on_commit_callbacks):
+    tax_rule = event.tax_rules.create(name='VAT', rate=Decimal('19.00'))
+    ticket = event.items.create(name='Ticket', default_price=Decimal('23.00'), tax_rule=tax_rule)
+    outdated = EventCatalogue(event)._load_items()
+
+    with django_capture_on_commit_callbacks(execute=True):
+        tax_rule.rate = Decimal('7.00')
+        tax_rule.save()
+        # A concurrent request that does not see the change yet stores its snapshot before the commit
+        EventCatalogue(event).cache.set('catalogue:items', outdated)
+    assert EventCatalogue(event).items[ticket.pk].tax_rule.rate == Decimal('7.00')
@@ -20,17 +20,24 @@
 # <https://www.gnu.org/licenses/>.
 #
 from datetime import datetime, time, timedelta, timezone
+from decimal import Decimal
 
 import pytest
 from django.core import mail as djmail
+from django.test import override_settings
 from django.utils.timezone import now
 from django_scopes import scope
 from freezegun import freeze_time
 
+from pretix.base.exporter import BaseExporter
+from pretix.base.exporters.invoices import InvoiceExporter
 from pretix.base.models import (
-    Event, Organizer, ScheduledEventExport, ScheduledOrganizerExport, User,
+    Event, Order, Organizer, ScheduledEventExport, ScheduledOrganizerExport,
+    User,
 )
-from pretix.base.services.export import run_scheduled_exports
+from pretix.base.services.export import _render_export, run_scheduled_exports
+from pretix.base.services.invoices import generate_invoice
+from pretix.helpers import database
 
 
 @pytest.fixture(scope='function')
@@ -362,3 +369,49 @@ def test_organizer_ok(event, user, team):
     assert len(djmail.outbox[0].attachments) == 1
     assert djmail.outbox[0].attachments[0][0] == "dummy_events.csv"
     assert len(djmail.outbox[0].attachments[0][1].splitlines()) == 3
+
+
+@pytest.fixture
+def replica_reads_recorded(monkeypatch):
+    # The replica does not exist, so we record where reads would go and let them all hit the primary database
+    reads = []
+
+    def db_for_read(self, model, **hints):
+        reads.append((model, database._replica_scope.get()))
+        return 'default'
+
+    monkeypatch.setattr(database, 'replication_lag', lambda alias: 5)
+    monkeypatch.setattr(database, '_replica_health', {})
+    monkeypatch.setattr(database.ReplicaRouter, 'db_for_read', db_for_read)
+    with override_settings(DATABASE_REPLICAS=['replica'], DATABASE_ROUTERS=['pretix.helpers.database.ReplicaRouter']):
+        yield reads
+
+
+@pytest.mark.django_db(transaction=True)
+def test_invoice_export_not_on_replica(event, replica_reads_recorded):
+    ticket = event.items.create(name='Ticket', default_price=Decimal('23.00'))
+    o = Order.objects.create(
+        code='FOO', event=event, email='dummy@dummy.test', status=Order.STATUS_PAID,
+        datetime=now(), expires=now() + timedelta(days=10), total=Decimal('23.00'),
+        sales_channel=event.organizer.sales_channels.get(identifier="web"),
+    )
+    o.positions.create(item=ticket, price=Decimal('23.00'))
+    inv = generate_invoice(o, trigger_pdf=False)
+    assert not inv.file
+
+    # Missing PDF files are generated and read back right away, which a lagging replica would not show yet
+    assert _render_export(InvoiceExporter(event, event.organizer), {})
+    assert replica_reads_recorded
+    assert all(alias is None for model, alias in replica_reads_recorded)
+
+    class CountExporter(BaseExporter):
+        identifier = 'count'
+        repeatable_read = False
+        verbose_name = 'Count'
+
+        def render(self, form_data):
+            return 'count.txt', 'text/plain', str(Order.objects.count()).encode()
+
+    replica_reads_recorded.clear()
+    assert _render_export(CountExporter(event, event.organizer), {})[2] == b'1'
+    assert (Order, 'replica') in replica_reads_recorded
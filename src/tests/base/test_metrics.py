@@ -232,3 +232,58 @@ def test_do_not_break_append_slash(monkeypatch, client):
     r = client.get('/control')
     assert r.status_code == 301
     assert r['Location'] == '/control/'
+
+
+@pytest.mark.django_db
+@override_settings(METRICS_COLLECT_INTERVAL=60)
+def test_collected_gauge(fakeredis_client, monkeypatch):
+    calls = []
+
+    def _collect():
+        calls.append(1)
+        yield {"dimension": "one"}, 42
+
+    monkeypatch.setattr(metrics, "collected_gauges", [])
+    g = metrics.CollectedGauge("my_collected_gauge", "this is a helpstring", ["dimension"], func=_collect)
+
+    # Scraping does not compute anything
+    assert "my_collected_gauge" not in metrics.metric_values()
+    assert not calls
+
+    assert g.is_due()
+    metrics.collect_metrics()
+    assert len(calls) == 1
+    assert not g.is_due()
+    v = metrics.metric_values()
+    assert v["my_collected_gauge"] == {'{dimension="one"}': 42}
+    assert '{collector="my_collected_gauge"}' in v["pretix_metrics_collected_timestamp_seconds"]
+
+    # Not due yet, no recomputation
+    metrics.collect_metrics()
+    metrics.metric_values()
+    assert len(calls) == 1
+
+    metrics.collect_metrics(force=True)
+    assert len(calls) == 2
+
+
+@pytest.mark.django_db
+def test_model_instance_counts_collected(fakeredis_client):
+    metrics.collect_metrics(force=True)
+    v = metrics.metric_values()
+    assert v["pretix_model_instances"]['{model="pretixbase.order"}'] == 0
+
+
+@pytest.mark.django_db
+@override_settings(REAL_CACHE_USED=False)
+def test_collected_gauge_without_shared_cache(monkeypatch):
+    monkeypatch.setattr(metrics, "collected_gauges", [])
+    metrics.CollectedGauge("my_collected_gauge", "this is a helpstring", ["dimension"],
+                           func=lambda: [({"dimension": "one"}, 42)])
+    v = metrics.metric_values()
+    assert v["my_collected_gauge"] == {'{dimension="one"}': 42}
+
+
+def test_collected_gauge_requires_func():
+    with pytest.raises(ValueError):
+        metrics.CollectedGauge("my_collected_gauge", "this is a helpstring")
@@ -23,6 +23,7 @@ import csv
 import datetime
 from decimal import Decimal
 from io import StringIO
+from unittest import mock
 
 import pytest
 from django.conf import settings as django_settings
@@ -35,6 +36,7 @@ from pretix.base.models import (
     CachedFile, Event, Item, Order, OrderPayment, OrderPosition, Organizer,
     Question, QuestionAnswer, User,
 )
+from pretix.base.services import modelimport
 from pretix.base.services.modelimport import DataImportError, import_orders
 
 
@@ -1018,3 +1020,46 @@ def test_import_line_endings_mix(event, item, user):
     )
     assert event.orders.count() == 3
     assert OrderPosition.objects.count() == 3
+
+
+@pytest.mark.django_db
+@scopes_disabled()
+def test_import_resumes_after_committed_chunks(event, item, user):
+    settings = dict(DEFAULT_SETTINGS)
+    settings['item'] = 'static:{}'.format(item.pk)
+    cf = inputfile_factory()
+    save_orders = modelimport._save_orders
+    calls = []
+
+    def fail_second_chunk(*args, **kwargs):
+        calls.append(1)
+        if len(calls) == 2:
+            raise DataImportError('Seat taken')
+        return save_orders(*args, **kwargs)
+
+    with mock.patch('pretix.base.services.modelimport.ORDER_IMPORT_CHUNK_SIZE', 1), \
+            mock.patch('pretix.base.services.modelimport._save_orders', side_effect=fail_second_chunk):
+        result = import_orders.apply(
+            args=(event.pk, cf.id, settings, 'en', user.pk)
+        )
+    assert event.orders.count() == 1
+    assert 'The first 1 lines of your file have already been imported' in str(result.result)
+
+    # A file that does not start with the imported lines is refused
+    other = inputfile_factory()
+    other.file.save("input.csv", ContentFile(other.file.read().decode().replace('Dieter', 'Peter')))
+    result = import_orders.apply(
+        args=(event.pk, other.id, settings, 'en', user.pk)
+    )
+    assert 'you can only import a file that starts with the same 1' in str(result.result)
+    assert event.orders.count() == 1
+
+    # Uploading the same file again continues the import
+    with mock.patch('pretix.base.services.modelimport.ORDER_IMPORT_CHUNK_SIZE', 1):
+        import_orders.apply(
+            args=(event.pk, inputfile_factory().id, settings, 'en', user.pk)
+        )
+    assert not event.settings.order_import_progress
+    assert event.orders.count() == 3
+    assert len({p.secret for p in OrderPosition.objects.all()}) == 3
+    assert len({p.pseudonymization_id for p in OrderPosition.objects.all()}) == 3
@@ -38,6 +38,7 @@ import time
 import zoneinfo
 from datetime import date, timedelta
 from decimal import Decimal
+from unittest import mock
 
 import pytest
 from dateutil.tz import tzoffset
@@ -45,7 +46,7 @@ from django.conf import settings
 from django.core.exceptions import ValidationError
 from django.core.files.storage import default_storage
 from django.core.files.uploadedfile import SimpleUploadedFile
-from django.test import TestCase
+from django.test import TestCase, override_settings
 from django.utils.timezone import now
 from django_scopes import scope, scopes_disabled
 from freezegun import freeze_time
@@ -62,8 +63,14 @@ from pretix.base.models.items import (
     ItemBundle, SubEventItem, SubEventItemVariation,
 )
 from pretix.base.reldate import RelativeDate, RelativeDateWrapper
+from pretix.base.services.cart import CartManager
+from pretix.base.services.cleanup import (
+    clean_cart_positions, release_expired_cart_quotas,
+)
 from pretix.base.services.orders import OrderError, cancel_order, perform_order
 from pretix.base.services.quotas import QuotaAvailability
+from pretix.base.services.seating import SeatAvailability
+from pretix.base.signals import order_canceled
 from pretix.helpers import repeatable_reads_transaction
 from pretix.testutils.scope import classscope
 
@@ -567,6 +574,44 @@ class QuotaTestCase(BaseQuotaTestCase):
         qa.compute(allow_cache=True)
         assert qa.results[self.quota] == (Quota.AVAILABILITY_OK, 5)
 
+    @classscope(attr='o')
+    def test_expired_cart_releases_cached_availability(self):
+        self.quota.items.add(self.item1)
+        self.quota.size = 1
+        self.quota.save()
+        cp = CartPosition.objects.create(event=self.event, item=self.item1, price=2,
+                                         expires=now() + timedelta(minutes=10))
+        qa = QuotaAvailability()
+        qa.queue(self.quota)
+        qa.compute()
+        assert qa.results[self.quota] == (Quota.AVAILABILITY_RESERVED, 0)
+
+        cp.expires = now() - timedelta(minutes=1)
+        cp.save()
+        qa = QuotaAvailability()
+        qa.queue(self.quota)
+        qa.compute(allow_cache=True)
+        assert qa.results[self.quota] == (Quota.AVAILABILITY_RESERVED, 0)
+
+        release_expired_cart_quotas(sender=None)
+        qa = QuotaAvailability()
+        qa.queue(self.quota)
+        qa.compute(allow_cache=True)
+        assert qa.results[self.quota] == (Quota.AVAILABILITY_OK, 1)
+
+    @classscope(attr='o')
+    def test_clean_cart_positions_in_batches(self):
+        for i in range(5):
+            cp = CartPosition.objects.create(event=self.event, item=self.item1, price=2,
+                                             expires=now() - timedelta(days=15))
+            CartPosition.objects.create(event=self.event, item=self.item3, price=2, addon_to=cp,
+                                        expires=now() - timedelta(days=15))
+        recent = CartPosition.objects.create(event=self.event, item=self.item1, price=2,
+                                             expires=now() - timedelta(days=2))
+        with mock.patch('pretix.base.services.cleanup.CART_CLEANUP_BATCH_SIZE', 2):
+            clean_cart_positions(sender=None)
+        assert list(CartPosition.objects.all()) == [recent]
+
     @classscope(attr='o')
     def test_waitinglist_variation_fulfilled(self):
         self.quota.variations.add(self.var1)
@@ -2826,6 +2871,102 @@ class SeatingTestCase(TestCase):
         assert not self.seat_a1.is_available()
         assert self.seat_a2.is_available()
 
+    @classscope(attr='organizer')
+    def test_distancing_generated_plan(self):
+        seats = [
+            self.event.seats.create(seat_number=f"{r}-{c}", row_name=str(r), product=self.ticket,
+                                    x=c * 10 + (5 if r % 2 else 0), y=r * 12)
+            for r in range(20) for c in range(20)
+        ]
+        o = Order.objects.create(
+            code='FOO', event=self.event, email='dummy@dummy.test', total=Decimal("30"),
+            sales_channel=self.event.organizer.sales_channels.get(identifier="web"),
+            locale='en', status=Order.STATUS_PENDING, datetime=now(),
+            expires=now() + timedelta(days=10),
+        )
+        taken = seats[::37]
+        for seat in taken:
+            OrderPosition.objects.create(order=o, item=self.ticket, variation=None, price=Decimal("12"), seat=seat)
+
+        for distance, within_row in ((10, False), (15.7, False), (25, False), (25, True)):
+            self.event.settings.seating_minimal_distance = distance
+            self.event.settings.seating_distance_within_row = within_row
+            expected = {
+                s for s in seats
+                if s not in taken and not any(
+                    (s.x - t.x) ** 2 + (s.y - t.y) ** 2 < distance ** 2 and (not within_row or s.row_name == t.row_name)
+                    for t in taken
+                )
+            }
+            free = set(self.event.free_seats()) - {self.seat_a1, self.seat_a2}
+            assert free == expected
+            for seat in seats[:60]:
+                assert seat.is_available() == (seat in expected)
+
+    @classscope(attr='organizer')
+    @override_settings(CACHES={'default': {'BACKEND': 'django.core.cache.backends.locmem.LocMemCache'}})
+    def test_availability_snapshot(self):
+        seat_b1 = self.event.seats.create(seat_number="B1", product=self.ticket, blocked=True, x=5, y=5)
+        availability = SeatAvailability.get(self.event)
+        assert availability.count_free() == 2
+        assert availability.count_free(include_blocked=True) == 3
+        assert availability.count_free(product_id=self.ticket.pk) == 2
+        assert availability.is_free(self.seat_a1.pk)
+        assert not availability.is_free(seat_b1.pk)
+
+        o = Order.objects.create(
+            code='FOO', event=self.event, email='dummy@dummy.test', total=Decimal("30"),
+            sales_channel=self.event.organizer.sales_channels.get(identifier="web"),
+            locale='en', status=Order.STATUS_PENDING, datetime=now(),
+            expires=now() + timedelta(days=10),
+        )
+        with self.captureOnCommitCallbacks(execute=True):
+            OrderPosition.objects.create(
+                order=o, item=self.ticket, variation=None, price=Decimal("12"),
+                seat=self.seat_a1
+            )
+        availability = SeatAvailability.get(self.event)
+        assert availability.count_free() == 1
+        assert not availability.is_free(self.seat_a1.pk)
+        assert availability.seat_ids_in(availability.bitsets['sold']) == [self.seat_a1.pk]
+
+        self.event.settings.seating_minimal_distance = 1.5
+        availability = SeatAvailability.get(self.event)
+        assert availability.count_free() == self.event.free_seats().count() == 0
+
+        with self.captureOnCommitCallbacks(execute=True):
+            o.status = Order.STATUS_CANCELED
+            o.save()
+            order_canceled.send(self.event, order=o)
+        assert SeatAvailability.get(self.event).count_free() == self.event.free_seats().count() == 2
+
+    @classscope(attr='organizer')
+    @override_settings(CACHES={'default': {'BACKEND': 'django.core.cache.backends.locmem.LocMemCache'}})
+    def test_availability_snapshot_cart(self):
+        self.event.date_from = now() + timedelta(days=1)
+        self.event.date_to = None
+        self.event.seating_plan = self.plan
+        self.event.save()
+        self.seat_a1.seat_guid = 'A1'
+        self.seat_a1.save()
+        self.ticket.quotas.create(event=self.event, name="Ticket", size=None)
+        assert SeatAvailability.get(self.event).count_free() == 2
+
+        cm = CartManager(event=self.event, cart_id='abc',
+                         sales_channel=self.event.organizer.sales_channels.get(identifier="web"))
+        cm.add_new_items([{'item': self.ticket.pk, 'variation': None, 'count': 1, 'seat': 'A1'}])
+        with self.captureOnCommitCallbacks(execute=True):
+            cm.commit()
+        assert SeatAvailability.get(self.event).count_free() == 1
+        cp = CartPosition.objects.get(seat=self.seat_a1)
+
+        cm = CartManager(event=self.event, cart_id='abc',
+                         sales_channel=self.event.organizer.sales_channels.get(identifier="web"))
+        cm.remove_item(cp.pk)
+        with self.captureOnCommitCallbacks(execute=True):
+            cm.commit()
+        assert SeatAvailability.get(self.event).count_free() == 2
+
     @classscope(attr='organizer')
     def test_order_pending(self):
         o = Order.objects.create(
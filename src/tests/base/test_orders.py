@@ -46,7 +46,7 @@ from pretix.base.models import (
 from pretix.base.models.items import SubEventItem
 from pretix.base.models.orders import OrderFee, OrderPayment, OrderRefund
 from pretix.base.payment import (
-    FreeOrderProvider, GiftCardPayment, PaymentException,
+    FreeOrderProvider, GiftCardPayment, ManualPayment, PaymentException,
 )
 from pretix.base.reldate import RelativeDate, RelativeDateWrapper
 from pretix.base.secrets import assign_ticket_secret
@@ -400,6 +400,39 @@ def test_expire_skipped_if_canceled_with_fee(event):
     assert o2.status == Order.STATUS_PENDING
 
 
+@pytest.mark.django_db
+def test_expiring_in_chunks(event, monkeypatch):
+    monkeypatch.setattr('pretix.base.services.orders.EXPIRE_CHUNK_SIZE', 2)
+    ticket = Item.objects.create(event=event, name='Early-bird ticket',
+                                 default_price=Decimal('23.00'), admission=True)
+    orders = []
+    for i in range(5):
+        o = Order.objects.create(
+            code='FO{}'.format(i), event=event, email='dummy@dummy.test',
+            status=Order.STATUS_PENDING, locale='en',
+            datetime=now(), expires=now() - timedelta(days=1),
+            total=23,
+            sales_channel=event.organizer.sales_channels.get(identifier="web"),
+        )
+        OrderPosition.objects.create(
+            order=o, item=ticket, variation=None,
+            price=Decimal("23.00"), attendee_name_parts={'full_name': "Peter"}, positionid=1
+        )
+        o.create_transactions()
+        orders.append(o)
+    orders[4].fees.create(fee_type=OrderFee.FEE_TYPE_CANCELLATION, value=Decimal('5.00'))
+
+    expire_orders(None)
+
+    for o in orders[:4]:
+        o.refresh_from_db()
+        assert o.status == Order.STATUS_EXPIRED
+        assert o.all_logentries().filter(action_type='pretix.event.order.expired').count() == 1
+        assert o.transactions.aggregate(s=Sum(F('price') * F('count')))['s'] == Decimal('0.00')
+    orders[4].refresh_from_db()
+    assert orders[4].status == Order.STATUS_PENDING
+
+
 @pytest.mark.django_db
 def test_expiring_auto_disabled(event):
     event.settings.set('payment_term_expire_automatically', False)
@@ -4655,3 +4688,147 @@ def test_autocreate_medium(event):
     op = order.positions.first()
     m = op.linked_media.get()
     assert m.type == "barcode"
+
+
+@pytest.fixture
+def placed_order(event):
+    o = Order.objects.create(
+        code='FOO', event=event, email='dummy@dummy.test', status=Order.STATUS_PENDING,
+        datetime=now(), expires=now() + timedelta(days=10), total=Decimal('23.00'), locale='en',
+        sales_channel=event.organizer.sales_channels.get(identifier="web"),
+    )
+    ticket = Item.objects.create(event=event, name='Early-bird ticket', default_price=Decimal('23.00'), admission=True)
+    OrderPosition.objects.create(order=o, item=ticket, price=Decimal('23.00'))
+    p = o.payments.create(provider='banktransfer', amount=o.total, state=OrderPayment.PAYMENT_STATE_CREATED)
+    job = o.queued_side_effects.create(
+        event=event, steps=['invoice', 'email', 'email_attendees', 'payment'], params={'payments': [p.pk]},
+        not_before=now(),
+    )
+    return o, job
+
+
+@pytest.mark.django_db
+def test_order_side_effects(event, placed_order):
+    from pretix.base.services.orders import process_order_side_effects
+
+    event.settings.invoice_generate = 'True'
+    order, job = placed_order
+    djmail.outbox = []
+    process_order_side_effects.apply(args=(job.pk,))
+    assert not order.queued_side_effects.exists()
+    assert order.invoices.count() == 1
+    assert len(djmail.outbox) == 1
+    assert order.all_logentries().filter(action_type='pretix.event.order.email.order_placed').exists()
+
+
+@pytest.mark.django_db
+def test_order_side_effects_retry(event, placed_order, monkeypatch):
+    from pretix.base.services import orders
+
+    order, job = placed_order
+    djmail.outbox = []
+
+    def fail(*args, **kwargs):
+        raise ValueError("Mail server on fire")
+
+    monkeypatch.setitem(orders.ORDER_PLACED_SIDE_EFFECTS, 'email', fail)
+    monkeypatch.setattr(orders.process_order_side_effects, 'apply_async', lambda *args, **kwargs: None)
+    orders.process_order_side_effects.apply(args=(job.pk,))
+    job.refresh_from_db()
+    assert job.steps == ['email', 'email_attendees', 'payment']
+    assert job.failed_attempts == 1
+    assert job.in_flight_since is None
+    assert job.not_before > now()
+    assert order.all_logentries().filter(action_type='pretix.event.order.side_effects.retry').exists()
+
+    # After the maximum number of attempts, the step is skipped and the remaining steps still run
+    job.failed_attempts = orders.SIDE_EFFECT_MAX_ATTEMPTS - 1
+    job.save()
+    orders.process_order_side_effects.apply(args=(job.pk,))
+    assert not order.queued_side_effects.exists()
+    assert order.all_logentries().filter(action_type='pretix.event.order.side_effects.failed').exists()
+    assert len(djmail.outbox) == 0
+
+
+@pytest.mark.django_db
+def test_order_side_effects_picked_up_periodically(event, placed_order):
+    from pretix.base.services import orders
+
+    order, job = placed_order
+    job.in_flight_since = now() - timedelta(hours=1)
+    job.save()
+    orders.pick_up_order_side_effects(None)
+    assert not order.queued_side_effects.exists()
+
+
+@pytest.mark.django_db
+def test_order_side_effects_payment_warning(event, placed_order, monkeypatch):
+    from pretix.base.services import orders
+
+    order, job = placed_order
+    order.payments.update(provider='manual')
+    djmail.outbox = []
+
+    def execute_payment(self, request, payment):
+        raise PaymentException('Card declined')
+
+    monkeypatch.setattr(ManualPayment, 'execute_payment', execute_payment)
+    job = orders._claim_order_side_effects(job.pk)
+    assert orders.run_order_side_effects(job) == ['Card declined']
+    p = order.payments.get()
+    assert p.state == OrderPayment.PAYMENT_STATE_CANCELED
+    assert not order.all_logentries().filter(action_type='pretix.event.order.payment.failed').exists()
+    assert len(djmail.outbox) == 1
+
+
+@pytest.mark.django_db
+def test_order_side_effects_email_not_repeated_after_crash(event, placed_order, monkeypatch):
+    from pretix.base.services import orders
+
+    order, job = placed_order
+
+    def crash(*args, **kwargs):
+        raise KeyboardInterrupt()
+
+    monkeypatch.setitem(orders.ORDER_PLACED_SIDE_EFFECTS, 'email', crash)
+    with pytest.raises(KeyboardInterrupt):
+        orders.process_order_side_effects.apply(args=(job.pk,), throw=True)
+    job.refresh_from_db()
+    assert job.steps == ['email_attendees', 'payment']
+
+
+@pytest.mark.django_db
+def test_order_side_effects_attendee_email_retry(event, placed_order, monkeypatch):
+    from pretix.base.services import orders
+
+    order, job = placed_order
+    event.settings.mail_send_order_placed_attendee = True
+    ticket = order.positions.get().item
+    p1 = order.positions.get()
+    p1.attendee_email = 'first@dummy.test'
+    p1.save()
+    p2 = OrderPosition.objects.create(order=order, item=ticket, price=Decimal('23.00'), attendee_email='second@dummy.test')
+    job.steps = ['email_attendees']
+    job.save()
+    djmail.outbox = []
+
+    send_attendee_email = orders._order_placed_email_attendee
+
+    def fail_first(event, order, position, *args, **kwargs):
+        if position.pk == p1.pk:
+            raise ValueError("Mail server on fire")
+        send_attendee_email(event, order, position, *args, **kwargs)
+
+    monkeypatch.setattr(orders, '_order_placed_email_attendee', fail_first)
+    monkeypatch.setattr(orders.process_order_side_effects, 'apply_async', lambda *args, **kwargs: None)
+    orders.process_order_side_effects.apply(args=(job.pk,))
+    job.refresh_from_db()
+    assert job.steps == ['email_attendees']
+    assert job.params['attendees_sent'] == [p2.pk]
+    assert [m.to for m in djmail.outbox] == [['second@dummy.test']]
+
+    # The retry only sends the email that failed
+    monkeypatch.setattr(orders, '_order_placed_email_attendee', send_attendee_email)
+    orders.process_order_side_effects.apply(args=(job.pk,))
+    assert not order.queued_side_effects.exists()
+    assert [m.to for m in djmail.outbox] == [['second@dummy.test'], ['first@dummy.test']]
@@ -19,6 +19,8 @@
 # You should have received a copy of the GNU Affero General Public License along with this program.  If not, see
 # <https://www.gnu.org/licenses/>.
 #
+import gc
+
 import pytest
 from django.conf import settings
 from django.test import TestCase
@@ -68,3 +70,28 @@ class PluginSignalTest(TestCase):
         responses = register_ticket_outputs.send(self.event, **payload)
         self.assertEqual(len(responses), 1)
         self.assertIn('tests.testdummy.signals', [r[0].__module__ for r in responses])
+
+    def test_plugin_changes_without_save(self):
+        self.event.plugins = ''
+        self.assertEqual(len(register_ticket_outputs.send(self.event)), 0)
+        self.event.plugins = 'tests.testdummy'
+        self.assertEqual(len(register_ticket_outputs.send(self.event)), 1)
+        self.event.plugins = 'pretix.plugins.banktransfer'
+        self.assertEqual(len(register_ticket_outputs.send(self.event)), 0)
+
+    def test_connected_receivers_are_dispatched_until_collected(self):
+        self.event.plugins = 'tests.testdummy'
+
+        def core_receiver(sender, **kwargs):
+            return 'core'
+
+        setattr(core_receiver, '__mocked_app', 'CORE')
+        register_ticket_outputs.connect(core_receiver)
+        responses = register_ticket_outputs.send(self.event)
+        self.assertEqual(len(responses), 2)
+        # Core receivers are always called first
+        self.assertEqual(responses[0][1], 'core')
+
+        del core_receiver, responses
+        gc.collect()
+        self.assertEqual(len(register_ticket_outputs.send(self.event)), 1)
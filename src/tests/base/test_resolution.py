@@ -0,0 +1,115 @@
+#
+# This file is part of pretix (Community Edition).
+#
+# Copyright (C) 2014-2020  Raphael Michel and contributors
+# Copyright (C) 2020-today pretix GmbH and contributors
+#
+# This program is free software: you can redistribute it and/or modify it under the terms of the GNU Affero General
+# Public License as published by the Free Software Foundation in version 3 of the License.
+#
+# ADDITIONAL TERMS APPLY: Pursuant to Section 7 of the GNU Affero General Public License, additional terms are
+# applicable granting you additional permissions and placing additional restrictions on your usage of this software.
+# Please refer to the pretix LICENSE file to obtain the full terms applicable to this work. If you did not receive
+# this file, see <https://pretix.eu/about/en/license>.
+#
+# This program is distributed in the hope that it will be useful, but WITHOUT ANY WARRANTY; without even the implied
+# warranty of MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the GNU Affero General Public License for more
+# details.
+#
+# You should have received a copy of the GNU Affero General Public License along with this program.  If not, see
+# <https://www.gnu.org/licenses/>.
+#
+import pytest
+from django.core.cache import cache
+from django.test import override_settings
+from django.utils.timezone import now
+from django_scopes import scopes_disabled
+
+from pretix.base.cache import NamespacedCache
+from pretix.base.models import Event, Organizer
+from pretix.base.services import resolution
+from pretix.base.services.resolution import (
+    _current_versions, resolve_event, resolve_organizer,
+)
+
+
+@pytest.fixture
+def event():
+    o = Organizer.objects.create(name='Dummy', slug='dummy')
+    event = Event.objects.create(
+        organizer=o, name='Dummy', slug='dummy', date_from=now(), live=True,
+    )
+    with override_settings(CACHES={'default': {'BACKEND': 'django.core.cache.backends.locmem.LocMemCache'}}):
+        cache.clear()
+        yield event
+
+
+@pytest.mark.django_db
+def test_resolved_from_cache(event, django_assert_num_queries):
+    for i in range(2):
+        # The first lookup only finds out which objects are involved, the second one stores the snapshot
+        assert resolve_event('dummy', 'dummy') == event
+        assert resolve_event(pk=event.pk) == event
+        assert resolve_organizer('dummy') == event.organizer
+        assert resolve_organizer(pk=event.organizer.pk) == event.organizer
+
+    with django_assert_num_queries(0):
+        e = resolve_event('dummy', 'dummy')
+        assert e.organizer.slug == 'dummy'
+        assert e.live
+        assert e.date_from == event.date_from
+        assert resolve_event(pk=event.pk).slug == 'dummy'
+        assert resolve_organizer('dummy').name == 'Dummy'
+        assert resolve_organizer(pk=event.organizer.pk).slug == 'dummy'
+
+
+@pytest.mark.django_db
+def test_invalidated_on_change(event, django_capture_on_commit_callbacks):
+    assert resolve_event('dummy', 'dummy').live
+    assert resolve_organizer('dummy').name == 'Dummy'
+
+    with django_capture_on_commit_callbacks(execute=True):
+        event.live = False
+        event.save()
+        event.organizer.name = 'Renamed'
+        event.organizer.save()
+    e = resolve_event('dummy', 'dummy')
+    assert not e.live
+    assert e.organizer.name == 'Renamed'
+    assert resolve_organizer('dummy').name == 'Renamed'
+
+    with django_capture_on_commit_callbacks(execute=True):
+        event.delete()
+    with pytest.raises(Event.DoesNotExist):
+        resolve_event('dummy', 'dummy')
+    with pytest.raises(Event.DoesNotExist):
+        resolve_event(pk=e.pk)
+
+
+@pytest.mark.django_db
+def test_not_stored_if_changed_while_loading(event, monkeypatch):
+    resolve_event('dummy', 'dummy')
+    calls = []
+
+    def current_versions(keys):
+        if calls:
+            # Another request commits a change to the event after we read it, but before we look up its version
+            with scopes_disabled():
+                Event.objects.filter(pk=event.pk).update(live=False)
+            NamespacedCache('Event:{}'.format(event.pk)).clear()
+        calls.append(keys)
+        return _current_versions(keys)
+
+    monkeypatch.setattr(resolution, '_current_versions', current_versions)
+    assert resolve_event('dummy', 'dummy').live
+    monkeypatch.undo()
+    assert not resolve_event('dummy', 'dummy').live
+
+
+@pytest.mark.django_db
+def test_snapshot_not_taken_from_replica(event, django_assert_num_queries):
+    resolve_event('dummy', 'dummy', using='replica')
+    e = resolve_event('dummy', 'dummy', using='replica')
+    assert e._state.db == 'default'
+    with django_assert_num_queries(0):
+        assert resolve_event('dummy', 'dummy') == event
@@ -19,11 +19,106 @@
 # You should have received a copy of the GNU Affero General Public License along with this program.  If not, see
 # <https://www.gnu.org/licenses/>.
 #
+import logging
+from unittest import mock
+
 import pytest
+from django.core.cache import cache
+from django.core.management import call_command
+from django.test import override_settings
 
 from pretix.base.signals import periodic_task
+from pretix.helpers import periodic
+from pretix.helpers.periodic import SKIPPED, minimum_interval
 
 
 @pytest.mark.django_db
 def test_all_periodic_tasks():
     periodic_task.send(sender=None)
+
+
+@pytest.fixture
+def periodic_receiver(fakeredis_client):
+    calls = []
+
+    @minimum_interval(minutes_after_success=5)
+    def receiver(signal, sender, **kwargs):
+        calls.append(sender)
+
+    receiver.__module__ = 'tests.base.test_runperiodic'
+    periodic_task.connect(receiver, dispatch_uid='test_runperiodic')
+    yield calls
+    periodic_task.disconnect(dispatch_uid='test_runperiodic')
+
+
+def test_minimum_interval_skips_recent_and_running(fakeredis_client):
+    calls = []
+
+    @minimum_interval(minutes_after_success=5)
+    def task():
+        calls.append(1)
+        # Nested call while running is rejected by the lock
+        assert task() is SKIPPED
+
+    assert task() is None
+    assert task() is SKIPPED
+    assert calls == [1]
+    assert not cache.get('pretix_periodic_tests.base.test_runperiodic.task_running')
+
+
+def test_minimum_interval_lost_lock(fakeredis_client):
+    calls = []
+
+    @minimum_interval(minutes_after_success=5)
+    def task():
+        calls.append(1)
+        # Simulate that the lock timed out and was taken over by a different run
+        cache.set('pretix_periodic_tests.base.test_runperiodic.task_running', 'other')
+
+    task()
+    # Result is not recorded and the lock of the other run is not released
+    assert not cache.get('pretix_periodic_tests.base.test_runperiodic.task_result')
+    assert cache.get('pretix_periodic_tests.base.test_runperiodic.task_running') == 'other'
+
+
+def test_minimum_interval_finished_while_acquiring(fakeredis_client):
+    calls = []
+
+    @minimum_interval(minutes_after_success=5)
+    def task():
+        calls.append(1)
+
+    acquire_lock = periodic._acquire_lock
+
+    def finished_by_other_run(name, timeout):
+        # Another run stores its result and releases the lock after we checked for a recent result
+        cache.set('pretix_periodic_tests.base.test_runperiodic.task_result', 'success')
+        return acquire_lock(name, timeout)
+
+    with mock.patch('pretix.helpers.periodic._acquire_lock', side_effect=finished_by_other_run):
+        assert task() is SKIPPED
+    assert calls == []
+    assert not cache.get('pretix_periodic_tests.base.test_runperiodic.task_running')
+
+
+@override_settings(REAL_CACHE_USED=False)
+def test_minimum_interval_without_shared_cache(caplog):
+    calls = []
+
+    @minimum_interval(minutes_after_success=5)
+    def task():
+        calls.append(1)
+
+    with caplog.at_level(logging.WARNING, logger='pretix.helpers.periodic'):
+        task()
+    assert calls == [1]
+    assert 'lock has been lost' not in caplog.text
+
+
+@pytest.mark.django_db(transaction=True)
+@pytest.mark.parametrize("args", [[], ["--concurrency", "4"], ["--celery"]])
+def test_runperiodic(periodic_receiver, args):
+    call_command('runperiodic', '--tasks', 'tests.base.test_runperiodic.receiver', *args)
+    assert len(periodic_receiver) == 1
+    call_command('runperiodic', '--tasks', 'tests.base.test_runperiodic.receiver', *args)
+    assert len(periodic_receiver) == 1
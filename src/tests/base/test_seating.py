@@ -0,0 +1,164 @@
+#
+# This file is part of pretix (Community Edition).
+#
+# Copyright (C) 2014-2020  Raphael Michel and contributors
+# Copyright (C) 2020-today pretix GmbH and contributors
+#
+# This program is free software: you can redistribute it and/or modify it under the terms of the GNU Affero General
+# Public License as published by the Free Software Foundation in version 3 of the License.
+#
+# ADDITIONAL TERMS APPLY: Pursuant to Section 7 of the GNU Affero General Public License, additional terms are
+# applicable granting you additional permissions and placing additional restrictions on your usage of this software.
+# Please refer to the pretix LICENSE file to obtain the full terms applicable to this work. If you did not receive
+# this file, see <https://pretix.eu/about/en/license>.
+#
+# This program is distributed in the hope that it will be useful, but WITHOUT ANY WARRANTY; without even the implied
+# warranty of MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the GNU Affero General Public License for more
+# details.
+#
+# You should have received a copy of the GNU Affero General Public License along with this program.  If not, see
+# <https://www.gnu.org/licenses/>.
+#
+import json
+from datetime import timedelta
+from decimal import Decimal
+
+import pytest
+from django.utils.timezone import now
+from django_scopes import scope
+
+from pretix.base.models import (
+    Event, Order, OrderPosition, Organizer, SeatingPlan,
+)
+from pretix.base.services import seating
+from pretix.base.services.seating import (
+    SeatProtected, apply_seating_plan, generate_seats_for_subevents,
+)
+
+
+def _layout(rows, seats):
+    return json.dumps({
+        "name": "Hall",
+        "categories": [{"name": "Stalls", "color": "red"}],
+        "zones": [{
+            "name": "Main",
+            "position": {"x": 0, "y": 0},
+            "rows": [{
+                "row_number": str(r),
+                "position": {"x": 0, "y": r * 30},
+                "seats": [{
+                    "seat_guid": f"{r}-{s}",
+                    "seat_number": str(s),
+                    "position": {"x": s * 30, "y": 0},
+                    "category": "Stalls",
+                } for s in range(seats)],
+            } for r in range(rows)],
+        }],
+        "size": {"width": 600, "height": 400},
+    })
+
+
+@pytest.fixture
+def event():
+    o = Organizer.objects.create(name='Dummy', slug='dummy')
+    event = Event.objects.create(
+        organizer=o, name='Dummy', slug='dummy', date_from=now(), has_subevents=True,
+    )
+    with scope(organizer=o):
+        yield event
+
+
+@pytest.fixture
+def subevents(event):
+    ticket = event.items.create(name='Ticket', default_price=Decimal('23.00'), admission=True)
+    subevents = [event.subevents.create(name=f'Date {i}', date_from=now()) for i in range(3)]
+    for se in subevents:
+        event.seat_category_mappings.create(subevent=se, layout_category='Stalls', product=ticket)
+    return subevents
+
+
+@pytest.mark.django_db
+def test_generate_seats_for_subevents(event, subevents):
+    plan = SeatingPlan.objects.create(name="Plan", organizer=event.organizer, layout=_layout(3, 4))
+    generate_seats_for_subevents.apply(args=(event.pk, [se.pk for se in subevents], plan.pk))
+    for se in subevents:
+        se.refresh_from_db()
+        assert se.seating_plan == plan
+        assert se.seats.count() == 12
+        assert se.seats.filter(product__isnull=False).count() == 12
+
+    seat_ids = set(subevents[0].seats.values_list('pk', flat=True))
+    plan.layout = _layout(2, 5)
+    plan.save()
+    generate_seats_for_subevents.apply(args=(event.pk, [se.pk for se in subevents], plan.pk))
+    for se in subevents:
+        assert se.seats.count() == 10
+        assert set(se.seats.values_list('seat_guid', flat=True)) == {f"{r}-{s}" for r in range(2) for s in range(5)}
+    # Existing seats are updated in place
+    assert len(seat_ids & set(subevents[0].seats.values_list('pk', flat=True))) == 8
+
+
+@pytest.mark.django_db
+def test_generate_seats_for_subevents_protected(event, subevents):
+    plan = SeatingPlan.objects.create(name="Plan", organizer=event.organizer, layout=_layout(3, 4))
+    generate_seats_for_subevents.apply(args=(event.pk, [se.pk for se in subevents], plan.pk))
+    o = Order.objects.create(
+        code='FOO', event=event, email='dummy@dummy.test', status=Order.STATUS_PAID, datetime=now(),
+        expires=now() + timedelta(days=10), total=Decimal('23.00'),
+        sales_channel=event.organizer.sales_channels.get(identifier="web"),
+    )
+    OrderPosition.objects.create(
+        order=o, item=event.items.get(), price=Decimal('23.00'), subevent=subevents[2],
+        seat=subevents[2].seats.get(seat_guid='2-3'),
+    )
+
+    plan.layout = _layout(2, 4)
+    plan.save()
+    with pytest.raises(SeatProtected):
+        generate_seats_for_subevents.apply(args=(event.pk, [se.pk for se in subevents], plan.pk), throw=True)
+    for se in subevents:
+        assert se.seats.count() == 12
+
+
+@pytest.mark.django_db
+def test_apply_seating_plan_in_chunks(event, subevents, monkeypatch):
+    monkeypatch.setattr(seating, 'SEAT_SUBEVENT_CHUNK_SIZE', 2)
+    plan = SeatingPlan.objects.create(name="Plan", organizer=event.organizer, layout=_layout(3, 4))
+    progress = []
+    apply_seating_plan(event, subevents, plan, progress=progress.append)
+    assert progress == [50, 100]
+    for se in subevents:
+        se.refresh_from_db()
+        assert se.seating_plan == plan
+        assert se.seats.count() == 12
+
+    # The check for sold seats covers all chunks before the first one is written
+    o = Order.objects.create(
+        code='FOO', event=event, email='dummy@dummy.test', status=Order.STATUS_PAID, datetime=now(),
+        expires=now() + timedelta(days=10), total=Decimal('23.00'),
+        sales_channel=event.organizer.sales_channels.get(identifier="web"),
+    )
+    OrderPosition.objects.create(
+        order=o, item=event.items.get(), price=Decimal('23.00'), subevent=subevents[2],
+        seat=subevents[2].seats.get(seat_guid='2-3'),
+    )
+    with pytest.raises(SeatProtected):
+        apply_seating_plan(event, subevents, None)
+    for se in subevents:
+        se.refresh_from_db()
+        assert se.seating_plan == plan
+        assert se.seats.count() == 12
+
+
+@pytest.mark.django_db
+def test_apply_seating_plan_to_event(event):
+    plan = SeatingPlan.objects.create(name="Plan", organizer=event.organizer, layout=_layout(2, 2))
+    apply_seating_plan(event, None, plan)
+    event.refresh_from_db()
+    assert event.seating_plan == plan
+    assert event.seats.filter(subevent__isnull=True).count() == 4
+
+    apply_seating_plan(event, None, None)
+    event.refresh_from_db()
+    assert event.seating_plan is None
+    assert not event.seats.exists()
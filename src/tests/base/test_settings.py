@@ -32,14 +32,16 @@
 # distributed on an "AS IS" BASIS, WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied. See the
 # License for the specific language governing permissions and limitations under the License.
 
-from django.test import TestCase
+from django.core.cache import cache
+from django.test import TestCase, override_settings
 from django.utils.timezone import now
 from django_scopes import scopes_disabled
+from hierarkey.proxy import dirty_cache_keys
 from i18nfield.strings import LazyI18nString
 
 from pretix.base import settings
 from pretix.base.models import Event, Organizer
-from pretix.base.settings import SettingsSandbox
+from pretix.base.settings import SettingsProxy, SettingsSandbox
 from pretix.control.forms.global_settings import GlobalSettingsObject
 
 
@@ -89,3 +91,66 @@ class SettingsTestCase(TestCase):
 
         self.assertIsNone(sandbox.bar)
         self.assertIsNone(sandbox['baz'])
+
+
+@override_settings(CACHES={'default': {'BACKEND': 'django.core.cache.backends.locmem.LocMemCache'}})
+class SettingsLocalCacheTestCase(TestCase):
+    def setUp(self):
+        cache.clear()
+        SettingsProxy._l1.clear()
+        # Keys marked as dirty by earlier tests, whose transactions were never committed, bypass all caches
+        dirty_cache_keys.set(set())
+        self.organizer = Organizer.objects.create(name='Dummy', slug='dummy')
+        self.event = Event.objects.create(
+            organizer=self.organizer, name='Dummy', slug='dummy',
+            date_from=now(),
+        )
+        with self.captureOnCommitCallbacks(execute=True):
+            self.event.settings.set('test', 'foo')
+
+    def _fresh_event(self):
+        with scopes_disabled():
+            return Event.objects.select_related('organizer').get(pk=self.event.pk)
+
+    def test_shared_between_instances(self):
+        e1 = self._fresh_event()
+        assert e1.settings.get('test') == 'foo'
+        e2 = self._fresh_event()
+        with self.assertNumQueries(0):
+            assert e2.settings.get('test') == 'foo'
+        assert e2.settings._cache() is e1.settings._cache()
+
+    def test_invalidated_by_write(self):
+        e1 = self._fresh_event()
+        assert e1.settings.get('test') == 'foo'
+        e2 = self._fresh_event()
+        with self.captureOnCommitCallbacks(execute=True):
+            e2.settings.set('test', 'bar')
+        # The dictionary shared with other instances is not changed by the write
+        assert e1.settings.get('test') == 'foo'
+        assert self._fresh_event().settings.get('test') == 'bar'
+
+    def test_invalidated_by_other_process(self):
+        assert self._fresh_event().settings.get('test') == 'foo'
+        self.event._settings_objects.filter(key='test').update(value='bar')
+        assert self._fresh_event().settings.get('test') == 'foo'
+
+        # Another process changed the setting and flushed the shared cache
+        cache.delete(self.event.settings._cache_key)
+        cache.incr(self.event.settings._version_key)
+        assert self._fresh_event().settings.get('test') == 'bar'
+
+    def test_memoized_values_are_copies(self):
+        with self.captureOnCommitCallbacks(execute=True):
+            self.event.settings.set('test_i18n', LazyI18nString({'de': 'Hallo', 'en': 'Hello'}))
+        v1 = self._fresh_event().settings.get('test_i18n', as_type=LazyI18nString)
+        v1.data['en'] = 'Changed'
+        v2 = self._fresh_event().settings.get('test_i18n', as_type=LazyI18nString)
+        assert v1 is not v2
+        assert v2.data == {'de': 'Hallo', 'en': 'Hello'}
+
+    def test_memoized_values_of_other_type(self):
+        with self.captureOnCommitCallbacks(execute=True):
+            self.event.settings.set('test_i18n', 'True')
+        assert self._fresh_event().settings.get('test_i18n', as_type=LazyI18nString) is True
+        assert self._fresh_event().settings.get('test_i18n', as_type=LazyI18nString) is True
@@ -0,0 +1,269 @@
+#
+# This file is part of pretix (Community Edition).
+#
+# Copyright (C) 2014-2020  Raphael Michel and contributors
+# Copyright (C) 2020-today pretix GmbH and contributors
+#
+# This program is free software: you can redistribute it and/or modify it under the terms of the GNU Affero General
+# Public License as published by the Free Software Foundation in version 3 of the License.
+#
+# ADDITIONAL TERMS APPLY: Pursuant to Section 7 of the GNU Affero General Public License, additional terms are
+# applicable granting you additional permissions and placing additional restrictions on your usage of this software.
+# Please refer to the pretix LICENSE file to obtain the full terms applicable to this work. If you did not receive
+# this file, see <https://pretix.eu/about/en/license>.
+#
+# This program is distributed in the hope that it will be useful, but WITHOUT ANY WARRANTY; without even the implied
+# warranty of MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the GNU Affero General Public License for more
+# details.
+#
+# You should have received a copy of the GNU Affero General Public License along with this program.  If not, see
+# <https://www.gnu.org/licenses/>.
+#
+from datetime import datetime, timedelta
+from decimal import Decimal
+from zoneinfo import ZoneInfo
+
+import pytest
+from django.utils.timezone import now
+from django_scopes import scope
+
+from pretix.base.models import (
+    Event, Order, OrderPayment, OrderPosition, Organizer, SalesRollup,
+    SalesRollupState, Transaction, TransactionSummary, TransactionSummaryState,
+)
+from pretix.base.services import stats
+from pretix.base.services.stats import (
+    build_sales_rollups, order_overview, refresh_sales_rollups,
+    sales_rollups_available, update_transaction_summaries,
+)
+from pretix.plugins.reports.accountingreport import ReportExporter
+
+
+@pytest.fixture
+def event():
+    o = Organizer.objects.create(name='Dummy', slug='dummy')
+    event = Event.objects.create(
+        organizer=o, name='Dummy', slug='dummy',
+        date_from=now(),
+    )
+    event.settings.timezone = 'Europe/Berlin'
+    with scope(organizer=o):
+        yield event
+
+
+@pytest.fixture
+def orders(event):
+    tz = ZoneInfo('Europe/Berlin')
+    ticket = event.items.create(name='Ticket', default_price=Decimal('23.00'), admission=True)
+    shirt = event.items.create(name='Shirt', default_price=Decimal('12.00'))
+    red = shirt.variations.create(value='Red')
+    channel = event.organizer.sales_channels.get(identifier="web")
+
+    def _order(code, status, dt, positions, require_approval=False, paid_at=None):
+        o = Order.objects.create(
+            code=code, event=event, email='dummy@dummy.test', status=status, datetime=dt,
+            expires=dt + timedelta(days=10), total=sum(p[1] for p in positions), sales_channel=channel,
+            require_approval=require_approval,
+        )
+        for item, price, variation, canceled in positions:
+            OrderPosition.all.create(
+                order=o, item=item, variation=variation, price=price, tax_value=price / 10, canceled=canceled,
+            )
+        if paid_at:
+            o.payments.create(
+                amount=o.total, provider='manual', state=OrderPayment.PAYMENT_STATE_CONFIRMED, payment_date=paid_at,
+            )
+        return o
+
+    return [
+        _order('PAID1', Order.STATUS_PAID, datetime(2026, 3, 1, 23, 30, tzinfo=tz),
+               [(ticket, Decimal('23.00'), None, False), (shirt, Decimal('12.00'), red, False)],
+               paid_at=datetime(2026, 3, 3, 12, 0, tzinfo=tz)),
+        _order('PAID2', Order.STATUS_PAID, datetime(2026, 3, 1, 0, 30, tzinfo=tz),
+               [(ticket, Decimal('23.00'), None, False), (ticket, Decimal('23.00'), None, True)],
+               paid_at=datetime(2026, 3, 1, 1, 0, tzinfo=tz)),
+        _order('PEND1', Order.STATUS_PENDING, datetime(2026, 3, 2, 12, 0, tzinfo=tz),
+               [(ticket, Decimal('20.00'), None, False)]),
+        _order('APPR1', Order.STATUS_PENDING, datetime(2026, 3, 2, 13, 0, tzinfo=tz),
+               [(ticket, Decimal('23.00'), None, False)], require_approval=True),
+        _order('CANC1', Order.STATUS_CANCELED, datetime(2026, 3, 4, 13, 0, tzinfo=tz),
+               [(shirt, Decimal('12.00'), red, True)]),
+        _order('EXPI1', Order.STATUS_EXPIRED, datetime(2026, 3, 4, 14, 0, tzinfo=tz),
+               [(ticket, Decimal('23.00'), None, False)]),
+    ]
+
+
+def _numbers(result):
+    items_by_category, total = result
+    return (
+        total,
+        [(str(i.name), i.num) for c, items in items_by_category for i in items],
+    )
+
+
+@pytest.mark.django_db
+def test_rollups_match_order_overview(event, orders):
+    assert not sales_rollups_available(event)
+    build_sales_rollups(event)
+    assert sales_rollups_available(event)
+
+    for kwargs in (
+        {},
+        {'admission_only': True},
+        {'date_filter': 'order_date', 'date_from': datetime(2026, 3, 2).date()},
+        {'date_filter': 'order_date', 'date_until': datetime(2026, 3, 1).date()},
+        {'date_filter': 'last_payment_date', 'date_from': datetime(2026, 3, 2).date()},
+    ):
+        assert _numbers(order_overview(event, use_rollups=True, **kwargs)) == _numbers(order_overview(event, **kwargs))
+
+
+@pytest.mark.django_db
+def test_rollup_rows(event, orders):
+    build_sales_rollups(event)
+    order_rows = SalesRollup.objects.filter(event=event, item__isnull=True)
+    assert order_rows.get(status=Order.STATUS_PAID, order_date=datetime(2026, 3, 1).date(),
+                          payment_date=datetime(2026, 3, 3).date()).count == 1
+    assert order_rows.get(status='unapproved').count == 1
+    assert order_rows.get(status=Order.STATUS_CANCELED).canceled
+    assert sum(r.count for r in order_rows) == 6
+    assert sum(r.price for r in order_rows.filter(status=Order.STATUS_PAID)) == Decimal('81.00')
+
+
+@pytest.mark.django_db
+def test_refresh_rollups(event, orders):
+    build_sales_rollups(event)
+    o = orders[2]
+    o.status = Order.STATUS_PAID
+    o.save()
+    refresh_sales_rollups.apply()
+
+    assert SalesRollup.objects.filter(event=event, item__isnull=True, status=Order.STATUS_PAID).count() == 3
+    assert _numbers(order_overview(event, use_rollups=True)) == _numbers(order_overview(event))
+
+
+@pytest.mark.django_db
+def test_rebuild_on_timezone_change(event, orders):
+    build_sales_rollups(event)
+    event.settings.timezone = 'UTC'
+    assert not sales_rollups_available(event)
+
+
+@pytest.mark.django_db
+def test_invalidate_on_order_deletion(event, orders):
+    build_sales_rollups(event)
+    orders[0].payments.all().delete()
+    orders[0].all_positions.all().delete()
+    orders[0].delete()
+    assert not SalesRollupState.objects.filter(event=event).exists()
+
+
+@pytest.mark.django_db
+def test_statistics_view_from_rollups(event, orders, client):
+    from pretix.base.models import User
+    event.enable_plugin('pretix.plugins.statistics')
+    event.save()
+    user = User.objects.create_user('dummy@dummy.dummy', 'dummy')
+    t = event.organizer.teams.create(all_events=True, all_event_permissions=True)
+    t.members.add(user)
+    client.login(email='dummy@dummy.dummy', password='dummy')
+
+    url = '/control/event/dummy/dummy/statistics/'
+    live = client.get(url + '?latest=1').context
+    build_sales_rollups(event)
+    rollup = client.get(url).context
+    for k in ('obd_data', 'abd_data', 'abt_data', 'obp_data', 'rev_data'):
+        assert rollup[k] == live[k], k
+    assert '"paid": 2' in rollup['obp_data']
+
+
+@pytest.mark.django_db
+def test_statistics_view_seats(event, orders, client):
+    from pretix.base.models import SeatingPlan, User
+    event.enable_plugin('pretix.plugins.statistics')
+    event.seating_plan = SeatingPlan.objects.create(name="Plan", organizer=event.organizer, layout="{}")
+    event.save()
+    ticket = event.items.get(name='Ticket')
+    seats = [event.seats.create(seat_guid=str(i), product=ticket, blocked=i == 3, x=i, y=0) for i in range(5)]
+    event.seats.create(seat_guid="nop", x=10, y=10)
+    orders[0].positions.filter(item=ticket).update(seat=seats[0])
+    user = User.objects.create_user('dummy@dummy.dummy', 'dummy')
+    t = event.organizer.teams.create(all_events=True, all_event_permissions=True)
+    t.members.add(user)
+    client.login(email='dummy@dummy.dummy', password='dummy')
+
+    ctx = client.get('/control/event/dummy/dummy/statistics/').context
+    assert ctx['seats']['free_seats'] == 4
+    assert ctx['seats']['blocked_seats'] == 1
+    assert ctx['seats']['purchased_seats'] == 1
+    assert ctx['seats']['products'][ticket]['free']['seats'] == 3
+    assert ctx['seats']['products'][ticket]['blocked']['seats'] == 1
+    assert ctx['seats']['products'][None]['free']['seats'] == 1
+
+
+@pytest.fixture
+def transactions(event, orders):
+    for o in orders:
+        o.create_transactions(is_new=True, dt_now=o.datetime)
+    Transaction.objects.update(created=now() - timedelta(days=1))
+
+
+def _report_rows(exporter, form_data):
+    return [
+        (r["item_id"], r["variation_id"], r["price"], r["sum_cont"], r["sum_price"], r["sum_tax"])
+        for r in exporter._transaction_rows(form_data, "EUR")
+    ]
+
+
+@pytest.mark.django_db
+def test_transaction_summaries(event, transactions):
+    update_transaction_summaries.apply()
+    assert sum(s.count for s in TransactionSummary.objects.filter(event=event)) == Transaction.objects.count()
+    assert sum(s.total for s in TransactionSummary.objects.filter(event=event)) == Decimal('78.00')
+
+    # Running again does not add transactions twice
+    update_transaction_summaries.apply()
+    assert sum(s.count for s in TransactionSummary.objects.filter(event=event)) == Transaction.objects.count()
+
+
+@pytest.mark.django_db
+def test_transaction_summaries_in_chunks(event, transactions, monkeypatch):
+    monkeypatch.setattr(stats, "TRANSACTION_SUMMARY_CHUNK_SIZE", 2)
+    for i, t in enumerate(Transaction.objects.order_by('pk')):
+        t.created = now() - timedelta(days=1, minutes=i)
+        t.save(update_fields=['created'])
+    assert Transaction.objects.count() > 2
+
+    update_transaction_summaries.apply()
+    assert sum(s.count for s in TransactionSummary.objects.filter(event=event)) == Transaction.objects.count()
+    assert sum(s.total for s in TransactionSummary.objects.filter(event=event)) == Decimal('78.00')
+    assert TransactionSummaryState.objects.get().watermark > now() - timedelta(hours=2)
+
+
+@pytest.mark.django_db
+@pytest.mark.parametrize("date_range,uses_summaries", [
+    (None, True),
+    # A single day in Europe/Berlin does not cover a full day in UTC
+    ("2026-03-01/2026-03-01", False),
+    ("2026-03-01/2026-03-04", True),
+])
+def test_accounting_report_from_summaries(event, transactions, date_range, uses_summaries):
+    exporter = ReportExporter(event=event, organizer=event.organizer)
+    form_data = {"date_range": date_range, "no_testmode": True}
+    expected = _report_rows(exporter, form_data)
+    expected_total = exporter._ledger_total(form_data, "EUR", *exporter._date_range(form_data))
+
+    update_transaction_summaries.apply()
+    tx_qs, summary_qs = exporter._ledger_sources(form_data, "EUR", *exporter._date_range(form_data))
+    assert summary_qs.exists() == uses_summaries
+    assert _report_rows(exporter, form_data) == expected
+    assert exporter._ledger_total(form_data, "EUR", *exporter._date_range(form_data)) == expected_total
+
+
+@pytest.mark.django_db
+def test_transaction_summaries_on_order_deletion(event, transactions):
+    update_transaction_summaries.apply()
+    o = Order.objects.get(code='PEND1')
+    o.testmode = True
+    o.save(update_fields=['testmode'])
+    Order.gracefully_delete_bulk(event, [o])
+    assert sum(s.count for s in TransactionSummary.objects.filter(event=event)) == Transaction.objects.count()
@@ -43,6 +43,7 @@ from pretix.base.models import (
     Event, Item, ItemCategory, Order, OrderPosition, Organizer, Question,
     Quota, Team, User, Voucher,
 )
+from pretix.base.signals import order_canceled, order_placed
 
 
 @pytest.fixture
@@ -249,3 +250,44 @@ def test_csp_header_unauthenticated(client, url, event):
     assert response.status_code == 200
     assert 'script-src' in response['Content-Security-Policy']
     assert 'nonce-' not in response['Content-Security-Policy']
+
+
+@pytest.mark.django_db
+def test_dashboard_widgets_served_from_snapshot(fakeredis_client, logged_in_client, event, order, quota):
+    url = '/control/event/{}/{}/widgets.json'.format(event.organizer.slug, event.slug)
+    data = logged_in_client.get(url).json()
+    assert 'timestamp' in data
+    widgets = {w['lazy']: w['content'] for w in data['widgets']}
+    assert 'Test left' in widgets['quota-{}'.format(quota.pk)]
+
+    with scope(organizer=event.organizer):
+        Quota.objects.filter(pk=quota.pk).update(name='Renamed')
+    data = logged_in_client.get(url).json()
+    widgets = {w['lazy']: w['content'] for w in data['widgets']}
+    assert 'Test left' in widgets['quota-{}'.format(quota.pk)]
+
+    # A relevant change marks the snapshot as outdated. It is refreshed in the background (eagerly in tests)
+    # while the old snapshot is served one more time.
+    with scope(organizer=event.organizer):
+        order_placed.send(event, order=order)
+    data = logged_in_client.get(url).json()
+    widgets = {w['lazy']: w['content'] for w in data['widgets']}
+    assert 'Test left' in widgets['quota-{}'.format(quota.pk)]
+    data = logged_in_client.get(url).json()
+    widgets = {w['lazy']: w['content'] for w in data['widgets']}
+    assert 'Renamed left' in widgets['quota-{}'.format(quota.pk)]
+
+
+@pytest.mark.django_db
+def test_user_dashboard_order_count_cached(fakeredis_client, logged_in_client, event, order):
+    data = logged_in_client.get('/control/widgets.json').json()
+    assert '1 order' in data['widgets'][0]['content']
+    with scope(organizer=event.organizer):
+        Order.objects.filter(pk=order.pk).update(status=Order.STATUS_CANCELED)
+    data = logged_in_client.get('/control/widgets.json').json()
+    assert '1 order' in data['widgets'][0]['content']
+
+    with scope(organizer=event.organizer):
+        order_canceled.send(event, order=order)
+    data = logged_in_client.get('/control/widgets.json').json()
+    assert '0 orders' in data['widgets'][0]['content']
@@ -0,0 +1,111 @@
+#
+# This file is part of pretix (Community Edition).
+#
+# Copyright (C) 2014-2020  Raphael Michel and contributors
+# Copyright (C) 2020-today pretix GmbH and contributors
+#
+# This program is free software: you can redistribute it and/or modify it under the terms of the GNU Affero General
+# Public License as published by the Free Software Foundation in version 3 of the License.
+#
+# ADDITIONAL TERMS APPLY: Pursuant to Section 7 of the GNU Affero General Public License, additional terms are
+# applicable granting you additional permissions and placing additional restrictions on your usage of this software.
+# Please refer to the pretix LICENSE file to obtain the full terms applicable to this work. If you did not receive
+# this file, see <https://pretix.eu/about/en/license>.
+#
+# This program is distributed in the hope that it will be useful, but WITHOUT ANY WARRANTY; without even the implied
+# warranty of MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the GNU Affero General Public License for more
+# details.
+#
+# You should have received a copy of the GNU Affero General Public License along with this program.  If not, see
+# <https://www.gnu.org/licenses/>.
+#
+import pytest
+from django.db import OperationalError
+from django.http import HttpResponse
+from django.test import RequestFactory, override_settings
+
+from pretix.helpers import database
+from pretix.helpers.database import (
+    REPLICA_PIN_COOKIE, ReplicaPinningMiddleware, ReplicaRouter,
+    get_read_replica, pin_to_primary, replica_reads,
+)
+
+
+@pytest.fixture
+def replicas(monkeypatch):
+    lag = {'replica': 0, 'replica_b': 0}
+
+    def replication_lag(alias):
+        if isinstance(lag[alias], Exception):
+            raise lag[alias]
+        return lag[alias]
+
+    monkeypatch.setattr(database, 'replication_lag', replication_lag)
+    monkeypatch.setattr(database, '_replica_health', {})
+    monkeypatch.setattr(database, '_replica_order', ['replica', 'replica_b'])
+    with override_settings(DATABASE_REPLICAS=['replica', 'replica_b'], DATABASE_REPLICA_MAX_LAG=10,
+                           DATABASE_REPLICA_CHECK_INTERVAL=0, DATABASE_REPLICA_PIN_SECONDS=11):
+        yield lag
+
+
+def test_no_replicas():
+    assert get_read_replica() == 'default'
+    with replica_reads() as using:
+        assert using == 'default'
+
+
+def test_replica_lag(replicas):
+    assert get_read_replica() == 'replica'
+    replicas['replica'] = 30
+    assert get_read_replica() == 'replica_b'
+    replicas['replica_b'] = OperationalError()
+    assert get_read_replica() == 'default'
+    replicas['replica'] = 5
+    assert get_read_replica() == 'replica'
+
+
+def test_replica_health_is_cached(replicas):
+    with override_settings(DATABASE_REPLICA_CHECK_INTERVAL=60):
+        assert get_read_replica() == 'replica'
+        replicas['replica'] = 30
+        assert get_read_replica() == 'replica'
+
+
+def test_router(replicas):
+    router = ReplicaRouter()
+    assert router.db_for_read(None) == 'default'
+    with replica_reads() as using:
+        assert using == 'replica'
+        assert router.db_for_read(None) == 'replica'
+        assert router.db_for_write(None) == 'default'
+    assert router.db_for_read(None) == 'default'
+
+
+def test_pinned_after_write(replicas):
+    used = []
+
+    def view(request):
+        used.append(get_read_replica())
+        return HttpResponse()
+
+    mw = ReplicaPinningMiddleware(view)
+    factory = RequestFactory()
+
+    response = mw(factory.get('/'))
+    assert REPLICA_PIN_COOKIE not in response.cookies
+    response = mw(factory.post('/'))
+    assert response.cookies[REPLICA_PIN_COOKIE]['max-age'] == 11
+    request = factory.get('/')
+    request.COOKIES[REPLICA_PIN_COOKIE] = '1'
+    mw(request)
+    assert used == ['replica', 'replica', 'default']
+    assert get_read_replica() == 'replica'
+
+
+def test_pinned_after_task_result(replicas):
+    def view(request):
+        pin_to_primary(request)
+        return HttpResponse()
+
+    response = ReplicaPinningMiddleware(view)(RequestFactory().get('/?async_id=abc'))
+    assert response.cookies[REPLICA_PIN_COOKIE]['max-age'] == 11
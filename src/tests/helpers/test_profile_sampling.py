@@ -0,0 +1,127 @@
+#
+# This file is part of pretix (Community Edition).
+#
+# Copyright (C) 2014-2020  Raphael Michel and contributors
+# Copyright (C) 2020-today pretix GmbH and contributors
+#
+# This program is free software: you can redistribute it and/or modify it under the terms of the GNU Affero General
+# Public License as published by the Free Software Foundation in version 3 of the License.
+#
+# ADDITIONAL TERMS APPLY: Pursuant to Section 7 of the GNU Affero General Public License, additional terms are
+# applicable granting you additional permissions and placing additional restrictions on your usage of this software.
+# Please refer to the pretix LICENSE file to obtain the full terms applicable to this work. If you did not receive
+# this file, see <https://pretix.eu/about/en/license>.
+#
+# This program is distributed in the hope that it will be useful, but WITHOUT ANY WARRANTY; without even the implied
+# warranty of MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the GNU Affero General Public License for more
+# details.
+#
+# You should have received a copy of the GNU Affero General Public License along with this program.  If not, see
+# <https://www.gnu.org/licenses/>.
+#
+import json
+import threading
+import time
+from io import StringIO
+
+from django.core.management import call_command
+from django.http import HttpResponse
+from django.test import RequestFactory, override_settings
+
+from pretix.helpers.profile.middleware import SamplingProfilerMiddleware
+from pretix.helpers.profile.sampling import (
+    SamplingProfiler, load_samples, store_samples, to_speedscope,
+)
+
+
+def _busy_function(stop):
+    while not stop.is_set():
+        time.sleep(0.001)
+
+
+def test_sample_only_tagged_threads():
+    p = SamplingProfiler()
+    p._ensure_running = lambda: None
+    stop = threading.Event()
+    t = threading.Thread(target=_busy_function, args=(stop,))
+    t.start()
+    try:
+        p.sample()
+        assert not p.samples
+
+        with p.tag("view:test"):
+            p.sample()
+            p.sample()
+    finally:
+        stop.set()
+        t.join()
+
+    assert len(p.samples) == 1
+    (window, tag), stacks = list(p.samples.items())[0]
+    assert tag == "view:test"
+    assert sum(stacks.values()) == 2
+    stack = list(stacks.keys())[0]
+    assert stack.endswith("tests.helpers.test_profile_sampling:test_sample_only_tagged_threads;"
+                          "pretix.helpers.profile.sampling:sample")
+    assert "_busy_function" not in stack
+    assert not p.active
+
+
+def test_sampling_thread_started_once():
+    p = SamplingProfiler()
+    started = []
+    stop = threading.Event()
+
+    def _run():
+        started.append(1)
+        stop.wait()
+
+    p._run = _run
+    threads = [threading.Thread(target=p._ensure_running) for i in range(10)]
+    try:
+        for t in threads:
+            t.start()
+        for t in threads:
+            t.join()
+        assert len(started) == 1
+    finally:
+        stop.set()
+
+
+def test_middleware_unresolvable_path():
+    def view(request):
+        return HttpResponse("ok")
+
+    r = SamplingProfilerMiddleware(view)(RequestFactory().get('/control/nonexistent/x/'))
+    assert r.status_code == 200
+
+
+def test_store_and_export(tmp_path):
+    with override_settings(PROFILE_DIR=str(tmp_path), HAS_REDIS=False):
+        now = int(time.time())
+        store_samples({
+            (now, "view:a"): {"a;b;c": 3, "a;b": 1},
+            (now, "celery:b"): {"x;y": 2},
+            (now - 3600 * 3, "view:a"): {"old": 2},
+        })
+        store_samples({
+            (now, "view:a"): {"a;b;c": 1},
+        })
+
+        samples = load_samples(now - 600)
+        assert samples == {"view:a": {"a;b;c": 4, "a;b": 1}, "celery:b": {"x;y": 2}}
+        assert load_samples(now - 600, name="celery:") == {"celery:b": {"x;y": 2}}
+
+        out = StringIO()
+        call_command("profile_samples", "--tag=view:", stdout=out)
+        assert out.getvalue() == "view:a;a;b 1\nview:a;a;b;c 4\n"
+
+        doc = to_speedscope(samples)
+        assert [f["name"] for f in doc["shared"]["frames"]] == ["x", "y", "a", "b", "c"]
+        assert doc["profiles"][1]["name"] == "view:a"
+        assert doc["profiles"][1]["samples"] == [[2, 3], [2, 3, 4]]
+        assert doc["profiles"][1]["weights"] == [1, 4]
+
+        out = StringIO()
+        call_command("profile_samples", "--format=speedscope", stdout=out)
+        assert json.loads(out.getvalue()) == doc
@@ -0,0 +1,71 @@
+#
+# This file is part of pretix (Community Edition).
+#
+# Copyright (C) 2014-2020  Raphael Michel and contributors
+# Copyright (C) 2020-today pretix GmbH and contributors
+#
+# This program is free software: you can redistribute it and/or modify it under the terms of the GNU Affero General
+# Public License as published by the Free Software Foundation in version 3 of the License.
+#
+# ADDITIONAL TERMS APPLY: Pursuant to Section 7 of the GNU Affero General Public License, additional terms are
+# applicable granting you additional permissions and placing additional restrictions on your usage of this software.
+# Please refer to the pretix LICENSE file to obtain the full terms applicable to this work. If you did not receive
+# this file, see <https://pretix.eu/about/en/license>.
+#
+# This program is distributed in the hope that it will be useful, but WITHOUT ANY WARRANTY; without even the implied
+# warranty of MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the GNU Affero General Public License for more
+# details.
+#
+# You should have received a copy of the GNU Affero General Public License along with this program.  If not, see
+# <https://www.gnu.org/licenses/>.
+#
+import logging
+
+import pytest
+from django.test import override_settings
+from django_scopes import scopes_disabled
+
+from pretix.base.models import Organizer
+from pretix.helpers.metrics.queries import QueryStats, fingerprint
+
+
+def test_fingerprint():
+    assert fingerprint('SELECT * FROM "a" WHERE "id" IN (%s, %s, %s) LIMIT 21') == \
+        fingerprint('SELECT * FROM "a" WHERE "id" IN (%s) LIMIT 1')
+    assert fingerprint('SELECT * FROM "a" WHERE "id" = %s') != fingerprint('SELECT * FROM "b" WHERE "id" = %s')
+
+
+@pytest.mark.django_db
+@override_settings(METRICS_QUERY_BUDGET=3, METRICS_QUERY_LOG_RATE=100)
+def test_query_stats(fakeredis_client, caplog):
+    with scopes_disabled():
+        orgs = [Organizer.objects.create(name=f"Org {i}", slug=f"org{i}").pk for i in range(5)]
+
+        with QueryStats(duplicate_threshold=3) as stats:
+            for pk in orgs:
+                Organizer.objects.get(pk=pk)
+    assert stats.count == 5
+    assert stats.max_duplicates == 5
+    assert stats.duration > 0
+    assert len(stats.stacks) == 1
+
+    with caplog.at_level(logging.WARNING, logger="pretix.helpers.metrics.queries"):
+        stats.report(name="test")
+    assert "5 times the same query" in caplog.text
+    assert "test_query_metrics.py" in caplog.text
+    assert fakeredis_client.hget("pretix_metrics", 'pretix_query_count_count{name="test"}') == b"1"
+    assert fakeredis_client.hget("pretix_metrics", 'pretix_query_count_bucket{name="test",le="5.0"}') == b"1"
+    assert fakeredis_client.hget("pretix_metrics", 'pretix_query_count_bucket{name="test",le="2.0"}') is None
+
+
+@pytest.mark.django_db
+@override_settings(METRICS_QUERY_BUDGET=3, METRICS_QUERY_LOG_RATE=100)
+def test_query_stats_within_budget(fakeredis_client, caplog):
+    with scopes_disabled():
+        with QueryStats() as stats:
+            Organizer.objects.count()
+
+    with caplog.at_level(logging.WARNING, logger="pretix.helpers.metrics.queries"):
+        stats.report(name="test")
+    assert stats.count == 1
+    assert not caplog.text
@@ -36,11 +36,12 @@ import datetime
 import json
 from datetime import timedelta
 from decimal import Decimal
+from unittest import mock
 
 import freezegun
 from bs4 import BeautifulSoup
 from django.conf import settings
-from django.test import TestCase
+from django.test import TestCase, override_settings
 from django.utils.timezone import now
 from django_countries.fields import Country
 from django_scopes import scopes_disabled
@@ -55,7 +56,9 @@ from pretix.base.models import (
 from pretix.base.models.items import (
     ItemAddOn, ItemBundle, SubEventItem, SubEventItemVariation,
 )
-from pretix.base.services.cart import CartError, CartManager, error_messages
+from pretix.base.services.cart import (
+    CartError, CartManager, add_items_to_cart, error_messages,
+)
 from pretix.testutils.scope import classscope
 from pretix.testutils.sessions import get_cart_session_key
 
@@ -168,6 +171,44 @@ class CartTest(CartTestMixin, TestCase):
         self.assertIsNone(objs[0].variation)
         self.assertEqual(objs[0].price, 23)
 
+    @override_settings(HAS_CELERY=True, INLINE_TASKS=True,
+                       CACHES={'default': {'BACKEND': 'django.core.cache.backends.locmem.LocMemCache'}})
+    def test_inline(self):
+        with mock.patch.object(add_items_to_cart, 'apply_async', wraps=add_items_to_cart.apply_async) as apply_async:
+            response = self.client.post('/%s/%s/cart/add?ajax=1' % (self.orga.slug, self.event.slug), {
+                'item_%d' % self.ticket.id: '1'
+            })
+            assert not apply_async.called
+            data = response.json()
+            assert data['ready']
+            assert data['success']
+            with scopes_disabled():
+                assert CartPosition.objects.filter(cart_id=self.session_key, event=self.event).count() == 1
+
+            # Too many products for inline execution
+            self.client.post('/%s/%s/cart/add?ajax=1' % (self.orga.slug, self.event.slug), {
+                'item_%d' % self.ticket.id: '1',
+                'variation_%d_%d' % (self.shirt.id, self.shirt_blue.id): '10',
+            })
+            assert apply_async.call_count == 1
+
+    @override_settings(HAS_CELERY=True, INLINE_TASKS=True,
+                       CACHES={'default': {'BACKEND': 'django.core.cache.backends.locmem.LocMemCache'}})
+    def test_inline_lock_contention(self):
+        with mock.patch.object(add_items_to_cart, 'apply_async', wraps=add_items_to_cart.apply_async) as apply_async:
+            self.client.post('/%s/%s/cart/add?ajax=1&_debug_flag=fail-locking' % (self.orga.slug, self.event.slug), {
+                'item_%d' % self.ticket.id: '1'
+            })
+            assert apply_async.call_count == 1
+
+            # After running into a lock, the operations of this event are sent to the workers for a while
+            self.client.post('/%s/%s/cart/add?ajax=1' % (self.orga.slug, self.event.slug), {
+                'item_%d' % self.ticket.id: '1'
+            })
+            assert apply_async.call_count == 2
+        with scopes_disabled():
+            assert CartPosition.objects.filter(cart_id=self.session_key, event=self.event).count() == 1
+
     def test_widget_data_post(self):
         self.event.settings.attendee_names_asked = True
         self.event.settings.attendee_emails_asked = True
@@ -0,0 +1,173 @@
+#
+# This file is part of pretix (Community Edition).
+#
+# Copyright (C) 2014-2020  Raphael Michel and contributors
+# Copyright (C) 2020-today pretix GmbH and contributors
+#
+# This program is free software: you can redistribute it and/or modify it under the terms of the GNU Affero General
+# Public License as published by the Free Software Foundation in version 3 of the License.
+#
+# ADDITIONAL TERMS APPLY: Pursuant to Section 7 of the GNU Affero General Public License, additional terms are
+# applicable granting you additional permissions and placing additional restrictions on your usage of this software.
+# Please refer to the pretix LICENSE file to obtain the full terms applicable to this work. If you did not receive
+# this file, see <https://pretix.eu/about/en/license>.
+#
+# This program is distributed in the hope that it will be useful, but WITHOUT ANY WARRANTY; without even the implied
+# warranty of MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the GNU Affero General Public License for more
+# details.
+#
+# You should have received a copy of the GNU Affero General Public License along with this program.  If not, see
+# <https://www.gnu.org/licenses/>.
+#
+import datetime
+import html
+import re
+
+import pytest
+from django.test import Client, override_settings
+from django.utils.timezone import now
+from django_scopes import scopes_disabled
+from freezegun import freeze_time
+
+from pretix.base.models import Event, Organizer
+from pretix.presale.waitingroom import (
+    admission_rate, admitted_until, issue_ticket,
+)
+
+
+@pytest.fixture
+def event(fakeredis_client):
+    with scopes_disabled():
+        o = Organizer.objects.create(name='Dummy', slug='dummy')
+        event = Event.objects.create(
+            organizer=o, name='Dummy', slug='dummy', live=True,
+            date_from=now() + datetime.timedelta(days=30),
+        )
+        event.settings.waiting_room_enabled = True
+        event.settings.waiting_room_rate = 1
+        yield event
+
+
+@pytest.mark.django_db
+def test_admission(event):
+    with freeze_time("2026-03-01 10:00:00"):
+        first, second, third = Client(), Client(), Client()
+        # One minute worth of visitors is let in right away
+        assert first.get('/dummy/dummy/').status_code == 200
+        assert second.get('/dummy/dummy/').status_code == 200
+
+        r = third.get('/dummy/dummy/')
+        assert r.status_code == 302
+        assert r['Location'].startswith('/dummy/dummy/waitingroom/?next=/dummy/dummy/&waitingroom_ticket=')
+        r = third.get(r['Location'])
+        assert r.status_code == 200
+        assert 'number 1 in the queue' in r.content.decode()
+        assert third.get('/dummy/dummy/waitingroom/status').json() == {
+            'admitted': False, 'position': 1, 'redirect': None,
+        }
+        # Existing orders are not behind the waiting room
+        assert third.get('/dummy/dummy/order/ABC/secret/').status_code == 404
+
+        # Visitors keep their place in the queue and admitted visitors stay admitted
+        assert first.get('/dummy/dummy/').status_code == 200
+        assert third.get('/dummy/dummy/').status_code == 302
+
+    with freeze_time("2026-03-01 10:01:00"):
+        assert third.get('/dummy/dummy/waitingroom/status').json() == {
+            'admitted': True, 'position': 0, 'redirect': '/dummy/dummy/',
+        }
+        assert third.get('/dummy/dummy/waitingroom/?next=/dummy/dummy/')['Location'] == '/dummy/dummy/'
+        assert third.get('/dummy/dummy/').status_code == 200
+
+    event.settings.waiting_room_enabled = False
+    assert Client().get('/dummy/dummy/').status_code == 200
+
+
+@pytest.mark.django_db
+def test_without_cookies(event):
+    with freeze_time("2026-03-01 10:00:00"):
+        Client().get('/dummy/dummy/')
+        Client().get('/dummy/dummy/')
+        # Every request of this visitor comes without cookies, e.g. in an iframe with third-party cookies blocked
+        visitor = Client()
+        refresh_url = visitor.get('/dummy/dummy/')['Location']
+        for i in range(2):
+            visitor.cookies.clear()
+            r = visitor.get(refresh_url)
+            assert 'number 1 in the queue' in r.content.decode()
+            refresh_url = html.unescape(re.search(r'content="\d+; url=([^"]+)"', r.content.decode()).group(1))
+            assert 'waitingroom_ticket=' in refresh_url
+        visitor.cookies.clear()
+        assert Client().get('/dummy/dummy/waitingroom/status').json()['position'] == 2
+
+    with freeze_time("2026-03-01 10:01:00"):
+        visitor.cookies.clear()
+        r = visitor.get(refresh_url)
+        assert r.status_code == 200
+        assert 'Cookies not supported' in r.content.decode()
+        visitor.cookies.clear()
+        redirect = visitor.get(refresh_url.replace('/waitingroom/', '/waitingroom/status')).json()['redirect']
+        assert redirect.startswith('/dummy/dummy/?waitingroom_ticket=')
+
+        # In a new tab, the admission is taken over from the URL and stored in a cookie
+        new_tab = Client()
+        assert new_tab.get(redirect).status_code == 200
+        assert new_tab.get('/dummy/dummy/').status_code == 200
+
+
+@pytest.mark.django_db
+def test_ajax_cart_add(event):
+    Client().get('/dummy/dummy/')
+    Client().get('/dummy/dummy/')
+    r = Client().post('/dummy/dummy/cart/add?ajax=1', {})
+    assert r.json()['redirect'].startswith('/dummy/dummy/waitingroom/?waitingroom_ticket=')
+
+
+@pytest.mark.django_db
+def test_rate_from_throughput(event, fakeredis_client):
+    assert admission_rate(event) == 1
+    del event.settings.waiting_room_rate
+    assert admission_rate(event) == 60
+    with freeze_time("2026-03-01 10:05:30"):
+        fakeredis_client.set('pretix_waitingroom:{}:orders:{}'.format(event.pk, 29539323), 100)
+        fakeredis_client.set('pretix_waitingroom:{}:orders:{}'.format(event.pk, 29539324), 100)
+        assert admission_rate(event) == 60
+        fakeredis_client.set('pretix_waitingroom:{}:orders:{}'.format(event.pk, 29539324), 10)
+        assert admission_rate(event) == 33
+
+
+@pytest.mark.django_db
+def test_admitted_never_moves_backwards(event):
+    with freeze_time("2026-03-01 10:00:00"):
+        for i in range(10):
+            issue_ticket(event)
+        assert admitted_until(event, rate=6) == 16
+    with freeze_time("2026-03-01 10:00:30"):
+        for i in range(20):
+            issue_ticket(event)
+        assert admitted_until(event, rate=6) == 19
+    with freeze_time("2026-03-01 10:00:20"):
+        # A server with a clock running behind must not undo the progress
+        assert admitted_until(event, rate=6) == 19
+    with freeze_time("2026-03-01 10:01:30"):
+        assert admitted_until(event, rate=6) == 25
+    with freeze_time("2026-03-01 10:01:35"):
+        assert admitted_until(event, rate=6) == 25
+    with freeze_time("2026-03-01 10:01:40"):
+        assert admitted_until(event, rate=6) == 26
+
+
+@pytest.mark.django_db
+@override_settings(HAS_REDIS=False)
+def test_disabled_without_redis():
+    with scopes_disabled():
+        o = Organizer.objects.create(name='Dummy', slug='dummy')
+        event = Event.objects.create(
+            organizer=o, name='Dummy', slug='dummy', live=True,
+            date_from=now() + datetime.timedelta(days=30),
+        )
+    event.settings.waiting_room_enabled = True
+    event.settings.waiting_room_rate = 1
+    for i in range(5):
+        assert Client().get('/dummy/dummy/').status_code == 200
+    assert Client().get('/dummy/dummy/waitingroom/status').json()['admitted']